@@ -0,0 +1,60 @@
+#include "FusedSampling.h"
+#include <torch/all.h>
+#include <torch/csrc/autograd/function.h>
+
+namespace torch_ipex {
+namespace cpu {
+
+DEFINE_DISPATCH(fused_sampling_kernel_stub);
+
+/*
+ *Draw the next token of each sequence from the logits of the last position,
+ *fusing the repetition penalty, temperature, top-k and top-p filtering and the
+ *multinomial draw in one pass over the vocab, in the order of the logits
+ *processors and warpers of transformers.
+ *@param logits [batch, vocab_size]
+ *@param input_ids [batch, seq_len], the tokens penalized by the repetition
+ *penalty
+ *@param temperature the logits are divided by the temperature
+ *@param top_k keep the top_k tokens of the highest logits, 0 to disable
+ *@param top_p keep the smallest set of the most probable tokens whose
+ *cumulative probability reaches top_p, 1.0 to disable
+ *@param repetition_penalty the penalty of the tokens in input_ids, 1.0 to
+ *disable
+ *@param uniform [batch], the uniform random numbers in [0, 1) of the draw
+ *@return next_tokens [batch]
+ */
+at::Tensor fused_sampling_forward_cpu(
+    const at::Tensor& logits,
+    const at::Tensor& input_ids,
+    const double temperature,
+    const int64_t top_k,
+    const double top_p,
+    const double repetition_penalty,
+    const at::Tensor& uniform) {
+  return fused_sampling_kernel_stub(
+      kCPU,
+      logits,
+      input_ids,
+      temperature,
+      top_k,
+      top_p,
+      repetition_penalty,
+      uniform);
+}
+
+} // namespace cpu
+} // namespace torch_ipex
+
+namespace {
+
+TORCH_LIBRARY_FRAGMENT(torch_ipex, m) {
+  m.def(
+      "fused_sampling(Tensor logits, Tensor input_ids, float temperature, int top_k, \
+       float top_p, float repetition_penalty, Tensor uniform)-> Tensor");
+  m.impl(
+      "fused_sampling",
+      c10::DispatchKey::CPU,
+      torch_ipex::cpu::fused_sampling_forward_cpu);
+}
+} // namespace
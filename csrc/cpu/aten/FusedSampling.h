@@ -0,0 +1,33 @@
+#pragma once
+
+#include <ATen/ATen.h>
+#include <dyndisp/DispatchStub.h>
+
+namespace torch_ipex {
+namespace cpu {
+
+namespace {
+
+at::Tensor fused_sampling(
+    const at::Tensor& logits,
+    const at::Tensor& input_ids,
+    const double temperature,
+    const int64_t top_k,
+    const double top_p,
+    const double repetition_penalty,
+    const at::Tensor& uniform);
+}
+
+using fused_sampling_kernel_fn = at::Tensor (*)(
+    const at::Tensor& logits,
+    const at::Tensor& input_ids,
+    const double temperature,
+    const int64_t top_k,
+    const double top_p,
+    const double repetition_penalty,
+    const at::Tensor& uniform);
+
+DECLARE_DISPATCH(fused_sampling_kernel_fn, fused_sampling_kernel_stub);
+
+} // namespace cpu
+} // namespace torch_ipex
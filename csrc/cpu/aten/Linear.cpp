@@ -366,17 +366,24 @@ at::Tensor woq_linear_pack_weight(
     int64_t lowp_mode) {
   // TPP kernel does not support edge cases
   // It generates packed weight in 4d (Nc, Kc, block_k, block_n)
-  auto N = weight.size(0), K = weight.size(1);
+  // Group-wise quantized int4 weight is in uint8 [N, K/2] holding two int4
+  // values per byte, with scales in shape [num_groups, N]
+  bool is_int4 = weight.scalar_type() == c10::kQUInt4x2 ||
+      weight.scalar_type() == c10::kByte;
+  auto N = weight.size(0);
+  auto K =
+      weight.scalar_type() == c10::kByte ? weight.size(1) * 2 : weight.size(1);
   // For TPP kernel, we only consider even K
   if (K % 2 == 0) {
-    bool is_int4 = weight.scalar_type() == c10::kQUInt4x2;
     // int num_threads = at::get_num_threads();
     size_t block_n = 32;
     if (lowp_mode == 0) {
       block_n = 16;
     }
+    // Each K block must lie in one group for group-wise quantization
+    int64_t group_size = scales.dim() == 2 ? K / scales.size(0) : K;
     size_t block_k = 64;
-    while (K % block_k != 0) {
+    while (K % block_k != 0 || group_size % block_k != 0) {
       block_k /= 2;
     }
     assert(block_k > 0);
@@ -388,7 +395,7 @@ at::Tensor woq_linear_pack_weight(
       int64_t N_int4 = N % block_n ? N / block_n * block_n + block_n : N;
       at::Tensor weight_int4 = at::empty(
           {N_int4, K_int4_compressed}, device(c10::kCPU).dtype(c10::kByte));
-      int64_t weight_size_bytes = weight.numel() / 2;
+      int64_t weight_size_bytes = N * K / 2;
       int64_t weight_int4_size_bytes = weight_int4.numel();
       int64_t pad_size_bytes = weight_int4_size_bytes - weight_size_bytes;
       std::memcpy(weight_int4.data_ptr(), weight.data_ptr(), weight_size_bytes);
@@ -0,0 +1,72 @@
+#include "PagedAttention.h"
+#include <torch/all.h>
+#include <torch/csrc/autograd/function.h>
+
+namespace torch_ipex {
+namespace cpu {
+
+DEFINE_DISPATCH(paged_attention_kernel_stub);
+
+/*
+ *Caculate the multihead attention for decoder layer with the key/value cache
+ *stored in fixed-size blocks. The new key/value of each sequence are written
+ *into the slots addressed by its block table before the attention is computed.
+ *@param query [batch, query_len, num_heads, head_size]
+ *@param key [batch, query_len, num_kv_heads, head_size]
+ *@param value [batch, query_len, num_kv_heads, head_size]
+ *@param key_cache [num_blocks, block_size, num_kv_heads, head_size]
+ *@param value_cache [num_blocks, block_size, num_kv_heads, head_size]
+ *@param block_tables [batch, max_num_blocks_per_seq]
+ *@param context_lens [batch], the number of cached tokens of each sequence
+ *@param scale_attn the sqrt(head_dim)
+ *@param attention_mask
+ *@param key_scale [num_blocks, block_size, num_kv_heads], the scales of the
+ *int8 key_cache, each head of a token is quantized with its own scale
+ *@param value_scale [num_blocks, block_size, num_kv_heads], the scales of the
+ *int8 value_cache
+ *@return attn_outs [batch, num_heads, query_len, head_size]
+ */
+at::Tensor paged_attention_forward_cpu(
+    at::Tensor& query,
+    at::Tensor& key,
+    at::Tensor& value,
+    at::Tensor& key_cache,
+    at::Tensor& value_cache,
+    at::Tensor& block_tables,
+    at::Tensor& context_lens,
+    const double scale_attn,
+    const c10::optional<at::Tensor>& attention_mask /* optional */,
+    const c10::optional<at::Tensor>& key_scale /* optional */,
+    const c10::optional<at::Tensor>& value_scale /* optional */) {
+  return paged_attention_kernel_stub(
+      kCPU,
+      query,
+      key,
+      value,
+      key_cache,
+      value_cache,
+      block_tables,
+      context_lens,
+      scale_attn,
+      attention_mask,
+      key_scale,
+      value_scale);
+}
+
+} // namespace cpu
+} // namespace torch_ipex
+
+namespace {
+
+TORCH_LIBRARY_FRAGMENT(torch_ipex, m) {
+  m.def(
+      "paged_attention(Tensor query, Tensor key, Tensor value, Tensor(a!) key_cache, \
+       Tensor(b!) value_cache, Tensor block_tables, Tensor context_lens, float scale_attn, \
+       Tensor? attention_mask, Tensor(c!)? key_scale=None, \
+       Tensor(d!)? value_scale=None)-> Tensor");
+  m.impl(
+      "paged_attention",
+      c10::DispatchKey::CPU,
+      torch_ipex::cpu::paged_attention_forward_cpu);
+}
+} // namespace
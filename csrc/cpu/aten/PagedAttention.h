@@ -0,0 +1,41 @@
+#pragma once
+
+#include <ATen/ATen.h>
+#include <dyndisp/DispatchStub.h>
+
+namespace torch_ipex {
+namespace cpu {
+
+namespace {
+
+at::Tensor paged_attention(
+    at::Tensor& query,
+    at::Tensor& key,
+    at::Tensor& value,
+    at::Tensor& key_cache,
+    at::Tensor& value_cache,
+    at::Tensor& block_tables,
+    at::Tensor& context_lens,
+    const double scale_attn,
+    const c10::optional<at::Tensor>& attention_mask /* optional */,
+    const c10::optional<at::Tensor>& key_scale /* optional */,
+    const c10::optional<at::Tensor>& value_scale /* optional */);
+}
+
+using paged_attention_kernel_fn = at::Tensor (*)(
+    at::Tensor& query,
+    at::Tensor& key,
+    at::Tensor& value,
+    at::Tensor& key_cache,
+    at::Tensor& value_cache,
+    at::Tensor& block_tables,
+    at::Tensor& context_lens,
+    const double scale_attn,
+    const c10::optional<at::Tensor>& attention_mask /* optional */,
+    const c10::optional<at::Tensor>& key_scale /* optional */,
+    const c10::optional<at::Tensor>& value_scale /* optional */);
+
+DECLARE_DISPATCH(paged_attention_kernel_fn, paged_attention_kernel_stub);
+
+} // namespace cpu
+} // namespace torch_ipex
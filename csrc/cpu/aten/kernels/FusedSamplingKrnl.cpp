@@ -0,0 +1,142 @@
+#include <ATen/Tensor.h>
+#include <aten/FusedSampling.h>
+#include <torch/all.h>
+#include <torch/csrc/autograd/function.h>
+#include <algorithm>
+#include <cmath>
+#include <numeric>
+#include <vector>
+
+namespace torch_ipex {
+namespace cpu {
+
+namespace {
+
+template <typename T>
+int64_t sample_row(
+    const T* logits_ptr,
+    const int64_t* input_ids_ptr,
+    int64_t vocab_size,
+    int64_t seq_len,
+    float temperature,
+    int64_t top_k,
+    float top_p,
+    float repetition_penalty,
+    float uniform) {
+  std::vector<float> scores(vocab_size);
+  for (auto vi = 0; vi < vocab_size; vi++) {
+    scores[vi] = static_cast<float>(logits_ptr[vi]);
+  }
+  // the repetition penalty lowers the logits of the tokens already generated,
+  // once per token no matter how many times it appears
+  if (repetition_penalty != 1.f) {
+    std::vector<bool> penalized(vocab_size, false);
+    for (auto si = 0; si < seq_len; si++) {
+      auto token = input_ids_ptr[si];
+      if (token < 0 || token >= vocab_size || penalized[token]) {
+        continue;
+      }
+      penalized[token] = true;
+      scores[token] = scores[token] < 0 ? scores[token] * repetition_penalty
+                                        : scores[token] / repetition_penalty;
+    }
+  }
+  // the candidates sorted by the logits, only the top_k ones are sorted
+  std::vector<int64_t> candidates(vocab_size);
+  std::iota(candidates.begin(), candidates.end(), 0);
+  auto num_candidates =
+      top_k > 0 && top_k < vocab_size ? top_k : vocab_size;
+  auto greater = [&](int64_t a, int64_t b) { return scores[a] > scores[b]; };
+  if (num_candidates < vocab_size) {
+    std::partial_sort(
+        candidates.begin(),
+        candidates.begin() + num_candidates,
+        candidates.end(),
+        greater);
+  } else {
+    std::sort(candidates.begin(), candidates.end(), greater);
+  }
+  // softmax of the candidates at the temperature
+  auto max_val = scores[candidates[0]] / temperature;
+  std::vector<float> probs(num_candidates);
+  float sum = 0.f;
+  for (auto ci = 0; ci < num_candidates; ci++) {
+    probs[ci] = std::exp(scores[candidates[ci]] / temperature - max_val);
+    sum += probs[ci];
+  }
+  // top-p: keep the most probable candidates until their probability reaches
+  // top_p, including the one crossing it
+  if (top_p < 1.f) {
+    float cum_prob = 0.f;
+    for (auto ci = 0; ci < num_candidates; ci++) {
+      cum_prob += probs[ci] / sum;
+      if (cum_prob >= top_p) {
+        num_candidates = ci + 1;
+        break;
+      }
+    }
+    sum = std::accumulate(probs.begin(), probs.begin() + num_candidates, 0.f);
+  }
+  // multinomial draw by the inverse of the cumulative distribution
+  auto target = uniform * sum;
+  float cum = 0.f;
+  for (auto ci = 0; ci < num_candidates; ci++) {
+    cum += probs[ci];
+    if (target < cum) {
+      return candidates[ci];
+    }
+  }
+  return candidates[num_candidates - 1];
+}
+
+at::Tensor fused_sampling_kernel_impl(
+    const at::Tensor& logits,
+    const at::Tensor& input_ids,
+    const double temperature,
+    const int64_t top_k,
+    const double top_p,
+    const double repetition_penalty,
+    const at::Tensor& uniform) {
+  RECORD_FUNCTION(
+      "ipex::fused_sampling_kernel_impl", c10::ArrayRef<c10::IValue>({}));
+  TORCH_CHECK(
+      logits.dim() == 2, "fused_sampling: logits should be [batch, vocab_size]");
+  TORCH_CHECK(temperature > 0, "fused_sampling: temperature should be > 0");
+  auto bs = logits.size(0);
+  auto vocab_size = logits.size(1);
+  auto logits_ = logits.contiguous();
+  auto input_ids_ = input_ids.to(at::kLong).contiguous();
+  auto uniform_ = uniform.to(at::kFloat).contiguous();
+  TORCH_CHECK(
+      input_ids_.size(0) == bs && uniform_.numel() == bs,
+      "fused_sampling: input_ids and uniform should have the batch size of logits");
+  auto seq_len = input_ids_.size(1);
+  auto next_tokens = at::empty({bs}, at::kLong);
+  auto next_tokens_ptr = next_tokens.data_ptr<int64_t>();
+  auto input_ids_ptr = input_ids_.data_ptr<int64_t>();
+  auto uniform_ptr = uniform_.data_ptr<float>();
+  AT_DISPATCH_FLOATING_TYPES_AND2(
+      at::kBFloat16, at::kHalf, logits_.scalar_type(), "fused_sampling", [&] {
+        auto logits_ptr = logits_.data_ptr<scalar_t>();
+#pragma omp parallel for
+        for (auto bi = 0; bi < bs; bi++) {
+          next_tokens_ptr[bi] = sample_row<scalar_t>(
+              logits_ptr + bi * vocab_size,
+              input_ids_ptr + bi * seq_len,
+              vocab_size,
+              seq_len,
+              temperature,
+              top_k,
+              top_p,
+              repetition_penalty,
+              uniform_ptr[bi]);
+        }
+      });
+  return next_tokens;
+}
+} // anonymous namespace
+
+REGISTER_DISPATCH(fused_sampling_kernel_stub, &fused_sampling_kernel_impl);
+
+} // namespace cpu
+} // namespace torch_ipex
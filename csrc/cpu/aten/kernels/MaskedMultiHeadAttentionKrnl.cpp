@@ -479,16 +479,23 @@ scale_dot_product_for_indirect_access_kv_cache(
   auto attn_out_ptr = attn_outs.data_ptr<VT>();
   // torch_ipex::cpu::kernel::zero_ker(attn_out_ptr, attn_outs.numel());
   auto attn_w_ptr = attn_weights.data_ptr<float>();
-  long new_beam_idx[beam_batch][offset + query.size(1) + 1];
+  // allocate on the heap, the stack may overflow for the long sequence
+  auto new_beam_idx_t =
+      at::empty({beam_batch, offset + query.size(1) + 1}, at::kLong);
+  auto new_beam_idx = new_beam_idx_t.accessor<long, 2>();
   auto b_ptr = beam_idx.data_ptr<long>();
   if (offset > 0) {
     // according to the last decoded token to get the target beam for the past
     // token
+    // the query of the multiple tokens (e.g. the rest of the prompt after the
+    // cached prefix) only comes with the first beam of each batch
+    auto beam_size = beam_batch / bs;
     for (int i = 0; i < bs; i++) {
-      new_beam_idx[i][offset - 1] = b_ptr[(offset - 1) * bs + i];
+      new_beam_idx[i][offset - 1] =
+          b_ptr[(offset - 1) * beam_batch + i * beam_size];
       for (int j = offset - 2; j >= 0;
            j--) { // for the token of input, the target beam is alwarys 0
-        new_beam_idx[i][j] = b_ptr[j * bs + new_beam_idx[i][j + 1]];
+        new_beam_idx[i][j] = b_ptr[j * beam_batch + new_beam_idx[i][j + 1]];
       }
     }
   }
@@ -552,11 +559,6 @@ scale_dot_product_for_indirect_access_kv_cache(
               } else {
                 kc_t_beam_start = kc_t_beam_start +
                     new_beam_idx[bi][ti] * kv_head * head_size;
-                if (cur_len > 1) {
-                  auto beam_size = beam_batch / bs;
-                  kc_t_beam_start =
-                      kc_t_beam_start + bi * beam_size * kv_head * head_size;
-                }
                 auto kc_head_start =
                     k_cache_ptr + kc_t_beam_start + kv_hi * head_size;
                 reduce_head<QT>(
@@ -705,11 +707,6 @@ scale_dot_product_for_indirect_access_kv_cache(
               } else {
                 auto vc_t_beam_start =
                     vc_token_start + new_beam_idx[bi][vi] * kv_head * head_size;
-                if (cur_len > 1) {
-                  auto beam_size = beam_batch / bs;
-                  vc_t_beam_start =
-                      vc_t_beam_start + bi * beam_size * kv_head * head_size;
-                }
                 auto v_cache_head_start =
                     v_cache_ptr + vc_t_beam_start + kv_hi * head_size;
                 mul_attenion_weights_and_value_of_head<VT, float>(
@@ -800,16 +797,23 @@ scale_dot_product_for_indirect_access_kv_cache_half(
   auto attn_out_ptr = attn_outs.data_ptr<at::Half>();
   // torch_ipex::cpu::kernel::zero_ker(attn_out_ptr, attn_outs.numel());
   auto attn_w_ptr = attn_weights.data_ptr<at::Half>();
-  long new_beam_idx[beam_batch][offset + query.size(1) + 1];
+  // allocate on the heap, the stack may overflow for the long sequence
+  auto new_beam_idx_t =
+      at::empty({beam_batch, offset + query.size(1) + 1}, at::kLong);
+  auto new_beam_idx = new_beam_idx_t.accessor<long, 2>();
   auto b_ptr = beam_idx.data_ptr<long>();
   if (offset > 0) {
     // according to the last decoded token to get the target beam for the past
     // token
+    // the query of the multiple tokens (e.g. the rest of the prompt after the
+    // cached prefix) only comes with the first beam of each batch
+    auto beam_size = beam_batch / bs;
     for (int i = 0; i < bs; i++) {
-      new_beam_idx[i][offset - 1] = b_ptr[(offset - 1) * bs + i];
+      new_beam_idx[i][offset - 1] =
+          b_ptr[(offset - 1) * beam_batch + i * beam_size];
       for (int j = offset - 2; j >= 0;
            j--) { // for the token of input, the target beam is alwarys 0
-        new_beam_idx[i][j] = b_ptr[j * bs + new_beam_idx[i][j + 1]];
+        new_beam_idx[i][j] = b_ptr[j * beam_batch + new_beam_idx[i][j + 1]];
       }
     }
   }
@@ -873,11 +877,6 @@ scale_dot_product_for_indirect_access_kv_cache_half(
               } else {
                 kc_t_beam_start = kc_t_beam_start +
                     new_beam_idx[bi][ti] * kv_head * head_size;
-                if (cur_len > 1) {
-                  auto beam_size = beam_batch / bs;
-                  kc_t_beam_start =
-                      kc_t_beam_start + bi * beam_size * kv_head * head_size;
-                }
                 auto kc_head_start =
                     k_cache_ptr + kc_t_beam_start + kv_hi * head_size;
                 reduce_head_half(
@@ -1000,11 +999,6 @@ scale_dot_product_for_indirect_access_kv_cache_half(
               } else {
                 auto vc_t_beam_start =
                     vc_token_start + new_beam_idx[bi][vi] * kv_head * head_size;
-                if (cur_len > 1) {
-                  auto beam_size = beam_batch / bs;
-                  vc_t_beam_start =
-                      vc_t_beam_start + bi * beam_size * kv_head * head_size;
-                }
                 auto v_cache_head_start =
                     v_cache_ptr + vc_t_beam_start + kv_hi * head_size;
                 mul_attenion_weights_and_value_of_head_half(
@@ -1276,6 +1270,11 @@ masked_multihead_self_attention_kernel_impl(
   auto cache_size = key_cache.size(0);
   auto cur_len = query.size(1);
   if (offset == 0) {
+    // the fake beam_idx of the first token is sized by the expected sequence
+    // length of the generation, otherwise fallback to max_positions
+    if (beam_idx.size(0) > 1) {
+      max_positions = beam_idx.size(0);
+    }
     max_positions =
         max_positions > cur_len ? max_positions : max_positions + cur_len;
     key_cache = at::empty(
@@ -1296,7 +1295,8 @@ masked_multihead_self_attention_kernel_impl(
       }
     }
   } else if (offset > 0 && offset + cur_len > cache_size) {
-    auto new_cache_size = cache_size * 2;
+    // grow the cache geometrically, and at least to fit the current tokens
+    auto new_cache_size = std::max(cache_size * 2, offset + cur_len);
     auto new_key_cache = at::empty(
         {new_cache_size, beam_batch, key.size(2), key.size(3)}, key.options());
     auto new_value_cache = at::empty(
@@ -0,0 +1,496 @@
+#include <ATen/Tensor.h>
+#include <aten/PagedAttention.h>
+#include <torch/all.h>
+#include <torch/csrc/autograd/function.h>
+#include <cmath>
+#include <omp.h>
+#include <limits>
+#include "vec/vec.h"
+
+namespace torch_ipex {
+namespace cpu {
+
+namespace {
+
+template <typename T, typename CT>
+inline void store_head(
+    const T* src,
+    CT* dst,
+    float* scale /* unused */,
+    int64_t head_size) {
+  for (auto i = 0; i < head_size; i++) {
+    dst[i] = src[i];
+  }
+}
+
+/*
+ *Quantize a head of a token to int8 with a symmetric scale of the head, the
+ *scale is stored along with the int8 values and applied when the head is read.
+ */
+template <typename T>
+inline void store_head(
+    const T* src,
+    int8_t* dst,
+    float* scale,
+    int64_t head_size) {
+  float max_abs = 0.f;
+  for (auto i = 0; i < head_size; i++) {
+    max_abs = std::max(max_abs, std::abs(static_cast<float>(src[i])));
+  }
+  auto head_scale = max_abs / 127.f;
+  auto inv_scale = head_scale == 0.f ? 0.f : 1.f / head_scale;
+  for (auto i = 0; i < head_size; i++) {
+    auto v = std::nearbyint(static_cast<float>(src[i]) * inv_scale);
+    dst[i] = static_cast<int8_t>(std::min(std::max(v, -127.f), 127.f));
+  }
+  scale[0] = head_scale;
+}
+
+/*
+ *Write the key/value of the current tokens into the cache slots addressed by
+ *the block table of each sequence. The token `context_lens[b] + qi` of
+ *sequence `b` lives in block `block_tables[b][pos / block_size]` at slot
+ *`pos % block_size`. For the int8 cache, the scale of each head of the token is
+ *written into the key/value scales of shape [num_blocks, block_size, kv_heads].
+ */
+template <typename T, typename CT>
+void reshape_and_cache(
+    const T* key_ptr,
+    const T* value_ptr,
+    CT* key_cache_ptr,
+    CT* value_cache_ptr,
+    float* key_scale_ptr,
+    float* value_scale_ptr,
+    const int64_t* block_tables_ptr,
+    const int64_t* context_lens_ptr,
+    int64_t bs,
+    int64_t q_len,
+    int64_t kv_head_num,
+    int64_t head_size,
+    int64_t block_size,
+    int64_t max_num_blocks) {
+  auto token_stride = kv_head_num * head_size;
+#pragma omp parallel for collapse(2)
+  for (auto bi = 0; bi < bs; bi++) {
+    for (auto qi = 0; qi < q_len; qi++) {
+      auto pos = context_lens_ptr[bi] + qi;
+      auto block_id = block_tables_ptr[bi * max_num_blocks + pos / block_size];
+      auto slot = block_id * block_size + pos % block_size;
+      auto src_offset = (bi * q_len + qi) * token_stride;
+      for (auto hi = 0; hi < kv_head_num; hi++) {
+        auto head_offset = hi * head_size;
+        auto scale_offset = slot * kv_head_num + hi;
+        store_head(
+            key_ptr + src_offset + head_offset,
+            key_cache_ptr + slot * token_stride + head_offset,
+            key_scale_ptr == nullptr ? nullptr : key_scale_ptr + scale_offset,
+            head_size);
+        store_head(
+            value_ptr + src_offset + head_offset,
+            value_cache_ptr + slot * token_stride + head_offset,
+            value_scale_ptr == nullptr ? nullptr
+                                       : value_scale_ptr + scale_offset,
+            head_size);
+      }
+    }
+  }
+}
+
+#if defined(CPU_CAPABILITY_AVX512)
+/*
+ *Load 16 elements of a head of the query, key or value as float32. The int8
+ *kv cache is converted as is, and dequantized by the scale of the head by the
+ *caller.
+ */
+inline __m512 load_fp32(const float* ptr) {
+  return _loadu(ptr);
+}
+
+inline __m512 load_fp32(const at::BFloat16* ptr) {
+  return _loadu(ptr);
+}
+
+inline __m512 load_fp32(const at::Half* ptr) {
+  return _loadu(ptr);
+}
+
+inline __m512 load_fp32(const int8_t* ptr) {
+  return _mm512_cvtepi32_ps(
+      _mm512_cvtepi8_epi32(_mm_loadu_si128((const __m128i*)ptr)));
+}
+
+inline __m512 maskz_load_fp32(const float* ptr, __mmask16 mask) {
+  return _maskz_loadu(ptr, mask);
+}
+
+inline __m512 maskz_load_fp32(const at::BFloat16* ptr, __mmask16 mask) {
+  return _maskz_loadu(ptr, mask);
+}
+
+inline __m512 maskz_load_fp32(const at::Half* ptr, __mmask16 mask) {
+  return _maskz_loadu(ptr, mask);
+}
+
+inline __m512 maskz_load_fp32(const int8_t* ptr, __mmask16 mask) {
+  return _mm512_cvtepi32_ps(
+      _mm512_cvtepi8_epi32(_mm_maskz_loadu_epi8(mask, ptr)));
+}
+#endif
+
+/*
+ *The dot product of the float32 query head and a key head of the cache.
+ */
+template <typename CT>
+inline float reduce_head(
+    const float* q_ptr_start,
+    const CT* k_ptr_start,
+    int64_t head_size) {
+#if defined(CPU_CAPABILITY_AVX512)
+  auto hsi = 0;
+  auto vec_size = 16; // 512/32
+  auto qk_sum_vec = _mm512_setzero_ps();
+  for (hsi = 0; hsi <= head_size - vec_size; hsi += vec_size) {
+    auto q_vec = _mm512_loadu_ps(q_ptr_start + hsi);
+    auto k_vec = load_fp32(k_ptr_start + hsi);
+    qk_sum_vec = _mm512_fmadd_ps(q_vec, k_vec, qk_sum_vec);
+  }
+  if (hsi < head_size) {
+    __mmask16 mask = (1 << (head_size - hsi)) - 1;
+    auto q_vec = _mm512_maskz_loadu_ps(mask, q_ptr_start + hsi);
+    auto k_vec = maskz_load_fp32(k_ptr_start + hsi, mask);
+    qk_sum_vec = _mm512_fmadd_ps(q_vec, k_vec, qk_sum_vec);
+  }
+  return _mm512_reduce_add_ps(qk_sum_vec);
+#else
+  float qk = 0.f;
+  for (auto hsi = 0; hsi < head_size; hsi++) {
+    qk += q_ptr_start[hsi] * static_cast<float>(k_ptr_start[hsi]);
+  }
+  return qk;
+#endif
+}
+
+/*
+ *Accumulate a value head of the cache weighted by its attention weight into
+ *the float32 output head.
+ */
+template <typename CT>
+inline void mul_attenion_weights_and_value_of_head(
+    float attn_w,
+    const CT* v_ptr_start,
+    float* attn_out_start,
+    int64_t head_size) {
+#if defined(CPU_CAPABILITY_AVX512)
+  auto hsi = 0;
+  auto vec_size = 16; // 512/32
+  auto attn_w_vec = _mm512_set1_ps(attn_w);
+  for (hsi = 0; hsi <= head_size - vec_size; hsi += vec_size) {
+    auto v_vec = load_fp32(v_ptr_start + hsi);
+    auto attn_out_vec = _mm512_loadu_ps(attn_out_start + hsi);
+    _mm512_storeu_ps(
+        attn_out_start + hsi, _mm512_fmadd_ps(attn_w_vec, v_vec, attn_out_vec));
+  }
+  if (hsi < head_size) {
+    __mmask16 mask = (1 << (head_size - hsi)) - 1;
+    auto v_vec = maskz_load_fp32(v_ptr_start + hsi, mask);
+    auto attn_out_vec = _mm512_maskz_loadu_ps(mask, attn_out_start + hsi);
+    _mm512_mask_storeu_ps(
+        attn_out_start + hsi,
+        mask,
+        _mm512_fmadd_ps(attn_w_vec, v_vec, attn_out_vec));
+  }
+#else
+  for (auto hsi = 0; hsi < head_size; hsi++) {
+    attn_out_start[hsi] += attn_w * static_cast<float>(v_ptr_start[hsi]);
+  }
+#endif
+}
+
+/*
+ *softmax of the attention weights in place, the weights are left unnormalized
+ *and their sum is returned, which is folded into the value accumulation.
+ */
+inline float exp_reduce_sum(float* attn_w, int64_t seq_len, float max_val) {
+#if defined(CPU_CAPABILITY_AVX512)
+  auto sum = max_val;
+  torch_ipex::cpu::kernel::_dil_exp_reduce_sum_fusion_kernel(
+      attn_w, seq_len, attn_w, sum);
+  return sum;
+#else
+  float sum = 0.f;
+  for (auto ti = 0; ti < seq_len; ti++) {
+    attn_w[ti] = std::exp(attn_w[ti] - max_val);
+    sum += attn_w[ti];
+  }
+  return sum;
+#endif
+}
+
+template <typename T, typename CT>
+void paged_attention_impl(
+    const T* query_ptr,
+    const CT* key_cache_ptr,
+    const CT* value_cache_ptr,
+    const float* key_scale_ptr,
+    const float* value_scale_ptr,
+    const int64_t* block_tables_ptr,
+    const int64_t* context_lens_ptr,
+    const float* mask_ptr,
+    T* attn_out_ptr,
+    float* scratch_ptr,
+    int64_t bs,
+    int64_t q_len,
+    int64_t head_num,
+    int64_t kv_head_num,
+    int64_t head_size,
+    int64_t block_size,
+    int64_t max_num_blocks,
+    int64_t max_seq_len,
+    float scale_factor,
+    int64_t mask_head_num,
+    int64_t mask_q_len,
+    int64_t mask_len) {
+  auto group_size = head_num / kv_head_num;
+  auto token_stride = kv_head_num * head_size;
+  // the scratch of each thread: the attention weights of the longest sequence,
+  // the float32 query head and the float32 output head
+  auto scratch_stride = max_seq_len + 2 * head_size;
+  auto r_scale_factor = 1.f / scale_factor;
+#pragma omp parallel for collapse(3)
+  for (auto bi = 0; bi < bs; bi++) {
+    for (auto hi = 0; hi < head_num; hi++) {
+      for (auto qi = 0; qi < q_len; qi++) {
+        auto thread_id = omp_get_thread_num();
+        auto attn_w = scratch_ptr + thread_id * scratch_stride;
+        auto q_fp32 = attn_w + max_seq_len;
+        auto attn_out = q_fp32 + head_size;
+        auto context_len = context_lens_ptr[bi];
+        // causal: the query token at `context_len + qi` attends to all the
+        // tokens before it and itself
+        auto seq_len = context_len + qi + 1;
+        auto kv_hi = hi / group_size;
+        auto q_start =
+            query_ptr + ((bi * q_len + qi) * head_num + hi) * head_size;
+        const float* mask_start = nullptr;
+        if (mask_ptr != nullptr) {
+          // the mask is aligned to the right, i.e. the shorter sequences are
+          // padded on the left
+          auto mask_offset = mask_len - (context_len + q_len);
+          mask_start = mask_ptr +
+              ((bi * mask_head_num + (mask_head_num == 1 ? 0 : hi)) *
+                   mask_q_len +
+               (mask_q_len == 1 ? 0 : qi)) *
+                  mask_len +
+              mask_offset;
+        }
+        torch_ipex::cpu::kernel::move_ker<float, T>(q_fp32, q_start, head_size);
+        auto max_val = -std::numeric_limits<float>::infinity();
+        for (auto ti = 0; ti < seq_len; ti++) {
+          auto block_id =
+              block_tables_ptr[bi * max_num_blocks + ti / block_size];
+          auto slot = block_id * block_size + ti % block_size;
+          auto k_start =
+              key_cache_ptr + slot * token_stride + kv_hi * head_size;
+          auto qk = reduce_head<CT>(q_fp32, k_start, head_size);
+          // dequantize the int8 key by its scale
+          if (key_scale_ptr != nullptr) {
+            qk *= key_scale_ptr[slot * kv_head_num + kv_hi];
+          }
+          qk = qk * r_scale_factor;
+          if (mask_start != nullptr) {
+            qk += mask_start[ti];
+          }
+          attn_w[ti] = qk;
+          max_val = std::max(max_val, qk);
+        }
+        auto r_sum = 1.f / exp_reduce_sum(attn_w, seq_len, max_val);
+        torch_ipex::cpu::kernel::zero_ker(attn_out, head_size);
+        for (auto ti = 0; ti < seq_len; ti++) {
+          auto block_id =
+              block_tables_ptr[bi * max_num_blocks + ti / block_size];
+          auto slot = block_id * block_size + ti % block_size;
+          auto v_start =
+              value_cache_ptr + slot * token_stride + kv_hi * head_size;
+          auto w = attn_w[ti] * r_sum;
+          // dequantize the int8 value by its scale
+          if (value_scale_ptr != nullptr) {
+            w *= value_scale_ptr[slot * kv_head_num + kv_hi];
+          }
+          mul_attenion_weights_and_value_of_head<CT>(
+              w, v_start, attn_out, head_size);
+        }
+        auto out_start =
+            attn_out_ptr + ((bi * head_num + hi) * q_len + qi) * head_size;
+        torch_ipex::cpu::kernel::move_ker<T, float>(
+            out_start, attn_out, head_size);
+      }
+    }
+  }
+}
+
+at::Tensor paged_attention_kernel_impl(
+    at::Tensor& query,
+    at::Tensor& key,
+    at::Tensor& value,
+    at::Tensor& key_cache,
+    at::Tensor& value_cache,
+    at::Tensor& block_tables,
+    at::Tensor& context_lens,
+    const double scale_attn,
+    const c10::optional<at::Tensor>& attention_mask,
+    const c10::optional<at::Tensor>& key_scale,
+    const c10::optional<at::Tensor>& value_scale) {
+  RECORD_FUNCTION(
+      "ipex::paged_attention_kernel_impl", c10::ArrayRef<c10::IValue>({}));
+  TORCH_CHECK(
+      key_cache.is_contiguous() && value_cache.is_contiguous(),
+      "paged_attention: key_cache and value_cache should be contiguous");
+  auto is_int8_cache = key_cache.scalar_type() == at::kChar;
+  if (is_int8_cache) {
+    TORCH_CHECK(
+        key_scale.has_value() && value_scale.has_value(),
+        "paged_attention: key_scale and value_scale are required by the int8 kv cache");
+    TORCH_CHECK(
+        key_scale.value().scalar_type() == at::kFloat &&
+            value_scale.value().scalar_type() == at::kFloat &&
+            key_scale.value().is_contiguous() &&
+            value_scale.value().is_contiguous(),
+        "paged_attention: key_scale and value_scale should be contiguous float tensors");
+  } else {
+    TORCH_CHECK(
+        key_cache.scalar_type() == query.scalar_type(),
+        "paged_attention: the dtype of key_cache should be the same as query");
+  }
+  auto bs = query.size(0);
+  auto q_len = query.size(1);
+  auto head_num = query.size(2);
+  auto head_size = query.size(3);
+  auto kv_head_num = key.size(2);
+  auto block_size = key_cache.size(1);
+  TORCH_CHECK(
+      head_num % kv_head_num == 0,
+      "paged_attention: num_heads should be divisible by num_kv_heads");
+  auto query_ = query.contiguous();
+  auto key_ = key.contiguous();
+  auto value_ = value.contiguous();
+  auto block_tables_ = block_tables.to(at::kLong).contiguous();
+  auto context_lens_ = context_lens.to(at::kLong).contiguous();
+  auto max_num_blocks = block_tables_.size(1);
+  auto block_tables_ptr = block_tables_.data_ptr<int64_t>();
+  auto context_lens_ptr = context_lens_.data_ptr<int64_t>();
+  int64_t max_seq_len = 0;
+  for (auto bi = 0; bi < bs; bi++) {
+    max_seq_len = std::max(max_seq_len, context_lens_ptr[bi] + q_len);
+  }
+  TORCH_CHECK(
+      max_seq_len <= max_num_blocks * block_size,
+      "paged_attention: the block table is too small for the sequence length");
+
+  at::Tensor mask;
+  int64_t mask_head_num = 1, mask_q_len = 1, mask_len = 0;
+  if (attention_mask.has_value()) {
+    mask = attention_mask.value().to(at::kFloat).contiguous();
+    TORCH_CHECK(
+        mask.dim() == 4,
+        "paged_attention: attention_mask should be [batch, 1 or heads, 1 or query_len, seq_len]");
+    mask_head_num = mask.size(1);
+    mask_q_len = mask.size(2);
+    mask_len = mask.size(3);
+    TORCH_CHECK(
+        mask_len >= max_seq_len,
+        "paged_attention: attention_mask is shorter than the sequence length");
+  }
+  auto attn_outs = at::empty({bs, head_num, q_len, head_size}, query.options());
+  // the scratch buffers of each thread, allocated once for all the heads
+  auto scratch = at::empty(
+      {omp_get_max_threads(), max_seq_len + 2 * head_size}, at::kFloat);
+  AT_DISPATCH_FLOATING_TYPES_AND2(
+      at::kBFloat16, at::kHalf, query.scalar_type(), "paged_attention", [&] {
+        if (is_int8_cache) {
+          reshape_and_cache<scalar_t, int8_t>(
+              key_.data_ptr<scalar_t>(),
+              value_.data_ptr<scalar_t>(),
+              key_cache.data_ptr<int8_t>(),
+              value_cache.data_ptr<int8_t>(),
+              key_scale.value().data_ptr<float>(),
+              value_scale.value().data_ptr<float>(),
+              block_tables_ptr,
+              context_lens_ptr,
+              bs,
+              q_len,
+              kv_head_num,
+              head_size,
+              block_size,
+              max_num_blocks);
+          paged_attention_impl<scalar_t, int8_t>(
+              query_.data_ptr<scalar_t>(),
+              key_cache.data_ptr<int8_t>(),
+              value_cache.data_ptr<int8_t>(),
+              key_scale.value().data_ptr<float>(),
+              value_scale.value().data_ptr<float>(),
+              block_tables_ptr,
+              context_lens_ptr,
+              mask.defined() ? mask.data_ptr<float>() : nullptr,
+              attn_outs.data_ptr<scalar_t>(),
+              scratch.data_ptr<float>(),
+              bs,
+              q_len,
+              head_num,
+              kv_head_num,
+              head_size,
+              block_size,
+              max_num_blocks,
+              max_seq_len,
+              scale_attn,
+              mask_head_num,
+              mask_q_len,
+              mask_len);
+          return;
+        }
+        reshape_and_cache<scalar_t, scalar_t>(
+            key_.data_ptr<scalar_t>(),
+            value_.data_ptr<scalar_t>(),
+            key_cache.data_ptr<scalar_t>(),
+            value_cache.data_ptr<scalar_t>(),
+            nullptr,
+            nullptr,
+            block_tables_ptr,
+            context_lens_ptr,
+            bs,
+            q_len,
+            kv_head_num,
+            head_size,
+            block_size,
+            max_num_blocks);
+        paged_attention_impl<scalar_t, scalar_t>(
+            query_.data_ptr<scalar_t>(),
+            key_cache.data_ptr<scalar_t>(),
+            value_cache.data_ptr<scalar_t>(),
+            nullptr,
+            nullptr,
+            block_tables_ptr,
+            context_lens_ptr,
+            mask.defined() ? mask.data_ptr<float>() : nullptr,
+            attn_outs.data_ptr<scalar_t>(),
+            scratch.data_ptr<float>(),
+            bs,
+            q_len,
+            head_num,
+            kv_head_num,
+            head_size,
+            block_size,
+            max_num_blocks,
+            max_seq_len,
+            scale_attn,
+            mask_head_num,
+            mask_q_len,
+            mask_len);
+      });
+  return attn_outs;
+}
+} // anonymous namespace
+
+REGISTER_DISPATCH(paged_attention_kernel_stub, &paged_attention_kernel_impl);
+
+} // namespace cpu
+} // namespace torch_ipex
@@ -2464,6 +2464,28 @@ struct Function_matching<T1, T2, has_bias, 0> {
   }
 };
 
+// Group-wise quantized weight is kept in plain format, i.e., uint8 [N, K/2]
+// holding two int4 values per byte or int8 [N, K], with scales and zero points
+// in shape [num_groups, N]. It is dequantized to fp32 [N, K].
+at::Tensor dequantize_group_wise(
+    const at::Tensor& weight,
+    const at::Tensor& scales,
+    const at::Tensor& zero_points) {
+  at::Tensor w;
+  if (weight.scalar_type() == c10::kByte) {
+    using namespace at::indexing;
+    w = at::empty({weight.size(0), weight.size(1) * 2}, weight.options());
+    w.index({Slice(), Slice(None, None, 2)}).copy_(weight.bitwise_and(0xf));
+    w.index({Slice(), Slice(1, None, 2)}).copy_(weight.bitwise_right_shift(4));
+  } else {
+    w = weight;
+  }
+  auto group_size = w.size(1) / scales.size(0);
+  auto scales_expanded = scales.t().repeat_interleave(group_size, 1);
+  auto zero_points_expanded = zero_points.t().repeat_interleave(group_size, 1);
+  return (w.to(c10::kFloat) - zero_points_expanded) * scales_expanded;
+}
+
 void woq_gemm_kernel_impl(
     const at::Tensor& self,
     const at::Tensor& weight,
@@ -2472,6 +2494,15 @@ void woq_gemm_kernel_impl(
     const at::Tensor& bias,
     int64_t lowp_mode,
     at::Tensor& output) {
+  if (scales_float.dim() == 2) {
+    // group-wise quantization
+    auto w = dequantize_group_wise(weight, scales_float, zero_points_float);
+    auto x = self.to(c10::kFloat);
+    auto out = bias.defined() ? at::linear(x, w, bias.to(c10::kFloat))
+                              : at::linear(x, w);
+    output.copy_(out);
+    return;
+  }
   auto self_ = self.is_contiguous() ? self : self.contiguous();
   const int64_t dim = self.dim();
   auto self_reshaped =
@@ -2847,6 +2878,10 @@ at::Tensor woq_linear_packB_impl(
     const at::Tensor& weight,
     const at::Tensor& scales,
     const at::Tensor& zero_points) {
+  if (!weight.is_quantized()) {
+    // group-wise quantized weight is kept in plain format
+    return weight;
+  }
 #if defined(CPU_CAPABILITY_AVX512)
   auto N = weight.size(0);
   auto K = weight.size(1);
@@ -2884,6 +2919,9 @@ at::Tensor woq_linear_packB_impl(
 }
 
 at::Tensor woq_linear_unpackB_impl(const at::Tensor& weight) {
+  if (!weight.is_quantized()) {
+    return weight;
+  }
 #if defined(CPU_CAPABILITY_AVX512)
   auto N = weight.size(0);
   auto K = weight.size(1);
@@ -585,9 +585,10 @@ struct GemmMicroKernel<
       long ldc,
       float* scales,
       int8_t* zps,
-      float scale_a,
-      int32_t zp_a) {
+      float* scale_a,
+      int32_t* zp_a) {
     auto pqB = GetVLAPtr<uint8_t>(B, {ldb, 2}); // [K/4,N,4] packed in 4-bit
+    auto pqB_int8 = GetVLAPtr<int8_t>(B, {ldb, 4}); // [K/4,N,4] in int8
 
     static_assert(N % 16 == 0, "N must be a multiple of 16");
     constexpr const int COLS = N / 16;
@@ -599,17 +600,26 @@ struct GemmMicroKernel<
     __m512 vscales[COLS];
     __m512i vzps[COLS];
     __m512i vcompensate[COLS];
+    // int8 weight is not shifted by its zero points which may overflow int8,
+    // the zero points are compensated with the row sums of A instead
+    __m512i vsum_a[M];
 
     // Load scales and zps
     compile_time_for<COLS>::op([&](auto i) {
       vscales[i] = _mm512_loadu_ps(scales + i * 16);
-      // TODO(jgong5): should we use 512 or two 256 here?
-      vzps[i] = combine_m256i(load_zps_4vnni(zps + i * 16));
+      if constexpr (is_int4) {
+        // TODO(jgong5): should we use 512 or two 256 here?
+        vzps[i] = combine_m256i(load_zps_4vnni(zps + i * 16));
+      } else {
+        vzps[i] = _mm512_cvtepi8_epi32(
+            _mm_loadu_si128(reinterpret_cast<__m128i*>(zps + i * 16)));
+      }
       vcompensate[i] = _mm512_setzero_epi32();
     });
 
     compile_time_for<M * COLS>::op(
         [&](auto i) { vc[i] = _mm512_setzero_epi32(); });
+    compile_time_for<M>::op([&](auto i) { vsum_a[i] = _mm512_setzero_epi32(); });
 
     auto compute = [&](auto i, int k) {
       constexpr const int row = i / COLS;
@@ -621,14 +631,27 @@ struct GemmMicroKernel<
         } else {
           va = _mm512_set1_epi32(*(int32_t*)ADDRESS(A, row, k, lda));
         }
+        if constexpr (!is_int4) {
+          vsum_a[row] = _mm512_dpbusd_epi32(vsum_a[row], va, ones);
+        }
       }
 
       if constexpr (row == 0) {
-        vb[col] = combine_m256i(load_int4_as_int8(pqB[k / 4][col * 16]));
-        vb[col] = _mm512_sub_epi8(vb[col], vzps[col]);
+        if constexpr (is_int4) {
+          vb[col] = combine_m256i(load_int4_as_int8(pqB[k / 4][col * 16]));
+          vb[col] = _mm512_sub_epi8(vb[col], vzps[col]);
+        } else {
+          vb[col] = _mm512_loadu_si512(pqB_int8[k / 4][col * 16]);
+        }
         vcompensate[col] = _mm512_dpbusd_epi32(vcompensate[col], ones, vb[col]);
         if constexpr (PREFETCH_K_DIST > 0) {
-          _mm_prefetch(pqB[(k + PREFETCH_K_DIST) / 4][col * 16], _MM_HINT_T0);
+          if constexpr (is_int4) {
+            _mm_prefetch(
+                pqB[(k + PREFETCH_K_DIST) / 4][col * 16], _MM_HINT_T0);
+          } else {
+            _mm_prefetch(
+                pqB_int8[(k + PREFETCH_K_DIST) / 4][col * 16], _MM_HINT_T0);
+          }
         }
       }
 
@@ -653,11 +676,22 @@ struct GemmMicroKernel<
       constexpr const int row = i / COLS;
       constexpr const int col = i % COLS;
       // compute (qC - compensate * zp_a) * scale_a * scale_b
-      // where compensate = sum(qB)
+      // where compensate = sum(qB), activation is quantized per row
       vc[i] = _mm512_sub_epi32(
-          vc[i], _mm512_mullo_epi32(vcompensate[col], _mm512_set1_epi32(zp_a)));
+          vc[i],
+          _mm512_mullo_epi32(vcompensate[col], _mm512_set1_epi32(zp_a[row])));
+      if constexpr (!is_int4) {
+        // qB is not shifted by zp_b, so further subtract
+        // zp_b * (sum(qA) - K * zp_a)
+        vc[i] = _mm512_sub_epi32(
+            vc[i],
+            _mm512_mullo_epi32(
+                vzps[col],
+                _mm512_sub_epi32(
+                    vsum_a[row], _mm512_set1_epi32(K * zp_a[row]))));
+      }
       __m512 vc_float = _mm512_cvtepi32_ps(vc[i]);
-      vc_float = _mm512_mul_ps(vc_float, _mm512_set1_ps(scale_a));
+      vc_float = _mm512_mul_ps(vc_float, _mm512_set1_ps(scale_a[row]));
       vc_float = _mm512_mul_ps(vc_float, vscales[col]);
       if constexpr (ACC) {
         auto vc_old = _mm512_loadu_ps(C + row * ldc + col * 16);
@@ -1069,8 +1103,8 @@ class DequantGemmTPP {
       TZero* zps,
       Tout* C,
       bool no_tile_cfg = true,
-      float scale_a = 1.0,
-      int32_t zp_a = 0) {
+      float* scale_a = nullptr,
+      int32_t* zp_a = nullptr) {
     TLA_ASSERT(false, "not implemented");
   }
 
@@ -1133,8 +1167,8 @@ class DequantGemmTPP<
       Tin* zps,
       Tout* C,
       bool no_tile_cfg = true,
-      float scale_a = 1.0,
-      int32_t zp_a = 0) {
+      float* scale_a = nullptr,
+      int32_t* zp_a = nullptr) {
     if (M < SMALL_BATCH_THRESHOLD &&
         ((std::is_same<Tin, half>() && std::is_same<Tout, half>()) ||
          (std::is_same<Tin, float>() && std::is_same<Tout, float>()))) {
@@ -1228,6 +1262,7 @@ template <
     long ldb,
     bool transA,
     bool ACC,
+    bool is_int4,
     long PREFETCH_K_DIST>
 class DequantGemmTPP<
     /*Tin*/ uint8_t,
@@ -1239,7 +1274,7 @@ class DequantGemmTPP<
     ldb,
     transA,
     ACC,
-    /*is_int4*/ true,
+    is_int4,
     PREFETCH_K_DIST> {
   using TBrgemmTPP = BrgemmTPP<int8_t, int32_t>;
 
@@ -1271,8 +1306,8 @@ class DequantGemmTPP<
       int8_t* zps,
       float* C,
       bool no_tile_cfg = true,
-      float scale_a = 1.0,
-      int32_t zp_a = 0) {
+      float* scale_a = nullptr,
+      int32_t* zp_a = nullptr) {
     auto qA = GetVLAPtr<uint8_t>(A, {lda});
 #ifdef __AVX512VNNI__
     if (M < SMALL_BATCH_THRESHOLD) {
@@ -1294,7 +1329,7 @@ class DequantGemmTPP<
                   /*transA*/ false,
                   ACC,
                   PREFETCH_K_DIST>::
-                  template call<true>(
+                  template call<is_int4>(
                       K,
                       qA[m],
                       lda,
@@ -1303,8 +1338,8 @@ class DequantGemmTPP<
                       ldc,
                       scales,
                       zps,
-                      scale_a,
-                      zp_a);
+                      scale_a + m,
+                      zp_a + m);
             },
             [&](auto i) {
               range_dispatcher<long, 1, PREFERRED_BLOCK_M - 1>::call(
@@ -1321,7 +1356,7 @@ class DequantGemmTPP<
                         /*transA*/ false,
                         ACC,
                         PREFETCH_K_DIST>::
-                        template call<true>(
+                        template call<is_int4>(
                             K,
                             qA[m],
                             lda,
@@ -1330,8 +1365,8 @@ class DequantGemmTPP<
                             ldc,
                             scales,
                             zps,
-                            scale_a,
-                            zp_a);
+                            scale_a + m,
+                            zp_a + m);
                   },
                   [&](auto j) { failing_fallback(); });
             });
@@ -1343,15 +1378,44 @@ class DequantGemmTPP<
       int8_t B[K / 4][N][4];
       int32_t qC[M][N];
       int32_t compensation[N];
+      // sum(qA) - K * zp_a of each row, used to compensate the zero points of
+      // int8 weight which is not shifted by them
+      int32_t compensation_a[M];
       // TODO(jgong5): add prefetch
-      Dequantize<int8_t, ldb, N_GROUP_SIZE, /*is_int4*/ true>::call(
-          qB, K, N, zps, B[0][0], compensation);
-      (*pgemm)((int8_t*)qA[0], B[0][0], qC[0], 1, no_tile_cfg);
+      if constexpr (is_int4) {
+        Dequantize<int8_t, ldb, N_GROUP_SIZE, /*is_int4*/ true>::call(
+            qB, K, N, zps, B[0][0], compensation);
+      } else {
+        // int8 weight is already in VNNI format [K/4,N,4]
+        auto pqB = GetVLAPtr<int8_t>(qB, {ldb, 4});
+        for (long n = 0; n < N; ++n) {
+          compensation[n] = 0;
+        }
+        for (long k = 0; k < K / 4; ++k) {
+#pragma omp simd
+          for (long n = 0; n < N; ++n) {
+            compensation[n] += pqB[k][n][0] + pqB[k][n][1] + pqB[k][n][2] +
+                pqB[k][n][3];
+          }
+        }
+        for (long m = 0; m < M; ++m) {
+          int32_t sum_a = 0;
+#pragma omp simd reduction(+ : sum_a)
+          for (long k = 0; k < K; ++k) {
+            sum_a += qA[m][k];
+          }
+          compensation_a[m] = sum_a - K * zp_a[m];
+        }
+      }
+      auto pB = is_int4 ? B[0][0] : reinterpret_cast<int8_t*>(qB);
+      (*pgemm)((int8_t*)qA[0], pB, qC[0], 1, no_tile_cfg);
       // post-op and convert back to C
       for (long m = 0; m < M; ++m) {
 #pragma omp simd
         for (long n = 0; n < N; ++n) {
-          float c = (qC[m][n] - compensation[n] * zp_a) * scale_a * scales[n];
+          float c = (qC[m][n] - compensation[n] * zp_a[m] -
+                     (is_int4 ? 0 : zps[n] * compensation_a[m])) *
+              scale_a[m] * scales[n];
           if constexpr (ACC) {
             C[m * ldc + n] += c;
           } else {
@@ -1410,8 +1474,8 @@ void qlinear_woq_affine_impl(
     int num_concats,
     int fusion_type,
     const TensorList& others_list,
-    float scale_a = 1.0f,
-    int32_t zp_a = 0) {
+    const at::Tensor& scale_a = at::Tensor(),
+    const at::Tensor& zp_a = at::Tensor()) {
   auto x_sizes = x.sizes();
   auto w_sizes = qw_packed.sizes();
   auto M = x_sizes[0];
@@ -1464,8 +1528,28 @@ void qlinear_woq_affine_impl(
   auto py = GetVLAPtr<Tout>(y, {Nc, Nb}); /*[M, Nc, Nb]*/
   auto py_concat = GetVLAPtr<Tout>(
       y, {M, Nc / num_concats, Nb}); /*[num_concats, M, Nc/num_concats, Nb]*/
-  auto pscales = GetVLAPtr<TScale>(scales, {Nb});
-  auto pzps = GetVLAPtr<TZero>(zps, {Nb});
+  // scales and zero points are in shape [N] for per-channel quantization or
+  // [num_groups, N] for group-wise quantization. The weight is packed with
+  // block_k dividing the group size so that each K block lies in one group.
+  auto num_groups = scales.dim() == 2 ? scales.size(0) : 1;
+  TLA_ASSERT(Kc % num_groups == 0, "Kc must be a multiple of num_groups");
+  auto Kc_per_group = Kc / num_groups;
+  auto pscales = GetVLAPtr<TScale>(scales, {Nc, Nb});
+  auto pzps = GetVLAPtr<TZero>(zps, {Nc, Nb});
+  // qparams of the activation quantized per token, in shape
+  // [num_groups_a, M] with each group covering Kc / num_groups_a K blocks,
+  // only used when T is uint8_t
+  auto num_groups_a = scale_a.defined() ? scale_a.size(0) : 1;
+  TLA_ASSERT(Kc % num_groups_a == 0, "Kc must be a multiple of num_groups_a");
+  auto Kc_per_group_a = Kc / num_groups_a;
+  auto pscale_a = GetVLAPtr<float>(scale_a, {M});
+  auto pzp_a = GetVLAPtr<int32_t>(zp_a, {M});
+  auto scale_a_at = [&](int m, int kc) -> float* {
+    return scale_a.defined() ? pscale_a[kc / Kc_per_group_a] + m : nullptr;
+  };
+  auto zp_a_at = [&](int m, int kc) -> int32_t* {
+    return zp_a.defined() ? pzp_a[kc / Kc_per_group_a] + m : nullptr;
+  };
   auto pb = GetVLAPtr<TGemmOut>(b, {Nb});
   auto tin0 = others_list.size() > 0 ? others_list[0] : at::Tensor{};
   auto pin0 = GetVLAPtr<Tout>(tin0, {Nc, Nb}); /*[M, Nc, Nb]*/
@@ -1666,22 +1750,22 @@ void qlinear_woq_affine_impl(
                         dequant_gemm_tpp(
                             x_ptr,
                             pw[nc][kc],
-                            pscales[nc],
-                            pzps[nc],
+                            pscales[kc / Kc_per_group][nc],
+                            pzps[kc / Kc_per_group][nc],
                             y_ptr,
                             true,
-                            scale_a,
-                            zp_a);
+                            scale_a_at(m, kc),
+                            zp_a_at(m, kc));
                       } else {
                         dequant_gemm_no_prefetch_tpp(
                             x_ptr,
                             pw[nc][kc],
-                            pscales[nc],
-                            pzps[nc],
+                            pscales[kc / Kc_per_group][nc],
+                            pzps[kc / Kc_per_group][nc],
                             y_ptr,
                             true,
-                            scale_a,
-                            zp_a);
+                            scale_a_at(m, kc),
+                            zp_a_at(m, kc));
                         if (fusion_type > 0) {
                           post_ops_fn(m, nc);
                         }
@@ -1699,23 +1783,23 @@ void qlinear_woq_affine_impl(
                         dequant_gemm_rem_tpp(
                             x_ptr,
                             pw[nc][kc],
-                            pscales[nc],
-                            pzps[nc],
+                            pscales[kc / Kc_per_group][nc],
+                            pzps[kc / Kc_per_group][nc],
                             y_ptr,
                             false,
-                            scale_a,
-                            zp_a);
+                            scale_a_at(m, kc),
+                            zp_a_at(m, kc));
                         dequant_gemm_tpp.config();
                       } else {
                         dequant_gemm_no_prefetch_rem_tpp(
                             x_ptr,
                             pw[nc][kc],
-                            pscales[nc],
-                            pzps[nc],
+                            pscales[kc / Kc_per_group][nc],
+                            pzps[kc / Kc_per_group][nc],
                             y_ptr,
                             false,
-                            scale_a,
-                            zp_a);
+                            scale_a_at(m, kc),
+                            zp_a_at(m, kc));
                         dequant_gemm_no_prefetch_tpp.config();
                         if (fusion_type > 0) {
                           post_ops_rem_fn(m, nc);
@@ -1800,22 +1884,22 @@ void qlinear_woq_affine_impl(
                           dequant_gemm_tpp(
                               x_ptr,
                               pw[nc][kc],
-                              pscales[nc],
-                              pzps[nc],
+                              pscales[kc / Kc_per_group][nc],
+                              pzps[kc / Kc_per_group][nc],
                               y_ptr,
                               true,
-                              scale_a,
-                              zp_a);
+                              scale_a_at(m, kc),
+                              zp_a_at(m, kc));
                         } else {
                           dequant_gemm_no_prefetch_tpp(
                               x_ptr,
                               pw[nc][kc],
-                              pscales[nc],
-                              pzps[nc],
+                              pscales[kc / Kc_per_group][nc],
+                              pzps[kc / Kc_per_group][nc],
                               y_ptr,
                               true,
-                              scale_a,
-                              zp_a);
+                              scale_a_at(m, kc),
+                              zp_a_at(m, kc));
                         }
                       } else {
                         alignas(64) TComp x_buf[BLOCK_M][Kb];
@@ -1827,23 +1911,23 @@ void qlinear_woq_affine_impl(
                           dequant_gemm_rem_tpp(
                               x_ptr,
                               pw[nc][kc],
-                              pscales[nc],
-                              pzps[nc],
+                              pscales[kc / Kc_per_group][nc],
+                              pzps[kc / Kc_per_group][nc],
                               y_ptr,
                               false,
-                              scale_a,
-                              zp_a);
+                              scale_a_at(m, kc),
+                              zp_a_at(m, kc));
                           dequant_gemm_tpp.config();
                         } else {
                           dequant_gemm_no_prefetch_rem_tpp(
                               x_ptr,
                               pw[nc][kc],
-                              pscales[nc],
-                              pzps[nc],
+                              pscales[kc / Kc_per_group][nc],
+                              pzps[kc / Kc_per_group][nc],
                               y_ptr,
                               false,
-                              scale_a,
-                              zp_a);
+                              scale_a_at(m, kc),
+                              zp_a_at(m, kc));
                           dequant_gemm_no_prefetch_tpp.config();
                         }
                       }
@@ -1972,15 +2056,15 @@ at::Tensor qlinear_woq_pack(
     });
     return result;
   } else {
-    TLA_ASSERT(
-        lowp_mode != LOWP_MODE_INT8,
-        "lowp mode int8 is not supported yet with int8 weight");
     auto result = at::empty({Nc, Kc, block_k, block_n}, qw.options());
     // Pack weight in [N,K] to [N/block_n, K/block_k, block_k, block_n]
+    // or [N/block_n, K/block_k, block_k/4, block_n, 4] for LOWP_MODE_INT8
     int8_t* src_data = (int8_t*)qw.data_ptr();
     int8_t* dst_data = (int8_t*)result.data_ptr();
     auto psrc = GetVLAPtr<int8_t>(src_data, {block_n, Kc, block_k});
     auto pdst = GetVLAPtr<int8_t>(dst_data, {Kc, block_k, block_n});
+    auto pdst_4vnni =
+        GetVLAPtr<int8_t>(dst_data, {Kc, block_k / 4, block_n, 4});
     auto pack_loop =
         ThreadedLoop<3>({{Nc}, {Kc}, {0, block_n, N_GROUP_SIZE, false}}, "ABc");
     pack_loop([&](int* idx) {
@@ -1989,7 +2073,12 @@ at::Tensor qlinear_woq_pack(
       int nb = idx[2];
       for (int i = 0; i < N_GROUP_SIZE; i++) {
         for (int kb = 0; kb < block_k; kb++) {
-          pdst[nc][kc][kb][nb + i] = psrc[nc][nb + i][kc][kb];
+          if (lowp_mode != LOWP_MODE_INT8) {
+            pdst[nc][kc][kb][nb + i] = psrc[nc][nb + i][kc][kb];
+          } else {
+            pdst_4vnni[nc][kc][kb / 4][nb + i][kb % 4] =
+                psrc[nc][nb + i][kc][kb];
+          }
         }
       }
     });
@@ -2043,13 +2132,11 @@ at::Tensor qlinear_woq_unpack(
       });
       return result;
     } else {
-      TLA_ASSERT(
-          lowp_mode != LOWP_MODE_INT8,
-          "lowp mode int8 is not supported yet with int8 weight");
       auto result = at::empty({N, K}, qw_packed.options());
       int8_t* src_data = (int8_t*)qw_packed.data_ptr();
       int8_t* dst_data = (int8_t*)result.data_ptr();
       auto psrc = GetVLAPtr<int8_t>(src_data, {Kc, Kb, Nb});
+      auto psrc_4vnni = GetVLAPtr<int8_t>(src_data, {Kc, Kb / 4, Nb, 4});
       auto pdst = GetVLAPtr<int8_t>(dst_data, {Nb, Kc, Kb});
       auto unpack_loop =
           ThreadedLoop<3>({{Nc}, {Kc}, {0, Nb, N_GROUP_SIZE, false}}, "ABc");
@@ -2059,7 +2146,9 @@ at::Tensor qlinear_woq_unpack(
         int nb = idx[2];
         for (int kb = 0; kb < Kb; kb++) {
           for (int i = 0; i < N_GROUP_SIZE; i++) {
-            pdst[nc][nb + i][kc][kb] = psrc[nc][kc][kb][nb + i];
+            pdst[nc][nb + i][kc][kb] = lowp_mode != LOWP_MODE_INT8
+                ? psrc[nc][kc][kb][nb + i]
+                : psrc_4vnni[nc][kc][kb / 4][nb + i][kb % 4];
           }
         }
       });
@@ -2071,132 +2160,60 @@ at::Tensor qlinear_woq_unpack(
   }
 }
 
-void compute_int8_qparams_per_tensor(
-    const at::Tensor& t,
-    float* scale,
-    int32_t* zp) {
-  auto [t_min, t_max] = at::aminmax(t);
-  auto min = t_min.item<float>();
-  auto max = t_max.item<float>();
-  min = std::min(min, 0.0f);
-  max = std::max(max, 0.0f);
-  *scale = (max - min) / 255.0f;
-  *zp = (int32_t)(-std::nearbyint(min / *scale));
-}
-
+/**
+ * @brief dynamically quantize the activation to uint8 per token, or per group
+ * of consecutive input channels of each token.
+ *
+ * @param t activation in floating point format, 2D plain format [M,K]
+ * @param num_groups number of the groups along K, 1 for per-token quantization
+ * @return std::tuple<at::Tensor, at::Tensor, at::Tensor> the quantized
+ * activation in uint8 [M,K], and the fp32 scales and int32 zero points in
+ * shape [num_groups, M]
+ */
 template <typename T>
-at::Tensor quantize_per_tensor(const at::Tensor& t, float scale, int32_t zp) {
-  // TODO(jgong5): optimize me
-  auto t_q = t / scale + zp;
-  t_q = at::clamp(at::round(t_q), 0, 255);
-  return t_q.to(at::kByte);
-}
-
-template <>
-at::Tensor quantize_per_tensor<bfloat16>(
+std::tuple<at::Tensor, at::Tensor, at::Tensor> quantize_per_token(
     const at::Tensor& t,
-    float scale,
-    int32_t zp) {
-#ifdef __AVX512F__
-  // modified based on inductor codegen...
-  auto convert_float_to_uint8 =
-      [](at::vec::Vectorized<float> src) -> at::vec::Vectorized<uint8_t> {
-    // Convert from float32 to int32
-    __m512i x_values_int32 = _mm512_cvtps_epi32(src);
-
-    // Convert from int32 to int16 using signed saturation
-    __m512i xy_packed_v = _mm512_packs_epi32(x_values_int32, x_values_int32);
-
-    constexpr auto min_val = std::numeric_limits<uint8_t>::min();
-    constexpr auto max_val = std::numeric_limits<uint8_t>::max();
-
-    // Convert from int16 to uint8 using unsigned saturation
-    __m512i packed_and_sat = _mm512_packus_epi16(xy_packed_v, xy_packed_v);
-    __m512i xyzw_clamped_v = _mm512_max_epu8(
-        _mm512_set1_epi8(min_val),
-        _mm512_min_epu8(packed_and_sat, _mm512_set1_epi8(max_val)));
-    __m512i permute_mask_v = _mm512_set_epi32(
-        0x0f,
-        0x0b,
-        0x07,
-        0x03,
-        0x0e,
-        0x0a,
-        0x06,
-        0x02,
-        0x0d,
-        0x09,
-        0x05,
-        0x01,
-        0x0c,
-        0x08,
-        0x04,
-        0x00);
-    return _mm512_permutexvar_epi32(permute_mask_v, xyzw_clamped_v);
-  };
-  at::Tensor out = at::empty_like(t, at::kByte);
-  auto in_ptr0 = t.data_ptr<at::BFloat16>();
-  auto out_ptr0 = out.data_ptr<uint8_t>();
-  auto n = t.numel();
-  auto vecsize = at::vec::Vectorized<float>::size();
-  auto vec_end = 0;
-#pragma omp parallel for
-  for (long i0 = 0; i0 < static_cast<long>(n) / vecsize * vecsize;
-       i0 += static_cast<long>(vecsize)) {
-    auto tmp0 = at::vec::Vectorized<at::BFloat16>::loadu(
-        in_ptr0 + static_cast<long>(i0), vecsize);
-    at::vec::Vectorized<float> res_vec1(0);
-    at::vec::Vectorized<float> res_vec2(0);
-    std::tie(res_vec1, res_vec2) = at::vec::convert_bfloat16_float(tmp0);
-    auto tmp1 = res_vec1;
-    // auto tmp1 = cvt_bf16_to_fp32(tmp0);
-    auto tmp2 = at::vec::Vectorized<float>(static_cast<float>(scale));
-    auto tmp3 = tmp1 / tmp2;
-    auto tmp4 = at::vec::Vectorized<float>(static_cast<float>(zp));
-    auto tmp5 = tmp3 + tmp4;
-    auto tmp6 = tmp5.round();
-    auto tmp7 = (tmp6);
-    auto tmp8 = at::vec::Vectorized<float>(static_cast<float>(0.0));
-    auto tmp9 = at::vec::maximum(tmp7, tmp8);
-    auto tmp10 = at::vec::Vectorized<float>(static_cast<float>(255.0));
-    auto tmp11 = at::vec::minimum(tmp9, tmp10);
-    auto tmp12 = (tmp11);
-    auto tmp13 = convert_float_to_uint8(tmp12);
-    tmp13.store(out_ptr0 + static_cast<long>(i0), vecsize);
-  }
-  for (long i0 = static_cast<long>(n) / vecsize * vecsize;
-       i0 < static_cast<long>(n);
-       i0 += static_cast<long>(1)) {
-    auto tmp0 = in_ptr0[static_cast<long>(i0)];
-    auto tmp1 = static_cast<float>(tmp0);
-    auto tmp2 = static_cast<float>(0.05);
-    auto tmp3 = tmp1 / tmp2;
-    auto tmp4 = static_cast<float>(1.0);
-    auto tmp5 = tmp3 + tmp4;
-    auto tmp6 = std::nearbyint(tmp5);
-    auto tmp7 = static_cast<float>(tmp6);
-    auto tmp8 = static_cast<float>(0.0);
-    // auto tmp9 = max_propagate_nan(tmp7, tmp8);
-    auto tmp9 = 0;
-    if (at::_isnan(tmp7)) {
-      tmp9 = tmp7;
-    }
-    tmp9 = tmp7 > tmp8 ? tmp7 : tmp8;
-    auto tmp10 = static_cast<float>(255.0);
-    auto tmp11 = 0;
-    if (at::_isnan(tmp9)) {
-      tmp11 = tmp9;
+    int64_t num_groups) {
+  auto M = t.size(0);
+  auto K = t.size(1);
+  TLA_ASSERT(K % num_groups == 0, "K must be a multiple of num_groups");
+  auto group_size = K / num_groups;
+  auto t_q = at::empty({M, K}, t.options().dtype(at::kByte));
+  auto scales = at::empty({num_groups, M}, t.options().dtype(at::kFloat));
+  auto zps = at::empty({num_groups, M}, t.options().dtype(at::kInt));
+  auto pt = GetVLAPtr<T>(t, {num_groups, group_size});
+  auto pt_q = GetVLAPtr<uint8_t>(t_q, {num_groups, group_size});
+  auto pscales = GetVLAPtr<float>(scales, {M});
+  auto pzps = GetVLAPtr<int32_t>(zps, {M});
+  at::parallel_for(0, M * num_groups, 0, [&](int64_t begin, int64_t end) {
+    for (int64_t i = begin; i < end; i++) {
+      auto m = i / num_groups;
+      auto g = i % num_groups;
+      T* src = pt[m][g];
+      uint8_t* dst = pt_q[m][g];
+      // the range always covers 0 so that the zero point is in [0, 255]
+      float min_val = 0.0f;
+      float max_val = 0.0f;
+#pragma omp simd reduction(min : min_val) reduction(max : max_val)
+      for (int64_t k = 0; k < group_size; k++) {
+        float v = static_cast<float>(src[k]);
+        min_val = std::min(min_val, v);
+        max_val = std::max(max_val, v);
+      }
+      float scale = (max_val - min_val) / 255.0f;
+      scale = scale == 0.0f ? 1.0f : scale;
+      int32_t zp = (int32_t)(-std::nearbyint(min_val / scale));
+      float inv_scale = 1.0f / scale;
+#pragma omp simd
+      for (int64_t k = 0; k < group_size; k++) {
+        float v = std::nearbyint(static_cast<float>(src[k]) * inv_scale) + zp;
+        dst[k] = (uint8_t)std::min(std::max(v, 0.0f), 255.0f);
+      }
+      pscales[g][m] = scale;
+      pzps[g][m] = zp;
     }
-    tmp11 = tmp9 < tmp10 ? tmp9 : tmp10;
-    // auto tmp11 = min_propagate_nan(tmp9, tmp10);
-    auto tmp12 = static_cast<float>(tmp11);
-    auto tmp13 = static_cast<unsigned char>(tmp12);
-    out_ptr0[static_cast<long>(i0)] = tmp13;
-  }
-  return out;
-#else
-  return at::quantize_per_tensor(t.to(c10::kFloat), scale, zp, c10::kQUInt8);
-#endif
+  });
+  return std::make_tuple(t_q, scales, zps);
 }
 
 /**
@@ -2207,13 +2224,17 @@ at::Tensor quantize_per_tensor<bfloat16>(
  * @param x input activation in floating point format, 2D plain format [M,K]
  * @param qw weight in affine quantized format, could be 4-bit or 8-bit
  * quantized in 4D blocked format [Nc,Kc,Kb,Nb] or 2D plain format [N,K].
- * @param scales_list a list of fp32/fp16/bf16 scales tensors
- * @param zp_list a list of fp32/fp16/bf16/int8 zero points tensors
+ * @param scales_list a list of fp32/fp16/bf16 scales tensors, in shape [N] for
+ * per-channel quantization or [num_groups, N] for group-wise quantization
+ * @param zp_list a list of fp32/fp16/bf16/int8 zero points tensors, in the same
+ * shape as the scales
  * @param bias_list a list of fp32/fp16/bf16 bias tensors
  * @param lowp_mode decide the compute dtype to use.
  *        LOWP_MODE_NONE: keep activation dtype
  *        LOWP_MODE_FP16: use FP16 or FP32 as compute dtype
  *        LOWP_MODE_BF16: use BF16, FP16 or FP32 as compute dtype
+ *        LOWP_MODE_INT8: quantize activation to uint8 per token (per group for
+ *        group-wise quantized weight) and compute with int8 VNNI/AMX
  * @return at::Tensor output activation in same dtype as `x`, 2D plain format
  * [M,N]
  */
@@ -2363,14 +2384,14 @@ at::Tensor qlinear_woq_affine(
                 }
               } else {
                 TLA_ASSERT(lowp_mode == LOWP_MODE_INT8, "invalid lowp_mode");
-                TLA_ASSERT(is_int4, "LOWP_MODE_INT8 only support is_int4=true");
-                float scale_a;
-                int32_t zp_a;
-                auto x_reshape_contig = x_reshape.contiguous();
-                compute_int8_qparams_per_tensor(
-                    x_reshape_contig, &scale_a, &zp_a);
-                auto x_quantized = quantize_per_tensor<act_type>(
-                    x_reshape_contig, scale_a, zp_a);
+                // activation is quantized per token, and per group for
+                // group-wise quantized weight so that both share the groups
+                auto num_groups = scales_list[fp32_idx].dim() == 2
+                    ? scales_list[fp32_idx].size(0)
+                    : 1;
+                auto [x_quantized, scale_a, zp_a] =
+                    quantize_per_token<act_type>(
+                        x_reshape.contiguous(), num_groups);
                 qlinear_woq_affine_impl<
                     uint8_t,
                     uint8_t,
@@ -2405,6 +2426,12 @@ at::Tensor qlinear_woq_affine(
     } else if (lowp_mode == LOWP_MODE_BF16) {
       compute_dtype = at::kBFloat16;
     }
+    // group-wise scales and zero points in shape [num_groups, N] are expanded
+    // to [N, K] to dequantize the weight
+    auto expand_qparams = [&](const at::Tensor& t, int64_t K) {
+      return t.dim() == 2 ? t.t().repeat_interleave(K / t.size(0), 1)
+                          : t.unsqueeze(-1);
+    };
     auto w =
         [&]() {
           if (is_int4) {
@@ -2415,11 +2442,14 @@ at::Tensor qlinear_woq_affine(
                 .copy_(qw.bitwise_and(0xf));
             w_int8.index({Slice(), Slice(1, None, 2)})
                 .copy_(qw.bitwise_right_shift(4));
-            return (w_int8.to(at::kFloat) - zp_list[fp32_idx]) *
-                scales_list[fp32_idx];
+            auto K = w_int8.size(1);
+            return (w_int8.to(at::kFloat) -
+                    expand_qparams(zp_list[fp32_idx], K)) *
+                expand_qparams(scales_list[fp32_idx], K);
           } else {
-            return (qw.to(at::kFloat) - zp_list[fp32_idx]) *
-                scales_list[fp32_idx];
+            auto K = qw.size(1);
+            return (qw.to(at::kFloat) - expand_qparams(zp_list[fp32_idx], K)) *
+                expand_qparams(scales_list[fp32_idx], K);
           }
         }()
             .to(compute_dtype);
@@ -35,6 +35,65 @@ c10::intrusive_ptr<WoqLinearOpContext> createWoqLinearPrePackOpContextInt4(
   RECORD_FUNCTION(
       "ipex_prepack::createWoqLinearPrePackOpContextInt4",
       c10::ArrayRef<c10::IValue>({}));
+  // Group-wise quantization: scales in shape [N, num_groups], zero points in
+  // shape [N, num_groups] or compressed as int32 (int4 * 8) along N, i.e.,
+  // [ceil(N / 8), num_groups], or along groups, i.e., [N, ceil(num_groups / 8)]
+  int64_t N = weight.size(0);
+  if (scales.dim() == 2 && scales.size(0) == N && scales.size(1) > 1) {
+    auto num_groups = scales.size(1);
+    auto zp_unpacked = zero_points;
+    if (zero_points.scalar_type() == c10::kInt &&
+        zero_points.sizes() != scales.sizes()) {
+      TORCH_CHECK(
+          zero_points.dim() == 2 &&
+              (zero_points.size(0) == N || zero_points.size(1) == num_groups),
+          "IPEX WOQ INT4: unexpected zero points size");
+      auto shifts = at::arange(0, 32, 4, zero_points.options());
+      if (zero_points.size(0) == N) {
+        zp_unpacked = zero_points.unsqueeze(-1)
+                          .bitwise_right_shift(shifts)
+                          .bitwise_and(0xf)
+                          .reshape({N, -1})
+                          .narrow(1, 0, num_groups);
+      } else {
+        zp_unpacked = zero_points.unsqueeze(1)
+                          .bitwise_right_shift(shifts.view({1, 8, 1}))
+                          .bitwise_and(0xf)
+                          .reshape({-1, num_groups})
+                          .narrow(0, 0, N);
+      }
+    }
+    at::Tensor weight_int4;
+    if (weight.scalar_type() == c10::kInt) {
+      // int32 [N, K/8] to uint8 [N, K/2], the order of int4 values is kept
+      weight_int4 = weight.contiguous().view(c10::kByte);
+    } else {
+      // Quantize fp32/bf16 weight
+      auto group_size = weight.size(1) / num_groups;
+      auto scales_expanded =
+          scales.to(c10::kFloat).repeat_interleave(group_size, 1);
+      auto zp_expanded =
+          zp_unpacked.to(c10::kFloat).repeat_interleave(group_size, 1);
+      auto qw = at::clamp(
+                    at::round(weight.to(c10::kFloat) / scales_expanded) +
+                        zp_expanded,
+                    0,
+                    15)
+                    .to(c10::kByte);
+      using namespace at::indexing;
+      weight_int4 = qw.index({Slice(), Slice(None, None, 2)})
+                        .bitwise_or(qw.index({Slice(), Slice(1, None, 2)})
+                                        .bitwise_left_shift(4));
+    }
+    return createWoqLinearPrePackOpContextGroupWise(
+        std::move(weight_int4),
+        std::move(scales),
+        std::move(zp_unpacked),
+        std::move(bias),
+        batch_size,
+        lowp_mode,
+        num_concats);
+  }
   // From
   // Weight dtype = int32 (uint4 * 8), scale dtype = fp16, zero points dtype =
   // int32 (int4 * 8) To Weight dtype = quint4x2, scale dtype = fp32, zero
@@ -71,7 +130,6 @@ c10::intrusive_ptr<WoqLinearOpContext> createWoqLinearPrePackOpContextInt4(
   at::Tensor weight_int4;
   if (weight.scalar_type() == c10::kInt) {
     // Create empty weight with desired options then copy data
-    int64_t N = weight.size(0);
     int64_t K_int32 = weight.size(1);
     int64_t K = K_int32 * 8; // int32 = int4 * 8
     std::vector<int64_t> weight_size = {N, K};
@@ -103,6 +161,50 @@ c10::intrusive_ptr<WoqLinearOpContext> createWoqLinearPrePackOpContextInt4(
       num_concats);
 }
 
+c10::intrusive_ptr<WoqLinearOpContext> createWoqLinearPrePackOpContextGroupWise(
+    at::Tensor&& weight,
+    at::Tensor&& scales,
+    at::Tensor&& zero_points,
+    c10::optional<at::Tensor>&& bias,
+    c10::optional<int64_t> batch_size,
+    int64_t lowp_mode,
+    int64_t num_concats) {
+  RECORD_FUNCTION(
+      "ipex_prepack::createWoqLinearPrePackOpContextGroupWise",
+      c10::ArrayRef<c10::IValue>({}));
+  // Weight is uint8 [N, K/2] holding two int4 values per byte (the lower 4 bits
+  // first) or int8 [N, K]. Scales and zero points are in shape
+  // [N, num_groups] and each group covers K / num_groups input channels.
+  TORCH_CHECK(
+      weight.scalar_type() == c10::kByte || weight.scalar_type() == c10::kChar,
+      "IPEX WOQ group-wise: weight should be uint8 (int4 * 2) or int8, got ",
+      weight.scalar_type());
+  bool is_int4 = weight.scalar_type() == c10::kByte;
+  int64_t N = weight.size(0);
+  int64_t K = is_int4 ? weight.size(1) * 2 : weight.size(1);
+  TORCH_CHECK(
+      scales.dim() == 2 && scales.size(0) == N &&
+          zero_points.sizes() == scales.sizes(),
+      "IPEX WOQ group-wise: scales and zero points should be in shape [N, num_groups]");
+  TORCH_CHECK(
+      K % scales.size(1) == 0,
+      "IPEX WOQ group-wise: K should be a multiple of the group size");
+  // Kernels take scales and zero points in shape [num_groups, N]
+  auto scales_fp32 = scales.to(c10::kFloat).t().contiguous();
+  auto zp_fp32 = zero_points.to(c10::kFloat).t().contiguous();
+  auto weight_contig = weight.contiguous();
+  auto op_context = create(
+      weight_contig,
+      scales_fp32,
+      zp_fp32,
+      bias,
+      batch_size,
+      lowp_mode,
+      num_concats);
+  return c10::make_intrusive<IpexWoqLinearOpContext>(
+      batch_size, std::move(op_context));
+}
+
 at::Tensor woq_linear_run(
     const at::Tensor& input,
     c10::intrusive_ptr<WoqLinearOpContext> op_context) {
@@ -122,10 +224,11 @@ ContextLinearWoq create(
     int64_t num_concats) {
   auto packed_weight =
       woq_linear_pack_weight(weight, scales, zero_points, lowp_mode);
-  bool is_int4 = weight.scalar_type() == c10::kQUInt4x2;
+  // Group-wise quantized int4 weight is uint8 [N, K/2]
+  bool is_int4 = weight.scalar_type() == c10::kQUInt4x2 ||
+      weight.scalar_type() == c10::kByte;
   auto packed_shape = packed_weight.sizes();
   int64_t N = weight.size(0);
-  int64_t K = weight.size(1);
   bool weight_is_padded = (packed_shape.size() == 4 && is_int4 &&
                            packed_shape[0] * packed_shape[3] * 2 != N) ||
       (packed_shape.size() == 4 && !is_int4 &&
@@ -176,11 +279,19 @@ ContextLinearWoq create(
                        : c10::nullopt);
 }
 
+static int64_t get_weight_k(const ContextLinearWoq& context) {
+  if (context.at_weight_.dim() == 2) {
+    // Group-wise quantized int4 weight in plain format is uint8 [N, K/2]
+    return context.at_weight_.scalar_type() == c10::kByte
+        ? context.at_weight_.size(1) * 2
+        : context.at_weight_.size(1);
+  }
+  return context.at_weight_.size(1) * context.at_weight_.size(2);
+}
+
 at::Tensor run(ContextLinearWoq& context, const at::Tensor& input) {
   // TPP kernel packs weight to 4d (Nc, Kc, block_k, block_n)
-  auto w_k = context.at_weight_.dim() == 2
-      ? context.at_weight_.size(1)
-      : context.at_weight_.size(1) * context.at_weight_.size(2);
+  auto w_k = get_weight_k(context);
   TORCH_CHECK(
       input.size(input.dim() - 1) == w_k,
       "WOQ linear: input and weight shapes do not match, got k = ",
@@ -223,9 +334,7 @@ at::Tensor run_eltwise(
     const torch::List<c10::optional<at::Scalar>>& scalars,
     const c10::optional<c10::string_view>& algorithm) {
   // TPP kernel packs weight to 4d (Nc, Kc, block_k, block_n)
-  auto w_k = context.at_weight_.dim() == 2
-      ? context.at_weight_.size(1)
-      : context.at_weight_.size(1) * context.at_weight_.size(2);
+  auto w_k = get_weight_k(context);
   TORCH_CHECK(
       input.size(input.dim() - 1) == w_k,
       "WOQ linear: input and weight shapes do not match, got k = ",
@@ -273,9 +382,7 @@ at::Tensor run_add(
     at::Tensor& accumu,
     const c10::optional<at::Scalar>& alpha) {
   // TPP kernel packs weight to 4d (Nc, Kc, block_k, block_n)
-  auto w_k = context.at_weight_.dim() == 2
-      ? context.at_weight_.size(1)
-      : context.at_weight_.size(1) * context.at_weight_.size(2);
+  auto w_k = get_weight_k(context);
   TORCH_CHECK(
       input.size(input.dim() - 1) == w_k,
       "WOQ linear: input and weight shapes do not match, got k = ",
@@ -304,9 +411,7 @@ at::Tensor run_add_relu(
     at::Tensor& accumu,
     const c10::optional<at::Scalar>& alpha) {
   // TPP kernel packs weight to 4d (Nc, Kc, block_k, block_n)
-  auto w_k = context.at_weight_.dim() == 2
-      ? context.at_weight_.size(1)
-      : context.at_weight_.size(1) * context.at_weight_.size(2);
+  auto w_k = get_weight_k(context);
   TORCH_CHECK(
       input.size(input.dim() - 1) == w_k,
       "WOQ linear: input and weight shapes do not match, got k = ",
@@ -335,9 +440,7 @@ at::Tensor run_add(
     const at::Tensor& input,
     const std::vector<at::Tensor>& others) {
   // TPP kernel packs weight to 4d (Nc, Kc, block_k, block_n)
-  auto w_k = context.at_weight_.dim() == 2
-      ? context.at_weight_.size(1)
-      : context.at_weight_.size(1) * context.at_weight_.size(2);
+  auto w_k = get_weight_k(context);
   TORCH_CHECK(
       input.size(input.dim() - 1) == w_k,
       "WOQ linear: input and weight shapes do not match, got k = ",
@@ -364,9 +467,7 @@ at::Tensor run_add_add(
     const at::Tensor& input,
     const std::vector<at::Tensor>& others) {
   // TPP kernel packs weight to 4d (Nc, Kc, block_k, block_n)
-  auto w_k = context.at_weight_.dim() == 2
-      ? context.at_weight_.size(1)
-      : context.at_weight_.size(1) * context.at_weight_.size(2);
+  auto w_k = get_weight_k(context);
   TORCH_CHECK(
       input.size(input.dim() - 1) == w_k,
       "WOQ linear: input and weight shapes do not match, got k = ",
@@ -427,6 +528,14 @@ at::Tensor unpack(ContextLinearWoq& context, const at::Tensor& tensor) {
   if (tensor.dim() > 2) {
     auto scales = context.scales_list_[0];
     auto zero_points = context.zero_points_list_[0];
+    if (scales.dim() == 2) {
+      // Group-wise quantized weight is returned in plain format, i.e., uint8
+      // [N, K/2] for int4 or int8 [N, K]
+      auto N = context.orig_wei_shape_.has_value()
+          ? context.orig_wei_shape_.value()[0]
+          : unpacked_weight.size(0);
+      return unpacked_weight.narrow(0, 0, N);
+    }
     if (context.is_int4_) {
       auto unpacked_shape = unpacked_weight.sizes().vec(); // = N * K/2
       auto shape = context.orig_wei_shape_.has_value()
@@ -450,6 +559,28 @@ at::Tensor unpack(ContextLinearWoq& context, const at::Tensor& tensor) {
   return unpacked_weight;
 }
 
+// Returns the scales or zero points in the original layout, i.e., [N] for
+// per-channel quantization or [N, num_groups] for group-wise quantization
+static at::Tensor to_public_qparams(
+    ContextLinearWoq& context,
+    const at::Tensor& qparams) {
+  auto qparams_public = qparams;
+  if (context.orig_wei_shape_.has_value()) {
+    qparams_public =
+        qparams.narrow(-1, 0, context.orig_wei_shape_.value()[0]);
+  }
+  return qparams_public.dim() == 2 ? qparams_public.t().contiguous()
+                                   : qparams_public;
+}
+
+at::Tensor get_scales(ContextLinearWoq& context) {
+  return to_public_qparams(context, context.scales_list_[0]);
+}
+
+at::Tensor get_zero_points(ContextLinearWoq& context) {
+  return to_public_qparams(context, context.zero_points_list_[0]);
+}
+
 } // namespace woq_linear
 } // namespace detail
 } // namespace cpu
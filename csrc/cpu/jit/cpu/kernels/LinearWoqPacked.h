@@ -26,6 +26,15 @@ c10::intrusive_ptr<WoqLinearOpContext> createWoqLinearPrePackOpContextInt4(
     int64_t lowp_mode,
     int64_t num_concats);
 
+c10::intrusive_ptr<WoqLinearOpContext> createWoqLinearPrePackOpContextGroupWise(
+    at::Tensor&& weight,
+    at::Tensor&& scales,
+    at::Tensor&& zero_points,
+    c10::optional<at::Tensor>&& bias,
+    c10::optional<int64_t> batch_size,
+    int64_t lowp_mode,
+    int64_t num_concats);
+
 at::Tensor woq_linear_run(
     const at::Tensor& input,
     c10::intrusive_ptr<WoqLinearOpContext> op_context);
@@ -93,6 +102,10 @@ at::Tensor pack(ContextLinearWoq& context, const at::Tensor& tensor);
 
 at::Tensor unpack(ContextLinearWoq& context, const at::Tensor& tensor);
 
+at::Tensor get_scales(ContextLinearWoq& context);
+
+at::Tensor get_zero_points(ContextLinearWoq& context);
+
 } // namespace woq_linear
 } // namespace detail
 } // namespace cpu
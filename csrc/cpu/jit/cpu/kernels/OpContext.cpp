@@ -545,6 +545,14 @@ c10::optional<at::Tensor> IpexWoqLinearOpContext::get_at_bias() {
   return op_context_.at_bias_;
 }
 
+at::Tensor IpexWoqLinearOpContext::get_scales() {
+  return torch_ipex::cpu::detail::woq_linear::get_scales(op_context_);
+}
+
+at::Tensor IpexWoqLinearOpContext::get_zero_points() {
+  return torch_ipex::cpu::detail::woq_linear::get_zero_points(op_context_);
+}
+
 detail::ContextLinearWoq& IpexWoqLinearOpContext::get_context() {
   return op_context_;
 }
@@ -373,6 +373,9 @@ class WoqLinearOpContext : public torch::jit::CustomClassHolder {
 
  public:
   SerializationTypeWoqLinearPrePack unpack() {
+    TORCH_CHECK(
+        this->get_context().scales_list_[0].dim() < 2,
+        "Serialization of group-wise quantized WoqLinearOpContext is not supported");
     auto orig_weight_ = this->to_public(this->get_at_packed_weight());
     auto orig_bias_ = this->get_context().at_bias_;
     return std::make_tuple(
@@ -417,6 +420,10 @@ class WoqLinearOpContext : public torch::jit::CustomClassHolder {
 
   virtual c10::optional<at::Tensor> get_at_bias() = 0;
 
+  virtual at::Tensor get_scales() = 0;
+
+  virtual at::Tensor get_zero_points() = 0;
+
   virtual at::Tensor pack(const at::Tensor& tensor) = 0;
 
   virtual detail::ContextLinearWoq& get_context() = 0;
@@ -477,6 +484,10 @@ class IpexWoqLinearOpContext final : public WoqLinearOpContext {
 
   virtual c10::optional<at::Tensor> get_at_bias() override;
 
+  virtual at::Tensor get_scales() override;
+
+  virtual at::Tensor get_zero_points() override;
+
   virtual at::Tensor pack(const at::Tensor& tensor) override;
 
   virtual detail::ContextLinearWoq& get_context() override;
@@ -17,6 +17,7 @@ using detail::mkl_sgemm::createLinearMKLPrePackOpContext;
 #ifdef USE_LIBXSMM
 using detail::woq_linear::createWoqLinearPrePackOpContext;
 using detail::woq_linear::createWoqLinearPrePackOpContextInt4;
+using detail::woq_linear::createWoqLinearPrePackOpContextGroupWise;
 #endif
 
 TORCH_LIBRARY(ipex_prepack, m) {
@@ -141,6 +142,10 @@ TORCH_LIBRARY(ipex_prepack, m) {
           "get_weight",
           &torch_ipex::cpu::WoqLinearOpContext::get_at_packed_weight)
       .def("get_bias", &torch_ipex::cpu::WoqLinearOpContext::get_at_bias)
+      .def("get_scales", &torch_ipex::cpu::WoqLinearOpContext::get_scales)
+      .def(
+          "get_zero_points",
+          &torch_ipex::cpu::WoqLinearOpContext::get_zero_points)
       .def("pack", &torch_ipex::cpu::WoqLinearOpContext::pack)
       .def("to_public", &torch_ipex::cpu::WoqLinearOpContext::to_public)
       .def(
@@ -172,6 +177,9 @@ TORCH_LIBRARY(ipex_prepack, m) {
   m.def(
       "weight_only_qlinear_prepack_int4(Tensor W, Tensor scales, Tensor zero_points, Tensor? B, int? batch_size, int lowp_mode, int num_concats) "
       "-> __torch__.torch.classes.ipex_prepack.WoqLinearOpContext");
+  m.def(
+      "weight_only_qlinear_prepack_group_wise(Tensor W, Tensor scales, Tensor zero_points, Tensor? B, int? batch_size, int lowp_mode, int num_concats) "
+      "-> __torch__.torch.classes.ipex_prepack.WoqLinearOpContext");
 #endif
 }
 
@@ -191,6 +199,9 @@ TORCH_LIBRARY_IMPL(ipex_prepack, CPU, m) {
   m.impl(
       "weight_only_qlinear_prepack_int4",
       TORCH_FN(createWoqLinearPrePackOpContextInt4));
+  m.impl(
+      "weight_only_qlinear_prepack_group_wise",
+      TORCH_FN(createWoqLinearPrePackOpContextGroupWise));
 }
 #endif
 } // namespace cpu
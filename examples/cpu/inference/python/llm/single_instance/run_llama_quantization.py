@@ -294,7 +294,8 @@ elif args.ipex_weight_only_quantization:
         weight_dtype=weight_dtype, lowp_mode=lowp_mode
     )
     if args.low_precision_checkpoint != "":
-        low_precision_checkpoint = torch.load(args.low_precision_checkpoint)
+        # the checkpoint is memory-mapped and converted layer by layer
+        low_precision_checkpoint = args.low_precision_checkpoint
     else:
         low_precision_checkpoint = None
     user_model = ipex.optimize_transformers(
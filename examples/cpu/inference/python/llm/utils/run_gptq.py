@@ -21,8 +21,13 @@ parser.add_argument(
 )
 parser.add_argument("--dataset", nargs="?", default="lambada", const="lambada")
 parser.add_argument("--output-dir", nargs="?", default="./saved_results")
-parser.add_argument("--calib-iters", default=512, type=int,
-                    help="calibration iters.")
+parser.add_argument("--calib-iters", default=512, type=int, help="calibration iters.")
+parser.add_argument(
+    "--group-size",
+    default=-1,
+    type=int,
+    help="group size of weight quantization, -1 for per-channel.",
+)
 args = parser.parse_args()
 
 
@@ -175,10 +180,10 @@ from neural_compressor import PostTrainingQuantConfig, quantization
 op_type_dict = {
     '.*': {  # re.match
         "weight": {
-            'bits': 4,  # only support 4-bit for now
-            'group_size': -1,  # only support per-channel for now
-            'scheme': 'asym',  # only support asym for now
-            'algorithm': 'GPTQ',  # RTN/AWQ/TEQ
+            "bits": 4,  # only support 4-bit for now
+            "group_size": args.group_size,
+            "scheme": "asym",  # only support asym for now
+            "algorithm": "GPTQ",  # RTN/AWQ/TEQ
         },
     },
 }
@@ -64,6 +64,8 @@ make_fallback(torch.ops.torch_ipex.tpp_linear_silu)
 make_fallback(torch.ops.torch_ipex.tpp_linear_add)
 make_fallback(torch.ops.torch_ipex.tpp_linear_mul)
 make_fallback(torch.ops.torch_ipex.masked_multihead_self_attention)
+make_fallback(torch.ops.torch_ipex.paged_attention)
+make_fallback(torch.ops.torch_ipex.fused_sampling)
 make_fallback(torch.ops.torch_ipex.rotary_position_embedding_out)
 
 make_fallback(torch.ops.torch_ipex.add_softmax_)
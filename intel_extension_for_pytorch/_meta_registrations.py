@@ -611,6 +611,38 @@ def meta_masked_multihead_self_attention(
     return (attn_output, attn_weights, key_cache_out, value_cache_out, beam_idx_out)
 
 
+@register_meta("paged_attention")
+def meta_paged_attention(
+    query,
+    key,
+    value,
+    key_cache,
+    value_cache,
+    block_tables,
+    context_lens,
+    scale_attn,
+    attention_mask,
+    key_scale=None,
+    value_scale=None,
+):
+    return query.new_empty(
+        (query.shape[0], query.shape[2], query.shape[1], query.shape[3])
+    )
+
+
+@register_meta("fused_sampling")
+def meta_fused_sampling(
+    logits,
+    input_ids,
+    temperature,
+    top_k,
+    top_p,
+    repetition_penalty,
+    uniform,
+):
+    return logits.new_empty((logits.shape[0],), dtype=torch.long)
+
+
 @register_meta("rotary_position_embedding")
 def meta_rotary_position_embedding(
     t_in,
@@ -1,3 +1,4 @@
+import glob
 import itertools
 import os
 import platform
@@ -63,6 +64,9 @@ class CoreInfo:
     - [bool] is a physical core or not
     - [float] maxmhz
     - [bool] is a performance core
+    - [int] L2 cache index, cores of the same index share the L2 cache
+    - [int] L3 cache index, cores of the same index share the L3 cache
+    - [int] Die index
     """
 
     def __init__(self, lscpu_txt="", headers=None):
@@ -75,6 +79,9 @@ class CoreInfo:
         self.is_physical_core = True
         self.maxmhz = 0
         self.is_p_core = True
+        self.l2 = -1
+        self.l3 = -1
+        self.die = -1
         if lscpu_txt != "" and len(headers) > 0:
             self.parse_raw(lscpu_txt, headers)
 
@@ -89,6 +96,16 @@ class CoreInfo:
             self.socket = int(cols[headers["socket"]])
         if "maxmhz" in headers:
             self.maxmhz = float(cols[headers["maxmhz"]])
+        if "caches" in headers:
+            # the L1d:L1i:L2:L3 column
+            caches = dict(
+                zip(headers["caches"][1], cols[headers["caches"][0]].split(":"))
+            )
+            for level in ["l2", "l3"]:
+                if level in caches and caches[level].isdigit():
+                    setattr(self, level, int(caches[level]))
+        if "die" in headers:
+            self.die = int(cols[headers["die"]])
 
     def __str__(self):
         return f"{self.cpu}\t{self.core}\t{self.socket}\t{self.node}\t{self.is_physical_core}\t{self.maxmhz}\t{self.is_p_core}"
@@ -128,14 +145,38 @@ class CPUPool(list):
         return ret
 
 
+def _read_sysfs(path):
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _parse_cpu_list(txt):
+    # "0-3,8,10-11" -> [0, 1, 2, 3, 8, 10, 11]
+    ret = []
+    for item in txt.split(","):
+        if "-" in item:
+            start, end = item.split("-")
+            ret.extend(range(int(start), int(end) + 1))
+        elif item != "":
+            ret.append(int(item))
+    return ret
+
+
 class CPUPoolList:
     """
     Get a CPU pool with all available CPUs and CPU pools filtered with designated criterias.
+    The L2/L3 cache sharing, the dies and the memory bandwidth of the NUMA nodes are read from sysfs
+    (/sys/devices/system by default), which is read only if lscpu_txt is not given or sysfs_path is set.
     """
 
-    def __init__(self, logger=None, lscpu_txt=""):
+    def __init__(self, logger=None, lscpu_txt="", sysfs_path=None):
         self.pool_all = CPUPool()
         self.pools_ondemand = []
+        # {node id: {"read": MB/s, "write": MB/s}}, None if not reported by the system
+        self.node_memory_bandwidth = {}
 
         self.logger = logger
         if platform.system() == "Windows":
@@ -170,8 +211,10 @@ class CPUPoolList:
                     t = line.split(" ")
                     num_cols = len(t)
                     for i in range(num_cols):
-                        if t[i] in ["cpu", "core", "socket", "node", "maxmhz"]:
+                        if t[i] in ["cpu", "core", "socket", "node", "maxmhz", "die"]:
                             headers[t[i]] = i
+                        elif t[i].startswith("l1d:"):
+                            headers["caches"] = (i, t[i].split(":"))
                 else:
                     t = line.split(" ")
                     if (
@@ -182,6 +225,10 @@ class CPUPoolList:
                     ):
                         self.pool_all.append(CoreInfo(t, headers))
             assert len(self.pool_all) > 0, "cpuinfo is empty"
+            if sysfs_path is None and lscpu_txt.strip() == "":
+                sysfs_path = "/sys/devices/system"
+            if sysfs_path is not None:
+                self.read_sysfs_topology(sysfs_path)
 
         # Determine logical cores
         core_cur = -1
@@ -210,6 +257,64 @@ class CPUPoolList:
                     if c.maxmhz in e_core_mhzs:
                         c.is_p_core = False
 
+    def read_sysfs_topology(self, sysfs_path):
+        """
+        Read the L2/L3 cache sharing groups and the die of each CPU, and the memory bandwidth of each NUMA node
+        from sysfs. The index of a cache is the smallest CPU id sharing it.
+        """
+        for c in self.pool_all:
+            cpu_path = os.path.join(sysfs_path, "cpu", f"cpu{c.cpu}")
+            die_id = _read_sysfs(os.path.join(cpu_path, "topology", "die_id"))
+            if die_id is not None and die_id.isdigit():
+                c.die = int(die_id)
+            for cache_path in glob.glob(os.path.join(cpu_path, "cache", "index*")):
+                level = _read_sysfs(os.path.join(cache_path, "level"))
+                cache_type = _read_sysfs(os.path.join(cache_path, "type"))
+                shared_cpus = _read_sysfs(os.path.join(cache_path, "shared_cpu_list"))
+                if level in ["2", "3"] and cache_type != "Instruction" and shared_cpus:
+                    setattr(c, f"l{level}", min(_parse_cpu_list(shared_cpus)))
+        for n in sorted(set([c.node for c in self.pool_all])):
+            # reported by the ACPI HMAT table on the supported platforms
+            initiators_path = os.path.join(
+                sysfs_path, "node", f"node{n}", "access0", "initiators"
+            )
+            bandwidth = {}
+            for k in ["read", "write"]:
+                v = _read_sysfs(os.path.join(initiators_path, f"{k}_bandwidth"))
+                if v is not None and v.isdigit():
+                    bandwidth[k] = int(v)
+            self.node_memory_bandwidth[n] = bandwidth if len(bandwidth) > 0 else None
+
+    def get_topology_txt(self):
+        """
+        Get a description line of each NUMA node: its socket, sub-NUMA clusters, dies, L3 cache domains and
+        memory bandwidth.
+        """
+        ret = []
+        for n in sorted(set([c.node for c in self.pool_all])):
+            cores = [c for c in self.pool_all if c.node == n]
+            sockets = sorted(set([c.socket for c in cores]))
+            nsnc = len(set([c.node for c in self.pool_all if c.socket in sockets]))
+            dies = sorted(set([c.die for c in cores if c.die > -1]))
+            l3s = sorted(set([c.l3 for c in cores if c.l3 > -1]))
+            txt = f"node {n}: {len([c for c in cores if c.is_physical_core])} physical cores"
+            txt += f", socket {','.join([str(i) for i in sockets])}"
+            if nsnc > len(sockets):
+                txt += f" with {nsnc} sub-NUMA clusters"
+            if len(dies) > 0:
+                txt += f", dies {','.join([str(i) for i in dies])}"
+            if len(l3s) > 0:
+                txt += f", {len(l3s)} L3 cache domain(s)"
+            bandwidth = self.node_memory_bandwidth.get(n, None)
+            if bandwidth is None:
+                txt += ", memory bandwidth unknown"
+            else:
+                txt += ", memory bandwidth " + ", ".join(
+                    [f"{k} {v} MB/s" for k, v in bandwidth.items()]
+                )
+            ret.append(txt)
+        return ret
+
     def verbose(self, level, msg):
         if self.logger:
             logging_fn = {
@@ -233,6 +338,8 @@ class CPUPoolList:
         only physical cores are used.
     - use_e_cores [bool]: Use Efficient-Cores, False by default. When set to False, only Performance-Cores are used.
     - skip_cross_node_cores [bool]: Allow instances to be executed on cores across NUMA nodes, False by default.
+    - skip_cross_l3_cores [bool]: Do not split an instance across L3 cache domains, dies or NUMA nodes, \
+        False by default. The cores of the domains which are not enough for an instance are left unused.
     - nodes_list [list]: A list containing all node ids that the execution is expected to be running on.
     - cores_list [list]: A list containing all cpu ids that the execution is expected to be running on.
     - return_mode [str]: A string that defines how result values are formed, could be either of 'auto', \
@@ -253,6 +360,7 @@ class CPUPoolList:
         nodes_list=None,
         cores_list=None,
         return_mode="auto",
+        skip_cross_l3_cores=False,
     ):
         if nodes_list is None:
             nodes_list = []
@@ -316,32 +424,44 @@ class CPUPoolList:
             ncores_per_instance >= 0
         ), "Argument --ncores-per-instance cannot be a negative value."
         assert ninstances >= 0, "Argument --ninstances cannot be a negative value."
-        nodes = set([c.node for c in pool])
+        # The domains that an instance doesn't cross
+        if skip_cross_l3_cores:
+
+            def domain_of(c):
+                return (c.node, c.die, c.l3)
+
+        else:
+
+            def domain_of(c):
+                return c.node
+
+        domains = sorted(set([domain_of(c) for c in pool]))
         if ncores_per_instance + ninstances == 0:
             # Both ncores_per_instance and ninstances are 0
             ninstances = 1
         if ncores_per_instance * ninstances == 0:
             # Either ncores_per_instance or ninstances is 0
-            if skip_cross_node_cores:
-                ncores_per_node = len(pool) // len(nodes)
-                nresidual = 0
+            if skip_cross_node_cores or skip_cross_l3_cores:
+                domain_cores = [[c for c in pool if domain_of(c) == d] for d in domains]
+                ncores_per_domain = min([len(cores) for cores in domain_cores])
                 if ncores_per_instance == 0:
-                    nins_per_node = ninstances // len(nodes)
-                    if ninstances % len(nodes) > 0:
-                        nins_per_node += 1
-                    ncores_per_instance = ncores_per_node // nins_per_node
-                    nresidual = ncores_per_node % nins_per_node
+                    nins_per_domain = ninstances // len(domains)
+                    if ninstances % len(domains) > 0:
+                        nins_per_domain += 1
+                    ncores_per_instance = ncores_per_domain // nins_per_domain
+                    assert (
+                        ncores_per_instance > 0
+                    ), "Requested number of instances exceeds what the domains of the cores can hold."
                 if ninstances == 0:
-                    ninstances = ncores_per_node // ncores_per_instance * len(nodes)
-                    nresidual = ncores_per_node % ncores_per_instance
-                if nresidual > 0:
-                    cores_remove = []
-                    for n in nodes:
-                        cores = [c for c in pool if c.node == n]
-                        for i in range(nresidual):
-                            cores_remove.append(cores[-1 * (i + 1)])
-                    for c in cores_remove:
-                        pool.remove(c)
+                    ninstances = sum(
+                        [len(cores) // ncores_per_instance for cores in domain_cores]
+                    )
+                    nins_per_domain = ninstances
+                # Each domain keeps the cores of whole instances, in the order of the domains
+                pool = []
+                for cores in domain_cores:
+                    nins_local = min(len(cores) // ncores_per_instance, nins_per_domain)
+                    pool.extend(cores[: nins_local * ncores_per_instance])
             else:
                 if ninstances == 0:
                     ninstances = len(pool) // ncores_per_instance
@@ -355,6 +475,13 @@ class CPUPoolList:
                     "Argument --skip-cross-node-cores won't take effect when both --ninstances and \
                         --ncores-per-instance are explicitly set.",
                 )
+            if skip_cross_l3_cores:
+                self.verbose(
+                    "warning",
+                    "Argument --skip-cross-l3-cores won't take effect when both --ninstances and \
+                        --ncores-per-instance are explicitly set.",
+                )
+                skip_cross_l3_cores = False
         assert (
             ninstances * ncores_per_instance > 0
             and ninstances * ncores_per_instance <= len(pool)
@@ -362,7 +489,16 @@ class CPUPoolList:
 
         # Split the aggregated pool into individual pools
         self.pools_ondemand.clear()
-        pool.sort(key=lambda x: (x.core, 1 - int(x.is_physical_core)))
+        if skip_cross_l3_cores:
+            pool.sort(
+                key=lambda x: (
+                    domains.index(domain_of(x)),
+                    x.core,
+                    1 - int(x.is_physical_core),
+                )
+            )
+        else:
+            pool.sort(key=lambda x: (x.core, 1 - int(x.is_physical_core)))
         for i in range(ninstances):
             # Generate individual raw pool
             pool_local = CPUPool()
@@ -3,6 +3,7 @@ import subprocess
 import os
 import intel_extension_for_pytorch.cpu.auto_ipex as auto_ipex
 from .launcher_base import Launcher
+from .supervisor import DEFAULT_METRICS_REGEX, Instance, InstanceSupervisor
 
 
 class MultiInstancesLauncher(Launcher):
@@ -45,6 +46,14 @@ class MultiInstancesLauncher(Launcher):
             default=False,
             help="Allow instances to be executed on cores across NUMA nodes.",
         )
+        group.add_argument(
+            "--skip-cross-l3-cores",
+            "--skip_cross_l3_cores",
+            action="store_true",
+            default=False,
+            help="Never split an instance across L3 cache domains, dies or NUMA nodes. The cores of the domains \
+                which are not enough for an instance are left unused.",
+        )
         group.add_argument(
             "--multi-task-manager",
             "--multi_task_manager",
@@ -85,6 +94,37 @@ class MultiInstancesLauncher(Launcher):
                 Recommend to use this for benchmarking purpose; for other use cases, \
                 this MALLOC_CONF may cause Out-of-Memory crash.",
         )
+        group.add_argument(
+            "--supervise",
+            action="store_true",
+            default=False,
+            help="Supervise the instances: restart the crashed or hung instances on the same cores, stream their \
+                outputs prefixed by the instance index, and report the aggregated throughput and latency.",
+        )
+        group.add_argument(
+            "--max-restarts",
+            "--max_restarts",
+            default=3,
+            type=int,
+            help="Maximum number of restarts of each instance with --supervise.",
+        )
+        group.add_argument(
+            "--health-timeout",
+            "--health_timeout",
+            default=0,
+            type=float,
+            help="Seconds without any output after which an instance is regarded as hung and restarted with \
+                --supervise. 0 disables the check.",
+        )
+        group.add_argument(
+            "--metrics-regex",
+            "--metrics_regex",
+            default=DEFAULT_METRICS_REGEX,
+            type=str,
+            help="Regular expression of the metric lines printed by the instances, whose groups are the metric \
+                name, the value and the unit, aggregated with --supervise. The throughputs are summed and the \
+                latencies are averaged.",
+        )
 
     def is_command_available(self, cmd):
         is_available = False
@@ -157,6 +197,11 @@ class MultiInstancesLauncher(Launcher):
                 self.verbose("info", f"env: {k}={v}")
                 environ_local[k] = v
 
+        # the index of the instance, e.g., to select the shard of a dataset
+        environ_local["IPEX_INSTANCE_IDX"] = str(index)
+        environ_local["IPEX_NINSTANCES"] = str(len(cpu_pools))
+        self.verbose("info", f"env: IPEX_INSTANCE_IDX={index}")
+
         if not args.no_python:
             cmd.append(sys.executable)
             cmd.append("-u")
@@ -167,7 +212,7 @@ class MultiInstancesLauncher(Launcher):
         log_name = os.path.join(args.log_dir, log_name)
         cmd.extend(args.program_args)
         cmd_s = " ".join(cmd)
-        if args.log_dir:
+        if args.log_dir and not args.supervise:
             cmd_s = f"{cmd_s} 2>&1 | tee {log_name}"
         self.verbose("info", f"cmd: {cmd_s}")
         if len(set([c.node for c in pool])) > 1:
@@ -175,6 +220,12 @@ class MultiInstancesLauncher(Launcher):
                 "warning",
                 f"Cross NUMA nodes execution detected: cores [{cores_list_local}] are on different NUMA nodes [{nodes_list_local}]",
             )
+        if args.supervise:
+            # Started and restarted by the supervisor, which writes the log file
+            instance = Instance(
+                index, cmd, dict(environ_local), log_name if args.log_dir else ""
+            )
+            return {"process": None, "cmd": cmd_s, "instance": instance}
         process = subprocess.Popen(cmd_s, env=environ_local, shell=True)
         return {"process": process, "cmd": cmd_s}
 
@@ -225,7 +276,10 @@ class MultiInstancesLauncher(Launcher):
             skip_cross_node_cores=args.skip_cross_node_cores,
             nodes_list=nodes_list,
             cores_list=cores_list,
+            skip_cross_l3_cores=args.skip_cross_l3_cores,
         )
+        for txt in self.cpuinfo.get_topology_txt():
+            self.verbose("info", f"topology: {txt}")
         args.ninstances = len(self.cpuinfo.pools_ondemand)
         args.ncores_per_instance = len(self.cpuinfo.pools_ondemand[0])
 
@@ -309,7 +363,25 @@ class MultiInstancesLauncher(Launcher):
             )
             processes.append(process)
         try:
+            if args.supervise:
+                supervisor = InstanceSupervisor(
+                    [process["instance"] for process in processes],
+                    max_restarts=args.max_restarts,
+                    health_timeout=args.health_timeout,
+                    metrics_regex=args.metrics_regex,
+                    verbose=self.verbose,
+                )
+                instances = supervisor.run()
+                for txt in supervisor.get_report():
+                    self.verbose("info", f"report: {txt}")
+                for instance, process in zip(instances, processes):
+                    if instance.returncode != 0:
+                        raise subprocess.CalledProcessError(
+                            returncode=instance.returncode, cmd=process["cmd"]
+                        )
             for process in processes:
+                if process["process"] is None:
+                    continue
                 p = process["process"]
                 p.wait()
                 if p.returncode != 0:
@@ -0,0 +1,195 @@
+import re
+import subprocess
+import sys
+import threading
+import time
+
+# e.g. "Throughput: 123.4 samples/s", "latency = 5.6 ms"
+DEFAULT_METRICS_REGEX = (
+    r"(throughput|latency)\s*[:=]\s*([0-9]+(?:\.[0-9]+)?)\s*([^\s,;]*)"
+)
+
+
+class Instance:
+    """
+    An instance run by the supervisor, with its command, environment variables and log file, which are kept to
+    restart it on the same cores.
+    """
+
+    def __init__(self, index, cmd, environ, log_name=""):
+        self.index = index
+        self.cmd = cmd
+        self.environ = environ
+        self.log_name = log_name
+        self.process = None
+        self.reader = None
+        self.nrestarts = 0
+        self.last_output_time = 0.0
+        self.returncode = None
+        # {metric name: (value, unit)}, the last reported values
+        self.metrics = {}
+
+
+class InstanceSupervisor:
+    """
+    Run the instances, restart the crashed or hung ones on the same cores and aggregate their metrics.
+    - max_restarts [int]: Maximum number of restarts of each instance.
+    - health_timeout [float]: Seconds without any output after which an instance is regarded as hung and restarted. \
+        0 disables the check.
+    - metrics_regex [str]: Regular expression of the metric lines in the output of the instances, whose groups are \
+        the metric name, the value and the unit. The match is case-insensitive.
+    """
+
+    def __init__(
+        self,
+        instances,
+        max_restarts=3,
+        health_timeout=0,
+        metrics_regex=DEFAULT_METRICS_REGEX,
+        verbose=None,
+        poll_interval=0.5,
+    ):
+        self.instances = instances
+        self.max_restarts = max_restarts
+        self.health_timeout = health_timeout
+        self.metrics_regex = re.compile(metrics_regex, re.IGNORECASE)
+        self.verbose = verbose if verbose is not None else lambda level, msg: print(msg)
+        self.poll_interval = poll_interval
+        self.output_lock = threading.Lock()
+
+    def read_output(self, instance, process, log_file):
+        for line in iter(process.stdout.readline, b""):
+            line = line.decode("utf-8", errors="replace").rstrip("\n")
+            instance.last_output_time = time.monotonic()
+            with self.output_lock:
+                sys.stdout.write(f"[instance {instance.index}] {line}\n")
+                sys.stdout.flush()
+            if log_file is not None:
+                log_file.write(f"{line}\n")
+                log_file.flush()
+            for m in self.metrics_regex.finditer(line):
+                instance.metrics[m.group(1).lower()] = (float(m.group(2)), m.group(3))
+        process.stdout.close()
+        if log_file is not None:
+            log_file.close()
+
+    def start(self, instance):
+        log_file = None
+        if instance.log_name:
+            # the output of the restarted instance is appended to the same log file
+            log_file = open(instance.log_name, "a" if instance.nrestarts > 0 else "w")
+        instance.process = subprocess.Popen(
+            instance.cmd,
+            env=instance.environ,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+        instance.last_output_time = time.monotonic()
+        instance.reader = threading.Thread(
+            target=self.read_output,
+            args=(instance, instance.process, log_file),
+            daemon=True,
+        )
+        instance.reader.start()
+
+    def stop(self, instance):
+        if instance.process is not None and instance.process.poll() is None:
+            instance.process.terminate()
+            try:
+                instance.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                instance.process.kill()
+                instance.process.wait()
+
+    def check(self, instance):
+        """
+        Check the health of a running instance. Return True if it is still running.
+        """
+        returncode = instance.process.poll()
+        if returncode is None:
+            if (
+                self.health_timeout > 0
+                and time.monotonic() - instance.last_output_time > self.health_timeout
+            ):
+                self.verbose(
+                    "warning",
+                    f"supervisor: instance {instance.index} has no output for {self.health_timeout} seconds. \
+                        Regarded as hung.",
+                )
+                self.stop(instance)
+                returncode = instance.process.returncode
+            else:
+                return True
+        instance.reader.join()
+        if returncode == 0:
+            instance.returncode = 0
+            return False
+        if instance.nrestarts < self.max_restarts:
+            instance.nrestarts += 1
+            self.verbose(
+                "warning",
+                f"supervisor: instance {instance.index} exited with code {returncode}. \
+                    Restarting it on the same cores ({instance.nrestarts}/{self.max_restarts}).",
+            )
+            self.start(instance)
+            return True
+        self.verbose(
+            "warning",
+            f"supervisor: instance {instance.index} exited with code {returncode}. \
+                It has been restarted {self.max_restarts} times, giving up.",
+        )
+        instance.returncode = returncode
+        return False
+
+    def run(self):
+        """
+        Run the instances until all of them exit successfully or run out of restarts. Return the instances.
+        """
+        for instance in self.instances:
+            self.start(instance)
+        running = list(self.instances)
+        try:
+            while len(running) > 0:
+                time.sleep(self.poll_interval)
+                running = [instance for instance in running if self.check(instance)]
+        finally:
+            for instance in self.instances:
+                self.stop(instance)
+        return self.instances
+
+    def get_report(self):
+        """
+        Get the lines of the aggregated report: the status and the metrics of each instance, and each metric over \
+            all the instances. The throughputs are summed and the latencies are averaged.
+        """
+        ret = []
+        for instance in self.instances:
+            if instance.returncode == 0:
+                txt = f"instance {instance.index}: succeeded"
+            else:
+                txt = f"instance {instance.index}: failed ({instance.returncode})"
+            txt += f", {instance.nrestarts} restart(s)"
+            for k, (value, unit) in sorted(instance.metrics.items()):
+                txt += f", {k} {value}{' ' + unit if unit else ''}"
+            ret.append(txt)
+        names = sorted(
+            set([k for instance in self.instances for k in instance.metrics])
+        )
+        for name in names:
+            values = [
+                instance.metrics[name][0]
+                for instance in self.instances
+                if name in instance.metrics
+            ]
+            unit = [
+                instance.metrics[name][1]
+                for instance in self.instances
+                if name in instance.metrics
+            ][0]
+            unit = f" {unit}" if unit else ""
+            if name == "throughput":
+                txt = f"{name}: {sum(values)}{unit} in total"
+            else:
+                txt = f"{name}: {sum(values) / len(values)}{unit} on average, {max(values)}{unit} at most"
+            ret.append(f"{txt} of {len(values)} instance(s)")
+        return ret
@@ -1,4 +1,5 @@
 from .task import Task
+from .executor import MultiPoolExecutor, DeadlineExceededError
 from .cpupool import pin, CPUPool, is_runtime_ext_enabled
 from .multi_stream import (
     MultiStreamModule,
@@ -0,0 +1,195 @@
+import heapq
+import itertools
+import threading
+import time
+
+import torch
+from .cpupool import CPUPool
+from .task import Task, _TaskFuture
+
+
+class DeadlineExceededError(RuntimeError):
+    r"""
+    Set on the future of a task submitted to a MultiPoolExecutor, which is
+    dropped since its deadline expired before it started.
+    """
+
+    pass
+
+
+class _ScheduledTask(object):
+    def __init__(self, args, kwargs, priority, deadline, seq):
+        self.future = _TaskFuture()
+        self.args = args
+        self.kwargs = kwargs
+        # The grad mode of the submitting thread, which the task runs with
+        self.grad_enabled = torch.is_grad_enabled()
+        self.priority = priority
+        self.deadline = deadline
+        self.seq = seq
+
+    def __lt__(self, other):
+        # The task of the higher priority, or submitted earlier, runs first
+        return (-self.priority, self.seq) < (-other.priority, other.seq)
+
+
+class MultiPoolExecutor(object):
+    r"""
+    Schedules the tasks of a module over several CPU pools. Each pool has a
+    queue of the tasks ordered by their priorities, and runs one task at a time
+    on its cores as a ``Task``. The queued tasks of the higher priority run
+    before the queued tasks of the lower priority, e.g., the latency-critical
+    requests before the offline jobs, while the running tasks are not
+    interrupted. The tasks whose deadlines expired before they started are
+    dropped, and their futures raise ``DeadlineExceededError``. With
+    ``work_stealing``, an idle pool takes the task of the highest priority
+    queued on the other pools.
+
+    Args:
+        module (torch.jit.ScriptModule or torch.nn.Module): The input module,
+            or a function.
+        cpu_pools (list of intel_extension_for_pytorch.cpu.runtime.CPUPool):
+            The CPU pools to run the tasks on.
+        work_stealing (bool): Whether the idle pools run the tasks queued on
+            the other pools. The default value is ``True``.
+
+    Returns:
+        intel_extension_for_pytorch.cpu.runtime.MultiPoolExecutor: Generated
+        intel_extension_for_pytorch.cpu.runtime.MultiPoolExecutor object.
+
+    Examples:
+
+        >>> executor = ipex.cpu.runtime.MultiPoolExecutor(
+        ...     traced_model, [cpu_pool1, cpu_pool2]
+        ... )
+        >>> y_future = executor.submit(x, priority=1, deadline=0.05)
+        >>> y = y_future.get()
+        >>> executor.shutdown()
+    """
+
+    def __init__(self, module, cpu_pools, work_stealing=True):
+        assert len(cpu_pools) > 0, "At least one CPUPool should be given"
+        for cpu_pool in cpu_pools:
+            assert type(cpu_pool) is CPUPool
+        self.tasks = [Task(module, cpu_pool) for cpu_pool in cpu_pools]
+        self.work_stealing = work_stealing
+        self._queues = [[] for _ in cpu_pools]
+        self._num_running = [0 for _ in cpu_pools]
+        self._condition = threading.Condition()
+        self._seq = itertools.count()
+        self._shutdown = False
+        self._workers = [
+            threading.Thread(target=self._work, args=(i,), daemon=True)
+            for i in range(len(cpu_pools))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, *args, priority=0, deadline=None, pool_index=None, **kwargs):
+        r"""
+        Submits a task running the module with the inputs ``args`` and
+        ``kwargs``.
+
+        Args:
+            priority (int): The priority of the task. The queued tasks of the
+                higher priority run first. The default value is ``0``.
+            deadline (float): The time in seconds from the submission, after
+                which the task is dropped if it hasn't started. The default
+                value is ``None``, which never drops the task.
+            pool_index (int): The index of the pool to queue the task on. The
+                default value is ``None``, which queues the task on the pool of
+                the least queued and running tasks.
+
+        Returns:
+            A future of the output of the module, whose ``get`` method waits for
+            and returns the output. The ``pool_index`` attribute of the future
+            is the index of the pool which runs the task after it started. The
+            task can be cancelled by the ``cancel`` method of the future before
+            it started.
+        """
+        if deadline is not None:
+            deadline = time.monotonic() + deadline
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("cannot submit a task after shutdown")
+            if pool_index is None:
+                pool_index = min(
+                    range(len(self._queues)),
+                    key=lambda i: len(self._queues[i]) + self._num_running[i],
+                )
+            task = _ScheduledTask(args, kwargs, priority, deadline, next(self._seq))
+            task.future.pool_index = None
+            heapq.heappush(self._queues[pool_index], task)
+            self._condition.notify_all()
+        return task.future
+
+    def _next(self, i):
+        # Returns the next task to run on the pool i, None after shutdown
+        with self._condition:
+            while True:
+                candidates = range(len(self._queues)) if self.work_stealing else [i]
+                candidates = [j for j in candidates if len(self._queues[j]) > 0]
+                if len(candidates) > 0:
+                    # The own queue of the pool goes first on a tie of priority
+                    j = min(
+                        candidates,
+                        key=lambda j: (
+                            -self._queues[j][0].priority,
+                            j != i,
+                            self._queues[j][0].seq,
+                        ),
+                    )
+                    self._num_running[i] += 1
+                    return heapq.heappop(self._queues[j])
+                if self._shutdown:
+                    return None
+                self._condition.wait()
+
+    def _work(self, i):
+        while True:
+            task = self._next(i)
+            if task is None:
+                return
+            try:
+                if not task.future.set_running_or_notify_cancel():
+                    continue
+                if task.deadline is not None and time.monotonic() > task.deadline:
+                    task.future.set_exception(
+                        DeadlineExceededError(
+                            "the deadline of the task expired before it started"
+                        )
+                    )
+                    continue
+                task.future.pool_index = i
+                try:
+                    with torch.set_grad_enabled(task.grad_enabled):
+                        output = self.tasks[i].run_sync(*task.args, **task.kwargs)
+                except Exception as e:
+                    task.future.set_exception(e)
+                else:
+                    task.future.set_result(output)
+            finally:
+                with self._condition:
+                    self._num_running[i] -= 1
+
+    def shutdown(self, wait=True):
+        r"""
+        Stops accepting tasks. The queued tasks still run.
+
+        Args:
+            wait (bool): Whether to wait for the queued tasks to finish. The
+                default value is ``True``.
+        """
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+        return False
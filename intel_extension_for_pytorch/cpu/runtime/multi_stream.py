@@ -1,5 +1,8 @@
+import asyncio
+import time
 import torch
 import torch.nn as nn
+from torch.utils._pytree import tree_flatten, tree_map
 from typing import Union
 import intel_extension_for_pytorch._C as core
 from .cpupool import CPUPool
@@ -64,12 +67,22 @@ class MultiStreamModule(nn.Module):
     as "AUTO", we suggest to set inputs' batchsize larger than and divisible by
     number of cores.
 
+    With ``num_streams`` as "ADAPTIVE", the number of streams is selected for
+    each signature of the inputs (the shapes and dtypes of the tensors), so
+    that the inputs of varying batchsizes keep all the cores busy. The first
+    forwards of a signature run each candidate number of streams, i.e., the
+    divisors of the number of cores and the batchsize, no larger than the
+    batchsize, ``adaptive_trials`` times after a warmup run, and the number of
+    streams of the lowest latency is cached and used by the next forwards of
+    the signature. The batch is split over the streams as described above.
+
     Args:
         model (torch.jit.ScriptModule or torch.nn.Module): The input model.
-        num_streams (Union[int, str]): Number of instances (int) or "AUTO" (str). "AUTO" means the stream number
-            will be selected automatically. Although "AUTO" usually provides a
+        num_streams (Union[int, str]): Number of instances (int), "AUTO" (str) or "ADAPTIVE" (str). "AUTO" means
+            the stream number will be selected automatically. Although "AUTO" usually provides a
             reasonable performance, it may still not be optimal for some cases which
             means manual tuning for number of streams is needed for this case.
+            "ADAPTIVE" means the stream number will be tuned for each signature of the inputs.
         cpu_pool (intel_extension_for_pytorch.cpu.runtime.CPUPool): An
             intel_extension_for_pytorch.cpu.runtime.CPUPool object, contains
             all CPU cores used to run multi-stream inference.
@@ -81,6 +94,18 @@ class MultiStreamModule(nn.Module):
             how to split the inputs.
         output_concat_hint (MultiStreamModuleHint): Hint to MultiStreamModule about
             how to concat the outputs.
+        adaptive_trials (int): The number of runs measured for each candidate
+            number of streams when ``num_streams`` is "ADAPTIVE". The default
+            value is 2.
+        reuse_output_buffers (bool): A flag indicates whether the outputs of
+            the streams are concatenated into the buffers kept for each
+            output, which are reused by the next forwards with the same shapes
+            instead of allocating new outputs. Only the buffer of the latest
+            shape of each output is kept. The output of a single
+            stream is returned without copy. The default value is False. Note:
+            with this flag, an output is only valid until the next forward, so
+            copy it if it is kept longer. ``forward_async`` always allocates
+            new outputs.
 
     Returns:
         intel_extension_for_pytorch.cpu.runtime.MultiStreamModule: Generated
@@ -97,6 +122,8 @@ class MultiStreamModule(nn.Module):
         concat_output: bool = True,
         input_split_hint: MultiStreamModuleHint = default_multi_stream_module_split_hint,
         output_concat_hint: MultiStreamModuleHint = default_multi_stream_module_concat_hint,
+        adaptive_trials: int = 2,
+        reuse_output_buffers: bool = False,
     ):
         super(MultiStreamModule, self).__init__()
         assert (
@@ -109,12 +136,17 @@ class MultiStreamModule(nn.Module):
             )
         self.cpu_pool = cpu_pool
         self.core_list = cpu_pool.core_ids
+        self.adaptive = False
         if isinstance(num_streams, str):
-            # For str input of num_streams, it must be "auto"
+            # For str input of num_streams, it must be "auto" or "adaptive"
             if num_streams.upper() == "AUTO":
                 self.num_streams = get_default_num_streams(
                     cpu_pool
                 )  # The default selected value when auto selection is on.
+            elif num_streams.upper() == "ADAPTIVE":
+                # The number of streams is selected for each signature of inputs in forward
+                self.adaptive = True
+                self.num_streams = get_default_num_streams(cpu_pool)
             else:
                 AssertionError(
                     False
@@ -133,32 +165,35 @@ class MultiStreamModule(nn.Module):
                 )
             )
 
-        if self.num_streams == 1:
+        if self.adaptive:
+            # The tasks of each number of streams are created when it is first used.
+            self.model = model
+            self.adaptive_trials = adaptive_trials
+            assert (
+                self.adaptive_trials > 0
+            ), "adaptive_trials must be a positive integer"
+            # {num_streams: (tasks, args_streams_input, kwargs_streams_input)}
+            # of the numbers of streams selected or being measured
+            self._stream_configs = {}
+            # {signature of inputs: {num_streams: [latency of each run]}}
+            self._adaptive_latencies = {}
+            # {signature of inputs: num_streams selected}
+            self.adaptive_num_streams = {}
+            self.tasks = []
+        elif self.num_streams == 1:
             # Sync execution path if num_stream is 1.
             self.model = model
         else:
-            self.cores_per_instance = self.core_list.__len__() // self.num_streams
-            num_stream_allocated_extra_core = (
-                self.core_list.__len__() % self.num_streams
-            )
-            self.tasks = []
-            start_core_list_idx = 0
-            end_core_list_idx = 0
-            for j in range(self.num_streams):
-                if j < num_stream_allocated_extra_core:
-                    # If the core number is not divisible by stream number,
-                    # the remainder streams(num_stream_allocated_extra_core) will be allocated one extra core.
-                    end_core_list_idx += self.cores_per_instance + 1
-                else:
-                    end_core_list_idx += self.cores_per_instance
-                self.tasks.append(
-                    Task(
-                        model,
-                        CPUPool(self.core_list[start_core_list_idx:end_core_list_idx]),
-                    )
-                )
-                start_core_list_idx = end_core_list_idx
+            self.tasks = self._create_tasks(model, self.num_streams)
+        # The task of the sync execution path, created by the first forward_async
+        self._async_task = None
         self.concat_output = concat_output
+        self.reuse_output_buffers = reuse_output_buffers
+        # {position of the output: buffer}, only the latest shape and dtype of each
+        # position is kept
+        self._output_buffers = {}
+        # The position of the output being concatenated, None if the buffers are not used
+        self._output_buffer_idx = None
         self.input_split_hint = input_split_hint
         self.output_concat_hint = output_concat_hint
 
@@ -179,6 +214,129 @@ class MultiStreamModule(nn.Module):
         # Init status needed for forward
         self.reset_forward_status()
 
+    def _create_tasks(self, model, num_streams):
+        self.cores_per_instance = self.core_list.__len__() // num_streams
+        num_stream_allocated_extra_core = self.core_list.__len__() % num_streams
+        tasks = []
+        start_core_list_idx = 0
+        end_core_list_idx = 0
+        for j in range(num_streams):
+            if j < num_stream_allocated_extra_core:
+                # If the core number is not divisible by stream number,
+                # the remainder streams(num_stream_allocated_extra_core) will be allocated one extra core.
+                end_core_list_idx += self.cores_per_instance + 1
+            else:
+                end_core_list_idx += self.cores_per_instance
+            tasks.append(
+                Task(
+                    model,
+                    CPUPool(self.core_list[start_core_list_idx:end_core_list_idx]),
+                )
+            )
+            start_core_list_idx = end_core_list_idx
+        return tasks
+
+    def _use_stream_config(self, num_streams):
+        # Switch the tasks and the stream inputs to the ones of num_streams for the adaptive mode
+        if num_streams not in self._stream_configs:
+            self._stream_configs[num_streams] = (
+                self._create_tasks(self.model, num_streams),
+                [copy.deepcopy(self.input_split_hint.args) for _ in range(num_streams)],
+                [
+                    copy.deepcopy(self.input_split_hint.kwargs)
+                    for _ in range(num_streams)
+                ],
+            )
+        self.num_streams = num_streams
+        (
+            self.tasks,
+            self.args_streams_input,
+            self.kwargs_streams_input,
+        ) = self._stream_configs[num_streams]
+
+    def _get_split_size(self, args, kwargs):
+        # The size of the first input to split along its split dim, None if no input is split
+        def _do_get_split_size(hint_object, input_object):
+            if type(hint_object) in [list, tuple]:
+                for hint, input in zip(hint_object, input_object):
+                    split_size = _do_get_split_size(hint, input)
+                    if split_size is not None:
+                        return split_size
+            elif type(hint_object) is dict:
+                for key in hint_object:
+                    split_size = _do_get_split_size(hint_object[key], input_object[key])
+                    if split_size is not None:
+                        return split_size
+            elif type(hint_object) is int:
+                return input_object.size(hint_object)
+            return None
+
+        split_size = _do_get_split_size(self.input_split_hint.args, args)
+        if split_size is None:
+            split_size = _do_get_split_size(self.input_split_hint.kwargs, kwargs)
+        return split_size
+
+    def _get_candidate_num_streams(self, split_size):
+        # The divisors of the core number, which split the cores evenly, and the batchsize,
+        # which uses as many streams as possible. More streams than the batchsize leave cores idle.
+        if split_size is None:
+            return [1]
+        num_cores = self.core_list.__len__()
+        max_num_streams = min(split_size, num_cores)
+        candidates = [n for n in range(1, max_num_streams + 1) if num_cores % n == 0]
+        if max_num_streams not in candidates:
+            candidates.append(max_num_streams)
+        return candidates
+
+    @staticmethod
+    def _get_input_signature(args, kwargs):
+        leaves, spec = tree_flatten((args, kwargs))
+        return (
+            str(spec),
+            tuple(
+                (tuple(leaf.shape), leaf.dtype)
+                if isinstance(leaf, torch.Tensor)
+                else type(leaf)
+                for leaf in leaves
+            ),
+        )
+
+    def _adaptive_forward(self, *args, **kwargs):
+        signature = self._get_input_signature(args, kwargs)
+        num_streams = self.adaptive_num_streams.get(signature, None)
+        if num_streams is not None:
+            self._use_stream_config(num_streams)
+            return self._multi_stream_forward(*args, **kwargs)
+
+        # Run the next candidate which hasn't been measured enough times.
+        # The first run of each candidate warms it up and isn't counted.
+        candidates = self._get_candidate_num_streams(self._get_split_size(args, kwargs))
+        latencies = self._adaptive_latencies.setdefault(signature, {})
+        num_streams = next(
+            n for n in candidates if len(latencies.get(n, [])) <= self.adaptive_trials
+        )
+        self._use_stream_config(num_streams)
+        start = time.perf_counter()
+        output = self._multi_stream_forward(*args, **kwargs)
+        latencies.setdefault(num_streams, []).append(time.perf_counter() - start)
+        if all(len(latencies.get(n, [])) > self.adaptive_trials for n in candidates):
+            self.adaptive_num_streams[signature] = min(
+                candidates, key=lambda n: min(latencies[n][1:])
+            )
+            del self._adaptive_latencies[signature]
+            self._release_stream_configs()
+        return output
+
+    def _release_stream_configs(self):
+        # Drop the tasks of the numbers of streams which are neither selected for any
+        # signature nor being measured, so that only the used ones keep their threads.
+        used_num_streams = set(self.adaptive_num_streams.values())
+        for latencies in self._adaptive_latencies.values():
+            used_num_streams.update(latencies.keys())
+        for num_streams in list(self._stream_configs.keys()):
+            if num_streams not in used_num_streams:
+                del self._stream_configs[num_streams]
+
     def reset_forward_status(self):
         # Since the input batchsize for each forward invoking may change
         # Need to reset the status for each forward invoking
@@ -448,8 +606,8 @@ class MultiStreamModule(nn.Module):
                 )
         elif (type_arg is int) or (hint_object[idx_or_key] is None):
             if hint_object[idx_or_key] is not None:
-                output_object[idx_or_key] = torch.cat(
-                    output_object[idx_or_key], dim=hint_object[idx_or_key]
+                output_object[idx_or_key] = self._concat_stream_outputs(
+                    output_object[idx_or_key], hint_object[idx_or_key]
                 )
         else:
             AssertionError(
@@ -457,8 +615,33 @@ class MultiStreamModule(nn.Module):
             ), "Concat output failed, unsupport output hint type of:{}".format(type_arg)
         return None
 
-    def _concat_output_for_each_stream(self):
+    def _concat_stream_outputs(self, stream_outputs, dim):
+        if self._output_buffer_idx is None:
+            return torch.cat(stream_outputs, dim=dim)
+        if stream_outputs.__len__() == 1:
+            # The output of the only stream is the whole output
+            return stream_outputs[0]
+        if torch.is_grad_enabled() and any(t.requires_grad for t in stream_outputs):
+            # torch.cat with out doesn't support autograd
+            return torch.cat(stream_outputs, dim=dim)
+        shape = list(stream_outputs[0].shape)
+        shape[dim] = sum(t.size(dim) for t in stream_outputs)
+        idx = self._output_buffer_idx
+        self._output_buffer_idx += 1
+        buffer = self._output_buffers.get(idx, None)
+        if (
+            buffer is None
+            or list(buffer.shape) != shape
+            or buffer.dtype != stream_outputs[0].dtype
+        ):
+            buffer = torch.empty(shape, dtype=stream_outputs[0].dtype)
+            self._output_buffers[idx] = buffer
+        # Each stream output is copied into its view of the buffer
+        return torch.cat(stream_outputs, dim=dim, out=buffer)
+
+    def _concat_output_for_each_stream(self, reuse_output_buffers=False):
         # Concat the output, when here each position is already a List of tensors to be concat.
+        self._output_buffer_idx = 0 if reuse_output_buffers else None
         if self.output_concat_hint.args:
             self._do_concat_output_for_each_stream(
                 self.output_concat_hint.args, self.output.args, 0
@@ -482,22 +665,28 @@ class MultiStreamModule(nn.Module):
             return return_obj
 
     def forward(self, *args, **kwargs):
-        # Reset the forward status to default value which mainly contains information
-        # to split inputs. They will init afterwards for each forward call.
-        self.reset_forward_status()
+        if self.adaptive:
+            return self._adaptive_forward(*args, **kwargs)
         if self.num_streams == 1:
+            # Reset the forward status to default value which mainly contains information
+            # to split inputs.
+            self.reset_forward_status()
             # Sync execution path if num_stream is 1
             if not core.is_same_core_affinity_setting(self.core_list):
                 # If the main thread's core affinity has been changed, we should set it again.
                 core.pin_cpu_cores(self.cpu_pool.cpu_pool)
             results_raw = self.model(*args, **kwargs)
             return results_raw if self.concat_output else [results_raw]
+        return self._multi_stream_forward(*args, **kwargs)
 
+    def _multi_stream_forward(self, *args, **kwargs):
+        # Reset the forward status to default value which mainly contains information
+        # to split inputs. They will init afterwards for each forward call.
+        self.reset_forward_status()
         # Split the raw input to generate input for each stream
         self._get_input_for_each_stream(self.input_split_hint, *args, **kwargs)
 
         results_raw_future = []
-        results_raw = []
         for stream_id in range(self.used_num_streams):
             results_raw_future.append(
                 self.tasks[stream_id](
@@ -505,24 +694,80 @@ class MultiStreamModule(nn.Module):
                     **(self.kwargs_streams_input[stream_id])
                 )
             )
+        return self._gather_outputs(
+            (
+                results_raw_future[stream_id].get()
+                for stream_id in range(self.used_num_streams)
+            ),
+            self.reuse_output_buffers,
+        )
 
-        for stream_id in range(self.used_num_streams):
+    def _gather_outputs(self, stream_outputs, reuse_output_buffers=False):
+        results_raw = []
+        for stream_id, stream_output in enumerate(stream_outputs):
             # If we need to concat the output, for each position, we will push the result generated \
             # by each stream into a list for concat later.
-            # For self._generate_outputs: here we put results_raw_future[stream_id].get() into a \
-            # [results_raw_future[stream_id].get()]
+            # For self._generate_outputs: here we put the output of the stream into a [stream_output]
             # to align the multi_stream_module_concat_hint structure.
-            self._generate_outputs(
-                [results_raw_future[stream_id].get()], stream_id
-            ) if self.concat_output else results_raw.append(
-                results_raw_future[stream_id].get()
-            )
+            if self.concat_output:
+                self._generate_outputs([stream_output], stream_id)
+            else:
+                results_raw.append(stream_output)
         # If we need to concat the output, for each position, we will concat the result in the list \
         # (generate in self._generate_outputs).
         return (
-            self._concat_output_for_each_stream() if self.concat_output else results_raw
+            self._concat_output_for_each_stream(reuse_output_buffers)
+            if self.concat_output
+            else results_raw
         )
 
+    async def forward_async(self, *args, **kwargs):
+        r"""
+        The awaitable variant of ``forward``, which should be awaited in a
+        coroutine. The inputs are split and submitted to the streams as
+        ``forward`` does, while the event loop keeps running other coroutines
+        until the outputs of all the streams are ready.
+
+        Examples:
+
+            >>> async def serve(multi_stream_model, x):
+            ...     return await multi_stream_model.forward_async(x)
+        """
+        if self.adaptive:
+            # The latencies aren't measured here since the forwards overlap in the event loop.
+            # The number of streams selected by forward is used, or the most streams otherwise.
+            num_streams = self.adaptive_num_streams.get(
+                self._get_input_signature(args, kwargs), None
+            )
+            if num_streams is None:
+                num_streams = self._get_candidate_num_streams(
+                    self._get_split_size(args, kwargs)
+                )[-1]
+            self._use_stream_config(num_streams)
+        self.reset_forward_status()
+        if not self.adaptive and self.num_streams == 1:
+            if self._async_task is None:
+                self._async_task = Task(self.model, self.cpu_pool)
+            results_raw = await self._async_task.run_awaitable(*args, **kwargs)
+            return results_raw if self.concat_output else [results_raw]
+
+        # Split the raw input to generate input for each stream
+        self._get_input_for_each_stream(self.input_split_hint, *args, **kwargs)
+
+        results_raw_future = []
+        for stream_id in range(self.used_num_streams):
+            # The containers of the stream inputs are reused by the next forward
+            # before the outputs of this forward are ready, so they are copied.
+            results_raw_future.append(
+                self.tasks[stream_id].run_awaitable(
+                    *tree_map(lambda x: x, self.args_streams_input[stream_id]),
+                    **tree_map(lambda x: x, self.kwargs_streams_input[stream_id])
+                )
+            )
+        stream_outputs = await asyncio.gather(*results_raw_future)
+        # No other coroutine runs while the outputs are concatenated
+        return self._gather_outputs(stream_outputs)
+
     def get_stream_number(self):
         return self.num_streams
 
@@ -1,36 +1,309 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
 import torch
+from torch.utils._pytree import tree_flatten, tree_unflatten
 import intel_extension_for_pytorch as ipex
 from .cpupool import CPUPool
 
 
+class _TaskFuture(Future):
+    r"""
+    The future of a request which is scheduled in Python, e.g., batched by a
+    Task with dynamic batching, which has the same ``get`` method as the
+    futures returned by the Task without batching.
+    """
+
+    def get(self):
+        return self.result()
+
+
+def _shape_except_dim(t, dim):
+    if not -t.dim() <= dim < t.dim():
+        return tuple(t.shape)
+    dim = dim % t.dim()
+    return tuple(t.shape[:dim] + t.shape[dim + 1 :])
+
+
+class _Request(object):
+    def __init__(self, args, kwargs, batch_dim):
+        self.future = _TaskFuture()
+        self.leaves, self.spec = tree_flatten((args, kwargs))
+        # The grad mode of the submitting thread, which the batch runs with
+        self.grad_enabled = torch.is_grad_enabled()
+        tensors = [leaf for leaf in self.leaves if isinstance(leaf, torch.Tensor)]
+        self.batchable = len(tensors) > 0 and all(
+            -t.dim() <= batch_dim < t.dim() for t in tensors
+        )
+        self.batch_size = 0
+        if self.batchable:
+            self.batch_size = tensors[0].size(batch_dim)
+            self.batchable = all(t.size(batch_dim) == self.batch_size for t in tensors)
+        # The requests of the same key can be concatenated along the batch dim
+        self.key = (
+            str(self.spec),
+            self.grad_enabled,
+            tuple(
+                (leaf.dtype, _shape_except_dim(leaf, batch_dim))
+                if isinstance(leaf, torch.Tensor)
+                else repr(leaf)
+                if isinstance(leaf, (type(None), bool, int, float, str))
+                else id(leaf)
+                for leaf in self.leaves
+            ),
+        )
+
+
+class _DynamicBatcher(object):
+    r"""
+    Collects the concurrent requests of a Task, up to ``max_batch_size``
+    samples or until ``batch_timeout`` seconds passed since the first request
+    of the batch, concatenates their inputs along ``batch_dim``, runs a single
+    forward and splits the outputs back onto the futures of the requests.
+    """
+
+    def __init__(self, run_sync, max_batch_size, batch_timeout, batch_dim):
+        self.run_sync = run_sync
+        self.max_batch_size = max_batch_size
+        self.batch_timeout = batch_timeout
+        self.batch_dim = batch_dim
+        self.requests = queue.Queue()
+        # The request collected which doesn't fit in the previous batch
+        self.pending = None
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+
+    def submit(self, args, kwargs):
+        request = _Request(args, kwargs, self.batch_dim)
+        self.requests.put(request)
+        return request.future
+
+    def close(self):
+        self.requests.put(None)
+        self.thread.join()
+
+    def _collect(self):
+        # Returns the requests of the next batch, None if the batcher is closed
+        request = self.pending if self.pending is not None else self.requests.get()
+        self.pending = None
+        if request is None:
+            return None
+        batch = [request]
+        if not request.batchable:
+            return batch
+        batch_size = request.batch_size
+        deadline = time.monotonic() + self.batch_timeout
+        while batch_size < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                request = (
+                    self.requests.get(timeout=timeout)
+                    if timeout > 0
+                    else self.requests.get_nowait()
+                )
+            except queue.Empty:
+                break
+            if (
+                request is None
+                or request.key != batch[0].key
+                or not request.batchable
+                or batch_size + request.batch_size > self.max_batch_size
+            ):
+                self.pending = request
+                break
+            batch.append(request)
+            batch_size += request.batch_size
+        return batch
+
+    def _run(self, batch):
+        # The requests of a batch have the same grad mode as a part of the key
+        with torch.set_grad_enabled(batch[0].grad_enabled):
+            return self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        if len(batch) == 1:
+            args, kwargs = tree_unflatten(batch[0].leaves, batch[0].spec)
+            return [self.run_sync(*args, **kwargs)]
+        leaves = [
+            torch.cat([request.leaves[i] for request in batch], dim=self.batch_dim)
+            if isinstance(leaf, torch.Tensor)
+            else leaf
+            for i, leaf in enumerate(batch[0].leaves)
+        ]
+        args, kwargs = tree_unflatten(leaves, batch[0].spec)
+        output = self.run_sync(*args, **kwargs)
+        output_leaves, output_spec = tree_flatten(output)
+        batch_sizes = [request.batch_size for request in batch]
+        outputs_leaves = [[] for _ in batch]
+        for leaf in output_leaves:
+            if isinstance(leaf, torch.Tensor):
+                assert -leaf.dim() <= self.batch_dim < leaf.dim() and leaf.size(
+                    self.batch_dim
+                ) == sum(batch_sizes), (
+                    "The outputs of a Task with dynamic batching should be "
+                    "tensors of the batch size of the inputs"
+                )
+                pieces = torch.split(leaf, batch_sizes, dim=self.batch_dim)
+            else:
+                pieces = [leaf] * len(batch)
+            for request_leaves, piece in zip(outputs_leaves, pieces):
+                request_leaves.append(piece)
+        return [tree_unflatten(leaves, output_spec) for leaves in outputs_leaves]
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            try:
+                outputs = self._run(batch)
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            for request, output in zip(batch, outputs):
+                request.future.set_result(output)
+
+
+def _set_result(aio_future, result):
+    if not aio_future.cancelled():
+        aio_future.set_result(result)
+
+
+def _set_exception(aio_future, exception):
+    if not aio_future.cancelled():
+        aio_future.set_exception(exception)
+
+
+class _FutureWaiter(object):
+    r"""
+    Waits for the futures of a Task in one thread, in the order they are
+    submitted, which is the order the Task runs them, and completes the asyncio
+    futures of them in their event loops. So the event loops are not blocked,
+    and no thread is taken by each request in flight.
+    """
+
+    def __init__(self):
+        self.futures = queue.Queue()
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+
+    def add(self, future, loop):
+        aio_future = loop.create_future()
+        self.futures.put((future, loop, aio_future))
+        return aio_future
+
+    def close(self):
+        self.futures.put(None)
+        self.thread.join()
+
+    def _loop(self):
+        while True:
+            item = self.futures.get()
+            if item is None:
+                return
+            future, loop, aio_future = item
+            try:
+                result = future.get()
+            except Exception as e:
+                loop.call_soon_threadsafe(_set_exception, aio_future, e)
+            else:
+                loop.call_soon_threadsafe(_set_result, aio_future, result)
+
+
 class Task(object):
     r"""
     An abstraction of computation based on PyTorch module and is scheduled
     asynchronously.
 
+    With ``max_batch_size`` set, the Task batches the concurrent requests
+    dynamically: the requests submitted by ``__call__`` are collected until
+    their total batch size reaches ``max_batch_size`` or ``batch_timeout``
+    seconds passed since the first of them, and their tensor inputs are
+    concatenated along ``batch_dim`` to run a single forward on the cores of
+    ``cpu_pool``. The outputs are split back along ``batch_dim`` onto the
+    futures of the requests. Only the requests with the same non-tensor inputs
+    and the same shapes other than the batch dim are batched together.
+
     Args:
         model (torch.jit.ScriptModule or torch.nn.Module): The input module.
         cpu_pool (intel_extension_for_pytorch.cpu.runtime.CPUPool): An
             intel_extension_for_pytorch.cpu.runtime.CPUPool object, contains
             all CPU cores used to run Task asynchronously.
+        max_batch_size (int): The maximum batch size of the batched requests.
+            The default value is ``None``, which disables the dynamic batching.
+        batch_timeout (float): The maximum time in seconds that a request
+            waits for the other requests to batch with. The default value is
+            ``0.001``.
+        batch_dim (int): The batch dim of the inputs and the outputs. The
+            default value is ``0``.
 
     Returns:
         intel_extension_for_pytorch.cpu.runtime.Task: Generated
         intel_extension_for_pytorch.cpu.runtime.Task object.
     """
 
-    def __init__(self, module, cpu_pool: CPUPool):
+    def __init__(
+        self,
+        module,
+        cpu_pool: CPUPool,
+        max_batch_size=None,
+        batch_timeout=0.001,
+        batch_dim=0,
+    ):
         self.cpu_pool = cpu_pool
         assert type(self.cpu_pool) is CPUPool
         if isinstance(module, torch.jit.ScriptModule):
             self._task = ipex._C.TaskModule(module._c, self.cpu_pool.cpu_pool, True)
         else:
             self._task = ipex._C.TaskModule(module, self.cpu_pool.cpu_pool)
+        self._batcher = None
+        self._waiter = None
+        if max_batch_size is not None:
+            assert max_batch_size > 0, "max_batch_size should be a positive integer"
+            self._batcher = _DynamicBatcher(
+                self._task.run_sync, max_batch_size, batch_timeout, batch_dim
+            )
 
     def __call__(self, *args, **kwargs):
         # async execution
+        if self._batcher is not None:
+            return self._batcher.submit(args, kwargs)
         return self._task.run_async(*args, **kwargs)
 
     def run_sync(self, *args, **kwargs):
         # sync execution
         return self._task.run_sync(*args, **kwargs)
+
+    def run_awaitable(self, *args, **kwargs):
+        r"""
+        Submits the inputs as ``__call__`` does, and returns an asyncio future
+        of the output instead, which is completed in the running event loop
+        without blocking it. It should be called in a coroutine.
+
+        Examples:
+
+            >>> async def serve(task, x):
+            ...     return await task.run_awaitable(x)
+        """
+        loop = asyncio.get_running_loop()
+        if self._batcher is not None:
+            return asyncio.wrap_future(self._batcher.submit(args, kwargs), loop=loop)
+        if self._waiter is None:
+            self._waiter = _FutureWaiter()
+        return self._waiter.add(self._task.run_async(*args, **kwargs), loop)
+
+    def close(self):
+        r"""
+        Stops the dynamic batching and the thread completing the asyncio
+        futures after the submitted requests are done.
+        """
+        if self._batcher is not None:
+            self._batcher.close()
+            self._batcher = None
+        if self._waiter is not None:
+            self._waiter.close()
+            self._waiter = None
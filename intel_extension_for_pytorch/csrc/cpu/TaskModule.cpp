@@ -96,16 +96,19 @@ std::unique_ptr<FutureTensor> TaskModule::run_async(
     }
   } else {
     CHECK(this->module_initialized_);
-    this->args = args;
-    this->kwargs = kwargs;
-
     typedef std::function<py::object()> SubmitFunctionType;
     typedef decltype(SubmitFunctionType()()) return_type;
+    // The inputs are held by each task, so that several tasks can be in flight
     auto task = std::make_shared<std::packaged_task<return_type()>>(
-        [&, this]() -> py::object {
+        [this,
+         task_args = std::move(args),
+         task_kwargs = std::move(kwargs)]() mutable -> py::object {
           {
             pybind11::gil_scoped_acquire gil_guard;
-            return this->module_(*(this->args), **(this->kwargs));
+            // The inputs are released with the GIL held
+            py::args run_args = std::move(task_args);
+            py::kwargs run_kwargs = std::move(task_kwargs);
+            return this->module_(*run_args, **run_kwargs);
           }
         });
 
@@ -57,8 +57,6 @@ class TaskModule {
 
   // TaskExecutor
   std::shared_ptr<TaskExecutor> task_executor;
-  py::args args;
-  py::kwargs kwargs;
 };
 
 } // namespace runtime
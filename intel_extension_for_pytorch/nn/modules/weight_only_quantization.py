@@ -1,15 +1,47 @@
+from collections import namedtuple
 import torch
 from torch import nn
 from torch.ao.nn.quantized.modules.utils import _clamp_weights
 from ...quantization._qconfig import get_weight_only_quant_qconfig_mapping
+from ...quantization._weight_only_quant import GroupWiseMinMaxObserver
 from intel_extension_for_pytorch.nn.utils._weight_prepack import (
     may_import_deepspeed_modules,
     _all_reduce_and_bias_add,
     _pre_ipex_gemm,
 )
 
+# Group-wise quantized weight in plain format, i.e., uint8 [N, K/2] holding two
+# int4 values per byte (the lower 4 bits first) or int8 [N, K], with scales and
+# zero points of shape [N, K / group_size]
+_GroupWiseQuantizedWeight = namedtuple(
+    "_GroupWiseQuantizedWeight", ["qweight", "scales", "zero_points", "group_size"]
+)
+
+
+def _quantize_weight_group_wise(float_wt, observer):
+    wt_scale, wt_zp = observer.calculate_qparams()
+    group_size = observer.group_size
+    scales = wt_scale.float().repeat_interleave(group_size, 1)
+    zero_points = wt_zp.float().repeat_interleave(group_size, 1)
+    qweight = torch.clamp(
+        torch.round(float_wt / scales + zero_points),
+        observer.quant_min,
+        observer.quant_max,
+    )
+    if observer.dtype == torch.quint4x2:
+        qweight = qweight.to(torch.uint8)
+        qweight = qweight[:, ::2] | (qweight[:, 1::2] << 4)
+    else:
+        qweight = qweight.to(torch.int8)
+    return _GroupWiseQuantizedWeight(
+        qweight.contiguous(), wt_scale.float(), wt_zp.float(), group_size
+    )
+
+
 # Port from PyTorch with a few changes
 def _quantize_weight(float_wt, observer):
+    if isinstance(observer, GroupWiseMinMaxObserver):
+        return _quantize_weight_group_wise(float_wt, observer)
     wt_scale, wt_zp = observer.calculate_qparams()
     dtype = observer.dtype
     if observer.qscheme in [torch.per_tensor_symmetric, torch.per_tensor_affine]:
@@ -32,6 +64,23 @@ def _quantize_weight(float_wt, observer):
         raise ValueError("Unexpected qscheme " + observer.qscheme)
     return qweight
 
+
+def _prepack_weight(qweight, bias, lowp_mode, num_concats):
+    if isinstance(qweight, _GroupWiseQuantizedWeight):
+        return torch.ops.ipex_prepack.weight_only_qlinear_prepack_group_wise(
+            qweight.qweight,
+            qweight.scales,
+            qweight.zero_points,
+            bias,
+            None,
+            int(lowp_mode),
+            num_concats,
+        )
+    return torch.ops.ipex_prepack.weight_only_qlinear_prepack(
+        qweight, bias, None, int(lowp_mode), num_concats
+    )
+
+
 class IpexWoqLinear(nn.Module):
     r"""
     A weight-only quantized (WOQ) linear module with floating point tensor as inputs and outputs.
@@ -49,6 +98,7 @@ class IpexWoqLinear(nn.Module):
         self._op_context = None
         self._lowp_mode = 0
         self._num_concats = 1
+        self._group_size = -1
 
     def pre_ipex_gemm(self, input):
         return input
@@ -75,6 +125,8 @@ class IpexWoqLinear(nn.Module):
         extra_repr_str += ", bias={}".format(self.bias)
         extra_repr_str += ", lowp_mode={}".format(self._lowp_mode)
         extra_repr_str += ", num_concats={}".format(self._num_concats)
+        if self._group_size > 0:
+            extra_repr_str += ", group_size={}".format(self._group_size)
         return extra_repr_str
 
     @classmethod
@@ -121,6 +173,8 @@ class IpexWoqLinear(nn.Module):
             mod.out_features = mod.weight.size()[0]
 
         qlinear = cls._init_cls(mod, dtype, qweight, lowp_mode, num_concats)
+        if isinstance(qweight, _GroupWiseQuantizedWeight):
+            qlinear._group_size = qweight.group_size
         del qweight
         return qlinear
 
@@ -133,8 +187,11 @@ class IpexWoqLinear(nn.Module):
                           utilities or provided by the user
             qweight (Tensor): tensor in int32 dtype and contains actually int4 data
             bias (Tensor or None): bias for linear
-            scales (Tensor): scales for qweight
-            zero_points (Tensor): zero points for qweight
+            scales (Tensor): scales for qweight, of shape [N] (or [N, 1]) for
+                per-channel quantization or [N, K / group_size] for group-wise
+                quantization
+            zero_points (Tensor): zero points for qweight, of the same shape as
+                scales or compressed as int32 along N or along the groups
         """
         float_modules = [torch.nn.Linear]
         deepspeed_modules = may_import_deepspeed_modules()
@@ -172,15 +229,19 @@ class IpexWoqLinear(nn.Module):
         )
         qlinear._lowp_mode = lowp_mode
         qlinear._num_concats = num_concats
+        if (
+            scales.dim() == 2
+            and scales.size(0) == mod.out_features
+            and scales.size(1) > 1
+        ):
+            qlinear._group_size = mod.in_features // scales.size(1)
         del qweight
         return qlinear
 
     @classmethod
     def _init_cls(cls, mod, dtype, qweight, lowp_mode, num_concats):
         qlinear = cls(mod.in_features, mod.out_features, mod.bias is not None, dtype=dtype)
-        qlinear._op_context = torch.ops.ipex_prepack.weight_only_qlinear_prepack(
-            qweight, mod.bias, None, int(lowp_mode), num_concats
-        )
+        qlinear._op_context = _prepack_weight(qweight, mod.bias, lowp_mode, num_concats)
         qlinear._lowp_mode = lowp_mode
         qlinear._num_concats = num_concats
         return qlinear
@@ -215,10 +276,9 @@ class IpexWoqLinearAllreduce(IpexWoqLinear):
     def _init_cls(cls, mod, dtype, qweight, lowp_mode, num_concats):
         qlinear = cls._init_from_mod(mod, dtype)
 
-        qlinear._op_context = torch.ops.ipex_prepack.weight_only_qlinear_prepack(
+        qlinear._op_context = _prepack_weight(
             qweight,
             None,  # Set bias to None when prepacking. Please refer to the comment in __init__ of _IPEXLinearAllreduce
-            None,  # batch_size
             lowp_mode,
             num_concats
         )
@@ -8,4 +8,5 @@ from ._qconfig import (
     get_weight_only_quant_qconfig_mapping,
     WoqLowpMode,
 )
-from ._autotune import autotune
+from ._autotune import autotune, autotune_mixed_precision
+from ._layerwise_calibration import layerwise_calibrate
@@ -1,8 +1,17 @@
 # This Python file uses the following encoding: utf-8
 
+import copy
+import json
+import multiprocessing
+import os
 import sys
 import subprocess
+import tempfile
 import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import torch
 
 
 def autotune(
@@ -86,3 +95,346 @@ def autotune(
         qconf_summary=dirname_str + "/best_configure.json"
     )
     return prepared_model
+
+
+_QUANTIZED_DTYPES = (str(torch.qint8), str(torch.quint8))
+_FALLBACK_PRECISIONS = ("bf16", "fp32")
+
+
+def _quantized_ops(qconf):
+    # (quant state key, op index) of the ops quantized by the recipe
+    ops = []
+    for k, layer_info in qconf.items():
+        for i, op_info in layer_info["q_op_infos"].items():
+            if any(
+                tensor_info.get("inf_dtype", None) in _QUANTIZED_DTYPES
+                for tensor_info in op_info["input_tensor_infos"]
+            ):
+                ops.append((k, i))
+    return ops
+
+
+def _fallback_qconf(qconf, fallback_ops):
+    # the inputs and weights of the fallback ops keep their original dtype
+    qconf = copy.deepcopy(qconf)
+    for k, i in fallback_ops:
+        op_info = qconf[k]["q_op_infos"][i]
+        for tensor_info in op_info["input_tensor_infos"]:
+            if len(tensor_info) > 0:
+                tensor_info["inf_dtype"] = tensor_info["orig_dtype"]
+                tensor_info["force_dtype"] = tensor_info["orig_dtype"]
+        for tensor_info in op_info["weight_tensor_infos"]:
+            if len(tensor_info) > 0:
+                tensor_info["inf_dtype"] = tensor_info["orig_dtype"]
+    return qconf
+
+
+def _meets_criterion(accuracy, baseline, accuracy_criterion):
+    if accuracy is None:
+        return False
+    criterion, tolerable_loss = list(accuracy_criterion.items())[0]
+    if criterion == "relative":
+        return accuracy >= baseline - abs(baseline) * tolerable_loss
+    return accuracy >= baseline - tolerable_loss
+
+
+def _run_trial(context, qconf_summary, precision):
+    r"""
+    Converts the prepared model with the recipe `qconf_summary`, the ops which
+    are not quantized run in `precision`, and returns the accuracy and the median
+    latency of the example inputs of the converted model.
+    """
+    from ._quantize import convert
+
+    prepared_model, eval_func, example_inputs, latency_iters = context
+    try:
+        prepared_model.load_qconf_summary(qconf_summary=qconf_summary)
+        with torch.no_grad(), torch.cpu.amp.autocast(
+            enabled=precision == "bf16", dtype=torch.bfloat16
+        ):
+            converted_model = convert(prepared_model)
+            traced_model = torch.jit.trace(converted_model, example_inputs)
+            traced_model = torch.jit.freeze(traced_model)
+            # the graph is optimized by the first runs
+            for _ in range(2):
+                traced_model(*example_inputs)
+            latencies = []
+            for _ in range(latency_iters):
+                start = time.perf_counter()
+                traced_model(*example_inputs)
+                latencies.append(time.perf_counter() - start)
+            latency = sorted(latencies)[len(latencies) // 2]
+            accuracy = eval_func(traced_model)
+    except Exception as e:
+        warnings.warn(f"fail to evaluate the recipe {qconf_summary} due to: {e}")
+        return None, None
+    return accuracy, latency
+
+
+_worker_context = None
+
+
+def _init_worker(core_pools, context):
+    # each worker runs on its own pool of cores
+    global _worker_context
+    cores = core_pools.get()
+    os.sched_setaffinity(0, cores)
+    torch.set_num_threads(len(cores))
+    _worker_context = context
+
+
+def _run_worker_trial(trial):
+    return _run_trial(_worker_context, *trial)
+
+
+class _TrialRunner(object):
+    r"""
+    Runs the trials in the current process, or in `num_workers` forked worker
+    processes pinned to disjoint pools of the cores available to the process.
+    """
+
+    def __init__(self, context, num_workers):
+        self.context = context
+        self.num_workers = num_workers
+        self.executor = None
+        if num_workers > 1:
+            cores = sorted(os.sched_getaffinity(0))
+            assert len(cores) >= num_workers, (
+                f"autotune_mixed_precision: {num_workers} workers cannot be pinned "
+                f"to {len(cores)} cores"
+            )
+            # the workers are forked so that the model and the evaluation
+            # function are not pickled
+            mp_context = multiprocessing.get_context("fork")
+            core_pools = mp_context.Queue()
+            cores_per_worker = len(cores) // num_workers
+            for i in range(num_workers):
+                core_pools.put(cores[i * cores_per_worker : (i + 1) * cores_per_worker])
+            self.executor = ProcessPoolExecutor(
+                max_workers=num_workers,
+                mp_context=mp_context,
+                initializer=_init_worker,
+                initargs=(core_pools, context),
+            )
+
+    def run(self, trials):
+        if self.executor is None:
+            return [_run_trial(self.context, *trial) for trial in trials]
+        return list(self.executor.map(_run_worker_trial, trials))
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+
+def autotune_mixed_precision(
+    prepared_model,
+    calib_dataloader,
+    eval_func,
+    example_inputs,
+    accuracy_criterion=None,
+    precisions=None,
+    tuning_time=0,
+    num_workers=1,
+    latency_iters=20,
+):
+    r"""
+    Tunes the ops of a static quantization recipe which fall back from INT8 to
+    BF16 or FP32, searching for the fastest recipe whose accuracy loss is within
+    the budget.
+
+    The default recipe quantizes all the quantizable ops in INT8. Each candidate
+    recipe is a set of ops which are not quantized, and the precision (BF16 or
+    FP32) of the ops which are not quantized. Each candidate is converted,
+    traced and frozen, its accuracy is measured by ``eval_func`` and its latency
+    by running ``example_inputs``. The tuning evaluates the recipe with all the
+    ops quantized first, then the recipes with one op not quantized to find the
+    sensitivity of each op, and then the recipes with the most sensitive ops not
+    quantized, adding one op at a time. The candidates are evaluated in parallel
+    by ``num_workers`` worker processes, each pinned to its own pool of cores.
+    Among the candidates within the accuracy budget, the one of the lowest
+    latency is chosen.
+
+    Args:
+        prepared_model (torch.nn.Module): the FP32 prepared model returned from ipex.quantization.prepare.
+        calib_dataloader (iterable): the calibration inputs, each of them is a tuple of the positional inputs,
+            a dict of the keyword inputs or a tensor. ``None`` if ``prepared_model`` is already calibrated.
+        eval_func (function): set a evaluation function. This function takes the converted model as input
+            parameter, and returns an accuracy value which is a scalar number. The higher the better.
+        example_inputs (tuple or torch.Tensor): the inputs to trace the converted model and to measure
+            its latency.
+        accuracy_criterion ({accuracy_criterion_type(str, 'relative' or 'absolute') : accuracy_criterion_value(float)}):
+            set the maximum allowed accuracy loss from the FP32 model, either relative or absolute.
+            The default value is ``{'relative': 0.01}``.
+        precisions (list): the precisions to be tuned, ``int8`` and at least one of ``bf16`` and ``fp32``.
+            The ops which are not quantized run in BF16 by autocast if ``bf16`` is chosen. The default value
+            is ``['int8', 'bf16', 'fp32']``.
+        tuning_time (seconds): tuning timeout. The default value is ``0`` which means early stop, i.e., the
+            tuning stops at the first round of candidates within the accuracy budget.
+        num_workers (int): the number of worker processes evaluating the candidates in parallel.
+            The default value is ``1``, which evaluates the candidates in the current process.
+        latency_iters (int): the number of runs of ``example_inputs`` to measure the median latency.
+            The default value is ``20``.
+
+    Returns:
+        The prepared model (torch.nn.Module) with the tuned recipe loaded, and the list of the evaluated
+        candidates, each of them is a dict of ``fallback_ops`` (the ops which are not quantized),
+        ``fallback_precision``, ``accuracy``, ``latency`` (seconds) and ``meets_criterion``, sorted by
+        rank. The first candidate is the tuned recipe, whose model should run under
+        ``torch.cpu.amp.autocast()`` if its ``fallback_precision`` is ``bf16``. If no candidate meets
+        the criterion, the recipe with none of the ops quantized, i.e., the FP32 model, is loaded.
+    """
+    if accuracy_criterion is None:
+        accuracy_criterion = {"relative": 0.01}
+    if precisions is None:
+        precisions = ["int8", "bf16", "fp32"]
+    assert len(accuracy_criterion) == 1 and list(accuracy_criterion.keys())[0] in [
+        "relative",
+        "absolute",
+    ], "accuracy_criterion should be {'relative': loss} or {'absolute': loss}"
+    fallback_precisions = [p for p in _FALLBACK_PRECISIONS if p in precisions]
+    assert "int8" in precisions and len(fallback_precisions) > 0, (
+        "autotune_mixed_precision: precisions should contain int8 and at least one "
+        "of bf16 and fp32"
+    )
+    if isinstance(example_inputs, torch.Tensor):
+        example_inputs = (example_inputs,)
+    example_inputs = tuple(example_inputs)
+
+    if calib_dataloader is not None:
+        with torch.no_grad():
+            for inputs in calib_dataloader:
+                if isinstance(inputs, dict):
+                    prepared_model(**inputs)
+                elif isinstance(inputs, (tuple, list)):
+                    prepared_model(*inputs)
+                else:
+                    prepared_model(inputs)
+    start_time = time.time()
+    early_stop = tuning_time == 0
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        default_qconf_summary = os.path.join(tmp_dir, "default.json")
+        prepared_model.save_qconf_summary(qconf_summary=default_qconf_summary)
+        with open(default_qconf_summary, "r") as f:
+            default_qconf = json.load(f)
+        ops = _quantized_ops(default_qconf)
+        # {(fallback ops, fallback precision): (qconf_summary, accuracy, latency)}
+        results = {}
+        runner = _TrialRunner(
+            (prepared_model, eval_func, example_inputs, latency_iters), num_workers
+        )
+
+        def _evaluate(candidates):
+            candidates = [c for c in candidates if c not in results]
+            trials = []
+            for fallback_ops, precision in candidates:
+                qconf_summary = os.path.join(
+                    tmp_dir, "candidate_{}.json".format(len(results))
+                )
+                with open(qconf_summary, "w") as f:
+                    json.dump(_fallback_qconf(default_qconf, fallback_ops), f, indent=4)
+                results[(fallback_ops, precision)] = (qconf_summary, None, None)
+                trials.append((qconf_summary, precision))
+            for c, (accuracy, latency) in zip(candidates, runner.run(trials)):
+                results[c] = (results[c][0], accuracy, latency)
+
+        def _passed(candidates):
+            return any(
+                _meets_criterion(results[c][1], baseline, accuracy_criterion)
+                for c in candidates
+            )
+
+        def _op_accuracy(op, precision):
+            # the ops which are not evaluated are the least sensitive
+            accuracy = results.get((frozenset([op]), precision), (None, None, None))[1]
+            return -float("inf") if accuracy is None else accuracy
+
+        def _time_is_up():
+            return tuning_time > 0 and time.time() - start_time > tuning_time
+
+        try:
+            # the FP32 model is the baseline of the accuracy
+            fp32_candidate = (frozenset(ops), "fp32")
+            int8_candidates = [(frozenset(), p) for p in fallback_precisions]
+            _evaluate([fp32_candidate] + int8_candidates)
+            baseline = results[fp32_candidate][1]
+            assert (
+                baseline is not None
+            ), "autotune_mixed_precision: fail to evaluate the FP32 model"
+            stop = early_stop and _passed(int8_candidates)
+
+            # the sensitivity of the ops: the accuracy with each op not quantized
+            op_candidates = [
+                (frozenset([op]), p) for p in fallback_precisions for op in ops
+            ]
+            for i in range(0, len(op_candidates), num_workers):
+                if stop or _time_is_up():
+                    break
+                _evaluate(op_candidates[i : i + num_workers])
+                stop = early_stop and _passed(op_candidates[i : i + num_workers])
+
+            # the most sensitive ops are not quantized, one more op at a time
+            for p in fallback_precisions:
+                sorted_ops = sorted(
+                    ops, key=lambda op: _op_accuracy(op, p), reverse=True
+                )
+                prefix_candidates = [
+                    (frozenset(sorted_ops[:n]), p) for n in range(2, len(ops) + 1)
+                ]
+                for i in range(0, len(prefix_candidates), num_workers):
+                    if stop or _time_is_up():
+                        break
+                    _evaluate(prefix_candidates[i : i + num_workers])
+                    stop = early_stop and _passed(
+                        prefix_candidates[i : i + num_workers]
+                    )
+        finally:
+            runner.shutdown()
+
+        op_names = {
+            (k, i): "{} ({})".format(
+                default_qconf[k]["q_op_infos"][i]["fqn"],
+                default_qconf[k]["q_op_infos"][i]["op_type"],
+            )
+            for k, i in ops
+        }
+        # the FP32 model is the baseline only, not a candidate of the recipe
+        report = []
+        for candidate, (qconf_summary, accuracy, latency) in results.items():
+            if candidate == fp32_candidate:
+                continue
+            fallback_ops, precision = candidate
+            report.append(
+                {
+                    "fallback_ops": [op_names[op] for op in ops if op in fallback_ops],
+                    "fallback_precision": precision,
+                    "accuracy": accuracy,
+                    "latency": latency,
+                    "meets_criterion": _meets_criterion(
+                        accuracy, baseline, accuracy_criterion
+                    ),
+                    "qconf_summary": qconf_summary,
+                }
+            )
+        # the fastest candidates within the budget, then the most accurate ones
+        report.sort(
+            key=lambda r: (0, r["latency"], -r["accuracy"])
+            if r["meets_criterion"]
+            else (
+                1,
+                -r["accuracy"] if r["accuracy"] is not None else float("inf"),
+                0,
+            )
+        )
+        if len(report) > 0 and report[0]["meets_criterion"]:
+            prepared_model.load_qconf_summary(qconf_summary=report[0]["qconf_summary"])
+        else:
+            warnings.warn(
+                "autotune_mixed_precision: no recipe meets the accuracy criterion, "
+                "the FP32 model is chosen"
+            )
+            prepared_model.load_qconf_summary(qconf_summary=results[fp32_candidate][0])
+        for r in report:
+            del r["qconf_summary"]
+    return prepared_model, report
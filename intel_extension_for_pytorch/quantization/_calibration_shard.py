@@ -0,0 +1,158 @@
+import torch
+from torch.ao.quantization import (
+    HistogramObserver,
+    MovingAverageMinMaxObserver,
+    MovingAveragePerChannelMinMaxObserver,
+)
+
+from ._smooth_quant import SmoothQuantWeightObserver
+
+# bumped whenever the content of the calibration shard changes
+_SHARD_FORMAT_VERSION = 1
+
+
+def _observers_of_model(model):
+    # {fqn of the quant state: {"activation": {id: observer}, "weight": {id: observer}}}
+    observers = {}
+    for k, v in model._fqn_to_auto_quant_state_map.items():
+        observers[k] = {
+            "activation": dict(v.tensor_id_to_observer.items()),
+            "weight": dict(v.weight_tensor_id_to_observer.items()),
+        }
+    return observers
+
+
+def save_observer_state(model, shard):
+    r"""
+    Saves the statistics of the observers of a prepared model, i.e., their
+    state_dict, into the file `shard`.
+    """
+    state = {}
+    for k, observers in _observers_of_model(model).items():
+        state[k] = {
+            kind: {
+                key: (type(obs).__name__, obs.state_dict())
+                for key, obs in kind_observers.items()
+            }
+            for kind, kind_observers in observers.items()
+        }
+    torch.save({"version": _SHARD_FORMAT_VERSION, "observers": state}, shard)
+
+
+def _has_run(min_val, max_val):
+    if min_val.numel() == 0 or max_val.numel() == 0:
+        return False
+    return not (
+        min_val.dim() == 0 and min_val == float("inf") and max_val == float("-inf")
+    )
+
+
+def _rebin_histogram(histogram, min_val, max_val, new_min, new_max, bins):
+    # The counts are assumed uniform inside a bin, so the cumulative counts at
+    # the new bin edges are linearly interpolated between the old edges
+    new_histogram = torch.zeros(bins, dtype=histogram.dtype)
+    if max_val <= min_val or new_max <= new_min:
+        pos = 0 if new_max <= new_min else (min_val - new_min) / (new_max - new_min)
+        new_histogram[min(int(pos * bins), bins - 1)] = histogram.sum()
+        return new_histogram
+    num_bins = histogram.numel()
+    cdf = torch.cat([histogram.new_zeros(1), torch.cumsum(histogram, 0)])
+    new_edges = torch.linspace(float(new_min), float(new_max), bins + 1)
+    pos = ((new_edges - min_val) / (max_val - min_val) * num_bins).clamp(0, num_bins)
+    lower = pos.floor().long().clamp(max=num_bins - 1)
+    new_cdf = cdf[lower] + (pos - lower) * histogram[lower]
+    return new_cdf[1:] - new_cdf[:-1]
+
+
+def _merge_min_max(obs, states):
+    # `states` are the state_dicts of `obs` in the shards where it has run
+    if isinstance(
+        obs, (MovingAverageMinMaxObserver, MovingAveragePerChannelMinMaxObserver)
+    ):
+        min_val = torch.stack([s["min_val"] for s in states]).mean(0)
+        max_val = torch.stack([s["max_val"] for s in states]).mean(0)
+    else:
+        min_val = torch.stack([s["min_val"] for s in states]).min(0)[0]
+        max_val = torch.stack([s["max_val"] for s in states]).max(0)[0]
+    if isinstance(obs, HistogramObserver):
+        histogram = sum(
+            _rebin_histogram(
+                s["histogram"], s["min_val"], s["max_val"], min_val, max_val, obs.bins
+            )
+            for s in states
+        )
+        obs.histogram.resize_(histogram.shape)
+        obs.histogram.copy_(histogram)
+    obs.min_val.resize_(min_val.shape)
+    obs.max_val.resize_(max_val.shape)
+    obs.min_val.copy_(min_val)
+    obs.max_val.copy_(max_val)
+
+
+def _merge_observer(obs, state_dicts):
+    # the observers of SmoothQuant hold the per-tensor and per-channel observers
+    # as submodules, each of them is merged by its own type
+    for name, sub_obs in obs.named_modules():
+        if not isinstance(getattr(sub_obs, "min_val", None), torch.Tensor):
+            continue
+        prefix = name + "." if name else ""
+        states = []
+        for state_dict in state_dicts:
+            state = {
+                key[len(prefix) :]: val
+                for key, val in state_dict.items()
+                if key.startswith(prefix) and "." not in key[len(prefix) :]
+            }
+            if "min_val" in state and _has_run(state["min_val"], state["max_val"]):
+                states.append(state)
+        if len(states) > 0:
+            _merge_min_max(sub_obs, states)
+
+
+def merge_observer_state(model, shards):
+    r"""
+    Replaces the statistics of the observers of a prepared model by the merge of
+    the statistics saved in the files `shards` by ``save_observer_state``. The
+    min/max are reduced over the shards (averaged for the moving average
+    observers) and the histograms are re-binned into the merged range and summed.
+    """
+    assert len(shards) > 0, "At least one calibration shard should be given to merge"
+    model_observers = _observers_of_model(model)
+    shard_states = []
+    for shard in shards:
+        state = torch.load(shard, map_location="cpu")
+        assert (
+            state.get("version", None) == _SHARD_FORMAT_VERSION
+        ), f"The calibration shard {shard} is saved by an incompatible version"
+        shard_states.append(state["observers"])
+    for k, observers in model_observers.items():
+        for kind, kind_observers in observers.items():
+            for key, obs in kind_observers.items():
+                state_dicts = []
+                for shard, state in zip(shards, shard_states):
+                    assert k in state and key in state[k][kind], (
+                        f"The calibration shard {shard} doesn't match the model, "
+                        "the shards should be saved from the same model prepared "
+                        "with the same example inputs"
+                    )
+                    obs_type, state_dict = state[k][kind][key]
+                    assert obs_type == type(obs).__name__, (
+                        f"The calibration shard {shard} is observed by {obs_type} "
+                        f"while the model uses {type(obs).__name__}"
+                    )
+                    state_dicts.append(state_dict)
+                _merge_observer(obs, state_dicts)
+                if (
+                    kind == "weight"
+                    and isinstance(obs, SmoothQuantWeightObserver)
+                    and obs.smooth_quant_enabled
+                    and not hasattr(obs, "w_orig")
+                ):
+                    # the weight is only kept when the observer runs, it is
+                    # taken from the module if this process didn't calibrate
+                    qstate = model._fqn_to_auto_quant_state_map[k]
+                    op_info = qstate.idx_to_seen_q_op_infos[int(key.split("_")[0])]
+                    assert (
+                        op_info.type_is_module
+                    ), "SmoothQuant is only enabled for the weight of the modules"
+                    obs.w_orig = model.get_submodule(op_info.fqn).weight.detach()
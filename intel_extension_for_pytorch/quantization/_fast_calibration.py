@@ -0,0 +1,247 @@
+import warnings
+
+import torch
+from torch.ao.quantization import MinMaxObserver, PerChannelMinMaxObserver
+from torch.utils._pytree import tree_flatten, tree_unflatten
+
+from ._smooth_quant import SmoothQuantActivationObserver
+
+# non-tensor inputs and outputs which are kept as constants of the traced graph
+_CONSTANT_TYPES = (type(None), bool, int, float, str, torch.dtype, torch.device)
+
+
+def _observer_to_run(observer):
+    # SmoothQuant observers pass the activation to one of their observers
+    if isinstance(observer, SmoothQuantActivationObserver):
+        return observer.ic_obs if observer.smooth_quant_enabled else observer.act_obs
+    return observer
+
+
+def _min_max_summary(observer, x):
+    r"""
+    For the min/max observers, returns a small tensor having the same min/max as
+    `x` (per channel for the per-channel observers), which is observed instead of
+    `x`. Returns None for the other observers, which observe `x` itself.
+    """
+    x = x.detach()
+    if x.numel() == 0:
+        return None
+    if type(observer) is MinMaxObserver:
+        return torch.stack(torch.aminmax(x))
+    if (
+        type(observer) is PerChannelMinMaxObserver
+        and observer.ch_axis in (-1, 0, 1)
+        and x.dim() >= 2
+    ):
+        y = torch.flatten(x.transpose(0, observer.ch_axis), 1)
+        min_val, max_val = torch.aminmax(y, dim=1)
+        return torch.stack([min_val, max_val], 1 if observer.ch_axis == 0 else 0)
+    return None
+
+
+class _RecordingObserver(torch.nn.Module):
+    # takes the place of an observer while the calibration graph is traced
+    def __init__(self, observer, records):
+        super().__init__()
+        # the dtype is checked by the quant state when the tensor is observed
+        self.dtype = observer.dtype
+        # not registered as a submodule, which would be compiled by the tracing
+        object.__setattr__(self, "observer", _observer_to_run(observer))
+        self.records = records
+
+    def forward(self, x):
+        # the tensor proxy is dropped so that the recorded tensor doesn't run the
+        # hooks of the prepared model when it is reduced
+        with torch._C.DisableTorchFunction():
+            self.records.append((self.observer, x.as_subclass(torch.Tensor)))
+        return x
+
+
+class _TracedCalibration(torch.nn.Module):
+    def __init__(self, model, fn):
+        super().__init__()
+        self.model = model
+        self.fn = fn
+
+    def forward(self, *tensors):
+        return self.fn(*tensors)
+
+
+class _CalibrationGraph(object):
+    def __init__(self, graph, observers, output_spec, output_leaves):
+        self.graph = graph
+        # the observers of the activations returned by the graph, in order
+        self.observers = observers
+        self.output_spec = output_spec
+        # the tensors are returned by the graph, the others are constants
+        self.output_leaves = output_leaves
+        self.output_tensor_pos = [
+            i for i, leaf in enumerate(output_leaves) if isinstance(leaf, torch.Tensor)
+        ]
+
+
+class FastCalibration(object):
+    r"""
+    Calibration of a prepared model without the tensor proxies and the Python
+    hooks on every op.
+
+    The first calibration call with an input signature (the shapes and dtypes of
+    the tensors and the values of the other inputs) runs the usual calibration
+    under ``torch.jit.trace``, with the observers of the activations replaced by
+    recorders, so that the graph returns the observed activations, or only their
+    min/max for the min/max observers, besides the outputs of the model. The next
+    calls with the signature run the traced graph and feed its results into the
+    observers, which gives the same statistics as the usual calibration. The
+    weights are observed once, since they don't change during the calibration.
+
+    A signature which cannot be traced, e.g., with other non-tensor inputs or
+    outputs than None, numbers and strings, is calibrated as usual.
+    """
+
+    def __init__(self):
+        self.graphs = {}
+        # set while the prepared model runs the usual calibration
+        self.bypass = False
+
+    def __deepcopy__(self, memo):
+        # the graphs are bound to the observers of the model
+        return FastCalibration()
+
+    def clear(self):
+        self.graphs.clear()
+
+    def _run_eager(self, model, args, kwargs):
+        self.bypass = True
+        try:
+            return model(*args, **kwargs)
+        finally:
+            self.bypass = False
+
+    def __call__(self, model, args, kwargs):
+        leaves, spec = tree_flatten((args, kwargs))
+        key = (
+            str(spec),
+            tuple(
+                (tuple(leaf.shape), leaf.dtype)
+                if isinstance(leaf, torch.Tensor)
+                else repr(leaf)
+                if isinstance(leaf, _CONSTANT_TYPES)
+                else type(leaf)
+                for leaf in leaves
+            ),
+            torch.is_grad_enabled(),
+            torch.is_autocast_cpu_enabled(),
+            torch.get_autocast_cpu_dtype(),
+        )
+        if key not in self.graphs:
+            return self._trace(model, key, leaves, spec, args, kwargs)
+        calibration_graph = self.graphs[key]
+        if calibration_graph is None:
+            return self._run_eager(model, args, kwargs)
+        results = calibration_graph.graph(
+            *[leaf for leaf in leaves if isinstance(leaf, torch.Tensor)]
+        )
+        num_outputs = len(calibration_graph.output_tensor_pos)
+        for observer, t in zip(calibration_graph.observers, results[num_outputs:]):
+            observer(t)
+        output_leaves = list(calibration_graph.output_leaves)
+        for i, t in zip(calibration_graph.output_tensor_pos, results[:num_outputs]):
+            output_leaves[i] = t
+        return tree_unflatten(output_leaves, calibration_graph.output_spec)
+
+    def _trace(self, model, key, leaves, spec, args, kwargs):
+        tensor_pos = [
+            i for i, leaf in enumerate(leaves) if isinstance(leaf, torch.Tensor)
+        ]
+        if len(tensor_pos) == 0 or any(
+            not isinstance(leaf, (torch.Tensor,) + _CONSTANT_TYPES) for leaf in leaves
+        ):
+            self.graphs[key] = None
+            return self._run_eager(model, args, kwargs)
+
+        records = []
+        weight_records = []
+        traced_output = {}
+
+        def fn(*tensors):
+            flat = list(leaves)
+            for i, t in zip(tensor_pos, tensors):
+                flat[i] = t
+            traced_args, traced_kwargs = tree_unflatten(flat, spec)
+            output = model(*traced_args, **traced_kwargs)
+            output_leaves, output_spec = tree_flatten(output)
+            assert all(
+                isinstance(leaf, (torch.Tensor,) + _CONSTANT_TYPES)
+                for leaf in output_leaves
+            ), "the outputs of the model cannot be returned by a traced graph"
+            traced_output["output"] = output
+            traced_output["spec"] = output_spec
+            traced_output["leaves"] = output_leaves
+            summaries = []
+            for observer, x in records:
+                summary = _min_max_summary(observer, x)
+                summaries.append(summary if summary is not None else x.detach())
+            return tuple(
+                leaf for leaf in output_leaves if isinstance(leaf, torch.Tensor)
+            ) + tuple(summaries)
+
+        quant_states = list(model._fqn_to_auto_quant_state_map.values())
+        saved_observers = []
+        for qstate in quant_states:
+            saved_observers.append(
+                (
+                    dict(qstate.tensor_id_to_observer.items()),
+                    dict(qstate.weight_tensor_id_to_observer.items()),
+                )
+            )
+            for k, observer in saved_observers[-1][0].items():
+                qstate.tensor_id_to_observer[k] = _RecordingObserver(observer, records)
+            for k, observer in saved_observers[-1][1].items():
+                qstate.weight_tensor_id_to_observer[k] = _RecordingObserver(
+                    observer, weight_records
+                )
+        self.bypass = True
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", torch.jit.TracerWarning)
+                graph = torch.jit.trace(
+                    _TracedCalibration(model, fn),
+                    tuple(leaves[i] for i in tensor_pos),
+                    strict=False,
+                    check_trace=False,
+                )
+        except Exception as e:
+            warnings.warn(
+                f"fail to trace the calibration graph due to: {e}, "
+                "the input is calibrated without the traced graph"
+            )
+            graph = None
+        finally:
+            self.bypass = False
+            for qstate, (observers, weight_observers) in zip(
+                quant_states, saved_observers
+            ):
+                for k, observer in observers.items():
+                    qstate.tensor_id_to_observer[k] = observer
+                for k, observer in weight_observers.items():
+                    qstate.weight_tensor_id_to_observer[k] = observer
+
+        if graph is None:
+            self.graphs[key] = None
+            return self._run_eager(model, args, kwargs)
+        # the input which is traced is calibrated by the recorded tensors
+        with torch.no_grad():
+            for observer, x in records:
+                observer(x.detach())
+            observed_weights = set()
+            for observer, w in weight_records:
+                if id(observer) not in observed_weights:
+                    observed_weights.add(id(observer))
+                    observer(w)
+        self.graphs[key] = _CalibrationGraph(
+            graph,
+            [observer for observer, _ in records],
+            traced_output["spec"],
+            traced_output["leaves"],
+        )
+        return traced_output["output"]
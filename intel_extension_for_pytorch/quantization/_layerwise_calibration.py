@@ -0,0 +1,232 @@
+import copy
+import inspect
+import itertools
+
+import torch
+from torch.ao.quantization import QConfigMapping
+from torch.fx.node import map_aggregate
+
+from ._quantize import prepare
+from ._utils import attach_scale_zp_values_to_model
+
+
+def _unwrap(x):
+    # drops the tensor proxy of the prepared model, the data is not copied
+    if isinstance(x, torch.Tensor):
+        with torch._C.DisableTorchFunction():
+            return x.as_subclass(torch.Tensor)
+    return x
+
+
+def _bind_inputs(block, args, kwargs):
+    # all the inputs of the block as keyword inputs
+    signature = inspect.signature(block.forward)
+    bound = signature.bind(*args, **kwargs)
+    inputs = {}
+    for name, value in bound.arguments.items():
+        kind = signature.parameters[name].kind
+        assert (
+            kind is not inspect.Parameter.VAR_POSITIONAL
+        ), "layerwise_calibrate: the forward of the blocks cannot take *args"
+        if kind is inspect.Parameter.VAR_KEYWORD:
+            inputs.update(value)
+        else:
+            inputs[name] = value
+    return dict(map_aggregate(inputs, _unwrap))
+
+
+def _hidden_states_name(block):
+    # the hidden states are the first input of a block
+    return next(iter(inspect.signature(block.forward).parameters))
+
+
+def _quant_states(block):
+    for name, m in block.named_modules():
+        if "_auto_quant_state" in m.__dict__:
+            yield name, m.__dict__["_auto_quant_state"]
+
+
+def _copy_block(block):
+    # a copy of the block without the quant states of the prepared model, the
+    # parameters and buffers are shared with the block
+    memo = {id(t): t for t in itertools.chain(block.parameters(), block.buffers())}
+    for _, qstate in _quant_states(block):
+        memo[id(qstate)] = None
+    block_copy = copy.deepcopy(block, memo)
+    for m in block_copy.modules():
+        m.__dict__.pop("_auto_quant_state", None)
+        m.__dict__.pop("_auto_quant_module_hook_type", None)
+    return block_copy
+
+
+def _copy_qparams(src, dst):
+    r"""
+    Copies the scales, zero points and SmoothQuant scaling factors computed in
+    the quant state `src` of a block calibrated alone to the quant state `dst` of
+    the same module in the whole model. The ops are matched by their index in the
+    module, and the tensor ids are mapped by the position of the tensors in the
+    ops since they are numbered over the whole traced model.
+    """
+    tensor_id_map = {}
+
+    def _map_tensor_ids(src_infos, dst_infos):
+        assert len(src_infos) == len(
+            dst_infos
+        ), "layerwise_calibrate: the block runs differently from the prepared model"
+        for src_info, dst_info in zip(src_infos, dst_infos):
+            if src_info is not None and dst_info is not None:
+                tensor_id_map[src_info.id] = dst_info.id
+
+    for idx, src_op_info in src.idx_to_seen_q_op_infos.items():
+        dst_op_info = dst.idx_to_seen_q_op_infos.get(idx, None)
+        assert (
+            dst_op_info is not None and dst_op_info.type == src_op_info.type
+        ), "layerwise_calibrate: the block runs differently from the prepared model"
+        _map_tensor_ids(src_op_info.input_tensor_infos, dst_op_info.input_tensor_infos)
+        _map_tensor_ids(
+            src_op_info.output_tensor_infos, dst_op_info.output_tensor_infos
+        )
+    _map_tensor_ids(src.output_qtensor_infos, dst.output_qtensor_infos)
+
+    for tensor_id, scale_zp in src.tensor_id_to_scale_zp.items():
+        dst.tensor_id_to_scale_zp[tensor_id_map[tensor_id]] = scale_zp
+    for tensor_id, factors in src.tensor_id_to_smooth_quant_scaling_factor.items():
+        dst.tensor_id_to_smooth_quant_scaling_factor[
+            str(tensor_id_map[int(tensor_id)])
+        ] = factors
+    # the weights are keyed by the op index and their position in the op
+    dst.weight_tensor_id_to_scale_zp.update(src.weight_tensor_id_to_scale_zp)
+    dst.weight_tensor_id_to_smooth_quant_scaling_factor.update(
+        src.weight_tensor_id_to_smooth_quant_scaling_factor
+    )
+
+
+def _calibrate_block(block, configure, block_inputs):
+    prepared_block = prepare(
+        _copy_block(block),
+        QConfigMapping().set_global(configure),
+        example_kwarg_inputs=block_inputs[0],
+        inplace=True,
+        bn_folding=False,
+    )
+    outputs = []
+    for inputs in block_inputs:
+        output = prepared_block(**inputs)
+        hidden_states = output[0] if isinstance(output, (tuple, list)) else output
+        outputs.append(_unwrap(hidden_states))
+    attach_scale_zp_values_to_model(prepared_block)
+    copied_modules = dict(prepared_block.named_modules())
+    for name, qstate in _quant_states(block):
+        _copy_qparams(copied_modules[name].__dict__["_auto_quant_state"], qstate)
+    return outputs
+
+
+def layerwise_calibrate(prepared_model, blocks, calib_inputs):
+    r"""
+    Calibrates a model prepared for static quantization, e.g., SmoothQuant, one
+    block at a time to cap the memory of the calibration of large models.
+
+    The calibration inputs run through the model once with the observers of
+    `blocks` disabled, which calibrates the ops outside the blocks (e.g.,
+    ``lm_head``) and records the inputs of the blocks. Then each block is prepared
+    alone, on a copy sharing its weights, and calibrated over the recorded inputs
+    of the block, whose outputs are the inputs of the next block. The scales and
+    SmoothQuant scaling factors of the block are computed, moved to the prepared
+    model, and the observers of the block are released before the next block
+    runs. So only the observers and activations of one block are alive at a
+    time, and the weights are never copied.
+
+    The prepared model can be saved by ``save_qconf_summary`` or converted by
+    ``ipex.quantization.convert`` afterwards, as after the usual calibration.
+
+    Args:
+        prepared_model (torch.nn.Module): The model returned by
+            ``ipex.quantization.prepare``.
+        blocks (list of torch.nn.Module): The blocks of ``prepared_model`` in the
+            order they run, e.g., the decoder layers of a transformer. The first
+            input of the blocks is the hidden states and the first output is the
+            hidden states fed into the next block.
+        calib_inputs (iterable): The calibration inputs of ``prepared_model``,
+            each of them is a tuple of the positional inputs, a dict of the
+            keyword inputs or a tensor.
+
+    Returns:
+        The calibrated ``prepared_model``.
+
+    Examples:
+
+        >>> qconfig_mapping = ipex.quantization.get_smooth_quant_qconfig_mapping()
+        >>> prepared_model = ipex.quantization.prepare(
+        ...     model, qconfig_mapping, example_inputs=example_inputs, inplace=True
+        ... )
+        >>> ipex.quantization.layerwise_calibrate(
+        ...     prepared_model, prepared_model.model.layers, calib_inputs
+        ... )
+        >>> prepared_model.save_qconf_summary(qconf_summary="qconf.json")
+    """
+    assert hasattr(
+        prepared_model, "_fqn_to_auto_quant_state_map"
+    ), "layerwise_calibrate: the model should be prepared for static quantization"
+    blocks = list(blocks)
+    assert len(blocks) > 0, "layerwise_calibrate: no block to calibrate"
+    hidden_states_names = [_hidden_states_name(block) for block in blocks]
+    for block in blocks:
+        for _, qstate in _quant_states(block):
+            qstate.tensor_id_to_observer.clear()
+            qstate.weight_tensor_id_to_observer.clear()
+
+    # the hidden states of the first block, and the other inputs (e.g., the
+    # attention mask and the kv cache) of each block
+    hidden_states = []
+    block_inputs = [[] for _ in blocks]
+
+    def _record_inputs(i):
+        def hook(module, args, kwargs):
+            inputs = _bind_inputs(module, args, kwargs)
+            name = hidden_states_names[i]
+            assert (
+                name in inputs
+            ), f"layerwise_calibrate: the hidden states {name} are not given"
+            hidden_states_i = inputs.pop(name)
+            if i == 0:
+                hidden_states.append(hidden_states_i)
+            block_inputs[i].append(inputs)
+
+        return hook
+
+    handles = [
+        block.register_forward_pre_hook(_record_inputs(i), with_kwargs=True)
+        for i, block in enumerate(blocks)
+    ]
+    # the hooks of the blocks don't run in the graphs of the fast calibration
+    fast_calibration = prepared_model.__dict__.get("_fast_calibration", None)
+    prepared_model._fast_calibration = None
+    try:
+        with torch.no_grad():
+            for inputs in calib_inputs:
+                if isinstance(inputs, dict):
+                    prepared_model(**inputs)
+                elif isinstance(inputs, (tuple, list)):
+                    prepared_model(*inputs)
+                else:
+                    prepared_model(inputs)
+    finally:
+        for handle in handles:
+            handle.remove()
+        prepared_model._fast_calibration = fast_calibration
+        if fast_calibration is not None:
+            # the observers of the blocks are cleared
+            fast_calibration.clear()
+    assert len(hidden_states) > 0, "layerwise_calibrate: no calibration input"
+
+    configure = prepared_model.q_config
+    with torch.no_grad():
+        for i, block in enumerate(blocks):
+            inputs = [
+                {**block_input, hidden_states_names[i]: hidden_states_j}
+                for block_input, hidden_states_j in zip(block_inputs[i], hidden_states)
+            ]
+            block_inputs[i] = None
+            hidden_states = _calibrate_block(block, configure, inputs)
+            del inputs
+    return prepared_model
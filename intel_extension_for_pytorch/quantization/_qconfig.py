@@ -9,6 +9,7 @@ from torch.ao.quantization import (
     QConfigMapping,
 )
 from ._smooth_quant import SmoothQuantActivationObserver, SmoothQuantWeightObserver
+from ._weight_only_quant import GroupWiseMinMaxObserver
 
 
 _default_weight_observer = PerChannelMinMaxObserver.with_args(
@@ -90,6 +91,14 @@ def get_smooth_quant_qconfig_mapping(
 
 # For weight-only quantization
 class WoqLowpMode(IntEnum):
+    r"""
+    Compute dtype of the weight-only quantized linear. With ``NONE``, ``FP16``
+    and ``BF16``, the weight is dequantized and computed in the activation dtype,
+    FP16 and BF16 respectively. With ``INT8``, the activation is dynamically
+    quantized to uint8 per token (per group of the input channels for group-wise
+    quantized weight) and computed with the int8 weight or the int4 weight
+    converted to int8 by VNNI/AMX instructions.
+    """
     NONE = 0
     FP16 = 1
     BF16 = 2
@@ -97,9 +106,22 @@ class WoqLowpMode(IntEnum):
 
 QConfigWoq = namedtuple('QConfigWoq', [*QConfig._fields, 'lowp_mode'])
 def get_weight_only_quant_qconfig_mapping(
-        *,
-        weight_dtype: torch.dtype = torch.qint8,
-        lowp_mode: int = WoqLowpMode.NONE):
+    *,
+    weight_dtype: torch.dtype = torch.qint8,
+    lowp_mode: int = WoqLowpMode.NONE,
+    group_size: int = -1
+):
+    r"""
+    Configuration with weight-only quantization.
+
+    Args:
+        weight_dtype (torch.dtype): Data type of the quantized weight, torch.qint8
+            or torch.quint4x2.
+        lowp_mode (int): Compute dtype of the linear, see ``WoqLowpMode``.
+        group_size (int): Number of the consecutive input channels sharing a scale
+            and a zero point. -1 means per-channel quantization, i.e., a scale and
+            a zero point for each output channel.
+    """
     dtype_to_qscheme = {
         torch.qint8: torch.per_channel_affine,
         torch.quint8: torch.per_channel_affine,
@@ -107,11 +129,17 @@ def get_weight_only_quant_qconfig_mapping(
         torch.quint4x2: torch.per_channel_affine_float_qparams,
     }
     weight_qscheme = dtype_to_qscheme[weight_dtype]
+    if group_size > 0:
+        weight_observer = GroupWiseMinMaxObserver.with_args(
+            group_size=group_size, dtype=weight_dtype, qscheme=weight_qscheme
+        )
+    else:
+        weight_observer = PerChannelMinMaxObserver.with_args(
+            dtype=weight_dtype, qscheme=weight_qscheme
+        )
     _weight_only_quant_qconfig = QConfigWoq(
         activation=PlaceholderObserver.with_args(dtype=torch.float, is_dynamic=False),
-        weight=PerChannelMinMaxObserver.with_args(
-            dtype=weight_dtype, qscheme=weight_qscheme
-        ),
+        weight=weight_observer,
         lowp_mode=lowp_mode,
     )
     weight_only_quant_qconfig_mapping = QConfigMapping().set_global(
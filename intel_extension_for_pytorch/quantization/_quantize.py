@@ -29,6 +29,7 @@ def prepare(
     inplace=False,
     bn_folding=True,
     example_kwarg_inputs=None,
+    fast_calibration=False,
 ):
     r"""
     Prepare an FP32 torch.nn.Module model to do calibration or to convert to quantized model.
@@ -49,6 +50,10 @@ def prepare(
         example_kwarg_inputs (dict):  A dict of example inputs that will be passed to the function while
             running to init quantization state. Only one of this argument or ``example_inputs`` should be
             specified.
+        fast_calibration (bool): whether to calibrate static quantization by graphs traced per input
+            signature (the shapes and dtypes of the inputs), which run without the Python hooks on every op
+            and give the same statistics as the usual calibration. The inputs that cannot be traced are
+            calibrated as usual. The default value is ``False``.
 
     Returns:
         torch.nn.Module
@@ -111,7 +116,13 @@ def prepare(
         assert isinstance(
             example_kwarg_inputs, Dict
         ), "IPEX quantization.prepare: example_kwarg_inputs must be type of Dict."
-    return auto_prepare(prepare_model, configure, example_inputs, example_kwarg_inputs)
+    return auto_prepare(
+        prepare_model,
+        configure,
+        example_inputs,
+        example_kwarg_inputs,
+        fast_calibration=fast_calibration,
+    )
 
 
 def _may_insert_deepspeed_modules(
@@ -29,6 +29,8 @@ from ._quantization_state import (
     init_model_quant_state,
 )
 from ._recipe import get_default_recipe
+from ._calibration_shard import save_observer_state, merge_observer_state
+from ._fast_calibration import FastCalibration
 from ._module_swap_utils import swap_child_modules
 
 
@@ -74,6 +76,7 @@ def auto_prepare(
     configure: QConfig,
     example_inputs: Optional[Tuple[Any]],
     example_kwarg_inputs: Optional[Dict[Any, Any]],
+    fast_calibration: bool = False,
 ) -> torch.nn.Module:
     def convert_to_interception_proxy(x):
         if isinstance(x, torch.Tensor):
@@ -270,6 +273,14 @@ def auto_prepare(
         """
 
         def __call__(self, *args, **kwargs):
+            nonlocal first_call
+            fast_calibration = self.__dict__.get("_fast_calibration", None)
+            if (
+                not first_call
+                and fast_calibration is not None
+                and not fast_calibration.bypass
+            ):
+                return fast_calibration(self, args, kwargs)
             new_args = map_aggregate(args, convert_to_interception_proxy)
             new_kwargs = map_aggregate(kwargs, convert_to_interception_proxy)
             orig_module_call = torch.nn.Module.__call__
@@ -422,7 +433,6 @@ def auto_prepare(
 
             torch.nn.Module.__call__ = _patched_module_call
             torch.nn.Sequential.forward = _nn_sequential_patched_forward  # type: ignore[assignment]
-            nonlocal first_call
             try:
                 if first_call:
                     init_model_quant_state(self, module_id_to_fqn, configure)
@@ -475,17 +485,43 @@ def auto_prepare(
             if os.path.exists(qconf_summary) and os.stat(qconf_summary).st_size != 0:
                 self._qconf_summary = qconf_summary
                 load_qconf_summary_to_model(self, qconf_summary)
+                if self.__dict__.get("_fast_calibration", None) is not None:
+                    # the traced graphs hold the observers which are replaced
+                    self._fast_calibration.clear()
             else:
                 AssertionError(
                     False,
                     ("Can not load a empty file or none existed file" + qconf_summary),
                 )
 
+        def save_calibration_shard(self, shard):
+            r"""
+            This function is about save the observer statistics of the calibration done by this process
+            to a file, which can be merged with the ones of the other processes by merge_calibration_shards.
+            """
+            assert (
+                shard is not None
+            ), "A file name should be given to save the calibration shard"
+            save_observer_state(self, shard)
+
+        def merge_calibration_shards(self, shards, qconf_summary=None):
+            r"""
+            This function is about merge the observer statistics saved by save_calibration_shard from the
+            processes which calibrated a part of the calibration dataset each, and overwrite the model's
+            observers with the merged ones. The merged qconf_summary is saved to a json file if qconf_summary
+            is given.
+            """
+            merge_observer_state(self, shards)
+            if qconf_summary is not None:
+                self.save_qconf_summary(qconf_summary)
+
     model.q_config = configure
     # For Dynamic quantization, most user model has a dynamic control flow, the DBR
     # doesn't support it now, so there skip DRB when user want to run dynamic quantization.
     if not isinstance(configure.activation(), PlaceholderObserver):
         model.__class__ = QuantizationInterceptionModule
+        # the calibration runs the graphs traced for the input signatures
+        model._fast_calibration = FastCalibration() if fast_calibration else None
         # init model quantization state using example_inputs
         assert example_inputs is not None or example_kwarg_inputs is not None, (
             "IPEX: example_inputs and example_kwarg_inputs cannot be None at same time "
@@ -4,7 +4,6 @@ from torch.ao.quantization import (
     HistogramObserver,
     PerChannelMinMaxObserver,
 )
-import copy
 
 
 class SmoothQuantActivationObserver(UniformQuantizationObserverBase):
@@ -237,8 +236,10 @@ class SmoothQuantWeightObserver(UniformQuantizationObserverBase):
     def forward(self, x_orig):
         if not self.smooth_quant_enabled:
             return self.oc_obs.forward(x_orig)
-        # Copy original weight to apply scaling factor
-        self.w_orig = copy.deepcopy(x_orig)
+        # Keep original weight to apply scaling factor. The weight is not
+        # changed during calibration, so it is referenced instead of copied
+        # to avoid holding a second copy of all the weights of the model
+        self.w_orig = x_orig.detach()
         # Call per-channel observer on IC to find scaling factor
         return self.ic_obs.forward(x_orig)
 
@@ -0,0 +1,70 @@
+import torch
+from torch.ao.quantization import PerChannelMinMaxObserver
+
+
+class GroupWiseMinMaxObserver(PerChannelMinMaxObserver):
+    r"""
+    Weight observer for group-wise weight-only quantization.
+
+    The weight of shape N * K (output channels * input channels) is split into
+    groups of `group_size` consecutive input channels, and the qparams are
+    computed from the running min/max of each group. Hence, the scales and zero
+    points are of shape N * (K / group_size).
+    """
+
+    def __init__(
+        self,
+        group_size=128,
+        dtype=torch.quint4x2,
+        qscheme=torch.per_channel_affine_float_qparams,
+        reduce_range=False,
+        quant_min=None,
+        quant_max=None,
+        factory_kwargs=None,
+        eps=torch.finfo(torch.float32).eps,
+    ) -> None:
+        super().__init__(
+            ch_axis=0,
+            dtype=dtype,
+            qscheme=qscheme,
+            reduce_range=reduce_range,
+            quant_min=quant_min,
+            quant_max=quant_max,
+            factory_kwargs=factory_kwargs,
+            eps=eps,
+        )
+        assert group_size > 0, "group_size should be a positive integer"
+        self.group_size = group_size
+
+    def forward(self, x_orig):
+        if x_orig.numel() == 0:
+            return x_orig
+        x = x_orig.detach()
+        x = x.to(self.min_val.dtype)
+        assert x.dim() == 2 and x.size(1) % self.group_size == 0, (
+            "GroupWiseMinMaxObserver expects weight of shape N * K "
+            "with K divisible by group_size"
+        )
+        min_val, max_val = torch.aminmax(
+            x.reshape(x.size(0), -1, self.group_size), dim=-1
+        )
+        if self.min_val.numel() != 0 and self.max_val.numel() != 0:
+            min_val = torch.min(min_val, self.min_val)
+            max_val = torch.max(max_val, self.max_val)
+        self.min_val.resize_(min_val.shape)
+        self.max_val.resize_(max_val.shape)
+        self.min_val.copy_(min_val)
+        self.max_val.copy_(max_val)
+        return x_orig
+
+    @torch.jit.export
+    def calculate_qparams(self):
+        # qparams of each group are computed in the same way as per-channel
+        scales, zero_points = self._calculate_qparams(
+            self.min_val.flatten(), self.max_val.flatten()
+        )
+        return scales.view(self.min_val.shape), zero_points.view(self.min_val.shape)
+
+    @torch.jit.export
+    def extra_repr(self):
+        return f"{super().extra_repr()}, group_size={self.group_size}"
@@ -1,4 +1,5 @@
 from .optimize import optimize_transformers
 from .optimize import _set_optimized_model_for_generation
+from .model_family import ModelFamily, register_model_family
 from .models.cpu.modules.attentions import _IPEXAttentionCPU
 from .models.cpu.modules.decoder import _IPEXDecoderLayerCPU
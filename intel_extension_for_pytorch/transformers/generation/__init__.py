@@ -1,2 +1,8 @@
 from .beam_search import _beam_search
 from .greedy_search import _greedy_search
+from .sample import _sample
+from .assisted_decoding import _assisted_decoding
+from .paged_kv_cache import PagedKVCache
+from .continuous_batching import ContinuousBatchingScheduler
+from .prefix_cache import PrefixKVCache
+from .profiler import GenerationProfiler
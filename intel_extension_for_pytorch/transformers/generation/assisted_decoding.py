@@ -0,0 +1,217 @@
+import inspect
+import torch
+import time
+from typing import Optional, Union, List
+from transformers.generation.stopping_criteria import StoppingCriteriaList
+from transformers.generation.logits_process import LogitsProcessorList
+from transformers.generation.streamers import BaseStreamer
+from .greedy_search import _greedy_search, GreedySearchDecoderOnlyOutput
+from .utils import _get_kv_cache_max_length, _init_kv_cache
+
+
+def _crop_kv_cache(past_key_values, length):
+    r"""
+    Rolls the discrete kv_cache back to its first `length` tokens. Only the
+    sequence length carried by seq_info changes, the next forward overwrites the
+    key/value of the discarded tokens in place.
+    """
+    seq_info = torch.zeros(1, 1, 1, 1, dtype=torch.long).expand(1, length, length, 1)
+    return tuple((seq_info,) + tuple(layer_past[1:]) for layer_past in past_key_values)
+
+
+def _forward_tokens(model, input_ids, past_key_values):
+    # forwards the tokens after the kv_cache and returns (logits, past_key_values)
+    past_len = past_key_values[0][0].size(-2)
+    seq_len = past_len + input_ids.size(-1)
+    model_inputs = {
+        "input_ids": input_ids,
+        "attention_mask": torch.ones(1, seq_len, dtype=torch.long),
+        "past_key_values": past_key_values,
+    }
+    if "position_ids" in inspect.signature(model.forward).parameters:
+        model_inputs["position_ids"] = torch.arange(past_len, seq_len).unsqueeze(0)
+    if hasattr(model, "trace_graph"):
+        outputs = model.trace_graph(**model_inputs)
+        return outputs[0], outputs[1]
+    outputs = model(**model_inputs, use_cache=True, return_dict=True)
+    return outputs.logits, outputs.past_key_values
+
+
+def _assisted_decoding(
+    self,
+    input_ids: torch.LongTensor,
+    assistant_model: "PreTrainedModel",  # noqa: F821
+    do_sample: bool = False,
+    logits_processor: Optional[LogitsProcessorList] = None,
+    logits_warper: Optional[LogitsProcessorList] = None,
+    stopping_criteria: Optional[StoppingCriteriaList] = None,
+    pad_token_id: Optional[int] = None,
+    eos_token_id: Optional[Union[int, List[int]]] = None,
+    output_attentions: Optional[bool] = None,
+    output_hidden_states: Optional[bool] = None,
+    output_scores: Optional[bool] = None,
+    return_dict_in_generate: Optional[bool] = None,
+    synced_gpus: bool = False,
+    streamer: Optional["BaseStreamer"] = None,
+    **model_kwargs,
+):
+    r"""
+    Speculative decoding of ``model.generate(assistant_model=...)``: the assistant
+    (draft) model proposes ``assistant_model.max_assistant_tokens`` tokens one by
+    one, then this model verifies all of them in one forward of the proposed
+    tokens on top of its kv_cache. The proposed tokens are kept up to the first
+    one differing from the token selected by this model, plus the selected one,
+    and both kv_caches are rolled back to the kept tokens. As in the transformers
+    implementation, the number of the proposed tokens grows by 2 when all of them
+    are kept and shrinks by 1 otherwise.
+
+    Both models should be optimized by ``ipex.optimize_transformers`` so that they
+    use the discrete kv_cache. The batch size is 1.
+    """
+    if getattr(assistant_model.greedy_search, "__func__", None) is not _greedy_search:
+        raise ValueError(
+            "assistant_model should be optimized by ipex.optimize_transformers"
+        )
+    if not hasattr(assistant_model, "max_assistant_tokens"):
+        # updated across the calls as the transformers implementation does
+        assistant_model.max_assistant_tokens = 5
+    token_latency = (
+        self.config.token_latency if hasattr(self.config, "token_latency") else False
+    )
+    latency_list = []
+    logits_processor = (
+        logits_processor if logits_processor is not None else LogitsProcessorList()
+    )
+    logits_warper = (
+        logits_warper if logits_warper is not None else LogitsProcessorList()
+    )
+    stopping_criteria = (
+        stopping_criteria if stopping_criteria is not None else StoppingCriteriaList()
+    )
+    eos_token_id = (
+        eos_token_id
+        if eos_token_id is not None
+        else self.generation_config.eos_token_id
+    )
+    if isinstance(eos_token_id, int):
+        eos_token_id = [eos_token_id]
+    eos_token_id = eos_token_id if eos_token_id is not None else []
+    output_scores = (
+        output_scores
+        if output_scores is not None
+        else self.generation_config.output_scores
+    )
+    return_dict_in_generate = (
+        return_dict_in_generate
+        if return_dict_in_generate is not None
+        else self.generation_config.return_dict_in_generate
+    )
+    scores = () if (return_dict_in_generate and output_scores) else None
+
+    # room for the proposed tokens beyond the max length, the kv_cache grows if
+    # the assistant proposes more
+    max_len = _get_kv_cache_max_length(self, input_ids, stopping_criteria)
+    kv_cache_max_length = max_len + int(assistant_model.max_assistant_tokens) + 1
+    past_key_values = _init_kv_cache(self, 1, kv_cache_max_length)
+    assistant_past_key_values = _init_kv_cache(assistant_model, 1, kv_cache_max_length)
+
+    while True:
+        tic = time.time()
+        cur_len = input_ids.shape[-1]
+
+        # 1. propose the candidate tokens greedily with the assistant model
+        candidate_input_ids = input_ids
+        last_assistant_token_is_eos = False
+        for _ in range(int(assistant_model.max_assistant_tokens)):
+            assistant_past_len = assistant_past_key_values[0][0].size(-2)
+            assistant_logits, assistant_past_key_values = _forward_tokens(
+                assistant_model,
+                candidate_input_ids[:, assistant_past_len:],
+                assistant_past_key_values,
+            )
+            new_token_logits = logits_processor(
+                candidate_input_ids, assistant_logits[:, -1, :]
+            )
+            new_token = new_token_logits.argmax(dim=-1)
+            candidate_input_ids = torch.cat(
+                (candidate_input_ids, new_token[:, None]), dim=-1
+            )
+            if int(new_token) in eos_token_id:
+                last_assistant_token_is_eos = True
+                break
+        candidate_length = candidate_input_ids.shape[1] - cur_len
+
+        # 2. verify all the candidate tokens in one forward
+        past_len = past_key_values[0][0].size(-2)
+        logits, past_key_values = _forward_tokens(
+            self, candidate_input_ids[:, past_len:], past_key_values
+        )
+        new_logits = logits[:, -candidate_length - 1 :].float()
+        for i in range(candidate_length + 1):
+            new_logits[:, i, :] = logits_processor(
+                candidate_input_ids[:, : cur_len + i], new_logits[:, i, :]
+            )
+            if do_sample:
+                new_logits[:, i, :] = logits_warper(
+                    candidate_input_ids[:, : cur_len + i], new_logits[:, i, :]
+                )
+        if do_sample:
+            probs = new_logits.softmax(dim=-1)
+            selected_tokens = torch.multinomial(probs[0], num_samples=1).view(1, -1)
+        else:
+            selected_tokens = new_logits.argmax(dim=-1)
+
+        # 3. keep the candidates up to the first mismatch, plus the selected token
+        candidate_new_tokens = candidate_input_ids[:, cur_len:]
+        n_matches = int(
+            (
+                (~(candidate_new_tokens == selected_tokens[:, :-1])).cumsum(dim=-1) < 1
+            ).sum()
+        )
+        if last_assistant_token_is_eos and n_matches == candidate_length:
+            n_matches -= 1
+        n_matches = min(n_matches, max_len - cur_len - 1)
+        valid_tokens = selected_tokens[:, : n_matches + 1]
+        input_ids = torch.cat((input_ids, valid_tokens), dim=-1)
+        if streamer is not None:
+            streamer.put(valid_tokens.cpu())
+        if scores is not None:
+            scores += tuple(new_logits[:, i, :] for i in range(n_matches + 1))
+
+        # 4. roll back the kv_caches to the kept tokens, the last selected token
+        # is fed in the next iteration
+        new_cache_size = input_ids.shape[-1] - 1
+        past_key_values = _crop_kv_cache(past_key_values, new_cache_size)
+        assistant_past_key_values = _crop_kv_cache(
+            assistant_past_key_values,
+            min(assistant_past_key_values[0][0].size(-2), new_cache_size),
+        )
+
+        if n_matches == int(assistant_model.max_assistant_tokens):
+            assistant_model.max_assistant_tokens += 2.0
+        else:
+            assistant_model.max_assistant_tokens = max(
+                1.0, assistant_model.max_assistant_tokens - 1.0
+            )
+
+        latency = time.time() - tic
+        latency_list.extend([latency / (n_matches + 1)] * (n_matches + 1))
+        if int(valid_tokens[0, -1]) in eos_token_id or stopping_criteria(
+            input_ids, scores
+        ):
+            break
+
+    if streamer is not None:
+        streamer.end()
+
+    if return_dict_in_generate:
+        output_result = GreedySearchDecoderOnlyOutput(
+            sequences=input_ids, scores=scores
+        )
+    else:
+        output_result = input_ids
+
+    if token_latency:
+        return (output_result, latency_list)
+    else:
+        return output_result
@@ -11,7 +11,10 @@ from transformers.generation.logits_process import LogitsProcessorList
 from transformers.generation.beam_search import BeamScorer
 from transformers.utils import ModelOutput
 import time
-import re
+from ..model_family import get_model_family
+from .utils import _get_kv_cache_max_length, _init_kv_cache, _prefill_in_chunks
+from .prefix_cache import _get_prefix_kv_cache
+from .profiler import _get_generation_profiler
 
 
 class BeamSearchEncoderDecoderOutput(ModelOutput):
@@ -77,6 +80,8 @@ def _beam_search(
             "You don't have defined any stopping_criteria, this will likely loop forever",
             UserWarning,
         )
+    # size the kv_cache by the expected sequence length, it grows if exceeded
+    kv_cache_max_length = _get_kv_cache_max_length(self, input_ids, stopping_criteria)
     pad_token_id = (
         pad_token_id
         if pad_token_id is not None
@@ -154,6 +159,14 @@ def _beam_search(
     beam_scores[:, 1:] = -1e9
     beam_scores = beam_scores.view((batch_size * num_beams,))
     this_peer_finished = False  # used by synced_gpus only
+    prefix_cache = _get_prefix_kv_cache(self)
+    profiler = _get_generation_profiler(self)
+    model_family = get_model_family(self.config)
+    prefill_chunk_size = (
+        self.config.prefill_chunk_size
+        if hasattr(self.config, "prefill_chunk_size")
+        else None
+    )
     while True:
         tic = time.time()
         if synced_gpus:
@@ -168,100 +181,23 @@ def _beam_search(
             if this_peer_finished_flag.item() == 0.0:
                 break
 
+        if profiler is not None:
+            profiler.step_begin(
+                "prefill" if model_kwargs.get("past_key_values") is None else "decode"
+            )
         model_inputs = self.prepare_inputs_for_generation(input_ids, **model_kwargs)
-        if (
-            re.search("GPTJ", self.config.architectures[0])
-            or re.search("llama", self.config.architectures[0], re.IGNORECASE)
-            or re.search("gptneox", self.config.architectures[0], re.IGNORECASE)
-            or re.search("OPT", self.config.architectures[0], re.IGNORECASE)
-            or re.search("falcon", self.config.architectures[0], re.IGNORECASE)
-            or re.search("rw", self.config.architectures[0], re.IGNORECASE)
-        ):
+        if profiler is not None:
+            profiler.lap("prepare_inputs")
+        if model_family is not None:
             first_token = False
             input_bs = input_ids.size()[0]
-            has_position_id = True
+            has_position_id = model_family.has_position_ids
             if model_inputs["past_key_values"] is None:
                 first_token = True
             if first_token:
-                if re.search("GPTJ", self.config.architectures[0]):
-                    beam_idx_tmp = torch.zeros(
-                        (2048, int(batch_size * num_beams)), dtype=torch.long
-                    ).contiguous()
-                    model_inputs["past_key_values"] = tuple(
-                        [
-                            (
-                                torch.zeros(1, 0, 0, 1, dtype=torch.long).contiguous(),
-                                torch.zeros([1, 1, 1, 1]).contiguous(),
-                                torch.zeros([1, 1, 1, 1]).contiguous(),
-                                beam_idx_tmp,
-                            )
-                            for i in range(self.config.n_layer)
-                        ]
-                    )
-                elif re.search("llama", self.config.architectures[0], re.IGNORECASE):
-                    beam_idx_tmp = torch.zeros(
-                        (2048, int(batch_size * num_beams)), dtype=torch.long
-                    ).contiguous()
-                    model_inputs["past_key_values"] = tuple(
-                        [
-                            (
-                                torch.zeros(1, 0, 0, 1, dtype=torch.long).contiguous(),
-                                torch.zeros([1, 1, 1, 1]).contiguous(),
-                                torch.zeros([1, 1, 1, 1]).contiguous(),
-                                beam_idx_tmp,
-                            )
-                            for i in range(self.config.num_hidden_layers)
-                        ]
-                    )
-                elif re.search("gptneox", self.config.architectures[0], re.IGNORECASE):
-                    beam_idx_tmp = torch.zeros(
-                        (2048, int(batch_size * num_beams)), dtype=torch.long
-                    ).contiguous()
-                    model_inputs["past_key_values"] = tuple(
-                        [
-                            (
-                                torch.zeros(1, 0, 0, 1, dtype=torch.long).contiguous(),
-                                torch.zeros([1, 1, 1, 1]).contiguous(),
-                                torch.zeros([1, 1, 1, 1]).contiguous(),
-                                beam_idx_tmp,
-                            )
-                            for i in range(self.config.num_hidden_layers)
-                        ]
-                    )
-                elif re.search("OPT", self.config.architectures[0], re.IGNORECASE):
-                    beam_idx_tmp = torch.zeros(
-                        (2048, int(batch_size * num_beams)), dtype=torch.long
-                    ).contiguous()
-                    model_inputs["past_key_values"] = tuple(
-                        [
-                            (
-                                torch.zeros(1, 0, 0, 1, dtype=torch.long).contiguous(),
-                                torch.zeros([1, 1, 1, 1]).contiguous(),
-                                torch.zeros([1, 1, 1, 1]).contiguous(),
-                                beam_idx_tmp,
-                            )
-                            for i in range(self.config.num_hidden_layers)
-                        ]
-                    )
-                    has_position_id = False
-                elif re.search(
-                    "falcon", self.config.architectures[0], re.IGNORECASE
-                ) or re.search("rw", self.config.architectures[0], re.IGNORECASE):
-                    beam_idx_tmp = torch.zeros(
-                        (2048, int(batch_size * num_beams)), dtype=torch.long
-                    ).contiguous()
-                    model_inputs["past_key_values"] = tuple(
-                        [
-                            (
-                                torch.zeros(1, 0, 0, 1, dtype=torch.long).contiguous(),
-                                torch.zeros([1, 1, 1, 1]).contiguous(),
-                                torch.zeros([1, 1, 1, 1]).contiguous(),
-                                beam_idx_tmp,
-                            )
-                            for i in range(self.config.num_hidden_layers)
-                        ]
-                    )
-                    has_position_id = False
+                model_inputs["past_key_values"] = _init_kv_cache(
+                    self, batch_size * num_beams, kv_cache_max_length
+                )
 
             if hasattr(self, "trace_graph"):
                 if first_token:
@@ -286,6 +222,10 @@ def _beam_search(
                     model_inputs["input_ids"] = new_input_ids
                     if has_position_id:
                         model_inputs["position_ids"] = new_position_ids
+                if first_token and prefix_cache is not None:
+                    prefix_cache.resume(self, model_inputs)
+                if first_token and prefill_chunk_size:
+                    _prefill_in_chunks(self, model_inputs, prefill_chunk_size)
                 model_inputs.pop("use_cache", None)
                 model_inputs.pop("token_type_ids", None)
                 if first_token and hasattr(self, "trace_graph_first"):
@@ -302,6 +242,10 @@ def _beam_search(
                     continue  # don't waste resources running the code we don't need
                 next_token_logits = outputs[0][:, -1, :]
             else:
+                if first_token and prefix_cache is not None:
+                    prefix_cache.resume(self, model_inputs)
+                if first_token and prefill_chunk_size:
+                    _prefill_in_chunks(self, model_inputs, prefill_chunk_size)
                 outputs = self(
                     **model_inputs,
                     return_dict=True,
@@ -312,6 +256,13 @@ def _beam_search(
                     cur_len = cur_len + 1
                     continue  # don't waste resources running the code we don't need
                 next_token_logits = outputs.logits[:, -1, :]
+            if first_token and prefix_cache is not None:
+                prefix_cache.update(
+                    self,
+                    input_ids,
+                    model_kwargs.get("attention_mask", None),
+                    self._extract_past_from_model_output(outputs),
+                )
         else:
             outputs = self(
                 **model_inputs,
@@ -324,6 +275,8 @@ def _beam_search(
                 continue  # don't waste resources running the code we don't need
             next_token_logits = outputs.logits[:, -1, :]
 
+        if profiler is not None:
+            profiler.lap("forward")
         # hack: adjust tokens for Marian. For Marian we have to make sure that the `pad_token_id`
         # cannot be generated both before and after the `nn.functional.log_softmax` operation.
         next_token_logits = self.adjust_logits_during_generation(
@@ -337,6 +290,8 @@ def _beam_search(
         next_token_scores = next_token_scores_processed + beam_scores[
             :, None
         ].expand_as(next_token_scores)
+        if profiler is not None:
+            profiler.lap("logits_processor")
 
         # Store scores, attentions and hidden_states when required
         if return_dict_in_generate:
@@ -388,6 +343,8 @@ def _beam_search(
         input_ids = torch.cat(
             [input_ids[beam_idx, :], beam_next_tokens.unsqueeze(-1)], dim=-1
         )
+        if profiler is not None:
+            profiler.lap("sampling")
 
         model_kwargs = self._update_model_kwargs_for_generation(
             outputs, model_kwargs, is_encoder_decoder=self.config.is_encoder_decoder
@@ -396,6 +353,8 @@ def _beam_search(
             model_kwargs["past_key_values"] = self._reorder_cache(
                 model_kwargs["past_key_values"], beam_idx
             )
+        if profiler is not None:
+            profiler.lap("update_model_kwargs")
 
         if return_dict_in_generate and output_scores:
             beam_indices = tuple(
@@ -408,6 +367,8 @@ def _beam_search(
         # increase cur_len
         cur_len = cur_len + 1
         latency_list.append(time.time() - tic)
+        if profiler is not None:
+            profiler.step_end(batch_size, model_kwargs.get("past_key_values", None))
 
         if beam_scorer.is_done or stopping_criteria(input_ids, scores):
             if not synced_gpus:
@@ -0,0 +1,333 @@
+import inspect
+import torch
+from collections import deque
+from typing import List, Optional, Union
+from transformers.generation.logits_process import LogitsProcessorList
+from ..model_family import get_model_family
+from .paged_kv_cache import PagedKVCache, _get_kv_cache_dtype
+from .utils import _get_paged_trace_graph
+
+
+class _GenerationRequest(object):
+    def __init__(self, request_id, input_ids: List[int], max_new_tokens: int):
+        self.request_id = request_id
+        self.prompt_ids = input_ids
+        self.output_ids = []
+        self.max_new_tokens = max_new_tokens
+        self.finished = False
+        # number of the tokens already in the kv cache during the prefill
+        self.num_prefilled_tokens = 0
+        self.prefilled = False
+
+    @property
+    def token_ids(self):
+        return self.prompt_ids + self.output_ids
+
+
+class ContinuousBatchingScheduler(object):
+    r"""
+    Iteration-level scheduler of ``model.generate()`` requests for the models
+    optimized by ``ipex.optimize_transformers``.
+
+    Instead of running a fixed batch to completion, the running batch is rebuilt
+    at every decode step: the waiting prompts are admitted into the free batch
+    slots as long as the paged kv cache has room for them, and the finished
+    sequences are evicted right away, releasing their cache blocks for the
+    next requests. When the cache runs out of blocks in the middle of decoding,
+    the latest admitted request is preempted back to the waiting queue and
+    recomputed later. Tokens are selected greedily as ``_greedy_search`` does.
+
+    With ``prefill_chunk_size``, the prompts are prefilled in chunks: every step
+    prefills at most ``prefill_chunk_size`` prompt tokens, the shortest
+    remaining prompts first, before decoding the running sequences, so a long
+    prompt is spread over several steps instead of stalling the decoding of the
+    others.
+
+    Args:
+        model (torch.nn.Module): The model optimized by ``ipex.optimize_transformers``.
+        max_batch_size (int): Max number of the sequences decoded together.
+        max_new_tokens (int): Default max number of the generated tokens per request.
+        block_size (int): Number of the tokens stored in a kv cache block.
+        num_blocks (int): Number of the kv cache blocks. The default value is
+            ``None``, meaning enough blocks for ``max_batch_size`` sequences of
+            ``config.max_position_embeddings`` tokens.
+        eos_token_id (int or List[int]): The end of sequence token ids. The default
+            value is ``None``, meaning ``model.generation_config.eos_token_id``.
+        logits_processor (LogitsProcessorList): Processors applied to the logits of
+            each sequence before the argmax.
+        prefill_chunk_size (int): Max number of the prompt tokens prefilled in a
+            step. The default value is ``None``, meaning the whole prompt is
+            prefilled once admitted.
+        kv_cache_dtype (torch.dtype): Data type of the kv cache, torch.int8 for the
+            quantized cache. The default value is ``None``, meaning the dtype of
+            the model, or the autocast dtype under autocast.
+
+    Examples:
+
+        >>> scheduler = ContinuousBatchingScheduler(optimized_model, max_batch_size=8)
+        >>> for prompt in prompts:
+        ...     scheduler.add_request(tokenizer(prompt).input_ids)
+        >>> outputs = scheduler.run_until_complete()
+    """
+
+    def __init__(
+        self,
+        model,
+        max_batch_size: int = 8,
+        max_new_tokens: int = 32,
+        block_size: int = 16,
+        num_blocks: Optional[int] = None,
+        eos_token_id: Optional[Union[int, List[int]]] = None,
+        logits_processor: Optional[LogitsProcessorList] = None,
+        prefill_chunk_size: Optional[int] = None,
+        kv_cache_dtype: Optional[torch.dtype] = None,
+    ):
+        self.model = model
+        config = model.config
+        self.use_position_ids = (
+            "position_ids" in inspect.signature(model.forward).parameters
+        )
+        model_family = get_model_family(config)
+        # OPT and ALiBi models derive the positions from the attention mask
+        if not (
+            self.use_position_ids
+            or (model_family is not None and model_family.attention == "opt")
+            or getattr(config, "alibi", False)
+        ):
+            raise ValueError(
+                "ContinuousBatchingScheduler requires a model taking position_ids "
+                "or deriving positions from attention_mask"
+            )
+        self.max_batch_size = max_batch_size
+        self.max_new_tokens = max_new_tokens
+        self.prefill_chunk_size = prefill_chunk_size
+        if num_blocks is None:
+            max_seq_len = (
+                config.max_position_embeddings
+                if hasattr(config, "max_position_embeddings")
+                else 2048
+            )
+            num_blocks = max_batch_size * -(-max_seq_len // block_size)
+        if kv_cache_dtype is None:
+            kv_cache_dtype = _get_kv_cache_dtype(model)
+        self.kv_cache = PagedKVCache.from_config(
+            config, num_blocks, block_size, kv_cache_dtype
+        )
+        if eos_token_id is None:
+            eos_token_id = model.generation_config.eos_token_id
+        if isinstance(eos_token_id, int):
+            eos_token_id = [eos_token_id]
+        self.eos_token_id = eos_token_id if eos_token_id is not None else []
+        self.logits_processor = (
+            logits_processor if logits_processor is not None else LogitsProcessorList()
+        )
+        self.waiting = deque()
+        self.running = []
+        self.finished = {}
+        self.next_request_id = 0
+
+    def add_request(
+        self,
+        input_ids: Union[torch.Tensor, List[int]],
+        max_new_tokens: Optional[int] = None,
+    ):
+        r"""
+        Queues a prompt and returns its request id.
+        """
+        if isinstance(input_ids, torch.Tensor):
+            input_ids = input_ids.view(-1).tolist()
+        request_id = self.next_request_id
+        self.next_request_id += 1
+        self.waiting.append(
+            _GenerationRequest(
+                request_id,
+                list(input_ids),
+                max_new_tokens if max_new_tokens is not None else self.max_new_tokens,
+            )
+        )
+        return request_id
+
+    def has_unfinished_requests(self):
+        return len(self.waiting) > 0 or len(self.running) > 0
+
+    def _forward(self, input_ids, attention_mask, position_ids, past_key_values):
+        model_inputs = {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "past_key_values": past_key_values,
+            "use_cache": True,
+            "return_dict": True,
+        }
+        if self.use_position_ids:
+            model_inputs["position_ids"] = position_ids
+        with torch.no_grad():
+            if hasattr(self.model, "trace_graph"):
+                model_inputs.pop("use_cache", None)
+                model_inputs.pop("return_dict", None)
+                trace_graph = _get_paged_trace_graph(self.model, model_inputs)
+                return trace_graph(**model_inputs)[0][:, -1, :]
+            outputs = self.model(**model_inputs)
+        return outputs.logits[:, -1, :]
+
+    def _next_tokens(self, requests, next_token_logits):
+        next_tokens = []
+        for i, request in enumerate(requests):
+            scores = self.logits_processor(
+                torch.tensor([request.token_ids]), next_token_logits[i : i + 1]
+            )
+            next_tokens.append(int(torch.argmax(scores, dim=-1)))
+        return next_tokens
+
+    def _append_token(self, request, next_token):
+        request.output_ids.append(next_token)
+        if (
+            next_token in self.eos_token_id
+            or len(request.output_ids) >= request.max_new_tokens
+        ):
+            request.finished = True
+
+    def _prefill(self, request, num_tokens: Optional[int] = None):
+        # prefills the next `num_tokens` tokens of the prompt, by default all of them
+        token_ids = request.token_ids
+        start = request.num_prefilled_tokens
+        end = len(token_ids) if num_tokens is None else start + num_tokens
+        past_key_values = self.kv_cache.get_past_key_values(
+            [request.request_id], end - start
+        )
+        next_token_logits = self._forward(
+            torch.tensor([token_ids[start:end]]),
+            torch.ones(1, end, dtype=torch.long),
+            torch.arange(start, end).unsqueeze(0),
+            past_key_values,
+        )
+        self.kv_cache.advance(request.request_id, end - start)
+        request.num_prefilled_tokens = end
+        if end == len(token_ids):
+            request.prefilled = True
+            self._append_token(
+                request, self._next_tokens([request], next_token_logits)[0]
+            )
+
+    def _prefill_chunks(self):
+        # the prompts closest to their first token go first, so the short prompts
+        # are not queued behind the long ones
+        requests = sorted(
+            [request for request in self.running if not request.prefilled],
+            key=lambda request: len(request.token_ids) - request.num_prefilled_tokens,
+        )
+        budget = self.prefill_chunk_size
+        for request in requests:
+            if budget == 0:
+                break
+            num_tokens = min(
+                budget, len(request.token_ids) - request.num_prefilled_tokens
+            )
+            self._prefill(request, num_tokens)
+            budget -= num_tokens
+
+    def _admit(self):
+        while self.waiting and len(self.running) < self.max_batch_size:
+            request = self.waiting[0]
+            num_tokens = len(request.token_ids)
+            # keep one more slot for the first decode step
+            if not self.kv_cache.can_append({request.request_id: num_tokens + 1}):
+                if not self.running:
+                    raise RuntimeError(
+                        "Out of KV cache blocks, please enlarge num_blocks to hold "
+                        f"a sequence of {num_tokens + 1} tokens"
+                    )
+                break
+            self.waiting.popleft()
+            self.kv_cache.add_sequence(request.request_id)
+            if self.prefill_chunk_size:
+                # hold the blocks of the whole prompt for the coming chunks
+                self.kv_cache.reserve(request.request_id, num_tokens)
+            else:
+                self._prefill(request)
+            self.running.append(request)
+
+    def _evict_finished(self):
+        running, finished_ids = [], []
+        for request in self.running:
+            if request.finished:
+                self.kv_cache.free_sequence(request.request_id)
+                self.finished[request.request_id] = torch.tensor(
+                    request.token_ids, dtype=torch.long
+                )
+                finished_ids.append(request.request_id)
+            else:
+                running.append(request)
+        self.running = running
+        return finished_ids
+
+    def _preempt(self):
+        # the latest admitted request goes back to the head of the waiting queue,
+        # its prompt and generated tokens are recomputed when it is re-admitted
+        request = self.running.pop()
+        self.kv_cache.free_sequence(request.request_id)
+        request.num_prefilled_tokens = 0
+        request.prefilled = False
+        self.waiting.appendleft(request)
+
+    def _decode(self):
+        while self.running and not self.kv_cache.can_append(
+            {request.request_id: 1 for request in self.running if request.prefilled}
+        ):
+            self._preempt()
+        requests = [request for request in self.running if request.prefilled]
+        if not requests:
+            return
+        seq_ids = [request.request_id for request in requests]
+        context_lens = [self.kv_cache.get_context_len(seq_id) for seq_id in seq_ids]
+        max_context_len = max(context_lens)
+        past_key_values = self.kv_cache.get_past_key_values(seq_ids, 1)
+        # the shorter sequences are padded on the left
+        attention_mask = torch.zeros(
+            len(seq_ids), max_context_len + 1, dtype=torch.long
+        )
+        for i, context_len in enumerate(context_lens):
+            attention_mask[i, max_context_len - context_len :] = 1
+        next_token_logits = self._forward(
+            torch.tensor([[request.token_ids[-1]] for request in requests]),
+            attention_mask,
+            torch.tensor(context_lens).unsqueeze(-1),
+            past_key_values,
+        )
+        for seq_id in seq_ids:
+            self.kv_cache.advance(seq_id, 1)
+        next_tokens = self._next_tokens(requests, next_token_logits)
+        for request, next_token in zip(requests, next_tokens):
+            self._append_token(request, next_token)
+
+    def step(self):
+        r"""
+        Runs one scheduling iteration: admits the waiting requests into the free
+        batch slots, prefills the next chunk of the admitted prompts if
+        ``prefill_chunk_size`` is set, decodes one token for every prefilled
+        sequence and evicts the finished ones. Returns the ids of the requests
+        finished in this step.
+        """
+        self._admit()
+        if self.prefill_chunk_size:
+            self._prefill_chunks()
+        finished_ids = self._evict_finished()
+        self._decode()
+        return finished_ids + self._evict_finished()
+
+    def get_output(self, request_id):
+        r"""
+        Returns the prompt and generated token ids of a finished request.
+        """
+        return self.finished.pop(request_id)
+
+    def run_until_complete(self):
+        r"""
+        Steps until all the queued requests finish, and returns a dict mapping the
+        request ids to their prompt and generated token ids.
+        """
+        outputs = {}
+        while self.has_unfinished_requests():
+            self.step()
+            outputs.update(self.finished)
+            self.finished.clear()
+        return outputs
@@ -1,4 +1,5 @@
 import torch
+from torch import nn
 import torch.distributed as dist
 import warnings
 from typing import Optional, Tuple, Union, List
@@ -10,7 +11,18 @@ from transformers.generation.logits_process import LogitsProcessorList
 from transformers.generation.streamers import BaseStreamer
 from transformers.utils import ModelOutput
 import time
-import re
+from ..model_family import get_model_family
+from .utils import (
+    _get_kv_cache_max_length,
+    _init_kv_cache,
+    _prefill_in_chunks,
+    _get_paged_trace_graph,
+    _get_fused_sampling_params,
+    _fused_sampling,
+)
+from .paged_kv_cache import _init_paged_kv_cache
+from .prefix_cache import _get_prefix_kv_cache
+from .profiler import _get_generation_profiler
 
 
 class GreedySearchDecoderOnlyOutput(ModelOutput):
@@ -35,6 +47,26 @@ GreedySearchOutput = Union[
 ]
 
 
+class SampleDecoderOnlyOutput(ModelOutput):
+    sequences: torch.LongTensor = None
+    scores: Optional[Tuple[torch.FloatTensor]] = None
+    attentions: Optional[Tuple[Tuple[torch.FloatTensor]]] = None
+    hidden_states: Optional[Tuple[Tuple[torch.FloatTensor]]] = None
+
+
+class SampleEncoderDecoderOutput(ModelOutput):
+    sequences: torch.LongTensor = None
+    scores: Optional[Tuple[torch.FloatTensor]] = None
+    encoder_attentions: Optional[Tuple[torch.FloatTensor]] = None
+    encoder_hidden_states: Optional[Tuple[torch.FloatTensor]] = None
+    decoder_attentions: Optional[Tuple[Tuple[torch.FloatTensor]]] = None
+    cross_attentions: Optional[Tuple[Tuple[torch.FloatTensor]]] = None
+    decoder_hidden_states: Optional[Tuple[Tuple[torch.FloatTensor]]] = None
+
+
+SampleOutput = Union[SampleEncoderDecoderOutput, SampleDecoderOnlyOutput]
+
+
 def _greedy_search(
     self,
     input_ids: torch.LongTensor,
@@ -49,11 +81,26 @@ def _greedy_search(
     return_dict_in_generate: Optional[bool] = None,
     synced_gpus: Optional[bool] = False,
     streamer: Optional["BaseStreamer"] = None,
+    logits_warper: Optional[LogitsProcessorList] = None,
+    do_sample: bool = False,
     **model_kwargs,
-) -> Union[GreedySearchOutput, torch.LongTensor]:
+) -> Union[GreedySearchOutput, SampleOutput, torch.LongTensor]:
     token_latency = (
         self.config.token_latency if hasattr(self.config, "token_latency") else False
     )
+    paged_kv_cache = (
+        self.config.paged_kv_cache if hasattr(self.config, "paged_kv_cache") else False
+    )
+    paged_cache = None
+    prefill_chunk_size = (
+        self.config.prefill_chunk_size
+        if hasattr(self.config, "prefill_chunk_size")
+        else None
+    )
+    # the prefix kv cache reuses the discrete kv_cache only
+    prefix_cache = None if paged_kv_cache else _get_prefix_kv_cache(self)
+    profiler = _get_generation_profiler(self)
+    model_family = get_model_family(self.config)
 
     latency_list = []
     logits_processor = (
@@ -69,6 +116,8 @@ def _greedy_search(
             UserWarning,
         )
         stopping_criteria = validate_stopping_criteria(stopping_criteria, max_length)
+    # size the kv_cache by the expected sequence length, it grows if exceeded
+    kv_cache_max_length = _get_kv_cache_max_length(self, input_ids, stopping_criteria)
     pad_token_id = (
         pad_token_id
         if pad_token_id is not None
@@ -106,6 +155,17 @@ def _greedy_search(
         if return_dict_in_generate is not None
         else self.generation_config.return_dict_in_generate
     )
+    logits_warper = (
+        logits_warper if logits_warper is not None else LogitsProcessorList()
+    )
+    # the fused sampling op replaces the processors, warpers and the draw, so the
+    # processed scores are not available with it
+    fused_sampling = (
+        self.config.fused_sampling if hasattr(self.config, "fused_sampling") else True
+    )
+    sampling_params = None
+    if do_sample and fused_sampling and not (return_dict_in_generate and output_scores):
+        sampling_params = _get_fused_sampling_params(logits_processor, logits_warper)
 
     # init attention / hidden states / scores tuples
     scores = () if (return_dict_in_generate and output_scores) else None
@@ -148,102 +208,49 @@ def _greedy_search(
             if this_peer_finished_flag.item() == 0.0:
                 break
 
+        if profiler is not None:
+            profiler.step_begin(
+                "prefill" if model_kwargs.get("past_key_values") is None else "decode"
+            )
         # prepare model inputs
         model_inputs = self.prepare_inputs_for_generation(input_ids, **model_kwargs)
-        if (
-            re.search("GPTJ", self.config.architectures[0])
-            or re.search("llama", self.config.architectures[0], re.IGNORECASE)
-            or re.search("gptneox", self.config.architectures[0], re.IGNORECASE)
-            or re.search("OPT", self.config.architectures[0], re.IGNORECASE)
-            or re.search("falcon", self.config.architectures[0], re.IGNORECASE)
-            or re.search("rw", self.config.architectures[0], re.IGNORECASE)
-        ):
+        if profiler is not None:
+            profiler.lap("prepare_inputs")
+        if model_family is not None:
             first_token = False
             input_bs = input_ids.size()[0]
             if model_inputs["past_key_values"] is None:
                 first_token = True
-            if first_token:
-                if re.search("GPTJ", self.config.architectures[0]):
-                    beam_idx_tmp = torch.zeros(
-                        (2048, int(input_bs)), dtype=torch.long
-                    ).contiguous()
-                    model_inputs["past_key_values"] = tuple(
-                        [
-                            (
-                                torch.zeros(1, 0, 0, 1, dtype=torch.long).contiguous(),
-                                torch.zeros([1, 1, 1, 1]).contiguous(),
-                                torch.zeros([1, 1, 1, 1]).contiguous(),
-                                beam_idx_tmp,
-                            )
-                            for i in range(self.config.n_layer)
-                        ]
-                    )
-                elif re.search("llama", self.config.architectures[0], re.IGNORECASE):
-                    beam_idx_tmp = torch.zeros(
-                        (2048, int(input_bs)), dtype=torch.long
-                    ).contiguous()
-                    model_inputs["past_key_values"] = tuple(
-                        [
-                            (
-                                torch.zeros(1, 0, 0, 1, dtype=torch.long).contiguous(),
-                                torch.zeros([1, 1, 1, 1]).contiguous(),
-                                torch.zeros([1, 1, 1, 1]).contiguous(),
-                                beam_idx_tmp,
-                            )
-                            for i in range(self.config.num_hidden_layers)
-                        ]
-                    )
-                elif re.search("gptneox", self.config.architectures[0], re.IGNORECASE):
-                    beam_idx_tmp = torch.zeros(
-                        (2048, int(input_bs)), dtype=torch.long
-                    ).contiguous()
-                    model_inputs["past_key_values"] = tuple(
-                        [
-                            (
-                                torch.zeros(1, 0, 0, 1, dtype=torch.long).contiguous(),
-                                torch.zeros([1, 1, 1, 1]).contiguous(),
-                                torch.zeros([1, 1, 1, 1]).contiguous(),
-                                beam_idx_tmp,
-                            )
-                            for i in range(self.config.num_hidden_layers)
-                        ]
+            if paged_kv_cache:
+                if first_token:
+                    paged_cache = _init_paged_kv_cache(
+                        self, input_bs, kv_cache_max_length
                     )
-                elif re.search("OPT", self.config.architectures[0], re.IGNORECASE):
-                    beam_idx_tmp = torch.zeros(
-                        (2048, int(input_bs)), dtype=torch.long
-                    ).contiguous()
-                    model_inputs["past_key_values"] = tuple(
-                        [
-                            (
-                                torch.zeros(1, 0, 0, 1, dtype=torch.long).contiguous(),
-                                torch.zeros([1, 1, 1, 1]).contiguous(),
-                                torch.zeros([1, 1, 1, 1]).contiguous(),
-                                beam_idx_tmp,
-                            )
-                            for i in range(self.config.num_hidden_layers)
-                        ]
-                    )
-                elif re.search(
-                    "falcon", self.config.architectures[0], re.IGNORECASE
-                ) or re.search("rw", self.config.architectures[0], re.IGNORECASE):
-                    beam_idx_tmp = torch.zeros(
-                        (2048, int(input_bs)), dtype=torch.long
-                    ).contiguous()
-                    model_inputs["past_key_values"] = tuple(
-                        [
-                            (
-                                torch.zeros(1, 0, 0, 1, dtype=torch.long).contiguous(),
-                                torch.zeros([1, 1, 1, 1]).contiguous(),
-                                torch.zeros([1, 1, 1, 1]).contiguous(),
-                                beam_idx_tmp,
-                            )
-                            for i in range(self.config.num_hidden_layers)
-                        ]
+                seq_ids = list(range(input_bs))
+                if first_token and prefill_chunk_size:
+                    _prefill_in_chunks(
+                        self, model_inputs, prefill_chunk_size, paged_cache
                     )
+                num_new_tokens = model_inputs["input_ids"].shape[-1]
+                model_inputs["past_key_values"] = paged_cache.get_past_key_values(
+                    seq_ids, num_new_tokens
+                )
+            elif first_token:
+                model_inputs["past_key_values"] = _init_kv_cache(
+                    self, input_bs, kv_cache_max_length
+                )
+            if first_token and prefix_cache is not None:
+                prefix_cache.resume(self, model_inputs)
+            if first_token and prefill_chunk_size and not paged_kv_cache:
+                _prefill_in_chunks(self, model_inputs, prefill_chunk_size)
             if hasattr(self, "trace_graph"):
                 model_inputs.pop("use_cache", None)
                 model_inputs.pop("token_type_ids", None)
-                outputs = self.trace_graph(**model_inputs)
+                if paged_kv_cache:
+                    trace_graph = _get_paged_trace_graph(self, model_inputs)
+                else:
+                    trace_graph = self.trace_graph
+                outputs = trace_graph(**model_inputs)
                 if synced_gpus and this_peer_finished:
                     cur_len = cur_len + 1
                     continue  # don't waste resources running the code we don't need
@@ -259,6 +266,16 @@ def _greedy_search(
                     cur_len = cur_len + 1
                     continue  # don't waste resources running the code we don't need
                 next_token_logits = outputs.logits[:, -1, :]
+            if paged_kv_cache:
+                for seq_id in seq_ids:
+                    paged_cache.advance(seq_id, num_new_tokens)
+            if first_token and prefix_cache is not None:
+                prefix_cache.update(
+                    self,
+                    input_ids,
+                    model_kwargs.get("attention_mask", None),
+                    self._extract_past_from_model_output(outputs),
+                )
         else:
             outputs = self(
                 **model_inputs,
@@ -271,8 +288,15 @@ def _greedy_search(
                 continue  # don't waste resources running the code we don't need
             next_token_logits = outputs.logits[:, -1, :]
 
+        if profiler is not None:
+            profiler.lap("forward")
         # pre-process distribution
-        next_tokens_scores = logits_processor(input_ids, next_token_logits)
+        if sampling_params is None:
+            next_tokens_scores = logits_processor(input_ids, next_token_logits)
+            if do_sample:
+                next_tokens_scores = logits_warper(input_ids, next_tokens_scores)
+        if profiler is not None:
+            profiler.lap("logits_processor")
 
         # Store scores, attentions and hidden_states when required
         if return_dict_in_generate:
@@ -294,8 +318,14 @@ def _greedy_search(
                     else (outputs.hidden_states,)
                 )
 
-        # argmax
-        next_tokens = torch.argmax(next_tokens_scores, dim=-1)
+        if sampling_params is not None:
+            next_tokens = _fused_sampling(input_ids, next_token_logits, sampling_params)
+        elif do_sample:
+            probs = nn.functional.softmax(next_tokens_scores, dim=-1)
+            next_tokens = torch.multinomial(probs, num_samples=1).squeeze(1)
+        else:
+            # argmax
+            next_tokens = torch.argmax(next_tokens_scores, dim=-1)
 
         # finished sentences should have their next token be a padding token
         if eos_token_id is not None:
@@ -307,6 +337,8 @@ def _greedy_search(
                 1 - unfinished_sequences
             )
 
+        if profiler is not None:
+            profiler.lap("sampling")
         # update generated ids, model inputs, and length for next step
         input_ids = torch.cat([input_ids, next_tokens[:, None]], dim=-1)
         if streamer is not None:
@@ -314,6 +346,8 @@ def _greedy_search(
         model_kwargs = self._update_model_kwargs_for_generation(
             outputs, model_kwargs, is_encoder_decoder=self.config.is_encoder_decoder
         )
+        if profiler is not None:
+            profiler.lap("update_model_kwargs")
 
         # if eos_token was found in one sentence, set sentence to finished
         if eos_token_id_tensor is not None:
@@ -325,6 +359,10 @@ def _greedy_search(
 
         # stop when each sentence is finished, or if we exceed the maximum length
         latency_list.append(time.time() - tic)
+        if profiler is not None:
+            profiler.step_end(
+                input_ids.shape[0], model_kwargs.get("past_key_values", None)
+            )
         if unfinished_sequences.max() == 0 or stopping_criteria(input_ids, scores):
             if not synced_gpus:
                 break
@@ -336,7 +374,12 @@ def _greedy_search(
 
     if return_dict_in_generate:
         if self.config.is_encoder_decoder:
-            output_result = GreedySearchEncoderDecoderOutput(
+            output_cls = (
+                SampleEncoderDecoderOutput
+                if do_sample
+                else GreedySearchEncoderDecoderOutput
+            )
+            output_result = output_cls(
                 sequences=input_ids,
                 scores=scores,
                 encoder_attentions=encoder_attentions,
@@ -346,7 +389,10 @@ def _greedy_search(
                 decoder_hidden_states=decoder_hidden_states,
             )
         else:
-            output_result = GreedySearchDecoderOnlyOutput(
+            output_cls = (
+                SampleDecoderOnlyOutput if do_sample else GreedySearchDecoderOnlyOutput
+            )
+            output_result = output_cls(
                 sequences=input_ids,
                 scores=scores,
                 attentions=decoder_attentions,
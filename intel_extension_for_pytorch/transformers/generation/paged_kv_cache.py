@@ -0,0 +1,234 @@
+import torch
+from typing import List, Optional
+
+
+class _BlockAllocator:
+    r"""
+    Free-list allocator of the fixed-size key/value cache blocks.
+    """
+
+    def __init__(self, num_blocks: int):
+        self.num_blocks = num_blocks
+        # blocks are popped from the tail, so the lower block ids go first
+        self.free_blocks = list(range(num_blocks - 1, -1, -1))
+
+    def num_free_blocks(self):
+        return len(self.free_blocks)
+
+    def allocate(self):
+        if len(self.free_blocks) == 0:
+            raise RuntimeError(
+                "Out of KV cache blocks, please enlarge kv_cache_num_blocks"
+            )
+        return self.free_blocks.pop()
+
+    def free(self, block_id: int):
+        self.free_blocks.append(block_id)
+
+
+def _get_kv_cache_shape(config):
+    r"""
+    Returns (num_layers, num_kv_heads, head_size) of the decoder layers.
+    """
+    num_layers = config.num_hidden_layers
+    num_heads = config.num_attention_heads
+    head_size = config.hidden_size // num_heads
+    num_kv_heads = num_heads
+    if hasattr(config, "num_key_value_heads"):
+        num_kv_heads = config.num_key_value_heads
+    elif getattr(config, "multi_query", False) and not getattr(
+        config, "new_decoder_architecture", False
+    ):
+        num_kv_heads = 1
+    return num_layers, num_kv_heads, head_size
+
+
+class PagedKVCache(object):
+    r"""
+    Key/value cache of all the decoder layers, stored in fixed-size blocks.
+
+    Each layer owns a key pool and a value pool of shape
+    [num_blocks, block_size, num_kv_heads, head_size]. A sequence gets a
+    block table mapping its logical blocks to the physical ones, and the blocks
+    are only allocated when the sequence grows into them, so the memory is
+    proportional to the tokens actually cached instead of the max length.
+
+    With ``dtype=torch.int8``, each head of a token is quantized with its own
+    symmetric scale when written by the attention and dequantized when read, and
+    the scales are kept in the key/value scale pools of shape
+    [num_blocks, block_size, num_kv_heads].
+
+    Args:
+        num_layers (int): Number of the decoder layers.
+        num_blocks (int): Number of the blocks in each pool.
+        block_size (int): Number of the tokens stored in a block.
+        num_kv_heads (int): Number of the key/value heads.
+        head_size (int): Size of each attention head.
+        dtype (torch.dtype): Data type of the key/value cache, the activation dtype
+            or torch.int8.
+    """
+
+    def __init__(
+        self,
+        num_layers: int,
+        num_blocks: int,
+        block_size: int,
+        num_kv_heads: int,
+        head_size: int,
+        dtype: torch.dtype = torch.float,
+    ):
+        self.num_layers = num_layers
+        self.num_blocks = num_blocks
+        self.block_size = block_size
+        self.key_caches = [
+            torch.empty(num_blocks, block_size, num_kv_heads, head_size, dtype=dtype)
+            for _ in range(num_layers)
+        ]
+        self.value_caches = [
+            torch.empty(num_blocks, block_size, num_kv_heads, head_size, dtype=dtype)
+            for _ in range(num_layers)
+        ]
+        self.key_scales, self.value_scales = None, None
+        if dtype == torch.int8:
+            self.key_scales = [
+                torch.zeros(num_blocks, block_size, num_kv_heads)
+                for _ in range(num_layers)
+            ]
+            self.value_scales = [
+                torch.zeros(num_blocks, block_size, num_kv_heads)
+                for _ in range(num_layers)
+            ]
+        self.allocator = _BlockAllocator(num_blocks)
+        self.block_tables = {}
+        self.context_lens = {}
+
+    @classmethod
+    def from_config(
+        cls,
+        config,
+        num_blocks: int,
+        block_size: int = 16,
+        dtype: torch.dtype = torch.float,
+    ):
+        num_layers, num_kv_heads, head_size = _get_kv_cache_shape(config)
+        return cls(num_layers, num_blocks, block_size, num_kv_heads, head_size, dtype)
+
+    def num_free_blocks(self):
+        return self.allocator.num_free_blocks()
+
+    def num_required_blocks(self, seq_id, num_tokens: int):
+        r"""
+        Number of the new blocks needed to append `num_tokens` to `seq_id`.
+        """
+        context_len = self.context_lens.get(seq_id, 0)
+        num_blocks = len(self.block_tables.get(seq_id, []))
+        total_blocks = -(-(context_len + num_tokens) // self.block_size)
+        return max(total_blocks - num_blocks, 0)
+
+    def can_append(self, num_tokens_per_seq: dict):
+        return self.num_free_blocks() >= sum(
+            self.num_required_blocks(seq_id, num_tokens)
+            for seq_id, num_tokens in num_tokens_per_seq.items()
+        )
+
+    def add_sequence(self, seq_id):
+        assert seq_id not in self.block_tables, f"Sequence {seq_id} already exists"
+        self.block_tables[seq_id] = []
+        self.context_lens[seq_id] = 0
+
+    def free_sequence(self, seq_id):
+        for block_id in self.block_tables.pop(seq_id):
+            self.allocator.free(block_id)
+        self.context_lens.pop(seq_id)
+
+    def reserve(self, seq_id, num_tokens: int):
+        r"""
+        Allocates the blocks for the next `num_tokens` tokens of `seq_id`.
+        """
+        for _ in range(self.num_required_blocks(seq_id, num_tokens)):
+            self.block_tables[seq_id].append(self.allocator.allocate())
+
+    def advance(self, seq_id, num_tokens: int):
+        r"""
+        Marks the reserved `num_tokens` slots of `seq_id` as written.
+        """
+        self.context_lens[seq_id] += num_tokens
+
+    def get_context_len(self, seq_id):
+        return self.context_lens[seq_id]
+
+    def get_past_key_values(self, seq_ids: List, num_tokens: Optional[int] = 1):
+        r"""
+        Reserves `num_tokens` slots for each sequence in `seq_ids` and returns the
+        `past_key_values` feeding the next forward of these sequences, one
+        (seq_info, key_cache, value_cache, block_tables, context_lens) tuple per layer,
+        followed by (key_scale, value_scale) for the int8 cache. The size(-2) of
+        `seq_info` is the longest context length in the batch as the models take it
+        as the past length.
+        """
+        for seq_id in seq_ids:
+            self.reserve(seq_id, num_tokens)
+        max_num_blocks = max(len(self.block_tables[seq_id]) for seq_id in seq_ids)
+        block_tables = torch.zeros(len(seq_ids), max_num_blocks, dtype=torch.long)
+        for i, seq_id in enumerate(seq_ids):
+            table = self.block_tables[seq_id]
+            block_tables[i, : len(table)] = torch.tensor(table, dtype=torch.long)
+        context_lens = torch.tensor(
+            [self.context_lens[seq_id] for seq_id in seq_ids], dtype=torch.long
+        )
+        max_context_len = int(context_lens.max())
+        seq_info = torch.zeros(1, 1, 1, 1, dtype=torch.long).expand(
+            1, max_context_len, max_context_len, 1
+        )
+        return tuple(
+            (
+                seq_info,
+                self.key_caches[i],
+                self.value_caches[i],
+                block_tables,
+                context_lens,
+            )
+            + (
+                (self.key_scales[i], self.value_scales[i])
+                if self.key_scales is not None
+                else ()
+            )
+            for i in range(self.num_layers)
+        )
+
+
+def _get_kv_cache_dtype(model):
+    # the key/value follow the autocast dtype if generating under autocast
+    return (
+        torch.get_autocast_cpu_dtype()
+        if torch.is_autocast_cpu_enabled()
+        else model.dtype
+    )
+
+
+def _init_paged_kv_cache(model, batch_size, max_length):
+    r"""
+    Creates the paged kv cache for `batch_size` sequences of `model.generate()`.
+    The block size and the number of blocks are taken from
+    `config.kv_cache_block_size` and `config.kv_cache_num_blocks`; the latter
+    defaults to the blocks needed by the whole batch at `max_length`. Setting
+    `config.kv_cache_dtype` to torch.int8 quantizes the cache.
+    """
+    config = model.config
+    block_size = (
+        config.kv_cache_block_size if hasattr(config, "kv_cache_block_size") else 16
+    )
+    num_blocks = (
+        config.kv_cache_num_blocks if hasattr(config, "kv_cache_num_blocks") else None
+    )
+    if num_blocks is None:
+        num_blocks = batch_size * -(-max_length // block_size)
+    dtype = (
+        config.kv_cache_dtype
+        if hasattr(config, "kv_cache_dtype")
+        else _get_kv_cache_dtype(model)
+    )
+    paged_cache = PagedKVCache.from_config(config, num_blocks, block_size, dtype)
+    for seq_id in range(batch_size):
+        paged_cache.add_sequence(seq_id)
+    return paged_cache
@@ -0,0 +1,206 @@
+import torch
+from collections import OrderedDict
+from typing import List
+from .paged_kv_cache import _get_kv_cache_dtype
+
+
+class _PrefixEntry(object):
+    def __init__(self, token_ids: List[int], key_values, dtype, index_keys):
+        self.token_ids = token_ids
+        # per layer (key, value) of shape [prompt_len, num_kv_heads, head_size]
+        self.key_values = key_values
+        self.dtype = dtype
+        self.index_keys = index_keys
+        self.nbytes = sum(
+            key.element_size() * key.numel() + value.element_size() * value.numel()
+            for key, value in key_values
+        )
+
+
+class PrefixKVCache(object):
+    r"""
+    LRU cache of the prompt key/value of ``model.generate()``, so that the prompts
+    sharing a prefix with a previous one, e.g., the same system prompt, only
+    compute the first token for the tokens after the shared prefix.
+
+    The key/value of a prompt is stored once; it is indexed by the hashes of its
+    prefixes at every ``block_size`` tokens and of the whole prompt, and a new
+    prompt resumes from the longest indexed prefix it starts with. The least
+    recently used prompts are evicted when the stored key/value exceed
+    ``max_bytes``.
+
+    The cache is created per model by ``_get_prefix_kv_cache`` when
+    ``config.prefix_kv_cache`` is set, and bounded by
+    ``config.prefix_kv_cache_max_bytes``.
+
+    Args:
+        max_bytes (int): Max bytes of the stored key/value.
+        block_size (int): Granularity of the reusable prefix lengths.
+    """
+
+    def __init__(self, max_bytes: int = 1 << 30, block_size: int = 16):
+        self.max_bytes = max_bytes
+        self.block_size = block_size
+        self.entries = OrderedDict()
+        # (dtype, prefix_len, prefix_hash) -> entry id
+        self.index = {}
+        self.nbytes = 0
+        self.next_entry_id = 0
+        self.num_hits = 0
+        self.num_misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        self.entries.clear()
+        self.index.clear()
+        self.nbytes = 0
+
+    def _prefix_hashes(self, token_ids: List[int]):
+        # chained hash of the prefixes ending at every block boundary and at the end
+        hashes = []
+        prefix_hash = 0
+        for start in range(0, len(token_ids), self.block_size):
+            end = min(start + self.block_size, len(token_ids))
+            prefix_hash = hash((prefix_hash, tuple(token_ids[start:end])))
+            hashes.append((end, prefix_hash))
+        return hashes
+
+    def lookup(self, token_ids: List[int], dtype: torch.dtype):
+        r"""
+        Returns (prefix_len, key_values) of the longest cached prefix of
+        `token_ids`, or (0, None) if there is none.
+        """
+        for prefix_len, prefix_hash in reversed(self._prefix_hashes(token_ids)):
+            entry_id = self.index.get((dtype, prefix_len, prefix_hash), None)
+            if entry_id is None:
+                continue
+            entry = self.entries[entry_id]
+            # guard against the hash collisions
+            if entry.token_ids[:prefix_len] != token_ids[:prefix_len]:
+                continue
+            self.entries.move_to_end(entry_id)
+            self.num_hits += 1
+            return prefix_len, entry.key_values
+        self.num_misses += 1
+        return 0, None
+
+    def insert(self, token_ids: List[int], key_values, dtype: torch.dtype):
+        r"""
+        Stores the per layer (key, value) of shape [len(token_ids), num_kv_heads,
+        head_size] computed for the prompt `token_ids`.
+        """
+        prefix_hashes = self._prefix_hashes(token_ids)
+        full_key = (dtype,) + prefix_hashes[-1]
+        entry_id = self.index.get(full_key, None)
+        if entry_id is not None and self.entries[entry_id].token_ids == token_ids:
+            self.entries.move_to_end(entry_id)
+            return
+        index_keys = [(dtype,) + prefix_hash for prefix_hash in prefix_hashes]
+        entry = _PrefixEntry(list(token_ids), key_values, dtype, index_keys)
+        if entry.nbytes > self.max_bytes:
+            return
+        while self.entries and self.nbytes + entry.nbytes > self.max_bytes:
+            self._evict()
+        entry_id = self.next_entry_id
+        self.next_entry_id += 1
+        self.entries[entry_id] = entry
+        self.nbytes += entry.nbytes
+        # the shared prefixes point to the latest prompt
+        for index_key in index_keys:
+            self.index[index_key] = entry_id
+
+    def _evict(self):
+        entry_id, entry = self.entries.popitem(last=False)
+        self.nbytes -= entry.nbytes
+        for index_key in entry.index_keys:
+            if self.index.get(index_key, None) == entry_id:
+                self.index.pop(index_key)
+                # keep the prefix reachable through an older prompt sharing it
+                for other_id, other in reversed(self.entries.items()):
+                    if index_key in other.index_keys:
+                        self.index[index_key] = other_id
+                        break
+
+    def resume(self, model, model_inputs):
+        r"""
+        Rewrites the first token `model_inputs` of `model.generate()` to start
+        from the longest cached prefix shared by all the prompts of the batch:
+        `input_ids` and `position_ids` keep the tokens after the prefix, and the
+        discrete kv_cache in `past_key_values` is seeded with the cached prefix.
+        Returns the length of the reused prefix.
+        """
+        input_ids = model_inputs["input_ids"]
+        attention_mask = model_inputs.get("attention_mask", None)
+        token_ids = input_ids[0].tolist()
+        prefix_len, key_values = self.lookup(token_ids, _get_kv_cache_dtype(model))
+        # at least one token is computed to get the logits of the next token
+        prefix_len = min(prefix_len, len(token_ids) - 1)
+        if prefix_len <= 0:
+            return 0
+        if not (input_ids[:, :prefix_len] == input_ids[:1, :prefix_len]).all():
+            return 0
+        # the left padded prompts do not start at position 0
+        if attention_mask is not None and not attention_mask[:, :prefix_len].all():
+            return 0
+
+        bs = input_ids.size(0)
+        beam_idx = model_inputs["past_key_values"][0][3]
+        capacity, beam_batch = beam_idx.shape
+        beam_size = beam_batch // bs
+        # the first token writes the kv_cache of the first beam of each batch
+        beam_idx = (
+            (torch.arange(beam_batch) // beam_size * beam_size)
+            .expand(capacity, beam_batch)
+            .contiguous()
+        )
+        seq_info = torch.zeros(1, 1, 1, 1, dtype=torch.long).expand(
+            1, prefix_len, prefix_len, 1
+        )
+        past_key_values = []
+        for key, value in key_values:
+            key_cache = key.new_zeros((capacity, beam_batch) + key.shape[1:])
+            value_cache = value.new_zeros((capacity, beam_batch) + value.shape[1:])
+            key_cache[:prefix_len, ::beam_size] = key[:prefix_len].unsqueeze(1)
+            value_cache[:prefix_len, ::beam_size] = value[:prefix_len].unsqueeze(1)
+            past_key_values.append((seq_info, key_cache, value_cache, beam_idx))
+        model_inputs["past_key_values"] = tuple(past_key_values)
+        model_inputs["input_ids"] = input_ids[:, prefix_len:]
+        if model_inputs.get("position_ids", None) is not None:
+            model_inputs["position_ids"] = model_inputs["position_ids"][:, prefix_len:]
+        return prefix_len
+
+    def update(self, model, input_ids, attention_mask, past_key_values):
+        r"""
+        Stores the kv_cache of the first prompt of the batch after the first token.
+        """
+        if attention_mask is not None and not attention_mask[0].all():
+            return
+        prompt_len = input_ids.size(-1)
+        key_values = [
+            (
+                layer_past[1][:prompt_len, 0].clone(),
+                layer_past[2][:prompt_len, 0].clone(),
+            )
+            for layer_past in past_key_values
+        ]
+        self.insert(input_ids[0].tolist(), key_values, _get_kv_cache_dtype(model))
+
+
+def _get_prefix_kv_cache(model):
+    r"""
+    Returns the prefix kv cache of `model` if `config.prefix_kv_cache` is set. The
+    cache lives on the model, so the key/value are never shared across models.
+    """
+    config = model.config
+    if not (config.prefix_kv_cache if hasattr(config, "prefix_kv_cache") else False):
+        return None
+    if not hasattr(model, "prefix_kv_cache"):
+        max_bytes = (
+            config.prefix_kv_cache_max_bytes
+            if hasattr(config, "prefix_kv_cache_max_bytes")
+            else 1 << 30
+        )
+        setattr(model, "prefix_kv_cache", PrefixKVCache(max_bytes))  # noqa: B010
+    return model.prefix_kv_cache
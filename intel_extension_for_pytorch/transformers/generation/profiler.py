@@ -0,0 +1,193 @@
+import json
+import os
+import time
+from collections import deque
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[int(round(q / 100.0 * (len(sorted_values) - 1)))]
+
+
+def _kv_cache_bytes(past_key_values):
+    # the key/value (and int8 scales) of all the layers, the shared pools of
+    # the paged kv cache are counted once
+    if past_key_values is None:
+        return 0
+    tensors = {}
+    for layer_past in past_key_values:
+        # (seq_info, key, value, beam_idx or block_tables, ...) of the ipex kv_cache
+        indices = [1, 2, 5, 6] if len(layer_past) >= 4 else range(len(layer_past))
+        for i in indices:
+            if i < len(layer_past):
+                t = layer_past[i]
+                tensors[t.data_ptr()] = t.element_size() * t.numel()
+    return sum(tensors.values())
+
+
+class GenerationProfiler(object):
+    r"""
+    Per-step instrumentation of ``model.generate()`` for the models optimized by
+    ``ipex.optimize_transformers``.
+
+    Each step of greedy or beam search is recorded with its phase (``prefill``
+    for the first token, ``decode`` for the others) and the time spent in
+    ``prepare_inputs``, ``forward``, ``logits_processor``, ``sampling`` and
+    ``update_model_kwargs``, together with the number of the generated tokens
+    and the bytes of the kv_cache. Only the latest ``max_records`` steps are
+    kept, and the aggregated counters (p50/p99 step latency, tokens/s) only
+    need a few ``time.perf_counter()`` calls per step, so the profiler can stay
+    on in production.
+
+    It is enabled by setting ``config.generation_profiler = True`` and lives on
+    the model as ``model.generation_profiler``.
+
+    Args:
+        max_records (int): Number of the latest steps kept for the percentiles
+            and the export.
+
+    Examples:
+
+        >>> model.config.generation_profiler = True
+        >>> model.generate(input_ids, max_new_tokens=32)
+        >>> print(model.generation_profiler.summary())
+        >>> model.generation_profiler.export_chrome_trace("generate_trace.json")
+    """
+
+    sections = [
+        "prepare_inputs",
+        "forward",
+        "logits_processor",
+        "sampling",
+        "update_model_kwargs",
+    ]
+
+    def __init__(self, max_records: int = 4096):
+        self.max_records = max_records
+        self.records = deque(maxlen=max_records)
+        self.reset()
+
+    def reset(self):
+        self.records.clear()
+        self.num_steps = {"prefill": 0, "decode": 0}
+        self.num_tokens = {"prefill": 0, "decode": 0}
+        self.total_time = {"prefill": 0.0, "decode": 0.0}
+        self._record = None
+        self._last = None
+
+    def step_begin(self, phase: str):
+        now = time.perf_counter()
+        self._record = {"phase": phase, "start": now}
+        self._last = now
+
+    def lap(self, section: str):
+        r"""
+        Accounts the time since the previous lap of the step to `section`.
+        """
+        now = time.perf_counter()
+        self._record[section] = self._record.get(section, 0.0) + now - self._last
+        self._last = now
+
+    def step_end(self, num_tokens: int, past_key_values=None):
+        record = self._record
+        record["latency"] = time.perf_counter() - record["start"]
+        record["num_tokens"] = num_tokens
+        record["kv_cache_bytes"] = _kv_cache_bytes(past_key_values)
+        phase = record["phase"]
+        self.num_steps[phase] += 1
+        self.num_tokens[phase] += num_tokens
+        self.total_time[phase] += record["latency"]
+        self.records.append(record)
+        self._record = None
+
+    def summary(self):
+        r"""
+        Returns the aggregated counters of each phase: the number of steps and
+        tokens, p50/p99/mean step latency in ms over the kept records, and the
+        tokens/s over all the steps.
+        """
+        summary = {}
+        for phase in ["prefill", "decode"]:
+            latencies = sorted(
+                record["latency"] for record in self.records if record["phase"] == phase
+            )
+            total_time = self.total_time[phase]
+            summary[phase] = {
+                "steps": self.num_steps[phase],
+                "tokens": self.num_tokens[phase],
+                "p50_ms": _percentile(latencies, 50) * 1000,
+                "p99_ms": _percentile(latencies, 99) * 1000,
+                "mean_ms": sum(latencies) * 1000 / max(len(latencies), 1),
+                "tokens_per_s": self.num_tokens[phase] / total_time
+                if total_time > 0
+                else 0.0,
+            }
+        return summary
+
+    def export_json(self, path: str):
+        r"""
+        Writes the summary and the kept step records into a JSON file.
+        """
+        with open(path, "w") as f:
+            json.dump(
+                {"summary": self.summary(), "records": list(self.records)}, f, indent=2
+            )
+
+    def export_chrome_trace(self, path: str):
+        r"""
+        Writes the kept step records as a Chrome trace (chrome://tracing or
+        Perfetto), one event per step with its sections nested inside.
+        """
+        events = []
+        pid = os.getpid()
+        for step, record in enumerate(self.records):
+            start_us = record["start"] * 1e6
+            events.append(
+                {
+                    "name": record["phase"],
+                    "cat": "generation",
+                    "ph": "X",
+                    "ts": start_us,
+                    "dur": record["latency"] * 1e6,
+                    "pid": pid,
+                    "tid": 0,
+                    "args": {
+                        "step": step,
+                        "num_tokens": record["num_tokens"],
+                        "kv_cache_bytes": record["kv_cache_bytes"],
+                    },
+                }
+            )
+            ts = start_us
+            for section in self.sections:
+                if section not in record:
+                    continue
+                events.append(
+                    {
+                        "name": section,
+                        "cat": record["phase"],
+                        "ph": "X",
+                        "ts": ts,
+                        "dur": record[section] * 1e6,
+                        "pid": pid,
+                        "tid": 0,
+                    }
+                )
+                ts += record[section] * 1e6
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+def _get_generation_profiler(model):
+    r"""
+    Returns the profiler of `model` if `config.generation_profiler` is set.
+    """
+    config = model.config
+    if not (
+        config.generation_profiler if hasattr(config, "generation_profiler") else False
+    ):
+        return None
+    if not hasattr(model, "generation_profiler"):
+        setattr(model, "generation_profiler", GenerationProfiler())  # noqa: B010
+    return model.generation_profiler
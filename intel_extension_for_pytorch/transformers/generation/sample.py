@@ -0,0 +1,50 @@
+import torch
+from typing import Optional, Union, List
+from transformers.generation.stopping_criteria import StoppingCriteriaList
+from transformers.generation.logits_process import LogitsProcessorList
+from transformers.generation.streamers import BaseStreamer
+from .greedy_search import _greedy_search
+
+
+def _sample(
+    self,
+    input_ids: torch.LongTensor,
+    logits_processor: Optional[LogitsProcessorList] = None,
+    stopping_criteria: Optional[StoppingCriteriaList] = None,
+    logits_warper: Optional[LogitsProcessorList] = None,
+    max_length: Optional[int] = None,
+    pad_token_id: Optional[int] = None,
+    eos_token_id: Optional[Union[int, List[int]]] = None,
+    output_attentions: Optional[bool] = None,
+    output_hidden_states: Optional[bool] = None,
+    output_scores: Optional[bool] = None,
+    return_dict_in_generate: Optional[bool] = None,
+    synced_gpus: bool = False,
+    streamer: Optional["BaseStreamer"] = None,
+    **model_kwargs,
+):
+    r"""
+    Multinomial sampling of ``model.generate(do_sample=True)`` on the kv_cache of
+    the greedy search. If the logits processors and warpers are only a repetition
+    penalty, temperature, top-k and top-p, they are applied together with the draw
+    of the next token by ``torch.ops.torch_ipex.fused_sampling``; set
+    ``config.fused_sampling = False`` to apply them one by one as transformers does.
+    """
+    return _greedy_search(
+        self,
+        input_ids,
+        logits_processor=logits_processor,
+        stopping_criteria=stopping_criteria,
+        max_length=max_length,
+        pad_token_id=pad_token_id,
+        eos_token_id=eos_token_id,
+        output_attentions=output_attentions,
+        output_hidden_states=output_hidden_states,
+        output_scores=output_scores,
+        return_dict_in_generate=return_dict_in_generate,
+        synced_gpus=synced_gpus,
+        streamer=streamer,
+        logits_warper=logits_warper,
+        do_sample=True,
+        **model_kwargs,
+    )
@@ -1,4 +1,12 @@
+import torch
+from transformers.generation.logits_process import (
+    RepetitionPenaltyLogitsProcessor,
+    TemperatureLogitsWarper,
+    TopKLogitsWarper,
+    TopPLogitsWarper,
+)
 from transformers.utils import ModelOutput
+from ..model_family import get_model_family
 
 
 def _extract_past_from_model_output(
@@ -22,3 +30,170 @@ def _extract_past_from_model_output(
             past_key_values, batch_size=batch_size
         )
     return past_key_values
+
+
+def _get_kv_cache_max_length(self, input_ids, stopping_criteria=None):
+    r"""
+    Returns the expected sequence length of the generation, i.e., prompt length
+    plus max new tokens, used to size the kv_cache for the first token.
+    """
+    max_length = stopping_criteria.max_length if stopping_criteria is not None else None
+    if max_length is None:
+        max_length = self.generation_config.max_length
+    return max(max_length, input_ids.shape[-1] + 1)
+
+
+def _init_kv_cache(model, batch_size, max_length):
+    r"""
+    Returns the first token `past_key_values` of the discrete kv_cache for
+    `batch_size` sequences, sized for `max_length` tokens.
+    """
+    model_family = get_model_family(model.config)
+    num_layers = getattr(model.config, model_family.num_layers_attr)
+    beam_idx_tmp = torch.zeros((max_length, batch_size), dtype=torch.long).contiguous()
+    return tuple(
+        [
+            (
+                torch.zeros(1, 0, 0, 1, dtype=torch.long).contiguous(),
+                torch.zeros([1, 1, 1, 1]).contiguous(),
+                torch.zeros([1, 1, 1, 1]).contiguous(),
+                beam_idx_tmp,
+            )
+            for i in range(num_layers)
+        ]
+    )
+
+
+def _get_paged_trace_graph(self, model_inputs):
+    r"""
+    Returns the traced graph of the model taking the `past_key_values` of the
+    paged kv cache, as `trace_graph` set by `ipex.optimize_transformers` is traced
+    with the discrete kv_cache. The model is traced with `model_inputs` on the
+    first use, and the graph is kept in `self.trace_graph_paged` per names of
+    the inputs and layout of the paged kv cache, i.e. with or without the int8
+    scales, its dtype and the autocast state.
+    """
+    layer_past = model_inputs["past_key_values"][0]
+    key = (
+        tuple(sorted(model_inputs.keys())),
+        len(layer_past),
+        layer_past[1].dtype,
+        torch.is_autocast_cpu_enabled(),
+    )
+    if not hasattr(self, "trace_graph_paged"):
+        setattr(self, "trace_graph_paged", {})  # noqa: B010
+    if key not in self.trace_graph_paged:
+        # the traced forward writes the same key/value into the reserved slots
+        # as the forward on the graph after it
+        with torch.no_grad():
+            trace_graph = torch.jit.trace(
+                self,
+                example_kwarg_inputs=model_inputs,
+                strict=False,
+                check_trace=False,
+            )
+            self.trace_graph_paged[key] = torch.jit.freeze(trace_graph.eval())
+    return self.trace_graph_paged[key]
+
+
+def _prefill_in_chunks(self, model_inputs, chunk_size, paged_cache=None):
+    r"""
+    Runs the first token forward of `model_inputs` on the leading prompt tokens in
+    chunks of `chunk_size`, appending each chunk to the kv_cache, and leaves the
+    last chunk (at most `chunk_size` tokens) in `model_inputs` for the caller to
+    compute the logits of the next token. The attention scores and activations
+    are then bounded by the chunk instead of the prompt length.
+    """
+    input_ids = model_inputs["input_ids"]
+    attention_mask = model_inputs.get("attention_mask", None)
+    position_ids = model_inputs.get("position_ids", None)
+    seq_ids = list(range(input_ids.size(0)))
+    if paged_cache is not None:
+        past_len = max(paged_cache.get_context_len(seq_id) for seq_id in seq_ids)
+    else:
+        past_len = model_inputs["past_key_values"][0][0].size(-2)
+    while input_ids.size(-1) > chunk_size:
+        chunk_inputs = dict(model_inputs)
+        chunk_inputs["input_ids"] = input_ids[:, :chunk_size]
+        if attention_mask is not None:
+            chunk_inputs["attention_mask"] = attention_mask[:, : past_len + chunk_size]
+        if position_ids is not None:
+            chunk_inputs["position_ids"] = position_ids[:, :chunk_size]
+        if paged_cache is not None:
+            chunk_inputs["past_key_values"] = paged_cache.get_past_key_values(
+                seq_ids, chunk_size
+            )
+            if hasattr(self, "trace_graph"):
+                chunk_inputs.pop("use_cache", None)
+                chunk_inputs.pop("token_type_ids", None)
+                _get_paged_trace_graph(self, chunk_inputs)(**chunk_inputs)
+            else:
+                self(**chunk_inputs, return_dict=True)
+            for seq_id in seq_ids:
+                paged_cache.advance(seq_id, chunk_size)
+        else:
+            if hasattr(self, "trace_graph"):
+                chunk_inputs.pop("use_cache", None)
+                chunk_inputs.pop("token_type_ids", None)
+                outputs = self.trace_graph(**chunk_inputs)
+            else:
+                outputs = self(**chunk_inputs, return_dict=True)
+            model_inputs["past_key_values"] = self._extract_past_from_model_output(
+                outputs
+            )
+        input_ids = input_ids[:, chunk_size:]
+        if position_ids is not None:
+            position_ids = position_ids[:, chunk_size:]
+        past_len += chunk_size
+    model_inputs["input_ids"] = input_ids
+    if position_ids is not None:
+        model_inputs["position_ids"] = position_ids
+
+
+def _get_fused_sampling_params(logits_processor, logits_warper):
+    r"""
+    Returns the arguments of ``torch.ops.torch_ipex.fused_sampling`` if the
+    processors and warpers of the sampling are all fused by the op, i.e. an
+    optional repetition penalty followed by temperature, top-k and top-p in the
+    order of transformers; otherwise None.
+    """
+    params = {
+        "temperature": 1.0,
+        "top_k": 0,
+        "top_p": 1.0,
+        "repetition_penalty": 1.0,
+    }
+    for processor in logits_processor:
+        if not isinstance(processor, RepetitionPenaltyLogitsProcessor):
+            return None
+        params["repetition_penalty"] *= processor.penalty
+    warper_order = [TemperatureLogitsWarper, TopKLogitsWarper, TopPLogitsWarper]
+    last_order = -1
+    for warper in logits_warper:
+        orders = [i for i, cls in enumerate(warper_order) if isinstance(warper, cls)]
+        if not orders or orders[0] <= last_order:
+            return None
+        last_order = orders[0]
+        if isinstance(warper, TemperatureLogitsWarper):
+            params["temperature"] = warper.temperature
+        elif isinstance(warper, TopKLogitsWarper):
+            params["top_k"] = warper.top_k
+        else:
+            if warper.min_tokens_to_keep > 1:
+                return None
+            params["top_p"] = warper.top_p
+    return params
+
+
+def _fused_sampling(input_ids, next_token_logits, params):
+    # the uniform random numbers are drawn here, so the draw follows torch.manual_seed
+    uniform = torch.rand(next_token_logits.size(0))
+    return torch.ops.torch_ipex.fused_sampling(
+        next_token_logits,
+        input_ids,
+        params["temperature"],
+        params["top_k"],
+        params["top_p"],
+        params["repetition_penalty"],
+        uniform,
+    )
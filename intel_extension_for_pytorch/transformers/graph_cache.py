@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import tempfile
+import warnings
+from collections.abc import Mapping
+
+import torch
+
+# bumped whenever the content of the cached graph changes
+_CACHE_FORMAT_VERSION = 1
+_META_FILE = "ipex_graph_cache.json"
+
+
+def _describe(obj):
+    # shapes and dtypes instead of the values of the tensors
+    if isinstance(obj, torch.Tensor):
+        return "Tensor({}, {})".format(list(obj.shape), obj.dtype)
+    if isinstance(obj, (list, tuple)):
+        return "[{}]".format(", ".join(_describe(o) for o in obj))
+    if isinstance(obj, Mapping):
+        return "{{{}}}".format(
+            ", ".join("{}: {}".format(k, _describe(v)) for k, v in obj.items())
+        )
+    return repr(obj)
+
+
+def _file_identity(path):
+    stat = os.stat(path)
+    return "{}:{}:{}".format(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+def _hash_tensor(digest, t):
+    t = t.detach()
+    if t.is_meta:
+        raise ValueError(
+            "The weights on meta device cannot be hashed into the key of the "
+            "graph cache, please pass cache_key to identify them"
+        )
+    digest.update(_describe(t).encode())
+    digest.update(t.cpu().contiguous().reshape(-1).view(torch.uint8).numpy().data)
+
+
+def _hash_state_dict(digest, state_dict):
+    for name, value in state_dict.items():
+        digest.update(str(name).encode())
+        if isinstance(value, torch.Tensor):
+            _hash_tensor(digest, value)
+        else:
+            digest.update(repr(value).encode())
+
+
+def _model_fingerprint(model, hash_weights=True):
+    # the name, config and the structure of the model, and the weight values
+    # unless they are identified by the key given by the caller
+    config = model.config
+    digest = hashlib.sha256()
+    digest.update(str(getattr(config, "_name_or_path", "")).encode())
+    digest.update(
+        config.to_json_string().encode()
+        if hasattr(config, "to_json_string")
+        else repr(config).encode()
+    )
+    if hash_weights:
+        _hash_state_dict(digest, model.state_dict())
+    else:
+        for name, t in model.state_dict(keep_vars=True).items():
+            digest.update("{}{}".format(name, _describe(t)).encode())
+    return digest.hexdigest()
+
+
+class _GraphCache(object):
+    r"""
+    On-disk cache of the frozen TorchScript graphs built by
+    ``ipex.optimize_transformers``, whose constants hold the prepacked weights.
+
+    A graph is keyed by the fingerprint of the model (the name and config of the
+    model and the names, shapes, dtypes and values of its parameters and
+    buffers), the versions of IPEX and PyTorch, the ISA level of the CPU and the
+    arguments of the optimization. An in-memory low precision checkpoint is
+    hashed by its tensor values, and a checkpoint file by its path, size and
+    modification time. Hashing reads all the weights; with ``cache_key`` given by
+    the caller to identify the weights, e.g. the revision of the checkpoint, the
+    values are not read, e.g., for the weights on meta device replaced by a low
+    precision checkpoint.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = os.fspath(cache_dir)
+
+    def key(
+        self,
+        model,
+        dtype,
+        quantization_config=None,
+        qconfig_summary_file=None,
+        low_precision_checkpoint=None,
+        sample_inputs=None,
+        cache_key=None,
+    ):
+        import intel_extension_for_pytorch as ipex
+
+        meta = {
+            "format_version": _CACHE_FORMAT_VERSION,
+            "ipex_version": ipex.__version__,
+            "torch_version": torch.__version__,
+            "isa": ipex._C._get_current_isa_level(),
+            "dtype": str(dtype),
+            "model": _model_fingerprint(model, hash_weights=cache_key is None),
+            "quantization_config": repr(quantization_config.global_qconfig)
+            if quantization_config is not None
+            else None,
+            "qconfig_summary_file": _file_identity(qconfig_summary_file)
+            if qconfig_summary_file is not None
+            else None,
+            "sample_inputs": _describe(sample_inputs),
+            "cache_key": cache_key,
+        }
+        if low_precision_checkpoint is not None:
+            checkpoint, config = (
+                low_precision_checkpoint
+                if isinstance(low_precision_checkpoint, tuple)
+                else (low_precision_checkpoint, None)
+            )
+            if isinstance(checkpoint, (str, os.PathLike)):
+                meta["low_precision_checkpoint"] = _file_identity(checkpoint)
+            elif cache_key is not None:
+                meta["low_precision_checkpoint"] = _describe(checkpoint)
+            else:
+                digest = hashlib.sha256()
+                _hash_state_dict(digest, checkpoint)
+                meta["low_precision_checkpoint"] = digest.hexdigest()
+            meta["low_precision_checkpoint_config"] = config
+        digest = hashlib.sha256(json.dumps(meta, sort_keys=True).encode())
+        return digest.hexdigest(), meta
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, "{}.pt".format(key[0]))
+
+    def load(self, key):
+        r"""
+        Returns the cached graph of `key`, or None if it is not cached or not
+        loadable by the current environment.
+        """
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+        extra_files = {_META_FILE: ""}
+        try:
+            graph = torch.jit.load(path, map_location="cpu", _extra_files=extra_files)
+        except Exception as e:
+            warnings.warn(f"fail to load the cached graph {path} due to: {e}")
+            return None
+        if json.loads(extra_files[_META_FILE] or "null") != key[1]:
+            warnings.warn(f"the cached graph {path} does not match the model, ignored")
+            return None
+        return graph
+
+    def save(self, key, graph):
+        path = self.path(key)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # written to a temporary file first since several processes may
+            # build the same graph at the same time
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            os.close(fd)
+            try:
+                torch.jit.save(
+                    graph, tmp_path, _extra_files={_META_FILE: json.dumps(key[1])}
+                )
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        except Exception as e:
+            warnings.warn(f"fail to save the optimized graph into {path} due to: {e}")
@@ -0,0 +1,181 @@
+import importlib
+import re
+from functools import lru_cache
+from typing import List, Optional
+
+
+class ModelFamily(object):
+    r"""
+    Description of a model family optimized by ``ipex.optimize_transformers``.
+
+    The family of a model is resolved once from ``config.architectures[0]`` when
+    the model is optimized, and the optimized modules and the generation loops
+    branch on the fields below instead of matching the architecture name again.
+    A family reusing the attention and rope implementations of a supported one,
+    e.g., a Llama-like model, can be added with ``register_model_family``.
+
+    Args:
+        name (str): Name of the family.
+        patterns (list of str): Regular expressions searched (case-insensitively)
+            in ``config.architectures[0]``.
+        attention (str): Attention and decoder layer implementation followed by
+            the family, one of ``gptj``, ``llama``, ``gptneox``, ``opt`` and
+            ``falcon``.
+        rope (str): Rotary position embedding variant, one of ``gptj``,
+            ``llama``, ``gptneox`` and ``falcon``, or None if the family has no
+            rotary position embedding.
+        qkv_layout (str): Layout of the query/key/value fed to the scaled dot
+            product, ``bshd``, ``bhsd`` or ``(bh)sd``.
+        fused_qkv (bool): Whether the q/k/v projections are concatenated into one
+            linear.
+        num_layers_attr (str): Attribute of the config holding the number of the
+            decoder layers, used to initialize the kv_cache.
+        forward_inputs (list of str): Positional inputs of the model forward,
+            in the order of the traced graph.
+        attention_classes (list of str): Import paths of the attention modules
+            converted by ``optimize_transformers``.
+        decoder_classes (list of str): Import paths of the decoder layers
+            converted by ``optimize_transformers``.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        patterns: List[str],
+        attention: str,
+        rope: Optional[str] = None,
+        qkv_layout: str = "bhsd",
+        fused_qkv: bool = False,
+        num_layers_attr: str = "num_hidden_layers",
+        forward_inputs: Optional[List[str]] = None,
+        attention_classes: Optional[List[str]] = None,
+        decoder_classes: Optional[List[str]] = None,
+    ):
+        self.name = name
+        self.patterns = [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+        self.attention = attention
+        self.rope = rope
+        self.qkv_layout = qkv_layout
+        self.fused_qkv = fused_qkv
+        self.num_layers_attr = num_layers_attr
+        self.forward_inputs = (
+            forward_inputs
+            if forward_inputs is not None
+            else ["input_ids", "attention_mask", "position_ids", "past_key_values"]
+        )
+        self.attention_classes = attention_classes or []
+        self.decoder_classes = decoder_classes or []
+
+    def match(self, architecture: str):
+        return any(pattern.search(architecture) for pattern in self.patterns)
+
+    @property
+    def has_position_ids(self):
+        return "position_ids" in self.forward_inputs
+
+    def __repr__(self):
+        return f"ModelFamily(name={self.name}, attention={self.attention})"
+
+
+_model_families = []
+
+
+def register_model_family(family: ModelFamily):
+    r"""
+    Adds `family` to the families supported by ``optimize_transformers``. The
+    families registered later take precedence when several of them match an
+    architecture.
+    """
+    _model_families.append(family)
+    _get_model_family.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def _get_model_family(architecture: str):
+    for family in reversed(_model_families):
+        if family.match(architecture):
+            return family
+    return None
+
+
+def get_model_family(config):
+    r"""
+    Returns the family of the model of `config`, or None if it is not supported.
+    """
+    if not getattr(config, "architectures", None):
+        return None
+    return _get_model_family(config.architectures[0])
+
+
+def _import_classes(paths: List[str]):
+    # the classes missing in the installed transformers are skipped
+    classes = []
+    for path in paths:
+        module_name, class_name = path.rsplit(".", 1)
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError:
+            continue
+        if hasattr(module, class_name):
+            classes.append(getattr(module, class_name))
+    return classes
+
+
+register_model_family(
+    ModelFamily(
+        "gptj",
+        ["GPTJ"],
+        attention="gptj",
+        rope="gptj",
+        qkv_layout="bshd",
+        fused_qkv=True,
+        num_layers_attr="n_layer",
+        attention_classes=["transformers.models.gptj.modeling_gptj.GPTJAttention"],
+        decoder_classes=["transformers.models.gptj.modeling_gptj.GPTJBlock"],
+    )
+)
+register_model_family(
+    ModelFamily(
+        "llama",
+        ["llama"],
+        attention="llama",
+        rope="llama",
+        fused_qkv=True,
+        attention_classes=["transformers.models.llama.modeling_llama.LlamaAttention"],
+        decoder_classes=["transformers.models.llama.modeling_llama.LlamaDecoderLayer"],
+    )
+)
+register_model_family(
+    ModelFamily(
+        "gptneox",
+        ["gptneox"],
+        attention="gptneox",
+        rope="gptneox",
+        attention_classes=[
+            "transformers.models.gpt_neox.modeling_gpt_neox.GPTNeoXAttention"
+        ],
+    )
+)
+register_model_family(
+    ModelFamily(
+        "opt",
+        ["OPT"],
+        attention="opt",
+        qkv_layout="bshd",
+        forward_inputs=["input_ids", "attention_mask", "past_key_values"],
+        attention_classes=["transformers.models.opt.modeling_opt.OPTAttention"],
+        decoder_classes=["transformers.models.opt.modeling_opt.OPTDecoderLayer"],
+    )
+)
+# falcon and RW models are loaded from the remote code, their attention and
+# decoder layer classes are taken from the model instance
+register_model_family(
+    ModelFamily(
+        "falcon",
+        ["falcon", "rw"],
+        attention="falcon",
+        rope="falcon",
+        qkv_layout="(bh)sd",
+        forward_inputs=["input_ids", "past_key_values", "attention_mask"],
+    )
+)
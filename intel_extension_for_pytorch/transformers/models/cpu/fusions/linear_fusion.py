@@ -4,6 +4,10 @@ import math
 import warnings
 import copy
 from intel_extension_for_pytorch.nn.modules import IpexWoqLinear
+from intel_extension_for_pytorch.nn.modules.weight_only_quantization import (
+    _GroupWiseQuantizedWeight,
+    _prepack_weight,
+)
 from intel_extension_for_pytorch.quantization import get_weight_only_quant_qconfig_mapping
 
 class _IPEXlinearFusionCPU(nn.Module):
@@ -209,12 +213,16 @@ class _IPEXConcatLinearCPU(_IPEXlinearFusionCPU):
             #   - weight dtype = quint4x2, qscheme = torch.per_channel_affine_float_qparams,
             #   - scales dtype = float, zero points dtype = float
             # We need to unpack weights then concat them
+            # Group-wise quantized weights are in plain format, i.e., uint8 [N, K/2]
+            # for int4 or int8 [N, K], with scales and zero points of shape
+            # [N, K / group_size], so they are concatenated along N as they are.
             weights_list = []
             scales_list = []
             zeros_list = []
             bias_list = []
             w_dtype = self.linear_list[0].dtype
             lowp_mode = self.linear_list[0]._lowp_mode
+            group_size = self.linear_list[0]._group_size
             qconfig = get_weight_only_quant_qconfig_mapping(
                 weight_dtype=w_dtype, lowp_mode=lowp_mode
             )
@@ -230,6 +238,20 @@ class _IPEXConcatLinearCPU(_IPEXlinearFusionCPU):
                     weights_list = []
                     break
                 qw = linear._op_context.to_public(linear._op_context.get_weight())
+                if linear._group_size != group_size:
+                    warnings.warn(
+                        "Concat linear fusion for CPU WOQ failed "
+                        "because group sizes of weights do not match. "
+                        "Falling back to separate linears."
+                    )
+                    weights_list = []
+                    break
+                if group_size > 0:
+                    weights_list.append(qw)
+                    scales_list.append(linear._op_context.get_scales())
+                    zeros_list.append(linear._op_context.get_zero_points())
+                    bias_list.append(linear._op_context.get_bias())
+                    continue
                 if qw.qscheme() not in \
                         [torch.per_channel_affine, torch.per_channel_affine_float_qparams] \
                         or qw.q_per_channel_axis() != 0:
@@ -247,7 +269,28 @@ class _IPEXConcatLinearCPU(_IPEXlinearFusionCPU):
                 zeros_list.append(z)
                 bias_list.append(linear._op_context.get_bias())
                 w_dtype = linear.dtype
-            if weights_list:
+            if weights_list and group_size > 0:
+                use_bias = all(b is not None for b in bias_list)
+                concat_bias = torch.concat(bias_list, 0) if use_bias else None
+                concat_qweight = _GroupWiseQuantizedWeight(
+                    torch.concat(weights_list, 0),
+                    torch.concat(scales_list, 0),
+                    torch.concat(zeros_list, 0),
+                    group_size,
+                )
+                self.concat_linear = IpexWoqLinear(
+                    self.linear_list[0].in_features,
+                    concat_qweight.qweight.shape[0],
+                    use_bias,
+                    dtype=w_dtype,
+                )
+                self.concat_linear._op_context = _prepack_weight(
+                    concat_qweight, concat_bias, lowp_mode, len(weights_list)
+                )
+                self.concat_linear._lowp_mode = lowp_mode
+                self.concat_linear._num_concats = len(weights_list)
+                self.concat_linear._group_size = group_size
+            elif weights_list:
                 concat_weight = torch.concat(weights_list, 0)
                 concat_scales = torch.concat(scales_list, -1)
                 concat_zeros = torch.concat(zeros_list, -1)
@@ -66,6 +66,10 @@ class _IPEXScaleDotProductCPU(nn.Module):
                 torch.zeros([1, 1, 1, 1]).contiguous(),
                 torch.zeros(1, int(query.size(0)), dtype=torch.long).contiguous(),
             )
+        if len(layer_past) >= 5:
+            return self._paged_attention(
+                query, key, value, scale_attn, layer_past, attention_mask
+            )
         key_cache = layer_past[1].contiguous()
         value_cache = layer_past[2].contiguous()
         beam_idx = layer_past[3].contiguous()
@@ -90,20 +94,58 @@ class _IPEXScaleDotProductCPU(nn.Module):
             attention_mask,
         )
 
+        # only the size(-2) of seq_info is used as the sequence length, so expand a
+        # single element instead of allocating seq_len * seq_len elements
+        seq_len = layer_past[0].size(-2) + query.shape[1]
         present = (
-            torch.zeros(
-                1,
-                (layer_past[0].size(-2) + query.shape[1]),
-                (layer_past[0].size(-2) + query.shape[1]),
-                1,
-                dtype=torch.long,
-            ).contiguous(),
+            torch.zeros(1, 1, 1, 1, dtype=torch.long).expand(1, seq_len, seq_len, 1),
             key_cache,
             value_cache,
             beam_idx,
         )
         return attn_output, attn_weights, present
 
+    def _paged_attention(
+        self,
+        query: torch.Tensor,
+        key: torch.Tensor,
+        value: torch.Tensor,
+        scale_attn: float,
+        layer_past: Tuple[torch.Tensor],
+        attention_mask: Optional[torch.Tensor] = None,
+    ):
+        # layer_past of the paged kv cache:
+        # (seq_info, key_cache, value_cache, block_tables, context_lens),
+        # followed by (key_scale, value_scale) for the int8 kv cache
+        seq_info, key_cache, value_cache, block_tables, context_lens = layer_past[:5]
+        key_scale, value_scale = (
+            layer_past[5:] if len(layer_past) == 7 else (None, None)
+        )
+        # the int8 kv cache is dequantized into the dtype of the query
+        cache_dtype = query.dtype if key_scale is not None else key_cache.dtype
+        attn_output = torch.ops.torch_ipex.paged_attention(
+            query.to(cache_dtype),
+            key.to(cache_dtype),
+            value.to(cache_dtype),
+            key_cache,
+            value_cache,
+            block_tables,
+            context_lens,
+            scale_attn,
+            attention_mask,
+            key_scale,
+            value_scale,
+        ).to(query.dtype)
+        seq_len = seq_info.size(-2) + query.shape[1]
+        present = (
+            torch.zeros(1, 1, 1, 1, dtype=torch.long).expand(1, seq_len, seq_len, 1),
+            key_cache,
+            value_cache,
+            block_tables,
+            context_lens + query.shape[1],
+        ) + tuple(layer_past[5:])
+        return attn_output, None, present
+
 
 class _IPEXRMSNorm(nn.Module):
     def __init__(self, module, config=None, tpp=False, woq=False):
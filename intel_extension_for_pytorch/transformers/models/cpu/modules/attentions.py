@@ -1,5 +1,4 @@
 from torch import nn
-import re
 from ...cpu.fusions.mha_fusion import (
     _IPEXRopeCPU,
     _IPEXScaleDotProductCPU,
@@ -19,15 +18,14 @@ class _IPEXAttentionCPU(nn.Module):
                 continue
             setattr(self.__class__, k, getattr(module.__class__, k))
 
-        if not re.search("OPT", self.model_backbone, re.IGNORECASE):
+        if self.model_family.rope is not None:
             self._IPEXROPE = _IPEXRopeCPU(
                 self.max_position_embeddings,
                 self.pos_embd_dim,
                 self.rope_base,
                 self.model_backbone,
             )
-        if re.search("GPTJ", self.model_backbone, re.IGNORECASE) or \
-                re.search("LLAMA", self.model_backbone, re.IGNORECASE):
+        if self.model_family.fused_qkv:
             self.concat_qkv = _IPEXConcatLinearCPU(
                 module.concat_qkv, tpp=tpp, woq=woq
             )
@@ -1,5 +1,4 @@
 from torch import nn
-import re
 from ...cpu.fusions.linear_fusion import (
     _IPEXlinearSiluCPU,
     _IPEXlinearAddCPU,
@@ -20,7 +19,7 @@ class _IPEXDecoderLayerCPU(nn.Module):
             if k.startswith("__"):
                 continue
             setattr(self.__class__, k, getattr(module.__class__, k))
-        if re.search("GPTJ", self.model_backbone, re.IGNORECASE):
+        if self.model_family.attention == "gptj":
             if not self.distributed:
                 self.linear_add_add = _IPEXlinearAddAddCPU(
                     module.linear_add_add.linear, tpp=tpp, woq=woq
@@ -28,7 +27,7 @@ class _IPEXDecoderLayerCPU(nn.Module):
             self.linear_gelu = _IPEXlinearNewGeluCPU(
                 module.linear_gelu.linear, tpp=tpp, woq=woq
             )
-        elif re.search("llama", self.model_backbone, re.IGNORECASE):
+        elif self.model_family.attention == "llama":
             if not self.distributed:
                 self.mha_linear_add = _IPEXlinearAddCPU(
                     module.mha_linear_add.linear, tpp=tpp, woq=woq
@@ -42,7 +41,7 @@ class _IPEXDecoderLayerCPU(nn.Module):
             self.linear_mul = _IPEXlinearMulCPU(
                 module.linear_mul.linear, tpp=tpp, woq=woq
             )
-        elif re.search("OPT", self.model_backbone, re.IGNORECASE):
+        elif self.model_family.attention == "opt":
             if not self.distributed:
                 self.mha_linear_add = _IPEXlinearAddCPU(
                     module.mha_linear_add.linear, tpp=tpp, woq=woq
@@ -53,9 +52,7 @@ class _IPEXDecoderLayerCPU(nn.Module):
             self.linear_relu = _IPEXlinearReluCPU(
                 module.linear_relu.linear, tpp=tpp, woq=woq
             )
-        elif re.search("falcon", self.model_backbone, re.IGNORECASE) or re.search(
-            "rw", self.model_backbone, re.IGNORECASE
-        ):
+        elif self.model_family.attention == "falcon":
             self.linear_gelu = _IPEXlinearGeluCPU(
                 module.linear_gelu.linear, tpp=tpp, woq=woq
             )
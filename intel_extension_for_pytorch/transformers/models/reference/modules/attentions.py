@@ -2,7 +2,7 @@ import torch
 from torch import nn
 from typing import Optional, Tuple, Union
 import math
-import re
+from ....model_family import get_model_family
 from ...reference.fusions.mha_fusion import (
     _IPEXRopeRef,
     _IPEXScaleDotProductRef,
@@ -33,6 +33,11 @@ def _GPTJAttention_forward(
 
     query = self._split_heads(query, self.num_attention_heads, self.head_dim, True)
     key = self._split_heads(key, self.num_attention_heads, self.head_dim, True)
+    kv_seq_len = (
+        key.shape[1] + layer_past[0].size(-2)
+        if layer_past is not None
+        else key.shape[1]
+    )
 
     key = self._IPEXROPE(
         key,
@@ -41,6 +46,7 @@ def _GPTJAttention_forward(
         self.head_dim,
         1,  # neighbor elements
         64,
+        kv_seq_len,
     )
     query = self._IPEXROPE(
         query,
@@ -49,6 +55,7 @@ def _GPTJAttention_forward(
         self.head_dim,
         1,
         64,
+        kv_seq_len,
     )
     if use_cache:
         value = self._split_heads(value, self.num_attention_heads, self.head_dim, True)
@@ -544,6 +551,7 @@ class _IPEXAttentionRef(nn.Module):
             setattr(self.__class__, k, getattr(module.__class__, k))
 
         self.model_backbone = config.architectures[0]
+        self.model_family = get_model_family(config)
 
         # common known as hidden_size
         self.hidden_size = (
@@ -575,7 +583,7 @@ class _IPEXAttentionRef(nn.Module):
             else 2048
         )
 
-        if not re.search("OPT", self.model_backbone, re.IGNORECASE):
+        if self.model_family.rope is not None:
             if hasattr(module, "rotary_dim"):
                 self.pos_embd_dim = module.rotary_dim
             elif hasattr(module, "rotary_ndims"):
@@ -592,17 +600,14 @@ class _IPEXAttentionRef(nn.Module):
                 self.model_backbone,
             )
 
-        if re.search("GPTJ", self.model_backbone, re.IGNORECASE) or \
-                re.search("LLAMA", self.model_backbone, re.IGNORECASE):
+        if self.model_family.fused_qkv:
             if hasattr(module, 'q_proj') and hasattr(module, 'k_proj') and hasattr(module, 'v_proj'):
                 self.concat_qkv = _IPEXConcatLinearRef([module.q_proj, module.k_proj, module.v_proj])
                 del module.q_proj, module.k_proj, module.v_proj
 
         self._IPEXScaleDotProduct = _IPEXScaleDotProductRef(module, config)
 
-        if re.search("falcon", self.model_backbone, re.IGNORECASE) or re.search(
-            "rw", self.model_backbone, re.IGNORECASE
-        ):
+        if self.model_family.attention == "falcon":
             self.split_size = self.hidden_size
             self.hidden_dropout = config.hidden_dropout
             self.rotary = config.rotary
@@ -660,7 +665,7 @@ class _IPEXAttentionRef(nn.Module):
         output_attentions: Optional[bool] = False,
         alibi: Optional[torch.Tensor] = None,
     ):
-        if re.search("GPTJ", self.model_backbone, re.IGNORECASE):
+        if self.model_family.attention == "gptj":
             return _GPTJAttention_forward(
                 self,
                 hidden_states,
@@ -671,7 +676,7 @@ class _IPEXAttentionRef(nn.Module):
                 use_cache,
                 output_attentions,
             )
-        elif re.search("llama", self.model_backbone, re.IGNORECASE):
+        elif self.model_family.attention == "llama":
             return _LlamaAttention_forward(
                 self,
                 hidden_states,
@@ -681,7 +686,7 @@ class _IPEXAttentionRef(nn.Module):
                 output_attentions,
                 use_cache,
             )
-        elif re.search("gptneox", self.model_backbone, re.IGNORECASE):
+        elif self.model_family.attention == "gptneox":
             return _GPTNeoXAttention_forward(
                 self,
                 hidden_states,
@@ -692,7 +697,7 @@ class _IPEXAttentionRef(nn.Module):
                 use_cache,
                 output_attentions,
             )
-        elif re.search("OPT", self.model_backbone, re.IGNORECASE):
+        elif self.model_family.attention == "opt":
             return _OPTAttention_forward(
                 self,
                 hidden_states,
@@ -702,9 +707,7 @@ class _IPEXAttentionRef(nn.Module):
                 layer_head_mask,
                 output_attentions,
             )
-        elif re.search("falcon", self.model_backbone, re.IGNORECASE) or re.search(
-            "rw", self.model_backbone, re.IGNORECASE
-        ):
+        elif self.model_family.attention == "falcon":
             return _FalconAttention_forward(
                 self,
                 hidden_states,
@@ -739,7 +742,7 @@ def _reorder_cache(
 def _convert_cache_to_standard_format(
     self, past_key_value: Tuple[Tuple[torch.Tensor, torch.Tensor]], batch_size: int
 ) -> Tuple[Tuple[torch.Tensor, torch.Tensor]]:
-    if len(past_key_value[0]) == 4:
+    if len(past_key_value[0]) >= 4:  # discrete or paged kv_cache
         return past_key_value
 
     batch_size_times_num_heads, kv_length, head_dim = past_key_value[0][0].shape
@@ -757,7 +760,7 @@ def _convert_cache_to_standard_format(
 def _convert_to_rw_cache(
     self, past_key_value: Tuple[Tuple[torch.Tensor, torch.Tensor]]
 ) -> Tuple[Tuple[torch.Tensor, torch.Tensor]]:
-    if len(past_key_value[0]) == 4:
+    if len(past_key_value[0]) >= 4:  # discrete or paged kv_cache
         return past_key_value
     batch_size, num_heads, kv_length, head_dim = past_key_value[0][0].shape
     batch_size_times_num_heads = batch_size * num_heads
@@ -789,16 +792,16 @@ def _make_causal_mask(
     mask.masked_fill_(mask_cond < (mask_cond + 1).view(mask.size(-1), 1), 0)
     mask = mask.to(dtype)
 
-    if past_key_values_length > 0:
-        mask = torch.cat(
-            [
-                torch.zeros(
-                    tgt_len, past_key_values_length, dtype=dtype, device=device
-                ),
-                mask,
-            ],
-            dim=-1,
-        )
+    # concatenate the past unconditionally (a no-op for the empty past), so the
+    # traced graph also serves the multi-token steps with a past, e.g., resuming
+    # from a cached prefix
+    mask = torch.cat(
+        [
+            torch.zeros(tgt_len, past_key_values_length, dtype=dtype, device=device),
+            mask,
+        ],
+        dim=-1,
+    )
     return mask[None, None, :, :].expand(
         bsz, 1, tgt_len, tgt_len + past_key_values_length
     )
@@ -1,7 +1,7 @@
 import torch
 from torch import nn
 from typing import Optional, Tuple, Union
-import re
+from ....model_family import get_model_family
 from ...reference.fusions.linear_fusion import (
     _IPEXlinearSiluRef,
     _IPEXlinearAddRef,
@@ -259,14 +259,15 @@ class _IPEXDecoderLayerRef(nn.Module):
             setattr(self.__class__, k, getattr(module.__class__, k))
         self.distributed = distributed
         self.model_backbone = config.architectures[0]
+        self.model_family = get_model_family(config)
 
-        if re.search("GPTJ", self.model_backbone, re.IGNORECASE):
+        if self.model_family.attention == "gptj":
             if not self.distributed:
                 self.linear_add_add = _IPEXlinearAddAddRef(module.mlp.fc_out)
                 del self.__dict__["_modules"]["mlp"].fc_out
             self.linear_gelu = _IPEXlinearNewGeluRef(module.mlp.fc_in)
             del self.__dict__["_modules"]["mlp"].fc_in
-        elif re.search("llama", self.model_backbone, re.IGNORECASE):
+        elif self.model_family.attention == "llama":
             if not self.distributed:
                 self.mha_linear_add = _IPEXlinearAddRef(module.self_attn.o_proj)
                 self.mlp_linear_add = _IPEXlinearAddRef(module.mlp.down_proj)
@@ -277,7 +278,7 @@ class _IPEXDecoderLayerRef(nn.Module):
             del self.__dict__["_modules"]["mlp"].gate_proj
             del self.__dict__["_modules"]["mlp"].up_proj
 
-        elif re.search("OPT", self.model_backbone, re.IGNORECASE):
+        elif self.model_family.attention == "opt":
             if not self.distributed:
                 self.mha_linear_add = _IPEXlinearAddRef(module.self_attn.out_proj)
                 self.mlp_linear_add = _IPEXlinearAddRef(module.fc2)
@@ -285,9 +286,7 @@ class _IPEXDecoderLayerRef(nn.Module):
                 del self.__dict__["_modules"]["fc2"]
             self.linear_relu = _IPEXlinearReluRef(module.fc1)
             del self.__dict__["_modules"]["fc1"]
-        elif re.search("falcon", self.model_backbone, re.IGNORECASE) or re.search(
-            "rw", self.model_backbone, re.IGNORECASE
-        ):
+        elif self.model_family.attention == "falcon":
             self.linear_gelu = _IPEXlinearGeluRef(module.mlp.dense_h_to_4h)
             del self.__dict__["_modules"]["mlp"].dense_h_to_4h
             if not self.distributed:
@@ -316,7 +315,7 @@ class _IPEXDecoderLayerRef(nn.Module):
         past_key_value: Optional[Tuple[torch.Tensor]] = None,
         alibi: Optional[torch.Tensor] = None,
     ):
-        if re.search("GPTJ", self.model_backbone, re.IGNORECASE):
+        if self.model_family.attention == "gptj":
             return GPTJBlock_forward(
                 self,
                 hidden_states,
@@ -327,7 +326,7 @@ class _IPEXDecoderLayerRef(nn.Module):
                 use_cache,
                 output_attentions,
             )
-        elif re.search("llama", self.model_backbone, re.IGNORECASE):
+        elif self.model_family.attention == "llama":
             return LlamaDecoderLayer_forward(
                 self,
                 hidden_states,
@@ -337,7 +336,7 @@ class _IPEXDecoderLayerRef(nn.Module):
                 output_attentions,
                 use_cache,
             )
-        elif re.search("OPT", self.model_backbone, re.IGNORECASE):
+        elif self.model_family.attention == "opt":
             return OPTDecoderLayer_forward(
                 self,
                 hidden_states,
@@ -347,9 +346,7 @@ class _IPEXDecoderLayerRef(nn.Module):
                 use_cache,
                 past_key_value,
             )
-        elif re.search("falcon", self.model_backbone, re.IGNORECASE) or re.search(
-            "rw", self.model_backbone, re.IGNORECASE
-        ):
+        elif self.model_family.attention == "falcon":
             return FalconDecoderLayer_forward(
                 self,
                 hidden_states,
@@ -1,6 +1,5 @@
 import torch
 import copy
-import re
 import warnings
 import pkg_resources
 from intel_extension_for_pytorch.cpu._auto_kernel_selection import (
@@ -9,9 +8,13 @@ from intel_extension_for_pytorch.cpu._auto_kernel_selection import (
     _using_tpp,
 )
 import intel_extension_for_pytorch as ipex
+from .model_family import get_model_family, _import_classes
+from .graph_cache import _GraphCache
 from ..utils.weight_only_quantization import (
     _is_woq_qconfig,
-    _convert_woq_with_low_precision_checkpoint
+    _convert_woq_with_low_precision_checkpoint,
+    _deepcopy_without_quantized_weights,
+    _load_low_precision_checkpoint,
 )
 
 
@@ -87,6 +90,8 @@ def model_convert_reference(_model):
     from .generation import (
         _beam_search,
         _greedy_search,
+        _sample,
+        _assisted_decoding,
     )
 
     # model wise optimization for MHA module
@@ -120,6 +125,8 @@ def model_convert_reference(_model):
     convert_function(_model, "_reorder_cache", _reorder_cache)
     convert_function(_model, "beam_search", _beam_search)
     convert_function(_model, "greedy_search", _greedy_search)
+    convert_function(_model, "sample", _sample)
+    convert_function(_model, "assisted_decoding", _assisted_decoding)
     convert_function(
         _model,
         "_extract_past_from_model_output",
@@ -131,6 +138,12 @@ def model_convert_reference(_model):
         "_prepare_decoder_attention_mask",
         _prepare_decoder_attention_mask,
     )
+    convert_functions(
+        _model,
+        transformers.models.opt.modeling_opt.OPTDecoder,
+        "_prepare_decoder_attention_mask",
+        _prepare_decoder_attention_mask,
+    )
 
     # model-wise changes for adoption
     # forward order
@@ -183,13 +196,9 @@ def model_convert_reference(_model):
         # distributed uses default False
         pass
 
+    model_family = get_model_family(_model.config)
     # model-wise optimizations - MHA module
-    for supported_mha_class in [
-        transformers.models.gpt_neox.modeling_gpt_neox.GPTNeoXAttention,
-        transformers.models.llama.modeling_llama.LlamaAttention,
-        transformers.models.gptj.modeling_gptj.GPTJAttention,
-        transformers.models.opt.modeling_opt.OPTAttention,
-    ]:
+    for supported_mha_class in _import_classes(model_family.attention_classes):
         convert_class(
             _model,
             supported_mha_class,
@@ -198,11 +207,7 @@ def model_convert_reference(_model):
             distributed=distributed,
         )
     # model-wise optimizations - Feedforward/Decoder layer modules
-    for supported_decoder_class in [
-        transformers.models.llama.modeling_llama.LlamaDecoderLayer,
-        transformers.models.gptj.modeling_gptj.GPTJBlock,
-        transformers.models.opt.modeling_opt.OPTDecoderLayer,
-    ]:
+    for supported_decoder_class in _import_classes(model_family.decoder_classes):
         convert_class(
             _model,
             supported_decoder_class,
@@ -212,9 +217,7 @@ def model_convert_reference(_model):
         )
 
     # special list that has not official transformers design
-    if re.search("falcon", _model.config.architectures[0], re.IGNORECASE) or re.search(
-        "rw", _model.config.architectures[0], re.IGNORECASE
-    ):
+    if model_family.attention == "falcon":
         with torch.no_grad():
             ipex.nn.utils._model_convert.replace_customized_linear_with_linear(
                 _model.eval()
@@ -262,8 +265,6 @@ def model_convert_reference(_model):
 
 
 def get_dummy_input(_model, return_dict=False):
-    sample_inputs = None
-
     if hasattr(_model.config, "n_layer"):
         model_num_layers = _model.config.n_layer
     elif hasattr(_model.config, "num_hidden_layers"):
@@ -290,44 +291,17 @@ def get_dummy_input(_model, return_dict=False):
     input_ids = torch.ones(32).to(torch.long)
     attention_mask = torch.ones(len(input_ids))
     position_ids = torch.arange(len(input_ids))
-    if re.search("opt", _model.config.architectures[0], re.IGNORECASE):
-        sample_inputs = (
-            {
-                "input_ids": input_ids.unsqueeze(0),
-                "attention_mask": attention_mask.unsqueeze(0),
-                "past_key_values": past_key_values,
-            }
-            if return_dict
-            else (input_ids.unsqueeze(0), attention_mask.unsqueeze(0), past_key_values)
-        )
-    elif re.search(
-        "falcon", _model.config.architectures[0], re.IGNORECASE
-    ) or re.search("rw", _model.config.architectures[0], re.IGNORECASE):
-        sample_inputs = (
-            {
-                "input_ids": input_ids.unsqueeze(0),
-                "past_key_values": past_key_values,
-                "attention_mask": attention_mask.unsqueeze(0),
-            }
-            if return_dict
-            else (input_ids.unsqueeze(0), past_key_values, attention_mask.unsqueeze(0))
-        )
-    else:
-        sample_inputs = (
-            {
-                "input_ids": input_ids.unsqueeze(0),
-                "attention_mask": attention_mask.unsqueeze(0),
-                "position_ids": position_ids.unsqueeze(0),
-                "past_key_values": past_key_values,
-            }
-            if return_dict
-            else (
-                input_ids.unsqueeze(0),
-                attention_mask.unsqueeze(0),
-                position_ids.unsqueeze(0),
-                past_key_values,
-            )
-        )
+    inputs = {
+        "input_ids": input_ids.unsqueeze(0),
+        "attention_mask": attention_mask.unsqueeze(0),
+        "position_ids": position_ids.unsqueeze(0),
+        "past_key_values": past_key_values,
+    }
+    # the inputs in the order of the model forward
+    model_family = get_model_family(_model.config)
+    sample_inputs = {name: inputs[name] for name in model_family.forward_inputs}
+    if not return_dict:
+        sample_inputs = tuple(sample_inputs.values())
     return sample_inputs
 
 
@@ -366,6 +340,7 @@ def model_convert_lowering(
     deployment_mode,
     is_quantization=False,
     woq=False,
+    trace_graph=None,
 ):
     from .models.reference.modules.attentions import _IPEXAttentionRef
     from .models.reference.modules.decoder import _IPEXDecoderLayerRef
@@ -416,7 +391,12 @@ def model_convert_lowering(
                 woq=woq,
             )
 
-        if deployment_mode:
+        if deployment_mode and trace_graph is not None:
+            # the graph traced and frozen before, e.g., loaded from the graph cache
+            _model = _set_optimized_model_for_generation(
+                _model, optimized_model=trace_graph
+            )
+        elif deployment_mode:
             sample_inputs = (
                 get_dummy_input(_model, return_dict=True)
                 if sample_inputs is None
@@ -450,6 +430,8 @@ def optimize_transformers(
     low_precision_checkpoint=None,
     sample_inputs=None,
     deployment_mode=True,
+    cache_dir=None,
+    cache_key=None,
 ):
     r"""
     Apply optimizations at Python frontend to the given transformers model (nn.Module).
@@ -469,22 +451,38 @@ def optimize_transformers(
         qconfig_summary_file (str): Path to the IPEX static quantization config json file.
             Default value is ``None``. Work with quantization_config under static quantization use case.
             Need to do IPEX static quantization calibration and generate this file.
-        low_precision_checkpoint (dict or tuple of dict): For weight only quantization with INT4 weights.
+        low_precision_checkpoint (dict, str or tuple): For weight only quantization with INT4 weights.
             If it's a dict, it should be the state_dict of checkpoint (`.pt`) generated by GPTQ, etc.
+            If it's a str, it should be the path of the checkpoint, i.e., a `.safetensors` file, a file
+            saved by `torch.save`, or a directory or `*.index.json` of sharded checkpoint. The checkpoint
+            is memory-mapped and converted layer by layer without loading it into memory as a whole.
+            The model may be created on meta device (e.g., under `accelerate.init_empty_weights()`),
+            then the parameters other than the quantized weights are also loaded from the checkpoint.
             If a tuple is provided, it should be `(checkpoint, checkpoint config)`,
-            where `checkpoint` is the state_dict and `checkpoint config` is dict specifying
+            where `checkpoint` is the state_dict or the path and `checkpoint config` is dict specifying
             keys of weight/scale/zero point/bias in the state_dict.
             The default config is {'weight_key': 'packed_weight', 'scale_key': 'scale',
             'zero_point_key': 'packed_zp', bias_key: 'bias'}. Change the values of the dict to make a custom config.
             Weights shape should be N by K and they are quantized to UINT4 and compressed along K, then stored as
             `torch.int32`. Zero points are also UINT4 and stored as INT32. Scales and bias are floating point values.
             Bias is optional. If bias is not in state dict, bias of the original model is used.
-            Only per-channel quantization of weight is supported (group size = -1).
+            Scales are of shape [N] for per-channel quantization or [N, K / group_size] for group-wise
+            quantization. Zero points are of the same shape as scales and may be compressed as INT32 along
+            N or along the groups.
             Default value is ``None``.
         sample_inputs (Tuple tensors): sample inputs used for model quantization or torchscript.
             Default value is ``None``, and for well supported model, we provide this sample inputs automaticlly.
         deployment_mode (bool): Whether to apply the optimized model for deployment of model generation.
             It means there is no need to further apply optimization like torchscirpt. Default value is ``True``.
+        cache_dir (str): Directory to cache the frozen TorchScript graph holding the prepacked weights.
+            The graph is keyed by the name, config and weights of the model, IPEX and PyTorch versions,
+            CPU ISA level and the arguments above. When the graph is cached, the tracing and freezing are
+            skipped and the cached graph is loaded instead, while the model is still converted as without
+            the cache for the paths running it eagerly, e.g., the paged kv cache. Only used with
+            ``deployment_mode``. Default value is ``None``, meaning no cache.
+        cache_key (str): Identifies the weights of ``model`` and ``low_precision_checkpoint`` in the key
+            of the graph cache, e.g. the revision of the checkpoint, instead of hashing the weight values,
+            which reads all the weights. Default value is ``None``, meaning the weights are hashed.
 
     Returns:
         optimized model object for model.generate(), also workable with model.forward
@@ -542,25 +540,13 @@ def optimize_transformers(
             )
             return model
 
-        well_supported_model = (
-            re.search("GPTJ", model.config.architectures[0], re.IGNORECASE)
-            or re.search("llama", model.config.architectures[0], re.IGNORECASE)
-            or re.search("gptneox", model.config.architectures[0], re.IGNORECASE)
-            or re.search("OPT", model.config.architectures[0], re.IGNORECASE)
-            or re.search("falcon", model.config.architectures[0], re.IGNORECASE)
-            or re.search("rw", model.config.architectures[0], re.IGNORECASE)
-        )
+        well_supported_model = get_model_family(model.config) is not None
         if not well_supported_model:
             warnings.warn(
                 "optimize_transformers supports Llama, GPT-J, GPT-Neox, Falcon, and OPT, fallback to origin model"
             )
             return model
 
-        if not inplace:
-            _model = copy.deepcopy(model)
-        else:
-            _model = model
-
         is_quantization = False
         is_woq = False
         if quantization_config is not None:
@@ -568,22 +554,52 @@ def optimize_transformers(
             if _is_woq_qconfig(quantization_config):
                 is_woq = True
 
-        # Load low precision checkpoint (generated by GPTQ, etc.) for WOQ before any conversion
+        graph_cache, cache_key, cached_graph = None, None, None
+        # only the graph traced for the deployment is cached
+        if cache_dir is not None and device == "cpu" and deployment_mode:
+            graph_cache = _GraphCache(cache_dir)
+            cache_key = graph_cache.key(
+                model,
+                dtype,
+                quantization_config,
+                qconfig_summary_file,
+                low_precision_checkpoint if is_woq else None,
+                sample_inputs,
+                cache_key,
+            )
+            # on a hit, the model is still converted as on a miss for the paths
+            # running the eager model, e.g., the paged kv cache, and only the
+            # tracing is skipped
+            cached_graph = graph_cache.load(cache_key)
+
+        # Low precision checkpoint (generated by GPTQ, etc.) for WOQ
+        lowp_checkpoint = None
         if device == 'cpu' and is_woq and low_precision_checkpoint is not None:
             state_dict, config = None, None
             if isinstance(low_precision_checkpoint, tuple):
                 assert len(low_precision_checkpoint) == 2 and \
-                    isinstance(low_precision_checkpoint[0], dict) and \
                     isinstance(low_precision_checkpoint[1], dict), \
                     'Invalid low_precision_checkpoint'
                 state_dict, config = low_precision_checkpoint
             else:
-                assert isinstance(low_precision_checkpoint, dict), \
-                    'Invalid low_precision_checkpoint argument'
                 state_dict = low_precision_checkpoint
-            lowp_checkpoint = state_dict if config is None else (state_dict, config)
+            # a path of checkpoint is memory-mapped and read layer by layer
+            state_dict = _load_low_precision_checkpoint(state_dict)
+            lowp_checkpoint = (state_dict, config)
+
+        if not inplace:
+            if lowp_checkpoint is not None:
+                # the float weights replaced by the checkpoint are not copied
+                _model = _deepcopy_without_quantized_weights(model, *lowp_checkpoint)
+            else:
+                _model = copy.deepcopy(model)
+        else:
+            _model = model
+
+        # Load low precision checkpoint for WOQ before any conversion
+        if lowp_checkpoint is not None:
             _model = _convert_woq_with_low_precision_checkpoint(
-                _model, quantization_config, lowp_checkpoint
+                _model, quantization_config, *lowp_checkpoint
             )
 
         # model reference conversion
@@ -612,6 +628,10 @@ def optimize_transformers(
                         quantization_config,
                         qconfig_summary_file,
                     )
+                    if cached_graph is not None:
+                        return _set_optimized_model_for_generation(
+                            _model, optimized_model=cached_graph
+                        )
                     sample_inputs = (
                         get_dummy_input(_model, return_dict=True)
                         if sample_inputs is None
@@ -630,6 +650,8 @@ def optimize_transformers(
                         _model = _set_optimized_model_for_generation(
                             _model, optimized_model=trace_model
                         )
+                    if graph_cache is not None:
+                        graph_cache.save(cache_key, trace_model)
                     return _model
                 else:
                     print(
@@ -658,7 +680,14 @@ def optimize_transformers(
             deployment_mode,
             is_quantization,
             is_woq,
+            trace_graph=cached_graph,
         )
+        if (
+            graph_cache is not None
+            and cached_graph is None
+            and hasattr(_model, "trace_graph")
+        ):
+            graph_cache.save(cache_key, _model.trace_graph)
 
         return _model
 
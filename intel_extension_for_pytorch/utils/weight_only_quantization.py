@@ -1,4 +1,7 @@
 import copy
+import json
+import os
+from collections.abc import Mapping
 import torch
 from intel_extension_for_pytorch.nn.modules import IpexWoqLinear
 from torch.ao.quantization import PlaceholderObserver
@@ -25,6 +28,96 @@ def _default_lowp_checkpoint_config():
     return DEFAULT_LOWP_CHECKPOINT_CONFIG
 
 
+class _LowPrecisionCheckpoint(Mapping):
+    r"""
+    Read-only state_dict of a low precision checkpoint on disk. The files are
+    memory-mapped and a tensor is only read when it is looked up, so converting
+    a model layer by layer never holds the whole checkpoint in memory.
+
+    Supported files are safetensors (`.safetensors`, requires the `safetensors`
+    package), torch zip files saved by `torch.save` (`.pt`, `.bin`, etc.), and
+    sharded checkpoints given by their index file (`*.index.json` with a
+    `weight_map`) or by a directory containing the shards.
+    """
+
+    def __init__(self, path):
+        self._handles = {}
+        # key -> file of the checkpoint holding the tensor
+        self._weight_map = {}
+        path = os.fspath(path)
+        if os.path.isdir(path):
+            index_files = [
+                f for f in sorted(os.listdir(path)) if f.endswith(".index.json")
+            ]
+            if index_files:
+                self._load_index(os.path.join(path, index_files[0]))
+            else:
+                shards = [
+                    os.path.join(path, f)
+                    for f in sorted(os.listdir(path))
+                    if f.endswith((".safetensors", ".pt", ".pth", ".bin"))
+                ]
+                assert shards, "No checkpoint file found in {}".format(path)
+                for shard in shards:
+                    self._add_file(shard)
+        elif path.endswith(".index.json"):
+            self._load_index(path)
+        else:
+            self._add_file(path)
+
+    def _load_index(self, index_file):
+        with open(index_file) as f:
+            weight_map = json.load(f)["weight_map"]
+        root = os.path.dirname(index_file)
+        self._weight_map = {k: os.path.join(root, v) for k, v in weight_map.items()}
+
+    def _add_file(self, file):
+        for k in self._open(file).keys():
+            self._weight_map[k] = file
+
+    def _open(self, file):
+        if file not in self._handles:
+            if file.endswith(".safetensors"):
+                try:
+                    from safetensors import safe_open
+                except ImportError as e:
+                    raise RuntimeError(
+                        "Loading safetensors checkpoint requires the safetensors package"
+                    ) from e
+                self._handles[file] = safe_open(file, framework="pt", device="cpu")
+            else:
+                # storages of the tensors are mapped to the file instead of read
+                self._handles[file] = torch.load(
+                    file, map_location="cpu", mmap=True, weights_only=True
+                )
+        return self._handles[file]
+
+    def __getitem__(self, key):
+        handle = self._open(self._weight_map[key])
+        if isinstance(handle, dict):
+            return handle[key]
+        return handle.get_tensor(key)
+
+    def __iter__(self):
+        return iter(self._weight_map)
+
+    def __len__(self):
+        return len(self._weight_map)
+
+
+def _load_low_precision_checkpoint(low_precision_checkpoint):
+    r"""
+    Returns the state_dict of `low_precision_checkpoint`, which is either a
+    state_dict or the path of a checkpoint loaded lazily by memory mapping.
+    """
+    if isinstance(low_precision_checkpoint, (str, os.PathLike)):
+        return _LowPrecisionCheckpoint(low_precision_checkpoint)
+    assert isinstance(
+        low_precision_checkpoint, Mapping
+    ), "low_precision_checkpoint should be a state_dict or the path of a checkpoint"
+    return low_precision_checkpoint
+
+
 def _get_keys_from_config(checkpoint_config):
     weight_key = checkpoint_config.get('weight_key', 'weight')
     scales_key = checkpoint_config.get('scale_key', 'scale')
@@ -47,6 +140,50 @@ def _get_linear_parameters(attr_name, state_dict, checkpoint_config):
     return qweight, scales, qzeros, bias
 
 
+def _deepcopy_without_quantized_weights(model, state_dict, checkpoint_config=None):
+    r"""
+    Deep copies `model` except the weights of the linear layers found in the low
+    precision checkpoint, which are replaced by the checkpoint anyway. Those are
+    put on the meta device in the copy to avoid duplicating the float weights.
+    """
+    if checkpoint_config is None:
+        checkpoint_config = _default_lowp_checkpoint_config()
+    weight_key, _, _, _ = _get_keys_from_config(checkpoint_config)
+    memo = {}
+    for name, mod in model.named_modules():
+        if isinstance(mod, torch.nn.Linear) and (name + "." + weight_key) in state_dict:
+            memo[id(mod.weight)] = torch.nn.Parameter(
+                torch.empty_like(mod.weight, device="meta"), requires_grad=False
+            )
+    return copy.deepcopy(model, memo)
+
+
+def _materialize_meta_tensors(model, state_dict):
+    r"""
+    Loads the parameters and buffers of `model` left on the meta device, e.g.,
+    the model is created under `accelerate.init_empty_weights()`, from the
+    checkpoint. Tied parameters are loaded once.
+    """
+    loaded = {}
+    for mod_name, mod in model.named_modules():
+        for tensors in [mod._parameters, mod._buffers]:
+            for name, t in tensors.items():
+                if t is None or not t.is_meta:
+                    continue
+                if id(t) not in loaded:
+                    key = mod_name + "." + name if mod_name != "" else name
+                    assert (
+                        key in state_dict
+                    ), "{} of the model is on meta device but not found in the checkpoint".format(
+                        key
+                    )
+                    value = state_dict[key].to(t.dtype)
+                    if isinstance(t, torch.nn.Parameter):
+                        value = torch.nn.Parameter(value, requires_grad=t.requires_grad)
+                    loaded[id(t)] = value
+                tensors[name] = loaded[id(t)]
+
+
 def _convert_woq_with_low_precision_checkpoint(
         model,
         qconfig,
@@ -58,7 +195,8 @@ def _convert_woq_with_low_precision_checkpoint(
     Args:
         model: original model
         qconfig: config object containing observer info, lowp mode, etc.
-        low_precision_checkpoint (dict): checkpoint generated by GPTQ, etc.
+        low_precision_checkpoint (dict or str): checkpoint generated by GPTQ, etc., or
+            the path of the checkpoint which is memory-mapped and read lazily
         checkpoint_config (dict): custom config to load the checkpoint. Use default if None
         inplace: do conversion in-place or make a copy of original model
     Return:
@@ -70,10 +208,16 @@ def _convert_woq_with_low_precision_checkpoint(
     Default format:
     - Weights and zero points in UINT4 and compressed as INT32, scales in FP16.
     - Keys are 'packed_weight', 'scale', 'packed_zp'
+    - Scales are of shape [N] (or [N, 1]) for per-channel quantization, or
+      [N, K / group_size] for group-wise quantization.
+
+    Linear layers are converted one by one and their float weights are released
+    once replaced. Parameters left on the meta device after the conversion, e.g.,
+    embeddings of a model created under `accelerate.init_empty_weights()`, are
+    loaded from the checkpoint, so the float model is never fully materialized.
     '''
 
-    assert isinstance(low_precision_checkpoint, dict), \
-        'low_precision_checkpoint should be a state_dict'
+    low_precision_checkpoint = _load_low_precision_checkpoint(low_precision_checkpoint)
     assert checkpoint_config is None or isinstance(checkpoint_config, dict), \
         'checkpoint_config should be a dict'
     if checkpoint_config is None:
@@ -83,7 +227,7 @@ def _convert_woq_with_low_precision_checkpoint(
     # Check that keys can be found in the state dict. Bias is optional.
     weight_key, scales_key, zeros_key, _ = _get_keys_from_config(checkpoint_config)
     keys_found = [False] * 3
-    for k, _ in state_dict.items():
+    for k in state_dict.keys():
         if k.endswith('.' + weight_key):
             keys_found[0] = True
         if k.endswith('.' + scales_key):
@@ -102,7 +246,11 @@ def _convert_woq_with_low_precision_checkpoint(
             )
             if any(i is None for i in [qweight, scales, qzeros]):
                 return mod
-            mod_new = IpexWoqLinear.from_float_and_int4_weight(mod, qweight, scales, qzeros, bias)
+            if bias is None and mod.bias is not None and mod.bias.is_meta:
+                bias = state_dict.get(attr_name + ".bias", None)
+            mod_new = IpexWoqLinear.from_float_and_int4_weight(
+                mod, qweight, scales, qzeros, bias
+            )
             return mod_new
 
         mod_new = mod
@@ -113,7 +261,11 @@ def _convert_woq_with_low_precision_checkpoint(
         return mod_new
 
     if not inplace:
-        model_new = copy.deepcopy(model)
+        model_new = _deepcopy_without_quantized_weights(
+            model, state_dict, checkpoint_config
+        )
     else:
         model_new = model
-    return _convert(model_new, "")
+    model_new = _convert(model_new, "")
+    _materialize_meta_tensors(model_new, state_dict)
+    return model_new
@@ -1,4 +1,5 @@
 import unittest
+import unittest.mock
 import torch
 import intel_extension_for_pytorch as ipex
 import sys
@@ -226,6 +227,43 @@ class OptimizeTransformersTester(TestCase):
             ipex.nn.utils._model_convert.replace_customized_linear_with_linear(m.eval())
         self.model_replacement_check(m, False, torchcompile=True)
 
+    def test_model_family(self):
+        from intel_extension_for_pytorch.transformers.model_family import (
+            ModelFamily,
+            register_model_family,
+            get_model_family,
+            _get_model_family,
+            _model_families,
+        )
+
+        for name, family in [
+            ("gptj", "gptj"),
+            ("llama", "llama"),
+            ("gptneox", "gptneox"),
+            ("opt", "opt"),
+            ("falcon", "falcon"),
+        ]:
+            config = AutoConfig.from_pretrained(
+                f"{curpath}/hf_configs/{name}", return_dict=False
+            )
+            self.assertEqual(get_model_family(config).name, family)
+        config = AutoConfig.from_pretrained(
+            f"{curpath}/hf_configs/llama", return_dict=False
+        )
+        config.architectures = ["MyLlamaForCausalLM"]
+        self.assertEqual(get_model_family(config).name, "llama")
+        # a family registered later takes precedence
+        register_model_family(
+            ModelFamily("my_llama", ["MyLlama"], attention="llama", rope="llama")
+        )
+        try:
+            self.assertEqual(get_model_family(config).name, "my_llama")
+        finally:
+            _model_families.pop()
+            _get_model_family.cache_clear()
+        config.architectures = ["BertForMaskedLM"]
+        self.assertTrue(get_model_family(config) is None)
+
     def _model_replacement_check_woq(self, model):
         qconfig = ipex.quantization.get_weight_only_quant_qconfig_mapping()
         model = ipex.optimize_transformers(
@@ -365,6 +403,149 @@ class OptimizeTransformersTester(TestCase):
                 # the optimized model is ipex_m.trace_graph
                 ipex_m.trace_graph(*example_inputs)
 
+    def test_weight_only_quant_gptq_lazy_checkpoint(self):
+        config = AutoConfig.from_pretrained(
+            f"{curpath}/hf_configs/gptj", return_dict=False
+        )
+        m = transformers.models.gptj.modeling_gptj.GPTJForCausalLM(config).eval()
+        state_dict = m.state_dict()
+        linear_keys = [
+            k[:-7]
+            for k in state_dict.keys()
+            if any(
+                k.endswith(suffix)
+                for suffix in ["proj.weight", "fc_in.weight", "fc_out.weight"]
+            )
+        ]
+        for k in linear_keys:
+            N, K = state_dict[k + ".weight"].shape
+            del state_dict[k + ".weight"]
+            state_dict[k + ".packed_weight"] = torch.randint(
+                -(2**31), 2**31 - 1, (N, K // 8), dtype=torch.int32
+            )
+            state_dict[k + ".scale"] = torch.ones((N, 1), dtype=torch.half) * 0.5
+            state_dict[k + ".packed_zp"] = torch.ones((N, 1), dtype=torch.int32) * 4
+        lowp_mode = ipex.quantization.WoqLowpMode.INT8
+        qconfig = ipex.quantization.get_weight_only_quant_qconfig_mapping(
+            lowp_mode=lowp_mode
+        )
+        example_inputs = _get_gptj_example_inputs()
+        ref_m = ipex.optimize_transformers(
+            copy.deepcopy(m),
+            dtype=torch.float,
+            quantization_config=qconfig,
+            low_precision_checkpoint=state_dict,
+            deployment_mode=False,
+        )
+        with torch.no_grad():
+            ref_out = ref_m(*example_inputs)
+        with tempfile.TemporaryDirectory() as work_dir:
+            checkpoint_file_name = work_dir + "/checkpoint.pt"
+            torch.save(state_dict, checkpoint_file_name)
+            # parameters on meta device are loaded from the checkpoint
+            meta_m = copy.deepcopy(m)
+            for mod in meta_m.modules():
+                for name, param in mod._parameters.items():
+                    if param is not None:
+                        mod._parameters[name] = torch.nn.Parameter(
+                            param.to("meta"), requires_grad=False
+                        )
+            for ipex_m, inplace in [(m, False), (meta_m, True)]:
+                ipex_m = ipex.optimize_transformers(
+                    ipex_m,
+                    dtype=torch.float,
+                    quantization_config=qconfig,
+                    low_precision_checkpoint=checkpoint_file_name,
+                    deployment_mode=False,
+                    inplace=inplace,
+                )
+                self.assertFalse(any(p.is_meta for p in ipex_m.parameters()))
+                with torch.no_grad():
+                    out = ipex_m(*example_inputs)
+                self.assertEqual(out[0], ref_out[0])
+
+    def test_graph_cache(self):
+        config = AutoConfig.from_pretrained(
+            f"{curpath}/hf_configs/gptj", return_dict=False
+        )
+        m = transformers.models.gptj.modeling_gptj.GPTJForCausalLM(config).eval()
+        example_inputs = _get_gptj_example_inputs()
+        with tempfile.TemporaryDirectory() as cache_dir:
+            ref_m = ipex.optimize_transformers(
+                copy.deepcopy(m), dtype=torch.float, cache_dir=cache_dir
+            )
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            # the cached graph is loaded without tracing the model again
+            with unittest.mock.patch("torch.jit.trace", side_effect=AssertionError):
+                ipex_m = ipex.optimize_transformers(
+                    copy.deepcopy(m), dtype=torch.float, cache_dir=cache_dir
+                )
+            with torch.no_grad():
+                self.assertEqual(
+                    ipex_m.trace_graph(*example_inputs)[0],
+                    ref_m.trace_graph(*example_inputs)[0],
+                )
+            # another dtype is not served by the cached graph
+            ipex.optimize_transformers(
+                copy.deepcopy(m), dtype=torch.bfloat16, cache_dir=cache_dir
+            )
+            self.assertEqual(len(os.listdir(cache_dir)), 2)
+            # nor are other weights under the same name and config
+            other_m = transformers.models.gptj.modeling_gptj.GPTJForCausalLM(
+                config
+            ).eval()
+            ipex.optimize_transformers(other_m, dtype=torch.float, cache_dir=cache_dir)
+            self.assertEqual(len(os.listdir(cache_dir)), 3)
+            # the weights on meta device are identified by the given cache_key only
+            meta_m = copy.deepcopy(m).to("meta")
+            with self.assertRaises(ValueError):
+                ipex.optimize_transformers(
+                    meta_m, dtype=torch.float, cache_dir=cache_dir
+                )
+            for _ in range(2):
+                ipex_m = ipex.optimize_transformers(
+                    copy.deepcopy(m),
+                    dtype=torch.float,
+                    cache_dir=cache_dir,
+                    cache_key="gptj-rev0",
+                )
+            self.assertEqual(len(os.listdir(cache_dir)), 4)
+            with torch.no_grad():
+                self.assertEqual(
+                    ipex_m.trace_graph(*example_inputs)[0],
+                    ref_m.trace_graph(*example_inputs)[0],
+                )
+            # no graph is cached or served without the deployment mode
+            ipex_m = ipex.optimize_transformers(
+                copy.deepcopy(m),
+                dtype=torch.float,
+                cache_dir=cache_dir,
+                deployment_mode=False,
+            )
+            self.assertFalse(hasattr(ipex_m, "trace_graph"))
+            self.assertEqual(len(os.listdir(cache_dir)), 4)
+
+    def test_graph_cache_paged_kv_cache(self):
+        config = AutoConfig.from_pretrained(
+            f"{curpath}/hf_configs/gptj", return_dict=False
+        )
+        m = transformers.models.gptj.modeling_gptj.GPTJForCausalLM(config).eval()
+        input_ids = torch.randint(0, 1000, (2, 10))
+        generate_kwargs = dict(do_sample=False, max_new_tokens=8, min_new_tokens=8)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            outs = []
+            # a cold run, then a run on the cached graph, whose eager model is
+            # converted as well for the paged kv cache
+            for _ in range(2):
+                ipex_m = ipex.optimize_transformers(
+                    copy.deepcopy(m), dtype=torch.float, cache_dir=cache_dir
+                )
+                ipex_m.config.paged_kv_cache = True
+                ipex_m.config.kv_cache_block_size = 4
+                with torch.no_grad():
+                    outs.append(ipex_m.generate(input_ids, **generate_kwargs))
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+        self.assertEqual(outs[0], outs[1])
 
 if __name__ == "__main__":
     test = unittest.main()
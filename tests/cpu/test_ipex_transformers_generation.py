@@ -0,0 +1,303 @@
+import unittest
+import torch
+import intel_extension_for_pytorch as ipex
+import sys
+import subprocess
+import os
+import copy
+import json
+import tempfile
+
+try:
+    import transformers
+    from transformers import AutoConfig
+except ImportError:
+    subprocess.check_call(
+        [sys.executable, "-m", "pip", "install", "transformers==4.31.0"]
+    )
+    import transformers
+    from transformers import AutoConfig
+
+from common_utils import TestCase
+
+torch.manual_seed(128)
+
+curpath = os.path.abspath(os.path.dirname(__file__))
+
+
+def _get_gptj_model():
+    config = AutoConfig.from_pretrained(f"{curpath}/hf_configs/gptj", return_dict=False)
+    return transformers.models.gptj.modeling_gptj.GPTJForCausalLM(config).eval()
+
+
+class GenerationTester(TestCase):
+    def _optimize(self, model, deployment_mode=False):
+        return ipex.optimize_transformers(
+            copy.deepcopy(model), dtype=torch.float, deployment_mode=deployment_mode
+        )
+
+    def test_greedy_search_paged_kv_cache(self):
+        ipex_m = self._optimize(_get_gptj_model())
+        input_ids = torch.randint(0, 1000, (2, 10))
+        generate_kwargs = dict(do_sample=False, max_new_tokens=8, min_new_tokens=8)
+        with torch.no_grad():
+            ref_out = ipex_m.generate(input_ids, **generate_kwargs)
+            ipex_m.config.paged_kv_cache = True
+            ipex_m.config.kv_cache_block_size = 4
+            out = ipex_m.generate(input_ids, **generate_kwargs)
+        self.assertEqual(out, ref_out)
+
+    def test_greedy_search_paged_kv_cache_trace_graph(self):
+        ipex_m = ipex.optimize_transformers(
+            copy.deepcopy(_get_gptj_model()), dtype=torch.float, deployment_mode=True
+        )
+        input_ids = torch.randint(0, 1000, (2, 10))
+        generate_kwargs = dict(do_sample=False, max_new_tokens=8, min_new_tokens=8)
+        with torch.no_grad():
+            ref_out = ipex_m.generate(input_ids, **generate_kwargs)
+            ipex_m.config.paged_kv_cache = True
+            ipex_m.config.kv_cache_block_size = 4
+            out = ipex_m.generate(input_ids, **generate_kwargs)
+        self.assertEqual(out, ref_out)
+        # the paged kv cache runs on its own traced graph
+        self.assertEqual(len(ipex_m.trace_graph_paged), 1)
+
+    def test_continuous_batching(self):
+        from intel_extension_for_pytorch.transformers.generation import (
+            ContinuousBatchingScheduler,
+        )
+
+        model = _get_gptj_model()
+        prompts = [torch.randint(0, 1000, (1, n)) for n in [5, 12, 3, 8, 7]]
+        max_new_tokens = [4, 9, 6, 2, 5]
+        # the deployment mode runs the scheduler on the traced graph
+        for deployment_mode in [False, True]:
+            ipex_m = self._optimize(model, deployment_mode)
+            # 2 slots and a small cache, so requests are queued and preempted
+            scheduler = ContinuousBatchingScheduler(
+                ipex_m, max_batch_size=2, block_size=4, num_blocks=8, eos_token_id=[]
+            )
+            request_ids = [
+                scheduler.add_request(prompt, max_new_tokens=n)
+                for prompt, n in zip(prompts, max_new_tokens)
+            ]
+            outputs = scheduler.run_until_complete()
+            self.assertEqual(len(outputs), len(prompts))
+            self.assertEqual(hasattr(ipex_m, "trace_graph_paged"), deployment_mode)
+            with torch.no_grad():
+                for request_id, prompt, n in zip(request_ids, prompts, max_new_tokens):
+                    ref_out = ipex_m.generate(
+                        prompt, do_sample=False, max_new_tokens=n, min_new_tokens=n
+                    )
+                    self.assertEqual(outputs[request_id], ref_out[0])
+
+    def test_chunked_prefill(self):
+        model = _get_gptj_model()
+        input_ids = torch.randint(0, 1000, (2, 19))
+        # the deployment mode runs the chunks on the traced graph, with a
+        # non-empty past and, for the beam search, the rows of the batch only
+        for deployment_mode in [False, True]:
+            ipex_m = self._optimize(model, deployment_mode)
+            for num_beams in [1, 4]:
+                generate_kwargs = dict(
+                    do_sample=False, num_beams=num_beams, max_new_tokens=8
+                )
+                with torch.no_grad():
+                    ref_out = ipex_m.generate(input_ids, **generate_kwargs)
+                    ipex_m.config.prefill_chunk_size = 8
+                    out = ipex_m.generate(input_ids, **generate_kwargs)
+                    self.assertEqual(out, ref_out)
+                    if num_beams == 1:
+                        ipex_m.config.paged_kv_cache = True
+                        ipex_m.config.kv_cache_block_size = 4
+                        out = ipex_m.generate(input_ids, **generate_kwargs)
+                        self.assertEqual(out, ref_out)
+                        ipex_m.config.paged_kv_cache = False
+                    ipex_m.config.prefill_chunk_size = None
+
+    def test_continuous_batching_chunked_prefill(self):
+        from intel_extension_for_pytorch.transformers.generation import (
+            ContinuousBatchingScheduler,
+        )
+
+        model = _get_gptj_model()
+        prompts = [torch.randint(0, 1000, (1, n)) for n in [21, 4, 9]]
+        for deployment_mode in [False, True]:
+            ipex_m = self._optimize(model, deployment_mode)
+            scheduler = ContinuousBatchingScheduler(
+                ipex_m,
+                max_batch_size=3,
+                block_size=4,
+                eos_token_id=[],
+                prefill_chunk_size=6,
+            )
+            request_ids = [
+                scheduler.add_request(prompt, max_new_tokens=5) for prompt in prompts
+            ]
+            # the short prompts start decoding while the long one is still prefilled
+            scheduler.step()
+            self.assertEqual(scheduler.running[0].num_prefilled_tokens, 0)
+            self.assertEqual(len(scheduler.running[1].output_ids), 2)
+            self.assertEqual(scheduler.running[2].num_prefilled_tokens, 2)
+            outputs = scheduler.run_until_complete()
+            with torch.no_grad():
+                for request_id, prompt in zip(request_ids, prompts):
+                    ref_out = ipex_m.generate(
+                        prompt, do_sample=False, max_new_tokens=5, min_new_tokens=5
+                    )
+                    self.assertEqual(outputs[request_id], ref_out[0])
+
+    def test_assisted_decoding(self):
+        model = _get_gptj_model()
+        ipex_m = self._optimize(model)
+        input_ids = torch.randint(0, 1000, (1, 10))
+        generate_kwargs = dict(do_sample=False, max_new_tokens=12, min_new_tokens=12)
+        with torch.no_grad():
+            ref_out = ipex_m.generate(input_ids, **generate_kwargs)
+            # a draft of the same weights accepts all the proposals, the other one
+            # gets most of them rejected and rolled back
+            for draft_model in [model, _get_gptj_model()]:
+                out = ipex_m.generate(
+                    input_ids,
+                    assistant_model=self._optimize(draft_model),
+                    **generate_kwargs,
+                )
+                self.assertEqual(out, ref_out)
+
+    def test_fused_sampling(self):
+        logits = torch.randn(4, 100)
+        input_ids = torch.randint(0, 100, (4, 8))
+        argmax = logits.argmax(dim=-1)
+        for uniform in [torch.zeros(4), torch.full((4,), 0.999)]:
+            # top_k=1 and a tiny top_p both keep the most likely token only
+            for top_k, top_p in [(1, 1.0), (0, 1e-6), (1, 0.5)]:
+                out = torch.ops.torch_ipex.fused_sampling(
+                    logits, input_ids, 0.7, top_k, top_p, 1.0, uniform
+                )
+                self.assertEqual(out, argmax)
+        # the repetition penalty moves the choice away from the generated tokens
+        penalized_ids = argmax.unsqueeze(1)
+        out = torch.ops.torch_ipex.fused_sampling(
+            logits, penalized_ids, 1.0, 1, 1.0, 1e4, torch.zeros(4)
+        )
+        ref_logits = logits.clone()
+        ref_logits.scatter_(1, penalized_ids, float("-inf"))
+        self.assertEqual(out, ref_logits.argmax(dim=-1))
+        # the draws follow the top-k softmax distribution
+        logits = torch.tensor([[2.0, 1.0, 0.5, -1.0]]).expand(20000, 4).contiguous()
+        out = torch.ops.torch_ipex.fused_sampling(
+            logits, input_ids[:1].repeat(20000, 1), 1.0, 3, 1.0, 1.0, torch.rand(20000)
+        )
+        freq = torch.bincount(out, minlength=4).float() / 20000
+        ref_freq = torch.cat([torch.softmax(logits[0, :3], dim=-1), torch.zeros(1)])
+        self.assertEqual(freq, ref_freq, prec=0.02)
+
+    def test_sample(self):
+        ipex_m = self._optimize(_get_gptj_model())
+        input_ids = torch.randint(0, 1000, (2, 10))
+        with torch.no_grad():
+            ref_out = ipex_m.generate(input_ids, do_sample=False, max_new_tokens=8)
+            for fused_sampling in [True, False]:
+                ipex_m.config.fused_sampling = fused_sampling
+                out = ipex_m.generate(
+                    input_ids, do_sample=True, top_k=1, top_p=0.9, max_new_tokens=8
+                )
+                self.assertEqual(out, ref_out)
+            del ipex_m.config.fused_sampling
+            out = ipex_m.generate(
+                input_ids,
+                do_sample=True,
+                top_k=1,
+                max_new_tokens=8,
+                return_dict_in_generate=True,
+            )
+        self.assertEqual(type(out).__name__, "SampleDecoderOnlyOutput")
+        self.assertEqual(out.sequences, ref_out)
+
+    def test_prefix_kv_cache(self):
+        model = _get_gptj_model()
+        system_prompt = torch.randint(0, 1000, (1, 20))
+        prompts = [
+            torch.cat([system_prompt, torch.randint(0, 1000, (1, n))], dim=-1)
+            for n in [6, 3]
+        ]
+        # the second prompt and the repeated first prompt resume from the
+        # cached system prompt and the cached whole prompt respectively
+        prompts.append(prompts[0])
+        # the deployment mode resumes the prefixes on the traced graph
+        for deployment_mode in [False, True]:
+            ipex_m = self._optimize(model, deployment_mode)
+            for num_beams in [1, 4]:
+                generate_kwargs = dict(
+                    do_sample=False, num_beams=num_beams, max_new_tokens=8
+                )
+                with torch.no_grad():
+                    ref_outs = [ipex_m.generate(p, **generate_kwargs) for p in prompts]
+                    ipex_m.config.prefix_kv_cache = True
+                    for prompt, ref_out in zip(prompts, ref_outs):
+                        out = ipex_m.generate(prompt, **generate_kwargs)
+                        self.assertEqual(out, ref_out)
+                    self.assertEqual(ipex_m.prefix_kv_cache.num_hits, 2)
+                    ipex_m.config.prefix_kv_cache = False
+                    del ipex_m.prefix_kv_cache
+
+    def test_prefix_kv_cache_eviction(self):
+        from intel_extension_for_pytorch.transformers.generation import PrefixKVCache
+
+        def _key_values(prompt_len):
+            return [(torch.randn(prompt_len, 2, 4), torch.randn(prompt_len, 2, 4))]
+
+        # room for two prompts of 8 tokens
+        cache = PrefixKVCache(max_bytes=2 * 2 * 8 * 2 * 4 * 4, block_size=4)
+        cache.insert(list(range(8)), _key_values(8), torch.float)
+        cache.insert(list(range(4)) + [9, 9, 9, 9], _key_values(8), torch.float)
+        prefix_len, _ = cache.lookup(list(range(6)), torch.float)
+        self.assertEqual(prefix_len, 4)
+        prefix_len, _ = cache.lookup(list(range(10)), torch.float)
+        self.assertEqual(prefix_len, 8)
+        self.assertEqual(cache.lookup(list(range(10)), torch.bfloat16)[0], 0)
+        # the least recently used second prompt is evicted
+        cache.insert([7] * 8, _key_values(8), torch.float)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.lookup([0, 1, 2, 3, 9, 9, 9, 9], torch.float)[0], 4)
+        self.assertEqual(cache.lookup(list(range(8)), torch.float)[0], 8)
+
+    def test_generation_profiler(self):
+        ipex_m = self._optimize(_get_gptj_model())
+        input_ids = torch.randint(0, 1000, (2, 10))
+        ipex_m.config.generation_profiler = True
+        for num_beams in [1, 4]:
+            with torch.no_grad():
+                ipex_m.generate(
+                    input_ids,
+                    do_sample=False,
+                    num_beams=num_beams,
+                    max_new_tokens=6,
+                    min_new_tokens=6,
+                )
+            profiler = ipex_m.generation_profiler
+            summary = profiler.summary()
+            self.assertEqual(summary["prefill"]["steps"], 1)
+            self.assertEqual(summary["decode"]["steps"], 5)
+            self.assertEqual(summary["decode"]["tokens"], 10)
+            self.assertTrue(summary["decode"]["p99_ms"] >= summary["decode"]["p50_ms"])
+            record = profiler.records[-1]
+            self.assertEqual(record["phase"], "decode")
+            for section in profiler.sections:
+                self.assertTrue(section in record)
+            self.assertTrue(record["kv_cache_bytes"] > 0)
+            with tempfile.TemporaryDirectory() as tmp:
+                trace_path = os.path.join(tmp, "trace.json")
+                profiler.export_chrome_trace(trace_path)
+                with open(trace_path) as f:
+                    events = json.load(f)["traceEvents"]
+                self.assertEqual(len(events), 6 * (1 + len(profiler.sections)))
+                json_path = os.path.join(tmp, "records.json")
+                profiler.export_json(json_path)
+                with open(json_path) as f:
+                    self.assertEqual(len(json.load(f)["records"]), 6)
+            profiler.reset()
+
+
+if __name__ == "__main__":
+    test = unittest.main()
@@ -10,6 +10,8 @@ import os
 from os.path import expanduser
 import glob
 import subprocess
+import sys
+import tempfile
 
 
 class TestLauncher(TestCase):
@@ -740,6 +742,141 @@ class TestLauncher(TestCase):
         }
         self.verify_affinity(cpuinfo.pools_ondemand, ground_truth)
 
+    def test_core_affinity_with_skip_cross_l3_cores(self):
+        num_nodes = 2
+        n_phycores_per_node = 16
+        lscpu_txt = construct_numa_config(
+            num_nodes,
+            n_phycores_per_node,
+            enable_ht=True,
+            numa_mode=1,
+            n_cores_per_l3=8,
+        )
+        cpuinfo = CPUPoolList(lscpu_txt=lscpu_txt)
+        cpuinfo.gen_pools_ondemand(ninstances=6, skip_cross_l3_cores=True)
+        ground_truth = {
+            "ninstances": 6,
+            "ncores_per_instance": 4,
+            "num_cores_sum": 24,
+            "num_nodes_sum": 2,
+            "num_cores": [4, 4, 4, 4, 4, 4],
+            "num_nodes": [1, 1, 1, 1, 1, 1],
+            "pools_cores": ["0-3", "4-7", "8-11", "12-15", "16-19", "20-23"],
+            "pools_nodes": ["0", "0", "0", "0", "1", "1"],
+        }
+        self.verify_affinity(cpuinfo.pools_ondemand, ground_truth)
+        # the instances of 6 cores don't fit in the L3 domains of 8 cores twice
+        cpuinfo.gen_pools_ondemand(ncores_per_instance=6, skip_cross_l3_cores=True)
+        ground_truth = {
+            "ninstances": 4,
+            "ncores_per_instance": 6,
+            "num_cores_sum": 24,
+            "num_nodes_sum": 2,
+            "num_cores": [6, 6, 6, 6],
+            "num_nodes": [1, 1, 1, 1],
+            "pools_cores": ["0-5", "8-13", "16-21", "24-29"],
+            "pools_nodes": ["0", "0", "1", "1"],
+        }
+        self.verify_affinity(cpuinfo.pools_ondemand, ground_truth)
+
+    def test_sysfs_topology(self):
+        lscpu_txt = construct_numa_config(1, 8, enable_ht=False)
+        with tempfile.TemporaryDirectory() as sysfs_path:
+
+            def write(path, txt):
+                path = os.path.join(sysfs_path, path)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "w") as f:
+                    f.write(f"{txt}\n")
+
+            # 2 dies of 4 cores, each with its own L3 cache
+            for i in range(8):
+                write(f"cpu/cpu{i}/topology/die_id", i // 4)
+                write(f"cpu/cpu{i}/cache/index3/level", 3)
+                write(f"cpu/cpu{i}/cache/index3/type", "Unified")
+                write(
+                    f"cpu/cpu{i}/cache/index3/shared_cpu_list",
+                    "0-3" if i < 4 else "4-7",
+                )
+            write("node/node0/access0/initiators/read_bandwidth", 100000)
+            write("node/node0/access0/initiators/write_bandwidth", 50000)
+            cpuinfo = CPUPoolList(lscpu_txt=lscpu_txt, sysfs_path=sysfs_path)
+        self.assertEqual([c.l3 for c in cpuinfo.pool_all], [0] * 4 + [4] * 4)
+        self.assertEqual([c.die for c in cpuinfo.pool_all], [0] * 4 + [1] * 4)
+        self.assertEqual(
+            cpuinfo.node_memory_bandwidth, {0: {"read": 100000, "write": 50000}}
+        )
+        self.assertIn("2 L3 cache domain(s)", cpuinfo.get_topology_txt()[0])
+        cpuinfo.gen_pools_ondemand(ncores_per_instance=3)
+        self.assertEqual(
+            [p.get_pool_txt()["cores"] for p in cpuinfo.pools_ondemand],
+            ["0-2", "3-5"],
+        )
+        # the instances don't straddle the dies
+        cpuinfo.gen_pools_ondemand(ncores_per_instance=3, skip_cross_l3_cores=True)
+        self.assertEqual(
+            [p.get_pool_txt()["cores"] for p in cpuinfo.pools_ondemand],
+            ["0-2", "4-6"],
+        )
+
+    def test_instance_supervisor(self):
+        from intel_extension_for_pytorch.cpu.launch.supervisor import (
+            Instance,
+            InstanceSupervisor,
+        )
+
+        with tempfile.TemporaryDirectory() as tmp:
+            marker = os.path.join(tmp, "crashed")
+            # crashes at the first run, then succeeds after the restart
+            crash_once = (
+                "import os, sys\n"
+                f"if not os.path.exists({marker!r}):\n"
+                f"    open({marker!r}, 'w').close()\n"
+                "    sys.exit(3)\n"
+                "print('Throughput: 10.0 samples/s')\n"
+                "print('latency: 4.0 ms')\n"
+            )
+            succeed = "print('Throughput: 5.0 samples/s')\nprint('latency: 2.0 ms')\n"
+            fail = "import sys\nsys.exit(5)\n"
+            log_name = os.path.join(tmp, "instance_0.log")
+            instances = [
+                Instance(
+                    0, [sys.executable, "-c", crash_once], dict(os.environ), log_name
+                ),
+                Instance(1, [sys.executable, "-c", succeed], dict(os.environ)),
+                Instance(2, [sys.executable, "-c", fail], dict(os.environ)),
+            ]
+            supervisor = InstanceSupervisor(
+                instances, max_restarts=1, poll_interval=0.05
+            )
+            supervisor.run()
+            with open(log_name) as f:
+                self.assertIn("Throughput: 10.0 samples/s", f.read())
+        self.assertEqual([i.returncode for i in instances], [0, 0, 5])
+        self.assertEqual([i.nrestarts for i in instances], [1, 0, 1])
+        self.assertEqual(instances[0].metrics["throughput"], (10.0, "samples/s"))
+        report = supervisor.get_report()
+        self.assertIn("throughput: 15.0 samples/s in total of 2 instance(s)", report)
+        self.assertIn(
+            "latency: 3.0 ms on average, 4.0 ms at most of 2 instance(s)", report
+        )
+
+    def test_instance_supervisor_health_timeout(self):
+        from intel_extension_for_pytorch.cpu.launch.supervisor import (
+            Instance,
+            InstanceSupervisor,
+        )
+
+        hang = "import time\ntime.sleep(60)\n"
+        instances = [Instance(0, [sys.executable, "-c", hang], dict(os.environ))]
+        supervisor = InstanceSupervisor(
+            instances, max_restarts=1, health_timeout=0.5, poll_interval=0.05
+        )
+        supervisor.run()
+        # restarted once after hanging, then given up
+        self.assertEqual(instances[0].nrestarts, 1)
+        self.assertNotEqual(instances[0].returncode, 0)
+
 
 if __name__ == "__main__":
     test = unittest.main()
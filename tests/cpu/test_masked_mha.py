@@ -774,6 +774,70 @@ class MaskedMHATest(TestCase):
                             value_cache_iakv_half[offset, :, :, :],
                         )
 
+    def test_kv_cache_size(self):
+        batch_size, head_num, head_size = 2, 4, 64
+        first_seq_len, max_seq_len = 8, 12
+        scale_attn = head_size**0.5
+
+        def _random_qkv(seq_len):
+            return [
+                torch.randn(batch_size, seq_len, head_num, head_size) for _ in range(3)
+            ]
+
+        query, key, value = _random_qkv(first_seq_len)
+        attention_mask = torch.zeros(batch_size, 1, first_seq_len, first_seq_len)
+        # the kv_cache is sized by the rows of beam_idx of the first token
+        beam_idx = torch.zeros(max_seq_len, batch_size, dtype=torch.long)
+        (
+            _,
+            _,
+            key_cache,
+            value_cache,
+            beam_idx,
+        ) = torch.ops.torch_ipex.masked_multihead_self_attention(
+            query,
+            key,
+            value,
+            torch.zeros(1, 1, 1, 1),
+            torch.zeros(1, 1, 1, 1),
+            beam_idx,
+            torch.tensor(0),
+            scale_attn,
+            2048,
+            None,
+            attention_mask,
+        )
+        self.assertEqual(key_cache.size(0), max_seq_len)
+        self.assertEqual(beam_idx.size(0), max_seq_len)
+        # the kv_cache grows when the sequence goes beyond it
+        offset = first_seq_len
+        for _ in range(2 * max_seq_len):
+            query, key, value = _random_qkv(1)
+            attention_mask = torch.zeros(batch_size, 1, 1, offset + 1)
+            (
+                _,
+                _,
+                key_cache,
+                value_cache,
+                beam_idx,
+            ) = torch.ops.torch_ipex.masked_multihead_self_attention(
+                query,
+                key,
+                value,
+                key_cache,
+                value_cache,
+                beam_idx,
+                torch.tensor(offset),
+                scale_attn,
+                2048,
+                None,
+                attention_mask,
+            )
+            offset += 1
+            self.assertTrue(key_cache.size(0) >= offset)
+            self.assertEqual(key_cache.size(0), value_cache.size(0))
+            self.assertEqual(key_cache.size(0), beam_idx.size(0))
+
     def test_mha(self):
         self._test_mha(torchcompile=False)
         self._test_mha_fp16(torchcompile=False)
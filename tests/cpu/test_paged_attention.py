@@ -0,0 +1,169 @@
+import torch
+from common_utils import TestCase
+import unittest
+import intel_extension_for_pytorch as ipex  # noqa: F401
+from intel_extension_for_pytorch.transformers.generation.paged_kv_cache import (
+    PagedKVCache,
+    _BlockAllocator,
+)
+
+
+def _ref_attention(query, key, value, scale_attn, attention_mask=None):
+    # query: [q_len, num_heads, head_size], key/value: [seq_len, kv_heads, head_size]
+    q_len, num_heads, _ = query.shape
+    seq_len, kv_heads, _ = key.shape
+    group = num_heads // kv_heads
+    key = key.repeat_interleave(group, dim=1).transpose(0, 1).float()
+    value = value.repeat_interleave(group, dim=1).transpose(0, 1).float()
+    attn_weights = torch.matmul(query.transpose(0, 1).float(), key.transpose(-1, -2))
+    attn_weights = attn_weights / scale_attn
+    causal_mask = torch.ones(q_len, seq_len, dtype=torch.bool).tril(seq_len - q_len)
+    attn_weights = attn_weights.masked_fill(~causal_mask, float("-inf"))
+    if attention_mask is not None:
+        attn_weights = attn_weights + attention_mask
+    attn_weights = torch.softmax(attn_weights, dim=-1)
+    return torch.matmul(attn_weights, value)
+
+
+class PagedAttentionTest(TestCase):
+    def test_block_allocator(self):
+        allocator = _BlockAllocator(4)
+        blocks = [allocator.allocate() for _ in range(4)]
+        self.assertEqual(blocks, [0, 1, 2, 3])
+        self.assertEqual(allocator.num_free_blocks(), 0)
+        with self.assertRaises(RuntimeError):
+            allocator.allocate()
+        allocator.free(2)
+        self.assertEqual(allocator.allocate(), 2)
+
+    def test_paged_kv_cache_block_tables(self):
+        cache = PagedKVCache(
+            num_layers=2, num_blocks=8, block_size=4, num_kv_heads=2, head_size=8
+        )
+        cache.add_sequence(0)
+        cache.add_sequence(1)
+        past_key_values = cache.get_past_key_values([0, 1], 5)
+        self.assertEqual(len(past_key_values), 2)
+        self.assertEqual(len(past_key_values[0]), 5)
+        self.assertEqual(past_key_values[0][0].size(-2), 0)
+        self.assertEqual(past_key_values[0][3].shape, (2, 2))
+        self.assertEqual(cache.num_free_blocks(), 4)
+        cache.advance(0, 5)
+        cache.advance(1, 5)
+        past_key_values = cache.get_past_key_values([1], 4)
+        self.assertEqual(past_key_values[0][0].size(-2), 5)
+        self.assertEqual(past_key_values[0][3].shape, (1, 3))
+        self.assertEqual(past_key_values[0][4].tolist(), [5])
+        cache.free_sequence(0)
+        self.assertEqual(cache.num_free_blocks(), 5)
+
+    def _test_paged_attention(self, dtype, q_len, kv_cache_dtype, prec):
+        block_size = 4
+        num_heads, kv_heads, head_size = 8, 2, 16
+        scale_attn = head_size**0.5
+        context_lens = [5, 9, 2]
+        bs = len(context_lens)
+        cache = PagedKVCache(
+            1, 16, block_size, kv_heads, head_size, dtype=kv_cache_dtype
+        )
+        keys, values = [], []
+        # fill the cache with the history of each sequence
+        for seq_id, context_len in enumerate(context_lens):
+            cache.add_sequence(seq_id)
+            key = torch.randn(1, context_len, kv_heads, head_size).to(dtype)
+            value = torch.randn(1, context_len, kv_heads, head_size).to(dtype)
+            (
+                _,
+                key_cache,
+                value_cache,
+                block_tables,
+                lens,
+                *scales,
+            ) = cache.get_past_key_values([seq_id], context_len)[0]
+            torch.ops.torch_ipex.paged_attention(
+                torch.randn(1, context_len, num_heads, head_size).to(dtype),
+                key,
+                value,
+                key_cache,
+                value_cache,
+                block_tables,
+                lens,
+                scale_attn,
+                None,
+                *scales,
+            )
+            cache.advance(seq_id, context_len)
+            keys.append(key[0])
+            values.append(value[0])
+
+        query = torch.randn(bs, q_len, num_heads, head_size).to(dtype)
+        key = torch.randn(bs, q_len, kv_heads, head_size).to(dtype)
+        value = torch.randn(bs, q_len, kv_heads, head_size).to(dtype)
+        # left padded mask, masking out the first token of each sequence
+        max_len = max(context_lens) + q_len
+        attention_mask = torch.zeros(bs, 1, q_len, max_len)
+        for i, context_len in enumerate(context_lens):
+            attention_mask[i, :, :, : max_len - context_len - q_len + 1] = -1e4
+        (
+            _,
+            key_cache,
+            value_cache,
+            block_tables,
+            lens,
+            *scales,
+        ) = cache.get_past_key_values(list(range(bs)), q_len)[0]
+        attn_output = torch.ops.torch_ipex.paged_attention(
+            query,
+            key,
+            value,
+            key_cache,
+            value_cache,
+            block_tables,
+            lens,
+            scale_attn,
+            attention_mask.to(dtype),
+            *scales,
+        )
+        self.assertEqual(attn_output.shape, (bs, num_heads, q_len, head_size))
+        self.assertEqual(attn_output.dtype, dtype)
+        for i, context_len in enumerate(context_lens):
+            seq_len = context_len + q_len
+            ref = _ref_attention(
+                query[i],
+                torch.cat([keys[i], key[i]]),
+                torch.cat([values[i], value[i]]),
+                scale_attn,
+                attention_mask[i, 0, :, max_len - seq_len :],
+            )
+            self.assertEqual(attn_output[i].float(), ref, prec=prec)
+
+    def test_paged_attention(self):
+        for dtype in [torch.float, torch.bfloat16]:
+            for q_len in [1, 3]:
+                self._test_paged_attention(
+                    dtype, q_len, dtype, 2e-2 if dtype is torch.bfloat16 else 1e-5
+                )
+
+    def test_paged_attention_int8_kv_cache(self):
+        for dtype in [torch.float, torch.bfloat16]:
+            for q_len in [1, 3]:
+                self._test_paged_attention(dtype, q_len, torch.int8, 5e-2)
+
+    def test_int8_paged_kv_cache(self):
+        cache = PagedKVCache(
+            num_layers=2,
+            num_blocks=8,
+            block_size=4,
+            num_kv_heads=2,
+            head_size=8,
+            dtype=torch.int8,
+        )
+        cache.add_sequence(0)
+        past_key_values = cache.get_past_key_values([0], 5)
+        self.assertEqual(len(past_key_values[0]), 7)
+        self.assertEqual(past_key_values[0][1].dtype, torch.int8)
+        self.assertEqual(past_key_values[0][5].shape, (8, 4, 2))
+
+
+if __name__ == "__main__":
+    test = unittest.main()
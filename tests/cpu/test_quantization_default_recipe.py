@@ -1,9 +1,12 @@
 import itertools
+import json
 import tempfile
+from unittest import mock
 import torch
 import torch.nn as nn
 from torch.testing import FileCheck
 from torch.ao.quantization import (
+    HistogramObserver,
     MinMaxObserver,
     PerChannelMinMaxObserver,
     QConfig,
@@ -16,6 +19,7 @@ from test_ao_jit_llga_utils import JitLlgaTestCase, LLGA_FUSION_GROUP
 from torch.testing._internal.common_utils import run_tests
 from torch.ao.nn.quantized.modules.utils import _quantize_weight
 from intel_extension_for_pytorch.quantization import prepare, convert
+from intel_extension_for_pytorch.quantization import _autotune
 
 
 class TestDefaultRecipe(JitLlgaTestCase):
@@ -448,6 +452,310 @@ class TestDefaultRecipe(JitLlgaTestCase):
                 assert num_mul == 1 if share_weight_observers else 3
                 q_model(x)
 
+    def test_smooth_quant_layerwise_calibrate(self):
+        class Block(nn.Module):
+            def __init__(self):
+                super().__init__()
+                self.fc1 = nn.Linear(8, 16)
+                self.fc2 = nn.Linear(16, 8)
+                self.relu = nn.ReLU()
+
+            def forward(self, hidden_states, mask=None):
+                out = self.fc2(self.relu(self.fc1(hidden_states)))
+                if mask is not None:
+                    out = out * mask
+                return (hidden_states + out,)
+
+        class Mod(nn.Module):
+            def __init__(self):
+                super().__init__()
+                self.proj = nn.Linear(4, 8)
+                self.layers = nn.ModuleList([Block() for _ in range(3)])
+                self.lm_head = nn.Linear(8, 4)
+
+            def forward(self, x, mask):
+                hidden_states = self.proj(x)
+                for layer in self.layers:
+                    hidden_states = layer(hidden_states, mask=mask)[0]
+                return self.lm_head(hidden_states)
+
+        m = Mod().eval()
+        x = torch.rand(2, 4)
+        mask = torch.ones(2, 8)
+        calib_dataset = [(torch.rand(2, 4), mask) for _ in range(5)]
+        qconfig_mapping = ipex.quantization.get_smooth_quant_qconfig_mapping()
+        prepared_model = ipex.quantization.prepare(
+            m, qconfig_mapping, example_inputs=(x, mask), inplace=False
+        )
+        with torch.no_grad():
+            for data in calib_dataset:
+                prepared_model(*data)
+        prepared_model_2 = ipex.quantization.prepare(
+            m, qconfig_mapping, example_inputs=(x, mask), inplace=False
+        )
+        ipex.quantization.layerwise_calibrate(
+            prepared_model_2, prepared_model_2.layers, calib_dataset
+        )
+        # the blocks and the ops outside them are calibrated as usual
+        with tempfile.TemporaryDirectory() as tmp:
+            summaries = []
+            for i, model in enumerate([prepared_model, prepared_model_2]):
+                qconf_filename = f"{tmp}/qconf_{i}.json"
+                model.save_qconf_summary(qconf_summary=qconf_filename)
+                with open(qconf_filename) as f:
+                    summaries.append(json.load(f))
+        self.assertEqual(summaries[0], summaries[1])
+        outputs = []
+        for model in [prepared_model, prepared_model_2]:
+            q_model = ipex.quantization.convert(model)
+            with torch.no_grad():
+                q_model = torch.jit.trace(q_model, (x, mask))
+                q_model = torch.jit.freeze(q_model)
+                outputs.append(q_model(x, mask))
+        self.assertEqual(outputs[0], outputs[1])
+
+    def test_fast_calibration(self):
+        class Mod(nn.Module):
+            def __init__(self):
+                super().__init__()
+                self.conv = nn.Conv2d(3, 8, 3)
+                self.linear = nn.Linear(6, 4)
+                self.relu = nn.ReLU()
+
+            def forward(self, x, scale=None):
+                y = self.linear(self.relu(self.conv(x)))
+                if scale is not None:
+                    y = y * scale
+                return y, None
+
+        m = Mod().eval()
+        x = torch.rand(2, 3, 8, 8)
+        # several input signatures, the numbers are the constants of the graphs
+        calib_dataset = (
+            [(torch.rand(2, 3, 8, 8),) for _ in range(3)]
+            + [(torch.rand(1, 3, 8, 8), 0.5) for _ in range(3)]
+            + [(torch.rand(2, 3, 8, 8), torch.rand(1)) for _ in range(2)]
+        )
+        for qconfig_mapping in [
+            ipex.quantization.default_static_qconfig_mapping,
+            ipex.quantization.get_smooth_quant_qconfig_mapping(),
+        ]:
+            summaries = []
+            outputs = []
+            with tempfile.TemporaryDirectory() as tmp:
+                for i, fast_calibration in enumerate([False, True]):
+                    prepared_model = ipex.quantization.prepare(
+                        m,
+                        qconfig_mapping,
+                        example_inputs=(x,),
+                        inplace=False,
+                        fast_calibration=fast_calibration,
+                    )
+                    with torch.no_grad():
+                        for data in calib_dataset:
+                            outputs.append(prepared_model(*data))
+                    qconf_filename = f"{tmp}/qconf_{i}.json"
+                    prepared_model.save_qconf_summary(qconf_summary=qconf_filename)
+                    with open(qconf_filename) as f:
+                        summaries.append(json.load(f))
+            # the same outputs and statistics as the usual calibration
+            self.assertEqual(summaries[0], summaries[1])
+            n = len(calib_dataset)
+            for y, y_fast in zip(outputs[:n], outputs[n:]):
+                self.assertEqual(y[0], y_fast[0])
+                self.assertIsNone(y_fast[1])
+
+    def test_merge_calibration_shards(self):
+        class Mod(nn.Module):
+            def __init__(self):
+                super().__init__()
+                self.dense = nn.Linear(4, 8)
+                self.relu = nn.ReLU()
+                self.dense2 = nn.Linear(8, 4)
+
+            def forward(self, x):
+                return self.dense2(self.relu(self.dense(x)))
+
+        m = Mod().eval()
+        x = torch.rand(2, 4)
+        calib_dataset = [torch.randn(2, 4) * (i + 1) for i in range(6)]
+        static_qconfig = QConfig(
+            activation=MinMaxObserver.with_args(reduce_range=False),
+            weight=PerChannelMinMaxObserver.with_args(
+                dtype=torch.qint8, qscheme=torch.per_channel_symmetric
+            ),
+        )
+        smooth_quant_qconfig = ipex.quantization.get_smooth_quant_qconfig_mapping(
+            act_observer=MinMaxObserver()
+        )
+        for qconfig_mapping in [
+            QConfigMapping().set_global(static_qconfig),
+            smooth_quant_qconfig,
+        ]:
+            with tempfile.TemporaryDirectory() as tmp:
+                # each instance calibrates every other sample
+                shards = []
+                for idx in range(2):
+                    prepared_model = ipex.quantization.prepare(
+                        m, qconfig_mapping, example_inputs=x, inplace=False
+                    )
+                    for data in calib_dataset[idx::2]:
+                        prepared_model(data)
+                    shards.append(f"{tmp}/calib_shard_{idx}.pt")
+                    prepared_model.save_calibration_shard(shards[-1])
+                prepared_model = ipex.quantization.prepare(
+                    m, qconfig_mapping, example_inputs=x, inplace=False
+                )
+                prepared_model.merge_calibration_shards(
+                    shards, qconf_summary=f"{tmp}/qconf_merged.json"
+                )
+                prepared_model_ref = ipex.quantization.prepare(
+                    m, qconfig_mapping, example_inputs=x, inplace=False
+                )
+                for data in calib_dataset:
+                    prepared_model_ref(data)
+                prepared_model_ref.save_qconf_summary(
+                    qconf_summary=f"{tmp}/qconf_ref.json"
+                )
+                with open(f"{tmp}/qconf_merged.json") as f:
+                    qconf_merged = json.load(f)
+                with open(f"{tmp}/qconf_ref.json") as f:
+                    qconf_ref = json.load(f)
+            self.assertEqual(qconf_merged, qconf_ref)
+
+    def test_merge_calibration_shards_histogram(self):
+        from intel_extension_for_pytorch.quantization._calibration_shard import (
+            _merge_observer,
+        )
+
+        data = [torch.randn(64) * (i + 1) for i in range(4)]
+        shard_observers = [HistogramObserver(), HistogramObserver()]
+        for i, t in enumerate(data):
+            shard_observers[i % 2](t)
+        obs = HistogramObserver()
+        _merge_observer(obs, [o.state_dict() for o in shard_observers])
+        obs_ref = HistogramObserver()
+        for t in data:
+            obs_ref(t)
+        self.assertEqual(obs.min_val, obs_ref.min_val)
+        self.assertEqual(obs.max_val, obs_ref.max_val)
+        # the counts are kept by the re-binning
+        self.assertEqual(obs.histogram.sum(), sum(t.numel() for t in data))
+
+    def test_autotune_mixed_precision(self):
+        class M(nn.Module):
+            def __init__(self):
+                super().__init__()
+                self.conv = nn.Conv2d(3, 8, 3)
+                self.linear1 = nn.Linear(6, 6)
+                self.linear2 = nn.Linear(6, 4)
+
+            def forward(self, x):
+                return self.linear2(self.linear1(self.conv(x).relu()))
+
+        m = M().eval()
+        x = torch.rand(2, 3, 8, 8)
+        data = [torch.rand(2, 3, 8, 8) for _ in range(4)]
+        with torch.no_grad():
+            refs = [m(t) for t in data]
+
+        def eval_func(model):
+            with torch.no_grad():
+                return -max(
+                    (model(t).float() - ref).abs().max().item()
+                    for t, ref in zip(data, refs)
+                )
+
+        def _qconf_of(prepared_model, tmp):
+            prepared_model.save_qconf_summary(qconf_summary=f"{tmp}/qconf.json")
+            with open(f"{tmp}/qconf.json") as f:
+                return json.load(f)
+
+        run_trial = _autotune._run_trial
+
+        def _run_trial(context, qconf_summary, precision):
+            # the latency is stubbed to be deterministic: it grows with the ops
+            # which are not quantized, and BF16 is faster than FP32
+            accuracy, _ = run_trial(context, qconf_summary, precision)
+            with open(qconf_summary) as f:
+                num_quantized_ops = len(_autotune._quantized_ops(json.load(f)))
+            return accuracy, -num_quantized_ops + (0.0 if precision == "bf16" else 0.5)
+
+        for accuracy_criterion, num_workers in [
+            ({"absolute": 100.0}, 1),
+            ({"absolute": 100.0}, 2),
+            ({"absolute": 0.0}, 1),
+        ]:
+            prepared_model = ipex.quantization.prepare(
+                m,
+                ipex.quantization.default_static_qconfig_mapping,
+                example_inputs=(x,),
+            )
+            with tempfile.TemporaryDirectory() as tmp, mock.patch.object(
+                _autotune, "_run_trial", _run_trial
+            ):
+                with torch.no_grad():
+                    for t in data:
+                        prepared_model(t)
+                num_ops = len(_autotune._quantized_ops(_qconf_of(prepared_model, tmp)))
+                if accuracy_criterion["absolute"] > 0:
+                    tuned_model, report = ipex.quantization.autotune_mixed_precision(
+                        prepared_model,
+                        None,
+                        eval_func,
+                        x,
+                        accuracy_criterion=accuracy_criterion,
+                        num_workers=num_workers,
+                        latency_iters=2,
+                    )
+                else:
+                    with self.assertWarnsRegex(UserWarning, "the FP32 model is chosen"):
+                        (
+                            tuned_model,
+                            report,
+                        ) = ipex.quantization.autotune_mixed_precision(
+                            prepared_model,
+                            None,
+                            eval_func,
+                            x,
+                            accuracy_criterion=accuracy_criterion,
+                            num_workers=num_workers,
+                            latency_iters=2,
+                        )
+                tuned_ops = _autotune._quantized_ops(_qconf_of(tuned_model, tmp))
+            # the FP32 baseline is not a candidate
+            self.assertFalse(
+                any(
+                    r["fallback_precision"] == "fp32"
+                    and len(r["fallback_ops"]) == num_ops
+                    for r in report
+                )
+            )
+            passed = [r for r in report if r["meets_criterion"]]
+            self.assertEqual(
+                [r["latency"] for r in passed], sorted(r["latency"] for r in passed)
+            )
+            if accuracy_criterion["absolute"] > 0:
+                # early stop at the candidates with all the ops quantized, the BF16
+                # one is the fastest
+                self.assertEqual(len(report), 2)
+                self.assertTrue(report[0]["meets_criterion"])
+                self.assertEqual(report[0]["fallback_ops"], [])
+                self.assertEqual(report[0]["fallback_precision"], "bf16")
+                self.assertEqual(len(tuned_ops), num_ops)
+                # the tuned recipe is loaded
+                with torch.no_grad(), torch.cpu.amp.autocast():
+                    q_model = ipex.quantization.convert(tuned_model)
+                    q_model = torch.jit.freeze(torch.jit.trace(q_model, x))
+                    self.assertAlmostEqual(
+                        eval_func(q_model), report[0]["accuracy"], delta=1e-2
+                    )
+            else:
+                # no quantized recipe meets the criterion, the FP32 one is loaded
+                self.assertTrue(len(report) > 2)
+                self.assertEqual(passed, [])
+                self.assertEqual(len(tuned_ops), 0)
+
     def test_none_example_input_for_quantization(self):
         class M(nn.Module):
             def __init__(self):
@@ -819,6 +1127,54 @@ class TestDefaultRecipe(JitLlgaTestCase):
                 assert hasattr(woq_model.linear, '_lowp_mode') and woq_model.linear._lowp_mode == mode, \
                     'Weight-only quantization: low precision gemm flag is not correctly set'
 
+    def test_weight_only_quantization_int8_compute(self):
+        from intel_extension_for_pytorch.quantization import WoqLowpMode
+
+        class M(nn.Module):
+            def __init__(self):
+                super(M, self).__init__()
+                self.linear = torch.nn.Linear(128, 64)
+
+            def forward(self, x):
+                return self.linear(x)
+
+        def quantize_dequantize_per_token(x, group_size):
+            # activation quantized to uint8 per token, or per group of each token
+            x = x.view(x.size(0), -1, group_size)
+            min_val = torch.clamp(x.amin(-1, keepdim=True), max=0)
+            max_val = torch.clamp(x.amax(-1, keepdim=True), min=0)
+            scale = (max_val - min_val) / 255
+            scale = torch.where(scale == 0, torch.ones_like(scale), scale)
+            zp = -torch.round(min_val / scale)
+            x_q = torch.clamp(torch.round(x * (1 / scale)) + zp, 0, 255)
+            return ((x_q - zp) * scale).view(x.size(0), -1)
+
+        m = M().eval()
+        cases = itertools.product([torch.qint8, torch.quint4x2], [-1, 32], [1, 4, 64])
+        for w_dtype, group_size, batch_size in cases:
+            data = torch.rand(batch_size, 128) - 0.5
+            outputs = {}
+            for mode in [WoqLowpMode.NONE, WoqLowpMode.INT8]:
+                qconfig = ipex.quantization.get_weight_only_quant_qconfig_mapping(
+                    weight_dtype=w_dtype, lowp_mode=mode, group_size=group_size
+                )
+                prepared_model = prepare(m, qconfig, example_inputs=data, inplace=False)
+                with torch.no_grad():
+                    woq_model = convert(prepared_model)
+                    if mode == WoqLowpMode.NONE:
+                        x = quantize_dequantize_per_token(
+                            data, group_size if group_size > 0 else 128
+                        )
+                    else:
+                        x = data
+                    outputs[mode] = woq_model(x)
+            torch.testing.assert_close(
+                outputs[WoqLowpMode.INT8],
+                outputs[WoqLowpMode.NONE],
+                atol=1e-3,
+                rtol=1e-3,
+            )
+
     def test_weight_only_quantization_num_concats(self):
         class Mod(nn.Module):
             def __init__(self):
@@ -860,6 +1216,107 @@ class TestDefaultRecipe(JitLlgaTestCase):
                 output2 = qm2(data)
                 torch.testing.assert_close(output1, output2, atol=1e-2, rtol=1e-4)
 
+    def test_weight_only_quantization_group_wise(self):
+        class M(nn.Module):
+            def __init__(self, input_channel, output_channel, has_bias):
+                super(M, self).__init__()
+                self.linear = torch.nn.Linear(input_channel, output_channel, has_bias)
+
+            def forward(self, x):
+                return self.linear(x)
+
+        def test(feature, has_bias, w_dtype, group_size):
+            model = M(feature[1], feature[2], has_bias)
+            m = model.eval()
+            data = torch.rand(feature[0], feature[1])
+            qconfig = ipex.quantization.get_weight_only_quant_qconfig_mapping(
+                weight_dtype=w_dtype, group_size=group_size
+            )
+            weight_observer = qconfig.global_qconfig.weight()
+            weight_observer(model.linear.weight)
+            scales, zero_points = weight_observer.calculate_qparams()
+            assert scales.shape == (feature[2], feature[1] // group_size)
+            # reference: fake quantize each group with its own qparams
+            s = scales.repeat_interleave(group_size, 1)
+            z = zero_points.float().repeat_interleave(group_size, 1)
+            qw = torch.clamp(
+                torch.round(model.linear.weight / s + z),
+                weight_observer.quant_min,
+                weight_observer.quant_max,
+            )
+            weight_fp32 = (qw - z) * s
+            output1 = torch.matmul(data, weight_fp32.T)
+            if has_bias:
+                output1 += model.linear.bias
+
+            prepared_model = prepare(m, qconfig, example_inputs=data, inplace=False)
+            with torch.no_grad():
+                woq_model = convert(prepared_model)
+                woq_linear_class = (
+                    ipex.nn.modules.weight_only_quantization.IpexWoqLinear
+                )
+                assert isinstance(woq_model.linear, woq_linear_class)
+                assert woq_model.linear._group_size == group_size
+                output2 = woq_model(data)
+                torch.testing.assert_close(output1, output2, atol=1e-4, rtol=1e-4)
+
+        shape_list = [
+            [3, 128, 31],
+            [4, 256, 256],
+            [196, 512, 64],
+        ]
+        use_bias_list = [True, False]
+        w_dtype_list = [torch.qint8, torch.quint4x2]
+        group_size_list = [32, 128]
+        cases = itertools.product(
+            shape_list, use_bias_list, w_dtype_list, group_size_list
+        )
+        for shape, use_bias, w_dtype, group_size in cases:
+            test(shape, use_bias, w_dtype, group_size)
+
+    def test_weight_only_quantization_group_wise_int4_weight(self):
+        class M(nn.Module):
+            def __init__(self):
+                super(M, self).__init__()
+                self.linear = torch.nn.Linear(256, 64)
+
+            def forward(self, x):
+                return self.linear(x)
+
+        def pack_int4(t, dim):
+            # compress uint4 values as int32 along dim
+            t = t.movedim(dim, -1)
+            t = torch.nn.functional.pad(t, (0, -t.shape[-1] % 8))
+            t = t.reshape(*t.shape[:-1], -1, 8).to(torch.int32)
+            shifts = torch.arange(0, 32, 4, dtype=torch.int32)
+            return (
+                (t << shifts).sum(-1, dtype=torch.int32).movedim(-1, dim).contiguous()
+            )
+
+        N, K, group_size = 64, 256, 64
+        m = M().eval()
+        data = torch.rand(4, K)
+        qweight = torch.randint(0, 16, (N, K))
+        scales = (torch.rand(N, K // group_size) * 0.01 + 0.001).half()
+        zero_points = torch.randint(0, 16, (N, K // group_size))
+        weight_fp32 = (
+            qweight - zero_points.repeat_interleave(group_size, 1)
+        ) * scales.float().repeat_interleave(group_size, 1)
+        output1 = torch.matmul(data, weight_fp32.T) + m.linear.bias
+        qconfig = ipex.quantization.get_weight_only_quant_qconfig_mapping(
+            weight_dtype=torch.quint4x2
+        )
+        m.linear.qconfig = qconfig.global_qconfig
+        # zero points compressed along N or along the groups
+        for zp_dim in [0, 1]:
+            woq_linear = ipex.nn.modules.weight_only_quantization.IpexWoqLinear.from_float_and_int4_weight(
+                m.linear, pack_int4(qweight, 1), scales, pack_int4(zero_points, zp_dim)
+            )
+            assert woq_linear._group_size == group_size
+            with torch.no_grad():
+                output2 = woq_linear(data)
+            torch.testing.assert_close(output1, output2, atol=1e-2, rtol=1e-3)
+
 
 if __name__ == "__main__":
     run_tests()
@@ -1,3 +1,6 @@
+import asyncio
+import threading
+import time
 import unittest
 import torch
 import intel_extension_for_pytorch as ipex
@@ -247,6 +250,177 @@ class TestRuntimeAPI(TestCase):
         self.assertEqual(y, y_runtime)
         self.assertEqual(y, y_runtime2)
 
+    @unittest.skipIf(
+        not ipex.cpu.runtime.is_runtime_ext_enabled(),
+        "Skip when IPEX Runtime extension is not enabled",
+    )
+    @runtime_thread_affinity_test_env
+    def test_task_dynamic_batching(self):
+        model = SimpleNet()
+        model.eval()
+        xs = [torch.rand(1, 64, 3, 3) for _ in range(6)] + [torch.rand(2, 64, 3, 3)]
+        # Calculate the reference result
+        with torch.no_grad():
+            ys = [model(x) for x in xs]
+            traced_model = torch.jit.trace(model, xs[0])
+            traced_model = torch.jit.freeze(traced_model)
+
+        # Create task with dynamic batching
+        cpu_pool = ipex.cpu.runtime.CPUPool(node_id=0)
+        for m in (model, traced_model):
+            task = ipex.cpu.runtime.Task(
+                m, cpu_pool, max_batch_size=4, batch_timeout=0.1
+            )
+            # The requests are batched and the results are split back
+            y_runtime_futures = [task(x) for x in xs]
+            y_runtime = [
+                y_runtime_future.get() for y_runtime_future in y_runtime_futures
+            ]
+            for y, y_r in zip(ys, y_runtime):
+                self.assertEqual(y, y_r)
+            # The requests of another shape are not batched together
+            x = torch.rand(1, 64, 5, 5)
+            with torch.no_grad():
+                y = model(x)
+            y_runtime_futures = [task(xs[0]), task(x)]
+            self.assertEqual(ys[0], y_runtime_futures[0].get())
+            self.assertEqual(y, y_runtime_futures[1].get())
+            if m is model:
+                # The batch runs in the grad mode of the submitting thread
+                with torch.no_grad():
+                    self.assertFalse(task(xs[0]).get().requires_grad)
+                self.assertTrue(task(xs[0]).get().requires_grad)
+            task.close()
+            # Without the batching after closed
+            self.assertEqual(ys[0], task(xs[0]).get())
+
+    def test_task_dynamic_batching_request_key(self):
+        from intel_extension_for_pytorch.cpu.runtime.task import _Request
+
+        # The requests with a 0-dim tensor are not batched
+        request = _Request((torch.tensor(1.0), torch.rand(2, 3)), {}, 0)
+        self.assertFalse(request.batchable)
+        # The negative batch dim counts from the last dim
+        request = _Request((torch.rand(3, 2),), {}, -1)
+        self.assertTrue(request.batchable)
+        self.assertEqual(request.batch_size, 2)
+        self.assertEqual(request.key, _Request((torch.rand(3, 5),), {}, -1).key)
+        self.assertNotEqual(request.key, _Request((torch.rand(4, 2),), {}, -1).key)
+        # The requests in different grad modes are not batched together
+        with torch.no_grad():
+            self.assertNotEqual(request.key, _Request((torch.rand(3, 2),), {}, -1).key)
+
+    @unittest.skipIf(
+        not ipex.cpu.runtime.is_runtime_ext_enabled(),
+        "Skip when IPEX Runtime extension is not enabled",
+    )
+    @runtime_thread_affinity_test_env
+    def test_task_awaitable_api(self):
+        model = SimpleNet()
+        model.eval()
+        xs = [torch.rand(64, 64, 3, 3) for _ in range(4)]
+        # Calculate the reference result
+        ys = [model(x) for x in xs]
+
+        cpu_pool = ipex.cpu.runtime.CPUPool(node_id=0)
+        task = ipex.cpu.runtime.Task(model, cpu_pool)
+        batched_task = ipex.cpu.runtime.Task(model, cpu_pool, max_batch_size=128)
+
+        async def serve():
+            # Several requests are in flight in one event loop
+            return await asyncio.gather(
+                *[task.run_awaitable(x) for x in xs],
+                *[batched_task.run_awaitable(x) for x in xs],
+            )
+
+        y_runtime = asyncio.run(serve())
+        for y, y_r in zip(ys + ys, y_runtime):
+            self.assertEqual(y, y_r)
+        task.close()
+        batched_task.close()
+
+    @unittest.skipIf(
+        not ipex.cpu.runtime.is_runtime_ext_enabled(),
+        "Skip when IPEX Runtime extension is not enabled",
+    )
+    @runtime_thread_affinity_test_env
+    def test_multi_pool_executor_priority_and_deadline(self):
+        order = []
+
+        def test(x, started=None, release=None):
+            if started is not None:
+                started.set()
+                release.wait()
+            order.append(x)
+            return x
+
+        cpu_pool = ipex.cpu.runtime.CPUPool(node_id=0)
+        executor = ipex.cpu.runtime.MultiPoolExecutor(test, [cpu_pool])
+        started, release = threading.Event(), threading.Event()
+        # Occupy the pool, the next tasks are queued
+        y_future = executor.submit(0, started=started, release=release)
+        started.wait()
+        y_low_future = executor.submit(1)
+        y_high_future = executor.submit(2, priority=1)
+        y_expired_future = executor.submit(3, priority=2, deadline=0.01)
+        y_cancelled_future = executor.submit(4)
+        self.assertTrue(y_cancelled_future.cancel())
+        time.sleep(0.1)
+        release.set()
+        self.assertEqual(y_future.get(), 0)
+        self.assertEqual(y_low_future.get(), 1)
+        self.assertEqual(y_high_future.get(), 2)
+        with self.assertRaises(ipex.cpu.runtime.DeadlineExceededError):
+            y_expired_future.get()
+        executor.shutdown()
+        # The task of the higher priority runs first
+        self.assertEqual(order, [0, 2, 1])
+
+    @unittest.skipIf(
+        not ipex.cpu.runtime.is_runtime_ext_enabled(),
+        "Skip when IPEX Runtime extension is not enabled",
+    )
+    @runtime_thread_affinity_test_env
+    def test_multi_pool_executor_work_stealing(self):
+        model = SimpleNet()
+        model.eval()
+        x = torch.rand(64, 64, 3, 3)
+        # Calculate the reference result
+        y = model(x)
+
+        def test(x, started=None, release=None):
+            if started is not None:
+                started.set()
+                release.wait()
+                return None
+            return model(x)
+
+        cpu_pool = ipex.cpu.runtime.CPUPool([1, 2])
+        cpu_pool2 = ipex.cpu.runtime.CPUPool([3, 4])
+        with ipex.cpu.runtime.MultiPoolExecutor(
+            test, [cpu_pool, cpu_pool2]
+        ) as executor:
+            started, release = threading.Event(), threading.Event()
+            # Occupy one of the pools
+            blocking_future = executor.submit(
+                x, started=started, release=release, pool_index=0
+            )
+            started.wait()
+            busy_pool_index = blocking_future.pool_index
+            # The tasks queued on the busy pool are run by the idle pool
+            y_runtime_futures = [
+                executor.submit(x, pool_index=busy_pool_index) for _ in range(4)
+            ]
+            for y_runtime_future in y_runtime_futures:
+                self.assertEqual(y, y_runtime_future.result(timeout=60))
+                self.assertNotEqual(y_runtime_future.pool_index, busy_pool_index)
+            self.assertFalse(blocking_future.done())
+            release.set()
+            # The tasks run in the grad mode of the submitting thread
+            with torch.no_grad():
+                self.assertFalse(executor.submit(x).get().requires_grad)
+            self.assertTrue(executor.submit(x).get().requires_grad)
+
 
 class TestMultiStreamModule(TestCase):
     @unittest.skipIf(
@@ -272,6 +446,112 @@ class TestMultiStreamModule(TestCase):
         y_runtime = multi_stream_model(x)
         self.assertEqual(y, y_runtime)
 
+    @unittest.skipIf(
+        not ipex.cpu.runtime.is_runtime_ext_enabled(),
+        "Skip when IPEX Runtime extension is not enabled",
+    )
+    @runtime_thread_affinity_test_env
+    def test_multi_stream_module_forward_async(self):
+        model = SimpleNet()
+        model.eval()
+        batch_size = ipex.cpu.runtime.get_core_list_of_node_id(0).__len__()
+        xs = [torch.rand(batch_size, 64, 3, 3) for _ in range(3)]
+
+        # Calculate the reference result
+        ys = [model(x) for x in xs]
+
+        # Create MultiStreamModule
+        cpu_pool = ipex.cpu.runtime.CPUPool(node_id=0)
+        for num_streams in (1, 2):
+            multi_stream_model = ipex.cpu.runtime.MultiStreamModule(
+                model, num_streams=num_streams, cpu_pool=cpu_pool
+            )
+
+            async def serve():
+                return await asyncio.gather(
+                    *[multi_stream_model.forward_async(x) for x in xs]
+                )
+
+            y_runtime = asyncio.run(serve())
+            for y, y_r in zip(ys, y_runtime):
+                self.assertEqual(y, y_r)
+
+    @unittest.skipIf(
+        not ipex.cpu.runtime.is_runtime_ext_enabled(),
+        "Skip when IPEX Runtime extension is not enabled",
+    )
+    @runtime_thread_affinity_test_env
+    def test_multi_stream_module_adaptive_num_streams(self):
+        model = SimpleNet()
+        model.eval()
+        num_cores = ipex.cpu.runtime.get_core_list_of_node_id(0).__len__()
+        xs = [torch.rand(batch_size, 64, 3, 3) for batch_size in (1, 3, num_cores)]
+
+        # Calculate the reference result
+        ys = [model(x) for x in xs]
+
+        # Create MultiStreamModule
+        cpu_pool = ipex.cpu.runtime.CPUPool(node_id=0)
+        multi_stream_model = ipex.cpu.runtime.MultiStreamModule(
+            model, num_streams="ADAPTIVE", cpu_pool=cpu_pool, adaptive_trials=1
+        )
+
+        # Each candidate number of streams runs twice, and one more forward uses the selected one
+        for _ in range(2 * num_cores + 1):
+            for x, y in zip(xs, ys):
+                y_runtime = multi_stream_model(x)
+                self.assertEqual(y, y_runtime)
+        for x in xs:
+            signature = multi_stream_model._get_input_signature((x,), {})
+            num_streams = multi_stream_model.adaptive_num_streams[signature]
+            # The streams are no more than the batchsize
+            self.assertTrue(1 <= num_streams <= min(x.size(0), num_cores))
+        # Only the tasks of the selected numbers of streams are kept
+        self.assertEqual(
+            set(multi_stream_model._stream_configs.keys()),
+            set(multi_stream_model.adaptive_num_streams.values()),
+        )
+
+    @unittest.skipIf(
+        not ipex.cpu.runtime.is_runtime_ext_enabled(),
+        "Skip when IPEX Runtime extension is not enabled",
+    )
+    @runtime_thread_affinity_test_env
+    def test_multi_stream_module_reuse_output_buffers(self):
+        model = SimpleNet()
+        model.eval()
+        batch_size = ipex.cpu.runtime.get_core_list_of_node_id(0).__len__()
+        x = torch.rand(batch_size, 64, 3, 3)
+        x2 = torch.rand(batch_size, 64, 3, 3)
+        x3 = torch.rand(batch_size * 2, 64, 3, 3)
+
+        with torch.no_grad():
+            # Calculate the reference result
+            y = model(x)
+            y2 = model(x2)
+            y3 = model(x3)
+
+            # Create MultiStreamModule
+            cpu_pool = ipex.cpu.runtime.CPUPool(node_id=0)
+            multi_stream_model = ipex.cpu.runtime.MultiStreamModule(
+                model, num_streams=2, cpu_pool=cpu_pool, reuse_output_buffers=True
+            )
+
+            y_runtime = multi_stream_model(x)
+            self.assertEqual(y, y_runtime)
+            y_runtime_ptr = y_runtime.data_ptr()
+            # The output buffer is reused by the forward of the same shape
+            y2_runtime = multi_stream_model(x2)
+            self.assertEqual(y2, y2_runtime)
+            self.assertEqual(y_runtime_ptr, y2_runtime.data_ptr())
+            # Another buffer is used for another shape
+            y3_runtime = multi_stream_model(x3)
+            self.assertEqual(y3, y3_runtime)
+            self.assertNotEqual(y_runtime_ptr, y3_runtime.data_ptr())
+            self.assertEqual(y2, multi_stream_model(x2))
+            # Only the buffer of the latest shape is kept for the output
+            self.assertEqual(len(multi_stream_model._output_buffers), 1)
+
     @unittest.skipIf(
         not ipex.cpu.runtime.is_runtime_ext_enabled(),
         "Skip when IPEX Runtime extension is not enabled",
@@ -63,6 +63,7 @@ def construct_numa_config(
     n_e_cores=0,
     numa_mode=0,
     show_node=True,
+    n_cores_per_l3=0,
 ):
     cores = []
     for i in range(n_nodes):
@@ -119,11 +120,16 @@ def construct_numa_config(
         ret.append("CPU CORE SOCKET NODE MAXMHZ")
     else:
         ret.append("CPU CORE SOCKET MAXMHZ")
+    if n_cores_per_l3 > 0:
+        # every n_cores_per_l3 cores share an L3 cache
+        ret[0] += " L1d:L1i:L2:L3"
     for c in cores:
         if show_node:
             ret.append(f"{c.cpu} {c.core} {c.socket} {c.node} {c.maxmhz}")
         else:
             ret.append(f"{c.cpu} {c.core} {c.socket} {c.maxmhz}")
+        if n_cores_per_l3 > 0:
+            ret[-1] += f" {c.core}:{c.core}:{c.core}:{c.core // n_cores_per_l3}"
     return "\n".join(ret)
 
 